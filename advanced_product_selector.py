@@ -5,30 +5,39 @@ from database_manager import DatabaseManager
 from calculator import PoolCalculator
 from typing import Dict, List, Any
 import json
+import logging
+from app_logging import get_logger
+from metrics import stage
 try:
-    from flask import session
+    from flask import session, has_request_context
 except ImportError:
     session = None  # Para casos onde Flask não está disponível
 
+log = get_logger('advanced_product_selector')
+
+
+def _session_get(key, default):
+    """Valor da sessão Flask, ou default fora de um pedido Flask (ASGI, executores)"""
+    if session is None or not has_request_context():
+        return default
+    return session.get(key, default)
+
 class AdvancedProductSelector:
     """Seletor avançado de produtos integrado com base de dados"""
     
-    def __init__(self):
-        self.db = DatabaseManager()
+    def __init__(self, db: DatabaseManager = None):
+        self.db = db if db is not None else DatabaseManager()
         self.calculator = PoolCalculator()
     
-    def generate_budget(self, answers: Dict, metrics: Dict, dimensions: Dict) -> Dict:
-        """Gera orçamento completo usando a base de dados"""
-        # Calcular multiplicador final (novo sistema sem factor de acesso)
-        final_multiplier = self.calculator.calculate_final_multiplier(answers, dimensions)
-        # Obter breakdown detalhado dos multiplicadores
-        multiplier_breakdown = self.calculator.get_multiplier_breakdown(answers, dimensions)
+    def generate_budget(self, answers: Dict, metrics: Dict, dimensions: Dict, client_data: Dict = None) -> Dict:
+        """Gera orçamento completo usando a base de dados (client_data None: lido da sessão)"""
+        # Calcular multiplicador final e breakdown numa só passagem (novo sistema sem factor de acesso)
+        final_multiplier, multiplier_breakdown = self.calculator.calculate_complexity_multiplier(answers, dimensions)
         # Calcular custos específicos de transporte de areia (substitui multiplicador de acesso)
         transport_costs = self.calculator.calculate_transport_costs(answers, metrics)
         # Obter dados do cliente da sessão (se disponível)
-        client_data = {}
-        if session:
-            client_data = session.get('client_data', {})
+        if client_data is None:
+            client_data = _session_get('client_data', {})
         budget = {
             'pool_info': {
                 'dimensions': dimensions,
@@ -55,8 +64,10 @@ class AdvancedProductSelector:
             'tratamento_agua': answers.get('tratamento_agua', 'nao')
         }
         # Selecionar produtos por família
-        filtracao = self._select_filtration_products(conditions, metrics)
-        recirculacao = self._select_recirculation_lighting_products(conditions, dimensions)
+        with stage('filtracao'):
+            filtracao = self._select_filtration_products(conditions, metrics)
+        with stage('recirculacao_iluminacao'):
+            recirculacao = self._select_recirculation_lighting_products(conditions, dimensions)
 
         # --- Lógica para Sal Granulado Refinado ---
         import math
@@ -261,177 +272,24 @@ class AdvancedProductSelector:
                     'can_change_type': False
                 }
 
-        # --- Lógica para família Revestimento ---
-        revestimento = {}
-        revestimento_tipo = conditions.get('coating_type', 'tela')
-        cobertura = answers.get('cobertura', 'nao')
-        tipo_cobertura_laminas = answers.get('tipo_cobertura_laminas', '')
-        tipo_construcao = answers.get('tipo_construcao', 'nova')
-        forma_piscina = answers.get('forma_piscina', 'standard')  # Adapte se o nome do campo for diferente
-
-        if revestimento_tipo == 'tela':
-            comprimento = dimensions.get('comprimento', 0)
-            largura = dimensions.get('largura', 0)
-            bordadura = metrics.get('ml_bordadura', 0)
-            revestimento_produtos = self.db.get_products_by_family('Revestimento')
-            quantidades = answers.get('quantidades', {})
-
-            # Lógica só para forma standard
-            if forma_piscina == 'standard':
-                # Fórmulas de rolos
-                if cobertura == 'laminas' and tipo_cobertura_laminas in ['submersa_praia', 'fora_praia']:
-                    # Fórmula 1
-                    x = (comprimento + largura) * 2 + largura + largura + (comprimento / 1.6) * largura
-                else:
-                    # Fórmula 2
-                    x = (comprimento + largura) * 2 + (comprimento / 1.6) * 2
-                rolos_qty = math.ceil(x / 25) if x > 0 else 0
-
-                # Produto padrão: Revestimento Tela Armada 3D Unicolor CGT Vg 1
-                tela_produto = next((p for p in revestimento_produtos if 'tela armada 3d unicolor' in p['name'].lower() and 'cgt' in p['name'].lower()), None)
-                # Alternativas
-                tela_3d = next((p for p in revestimento_produtos if 'tela armada 3d' in p['name'].lower() and 'cgt' in p['name'].lower() and 'unicolor' not in p['name'].lower()), None)
-                tela_lisa = next((p for p in revestimento_produtos if 'tela armada lisa' in p['name'].lower() and 'cgt' in p['name'].lower()), None)
-                tela_alternatives = []
-                if tela_3d:
-                    tela_alternatives.append({'id': tela_3d['id'], 'name': tela_3d['name'], 'price': tela_3d['base_price']})
-                if tela_lisa:
-                    tela_alternatives.append({'id': tela_lisa['id'], 'name': tela_lisa['name'], 'price': tela_lisa['base_price']})
-                if tela_produto and rolos_qty > 0:
-                    key = f"tela_armada"
-                    q_override = quantidades.get(key)
-                    revestimento[key] = {
-                        'name': tela_produto['name'],
-                        'price': tela_produto['base_price'],
-                        'quantity': int(q_override) if q_override is not None else rolos_qty,
-                        'unit': tela_produto['unit'],
-                        'item_type': 'incluido',
-                        'reasoning': f'Quantidade calculada: {rolos_qty} rolos de 25m cada',
-                        'can_change_type': True,
-                        'alternatives': tela_alternatives,
-                        'product_id': tela_produto['id']
-                    }
-
-                # Perfis
-                perfil_horizontal = next((p for p in revestimento_produtos if 'perfil horizontal' in p['name'].lower()), None)
-                perfil_vertical = next((p for p in revestimento_produtos if 'perfil vertical' in p['name'].lower()), None)
-                chapa_colaminada = next((p for p in revestimento_produtos if 'chapa colaminada' in p['name'].lower()), None)
-                perfil_produto = perfil_horizontal if tipo_construcao == 'nova' else perfil_vertical
-                if bordadura > 0 and perfil_produto:
-                    perfis_qty = math.ceil(bordadura / 2)
-                    perfil_alternatives = []
-                    if chapa_colaminada:
-                        perfil_alternatives.append({'id': chapa_colaminada['id'], 'name': chapa_colaminada['name'], 'price': chapa_colaminada['base_price']})
-                    key_perfil = "perfil"
-                    q_override_perfil = quantidades.get(key_perfil)
-                    revestimento[key_perfil] = {
-                        'name': perfil_produto['name'],
-                        'price': perfil_produto['base_price'],
-                        'quantity': int(q_override_perfil) if q_override_perfil is not None else perfis_qty,
-                        'unit': perfil_produto['unit'],
-                        'item_type': 'incluido',
-                        'reasoning': f'Perfil {"horizontal" if tipo_construcao == "nova" else "vertical"}: {perfis_qty} un (2ml cada)',
-                        'can_change_type': True,
-                        'alternatives': perfil_alternatives,
-                        'product_id': perfil_produto['id']
-                    }
-                    # Chapa Colaminada como alternativa funcional (item_type alternativo)
-                    if chapa_colaminada:
-                        key_chapa = "chapa_colaminada"
-                        q_override_chapa = quantidades.get(key_chapa)
-                        revestimento[key_chapa] = {
-                            'name': chapa_colaminada['name'],
-                            'price': chapa_colaminada['base_price'],
-                            'quantity': int(q_override_chapa) if q_override_chapa is not None else perfis_qty,
-                            'unit': chapa_colaminada['unit'],
-                            'item_type': 'alternativo',
-                            'reasoning': f'Alternativa à {"horizontal" if tipo_construcao == "nova" else "vertical"}: {perfis_qty} un (2ml cada)',
-                            'alternative_to': 'perfil',
-                            'can_change_type': False,
-                            'product_id': chapa_colaminada['id']
-                        }
-            else:
-                # Forma especial: 1 rolo padrão
-                tela_produto = next((p for p in revestimento_produtos if 'tela armada 3d unicolor' in p['name'].lower() and 'cgt' in p['name'].lower()), None)
-                if tela_produto:
-                    revestimento['tela_armada'] = {
-                        'name': tela_produto['name'],
-                        'price': tela_produto['base_price'],
-                        'quantity': 1,
-                        'unit': tela_produto['unit'],
-                        'item_type': 'incluido',
-                        'reasoning': 'Forma especial: 1 rolo padrão',
-                        'can_change_type': True,
-                        'alternatives': [],
-                        'product_id': tela_produto['id']
-                    }
-        
-        elif revestimento_tipo == 'ceramica':
-            # --- Lógica para revestimento cerâmico ---
-            revestimento_produtos = self.db.get_products_by_family('Revestimento')
-            ceramicos = [p for p in revestimento_produtos if p.get('category_name') == 'Cerâmica']
-            quantidades = answers.get('quantidades', {})
-            
-            # Produto fixo: Impermeabilização
-            impermeabilizacao = next((p for p in ceramicos if 'impermeabilização' in p['name'].lower() or 'imper' in p['code'].lower()), None)
-            if impermeabilizacao:
-                # Usar as áreas já calculadas no metrics
-                area_paredes = metrics.get('m2_paredes', 0)
-                area_fundo = metrics.get('m2_fundo', 0) 
-                area_total = area_paredes + area_fundo
-                
-                key_imper = "impermeabilizacao_ceramico"
-                q_override = quantidades.get(key_imper)
-                revestimento[key_imper] = {
-                    'name': impermeabilizacao['name'],
-                    'price': impermeabilizacao['base_price'],
-                    'quantity': float(q_override) if q_override is not None else round(area_total, 2),
-                    'unit': impermeabilizacao['unit'],
-                    'item_type': 'incluido',
-                    'reasoning': f'Impermeabilização cerâmica: {round(area_total, 2)} m² ({area_paredes}m² paredes + {area_fundo}m² fundo)',
-                    'can_change_type': True,
-                    'editable_price': True,  # Preço editável
-                    'editable_cost': True,   # Custo editável
-                    'alternatives': [],
-                    'product_id': impermeabilizacao['id']
-                }
-            
-            # Produto variável: Item personalizado
-            item_personalizado = next((p for p in ceramicos if 'personalizado' in p['name'].lower() or 'custom' in p['code'].lower()), None)
-            if item_personalizado:
-                # Usar a mesma quantidade da impermeabilização
-                area_paredes = metrics.get('m2_paredes', 0)
-                area_fundo = metrics.get('m2_fundo', 0) 
-                area_total = area_paredes + area_fundo
-                
-                key_custom = "item_ceramico_personalizado"
-                q_override = quantidades.get(key_custom)
-                revestimento[key_custom] = {
-                    'name': item_personalizado['name'],
-                    'price': item_personalizado['base_price'],
-                    'quantity': float(q_override) if q_override is not None else round(area_total, 2),
-                    'unit': item_personalizado['unit'],
-                    'item_type': 'incluido',
-                    'reasoning': f'Item personalizável para revestimento cerâmico: {round(area_total, 2)} m² (mesma quantidade da impermeabilização)',
-                    'can_change_type': True,
-                    'editable_name': True,   # Nome editável
-                    'editable_price': True,  # Preço editável
-                    'editable_cost': True,   # Custo editável
-                    'alternatives': [],
-                    'product_id': item_personalizado['id']
-                }
+        # Selecionar produtos de revestimento
+        revestimento = self._select_coating_products(conditions, answers, dimensions, metrics)
 
         # Selecionar produtos de aquecimento
-        aquecimento = self._select_heating_products(conditions, dimensions, metrics)
+        with stage('aquecimento'):
+            aquecimento = self._select_heating_products(conditions, dimensions, metrics)
 
         # Selecionar produtos de construção da piscina
-        construcao = self._select_construction_products(conditions, dimensions, metrics, answers)
+        with stage('construcao'):
+            construcao = self._select_construction_products(conditions, dimensions, metrics, answers)
 
         # Selecionar produtos de construção da laje
-        construcao_laje = self._select_laje_products(answers, dimensions)
+        with stage('construcao_laje'):
+            construcao_laje = self._select_laje_products(answers, dimensions)
 
         # Selecionar produtos de bordadura
-        bordadura = self._select_bordadura_products(answers, dimensions)
+        with stage('bordadura'):
+            bordadura = self._select_bordadura_products(answers, dimensions)
 
         # ORDEM FILTRACAO
         filtracao_order = ['filter', 'valve', 'pump', 'vidro', 'quadro']
@@ -604,8 +462,8 @@ class AdvancedProductSelector:
             elif item_type == 'alternativo':
                 name_suffix = ' (ALTERNATIVO)'
 
-            # Usar numeração sequencial para manter ordem
-            pump_key = f"pump_{i+1:02d}_{pump['id']}"
+            # Chave estável derivada do produto (a ordem vem da inserção no dicionário)
+            pump_key = f"pump_{pump['id']}"
 
             # Se é a primeira bomba, é a principal
             if main_pump_id is None and item_type == 'incluido':
@@ -649,7 +507,7 @@ class AdvancedProductSelector:
                 name_suffix = ' (OPCIONAL)'
             elif item_type == 'alternativo':
                 name_suffix = ' (ALTERNATIVO)'
-            valve_key = f"valve_{i+1:02d}_{valve['id']}"
+            valve_key = f"valve_{valve['id']}"
 
             # Determine main valve
             if main_valve_key is None and item_type == 'incluido':
@@ -705,7 +563,7 @@ class AdvancedProductSelector:
 
         if suitable_filters:
             best_filter = suitable_filters[0]
-            filter_key = f"filter_01_{best_filter['id']}"
+            filter_key = f"filter_{best_filter['id']}"
             products[filter_key] = {
                 'name': best_filter['name'],
                 'price': best_filter['base_price'],
@@ -885,7 +743,7 @@ class AdvancedProductSelector:
             else:
                 valves = []
         except Exception as e:
-            print(f"[Fallback] Erro ao buscar categoria de válvulas no BD: {e}")
+            log.warning("Fallback: erro ao buscar categoria de válvulas na BD: %s", e)
             valves = []
 
         # 2) Se não encontrou no DB, usar fallback a partir de default_data.py
@@ -1004,7 +862,7 @@ class AdvancedProductSelector:
                         prod_copy['attributes'] = attrs
                         pumps.append(prod_copy)
         except Exception as e:
-            print(f"[Fallback] Erro ao acessar BD para bombas: {e}")
+            log.warning("Fallback: erro ao aceder à BD para bombas: %s", e)
             try:
                 from default_data import products, product_categories, product_attributes, attribute_types
             except ImportError:
@@ -1468,7 +1326,7 @@ class AdvancedProductSelector:
                 return product
             conn.close()
         except Exception as e:
-            print(f"[Fallback] Erro ao acessar BD: {e}")
+            log.warning("Fallback: erro ao aceder à BD: %s", e)
 
         # Fallback para dados Python
         try:
@@ -1493,15 +1351,178 @@ class AdvancedProductSelector:
                 prod_copy['category_name'] = cat['name'] if cat else None
                 prod_copy['attributes'] = self.db.get_product_attributes(prod['id'])
                 return prod_copy
-        print(f"⚠️  Produto não encontrado: '{pattern}' (fallback)")
-        # Sugestão de similares
-        similar = [p['name'] for p in products if pattern.split()[0].lower() in p['name'].lower()][:5]
-        if similar:
-            print(f"   Produtos similares encontrados:")
-            for s in similar:
-                print(f"   - {s}")
+        # Sugestão de similares (só procurada se o debug estiver ativo)
+        if log.isEnabledFor(logging.DEBUG):
+            similar = [p['name'] for p in products if pattern.split()[0].lower() in p['name'].lower()][:5]
+            log.debug("Produto não encontrado: '%s' (fallback)", pattern, similar=similar)
         return None
 
+    def _select_coating_products(self, conditions: Dict, answers: Dict, dimensions: Dict, metrics: Dict,
+                                 products: List[Dict] = None) -> Dict:
+        """Revestimento (tela ou cerâmica); products: produtos da família já lidos da BD"""
+        import math
+        revestimento = {}
+        revestimento_tipo = conditions.get('coating_type', 'tela')
+        cobertura = answers.get('cobertura', 'nao')
+        tipo_cobertura_laminas = answers.get('tipo_cobertura_laminas', '')
+        tipo_construcao = answers.get('tipo_construcao', 'nova')
+        forma_piscina = answers.get('forma_piscina', 'standard')  # Adapte se o nome do campo for diferente
+
+        if revestimento_tipo == 'tela':
+            comprimento = dimensions.get('comprimento', 0)
+            largura = dimensions.get('largura', 0)
+            bordadura = metrics.get('ml_bordadura', 0)
+            revestimento_produtos = products if products is not None else self.db.get_products_by_family('Revestimento')
+            quantidades = answers.get('quantidades', {})
+
+            # Lógica só para forma standard
+            if forma_piscina == 'standard':
+                # Fórmulas de rolos
+                if cobertura == 'laminas' and tipo_cobertura_laminas in ['submersa_praia', 'fora_praia']:
+                    # Fórmula 1
+                    x = (comprimento + largura) * 2 + largura + largura + (comprimento / 1.6) * largura
+                else:
+                    # Fórmula 2
+                    x = (comprimento + largura) * 2 + (comprimento / 1.6) * 2
+                rolos_qty = math.ceil(x / 25) if x > 0 else 0
+
+                # Produto padrão: Revestimento Tela Armada 3D Unicolor CGT Vg 1
+                tela_produto = next((p for p in revestimento_produtos if 'tela armada 3d unicolor' in p['name'].lower() and 'cgt' in p['name'].lower()), None)
+                # Alternativas
+                tela_3d = next((p for p in revestimento_produtos if 'tela armada 3d' in p['name'].lower() and 'cgt' in p['name'].lower() and 'unicolor' not in p['name'].lower()), None)
+                tela_lisa = next((p for p in revestimento_produtos if 'tela armada lisa' in p['name'].lower() and 'cgt' in p['name'].lower()), None)
+                tela_alternatives = []
+                if tela_3d:
+                    tela_alternatives.append({'id': tela_3d['id'], 'name': tela_3d['name'], 'price': tela_3d['base_price']})
+                if tela_lisa:
+                    tela_alternatives.append({'id': tela_lisa['id'], 'name': tela_lisa['name'], 'price': tela_lisa['base_price']})
+                if tela_produto and rolos_qty > 0:
+                    key = f"tela_armada"
+                    q_override = quantidades.get(key)
+                    revestimento[key] = {
+                        'name': tela_produto['name'],
+                        'price': tela_produto['base_price'],
+                        'quantity': int(q_override) if q_override is not None else rolos_qty,
+                        'unit': tela_produto['unit'],
+                        'item_type': 'incluido',
+                        'reasoning': f'Quantidade calculada: {rolos_qty} rolos de 25m cada',
+                        'can_change_type': True,
+                        'alternatives': tela_alternatives,
+                        'product_id': tela_produto['id']
+                    }
+
+                # Perfis
+                perfil_horizontal = next((p for p in revestimento_produtos if 'perfil horizontal' in p['name'].lower()), None)
+                perfil_vertical = next((p for p in revestimento_produtos if 'perfil vertical' in p['name'].lower()), None)
+                chapa_colaminada = next((p for p in revestimento_produtos if 'chapa colaminada' in p['name'].lower()), None)
+                perfil_produto = perfil_horizontal if tipo_construcao == 'nova' else perfil_vertical
+                if bordadura > 0 and perfil_produto:
+                    perfis_qty = math.ceil(bordadura / 2)
+                    perfil_alternatives = []
+                    if chapa_colaminada:
+                        perfil_alternatives.append({'id': chapa_colaminada['id'], 'name': chapa_colaminada['name'], 'price': chapa_colaminada['base_price']})
+                    key_perfil = "perfil"
+                    q_override_perfil = quantidades.get(key_perfil)
+                    revestimento[key_perfil] = {
+                        'name': perfil_produto['name'],
+                        'price': perfil_produto['base_price'],
+                        'quantity': int(q_override_perfil) if q_override_perfil is not None else perfis_qty,
+                        'unit': perfil_produto['unit'],
+                        'item_type': 'incluido',
+                        'reasoning': f'Perfil {"horizontal" if tipo_construcao == "nova" else "vertical"}: {perfis_qty} un (2ml cada)',
+                        'can_change_type': True,
+                        'alternatives': perfil_alternatives,
+                        'product_id': perfil_produto['id']
+                    }
+                    # Chapa Colaminada como alternativa funcional (item_type alternativo)
+                    if chapa_colaminada:
+                        key_chapa = "chapa_colaminada"
+                        q_override_chapa = quantidades.get(key_chapa)
+                        revestimento[key_chapa] = {
+                            'name': chapa_colaminada['name'],
+                            'price': chapa_colaminada['base_price'],
+                            'quantity': int(q_override_chapa) if q_override_chapa is not None else perfis_qty,
+                            'unit': chapa_colaminada['unit'],
+                            'item_type': 'alternativo',
+                            'reasoning': f'Alternativa à {"horizontal" if tipo_construcao == "nova" else "vertical"}: {perfis_qty} un (2ml cada)',
+                            'alternative_to': 'perfil',
+                            'can_change_type': False,
+                            'product_id': chapa_colaminada['id']
+                        }
+            else:
+                # Forma especial: 1 rolo padrão
+                tela_produto = next((p for p in revestimento_produtos if 'tela armada 3d unicolor' in p['name'].lower() and 'cgt' in p['name'].lower()), None)
+                if tela_produto:
+                    revestimento['tela_armada'] = {
+                        'name': tela_produto['name'],
+                        'price': tela_produto['base_price'],
+                        'quantity': 1,
+                        'unit': tela_produto['unit'],
+                        'item_type': 'incluido',
+                        'reasoning': 'Forma especial: 1 rolo padrão',
+                        'can_change_type': True,
+                        'alternatives': [],
+                        'product_id': tela_produto['id']
+                    }
+        
+        elif revestimento_tipo == 'ceramica':
+            # --- Lógica para revestimento cerâmico ---
+            revestimento_produtos = products if products is not None else self.db.get_products_by_family('Revestimento')
+            ceramicos = [p for p in revestimento_produtos if p.get('category_name') == 'Cerâmica']
+            quantidades = answers.get('quantidades', {})
+            
+            # Produto fixo: Impermeabilização
+            impermeabilizacao = next((p for p in ceramicos if 'impermeabilização' in p['name'].lower() or 'imper' in p['code'].lower()), None)
+            if impermeabilizacao:
+                # Usar as áreas já calculadas no metrics
+                area_paredes = metrics.get('m2_paredes', 0)
+                area_fundo = metrics.get('m2_fundo', 0) 
+                area_total = area_paredes + area_fundo
+                
+                key_imper = "impermeabilizacao_ceramico"
+                q_override = quantidades.get(key_imper)
+                revestimento[key_imper] = {
+                    'name': impermeabilizacao['name'],
+                    'price': impermeabilizacao['base_price'],
+                    'quantity': float(q_override) if q_override is not None else round(area_total, 2),
+                    'unit': impermeabilizacao['unit'],
+                    'item_type': 'incluido',
+                    'reasoning': f'Impermeabilização cerâmica: {round(area_total, 2)} m² ({area_paredes}m² paredes + {area_fundo}m² fundo)',
+                    'can_change_type': True,
+                    'editable_price': True,  # Preço editável
+                    'editable_cost': True,   # Custo editável
+                    'alternatives': [],
+                    'product_id': impermeabilizacao['id']
+                }
+            
+            # Produto variável: Item personalizado
+            item_personalizado = next((p for p in ceramicos if 'personalizado' in p['name'].lower() or 'custom' in p['code'].lower()), None)
+            if item_personalizado:
+                # Usar a mesma quantidade da impermeabilização
+                area_paredes = metrics.get('m2_paredes', 0)
+                area_fundo = metrics.get('m2_fundo', 0) 
+                area_total = area_paredes + area_fundo
+                
+                key_custom = "item_ceramico_personalizado"
+                q_override = quantidades.get(key_custom)
+                revestimento[key_custom] = {
+                    'name': item_personalizado['name'],
+                    'price': item_personalizado['base_price'],
+                    'quantity': float(q_override) if q_override is not None else round(area_total, 2),
+                    'unit': item_personalizado['unit'],
+                    'item_type': 'incluido',
+                    'reasoning': f'Item personalizável para revestimento cerâmico: {round(area_total, 2)} m² (mesma quantidade da impermeabilização)',
+                    'can_change_type': True,
+                    'editable_name': True,   # Nome editável
+                    'editable_price': True,  # Preço editável
+                    'editable_cost': True,   # Custo editável
+                    'alternatives': [],
+                    'product_id': item_personalizado['id']
+                }
+
+        return revestimento
+
+
     def _select_heating_products(self, conditions: Dict, dimensions: Dict, metrics: Dict) -> Dict:
         """Seleciona produtos de aquecimento baseado no volume da piscina"""
         aquecimento = {}
@@ -1669,22 +1690,10 @@ class AdvancedProductSelector:
         
         construcao = {}
         
-        # Obter localidade dos answers primeiro, depois client_data como fallback
+        # Localidade dos dados do cliente (copiada para as respostas, ver budget_requests)
         localidade = answers.get('localidade', '')
-        if not localidade:
-            client_data = {}
-            if session:
-                budget = session.get('current_budget', {})
-                client_data = budget.get('client_data', {})
-            localidade = client_data.get('localidade', '')
-        
         if localidade == 'Outro':
-            localidade_outro = answers.get('localidade_outro', '')
-            if not localidade_outro and session:
-                budget = session.get('current_budget', {})
-                client_data = budget.get('client_data', {})
-                localidade_outro = client_data.get('localidade_outro', '')
-            localidade = localidade_outro
+            localidade = answers.get('localidade_outro', '')
         
         # Mapeamento de localidades para regiões de preços
         regiao_precos = {
@@ -0,0 +1,217 @@
+# Registo (logging) - Níveis por módulo, escrita fora do pedido e tracing por amostragem
+# Substitui os print() de debug: as mensagens só são formatadas se o nível estiver
+# ativo e a escrita (consola/ficheiro) é feita por uma thread própria, através de
+# uma fila, para não bloquear os pedidos.
+#
+# Configuração por variáveis de ambiente:
+#   LOG_LEVEL=INFO                              nível por omissão
+#   LOG_LEVELS=app=DEBUG,database_manager=WARNING   níveis por módulo
+#   LOG_FORMAT=text | json                      json: um objeto por linha
+#   LOG_TRACE_SAMPLE=0.01                       fração de pedidos com debug completo
+#   LOG_TRACE_HEADER=1                          aceitar X-Debug-Trace: 1 para forçar o tracing
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+import threading
+import contextvars
+import uuid
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+LOG_TRACE_SAMPLE = float(os.environ.get('LOG_TRACE_SAMPLE', 0))
+LOG_TRACE_HEADER = os.environ.get('LOG_TRACE_HEADER', '0') == '1'
+
+# Logger raiz da aplicação; os módulos usam filhos (piscinas.app, piscinas.database_manager...)
+ROOT_LOGGER = 'piscinas'
+
+# Pedido atual: ID (para correlacionar linhas) e se está a ser seguido em debug
+_request_id = contextvars.ContextVar('request_id', default=None)
+_trace = contextvars.ContextVar('trace', default=False)
+
+# Argumentos de logging que não são campos estruturados
+_LOG_KWARGS = ('exc_info', 'stack_info', 'stacklevel', 'extra')
+
+_setup_lock = threading.Lock()
+_listener = None
+
+
+class AppLogger(logging.LoggerAdapter):
+    """
+    Logger de um módulo. Aceita campos estruturados como kwargs
+    (log.info("Orçamento gerado", total=123.4)) e, num pedido em tracing,
+    deixa passar DEBUG mesmo que o nível do módulo seja superior.
+    """
+
+    def __init__(self, logger):
+        super().__init__(logger, {})
+
+    def isEnabledFor(self, level):
+        return self.logger.isEnabledFor(level) or (_trace.get() and level >= logging.DEBUG)
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.isEnabledFor(level):
+            return
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _LOG_KWARGS}
+        if fields:
+            kwargs['extra'] = dict(kwargs.get('extra') or {}, fields=fields)
+        kwargs.setdefault('stacklevel', 3)
+        self.logger._log(level, msg, args, **kwargs)
+
+
+def get_logger(name):
+    """Logger do módulo (nome curto, ex: 'app', 'database_manager')"""
+    configure_logging()
+    return AppLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"))
+
+
+class _ContextFilter(logging.Filter):
+    """Acrescenta o ID do pedido (corre na thread do pedido, antes da fila)"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get() or '-'
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Formata a mensagem e os campos na thread do pedido (valores podem mudar depois)"""
+
+    def prepare(self, record):
+        fields = getattr(record, 'fields', None)
+        record = super().prepare(record)
+        record.fields_json = json.dumps(fields, ensure_ascii=False, default=str) if fields else ''
+        return record
+
+
+class _TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s [%(name)s] %(request_id)s %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        return f"{line} {record.fields_json}" if record.fields_json else line
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': record.request_id,
+            'msg': record.getMessage(),
+        }
+        if record.fields_json:
+            entry['fields'] = json.loads(record.fields_json)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in spec.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(force=False):
+    """Configura o logger da aplicação (uma vez por processo) e arranca a thread de escrita"""
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None and not force:
+        return root
+    with _setup_lock:
+        if _listener is not None and not force:
+            return root
+        if _listener is not None:
+            _listener.stop()
+
+        output = logging.StreamHandler(sys.stderr)
+        output.setFormatter(_JsonFormatter() if LOG_FORMAT == 'json' else _TextFormatter())
+
+        log_queue = queue.SimpleQueue()
+        handler = _QueueHandler(log_queue)
+        handler.addFilter(_ContextFilter())
+
+        root.handlers[:] = [handler]
+        root.setLevel(LOG_LEVEL)
+        # Não duplicar as linhas no logging do servidor (gunicorn/waitress)
+        root.propagate = False
+        for name, level in _parse_levels(LOG_LEVELS).items():
+            logging.getLogger(f"{ROOT_LOGGER}.{name}").setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+    return root
+
+
+def restart_after_fork():
+    """No processo filho (workers com fork): a thread de escrita não foi copiada"""
+    global _listener, _setup_lock
+    _setup_lock = threading.Lock()
+    _listener = None
+    configure_logging()
+
+
+def shutdown_logging():
+    """Escreve o que estiver na fila e pára a thread de escrita"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def begin_request(request_id=None, trace=False):
+    """Marca o início de um pedido; tracing por amostragem (LOG_TRACE_SAMPLE) ou forçado"""
+    trace = trace or (LOG_TRACE_SAMPLE > 0 and random.random() < LOG_TRACE_SAMPLE)
+    return (_request_id.set(request_id or uuid.uuid4().hex[:12]), _trace.set(trace))
+
+
+def end_request(tokens):
+    request_token, trace_token = tokens
+    _request_id.reset(request_token)
+    _trace.reset(trace_token)
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def init_request_logging(app):
+    """Regista os hooks que dão ID (X-Request-ID) e tracing a cada pedido Flask"""
+    from flask import request, g
+
+    log = get_logger('http')
+
+    @app.before_request
+    def _begin_request_logging():
+        forced = LOG_TRACE_HEADER and request.headers.get('X-Debug-Trace') == '1'
+        # ID vindo do proxy/cliente, limitado para não inflacionar as linhas
+        g.log_tokens = begin_request((request.headers.get('X-Request-ID') or '')[:64] or None, forced)
+        g.log_started = time.perf_counter()
+
+    @app.after_request
+    def _log_response(response):
+        response.headers['X-Request-ID'] = current_request_id() or ''
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("%s %s -> %s", request.method, request.path, response.status_code,
+                      duration_ms=round((time.perf_counter() - g.get('log_started', time.perf_counter())) * 1000, 2))
+        return response
+
+    @app.teardown_request
+    def _end_request_logging(exc):
+        tokens = g.pop('log_tokens', None)
+        if tokens is not None:
+            end_request(tokens)
@@ -0,0 +1,360 @@
+# Aplicação ASGI - Variante assíncrona da API de orçamentos (uvicorn)
+# As rotas quentes da API (gerar orçamento, pré-visualização do total, catálogo e
+# alternativas) são servidas diretamente, com os mesmos contratos JSON da aplicação
+# Flask e o mesmo núcleo (budget_requests, seletor, caches):
+#   - a geração do orçamento e a pré-visualização correm num ProcessPoolExecutor
+#     (budget_workers), fora do ciclo de eventos e sem disputar o GIL;
+#   - sessão e cache de orçamentos (SQLite, sem API assíncrona) são lidas e gravadas
+#     num pool de threads de I/O, sem bloquear o ciclo de eventos.
+# Todas as outras rotas (páginas, edições do orçamento, estáticos) passam para a
+# aplicação Flask, executada num pool de threads.
+#
+# Configuração por variáveis de ambiente:
+#   ASGI_CPU_WORKERS=4     processos de cálculo (0: threads no próprio processo)
+#   ASGI_IO_THREADS=16     threads para sessão/cache
+#   ASGI_WSGI_THREADS=8    threads para as rotas servidas pelo Flask
+#
+# Uso: python serve.py --server uvicorn   (ou: uvicorn asgi:application)
+
+import io
+import os
+import sys
+import time
+import asyncio
+import logging
+import functools
+import contextvars
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import unquote
+
+from werkzeug.wrappers import Request
+
+import budget_workers
+from app import app, calculator, CATALOG_MAX_AGE
+from app_logging import get_logger, begin_request, end_request, current_request_id, LOG_TRACE_HEADER
+from budget_cache import budget_cache
+from budget_history import budget_history
+from budget_patch import public_budget
+from budget_repository import BudgetRepository, budget_io_stats
+from budget_requests import parse_budget_request, parse_preview_request
+from catalog_alternatives import alternatives_index
+from catalog_responses import catalog_responses, http_response
+from http_compression import compress_response, compression_stats
+from metrics import ensure_shared_directory, observe_request
+
+log = get_logger('asgi')
+
+ASGI_CPU_WORKERS = int(os.environ.get('ASGI_CPU_WORKERS', min(os.cpu_count() or 1, 4)))
+ASGI_IO_THREADS = int(os.environ.get('ASGI_IO_THREADS', 16))
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 8))
+
+
+class Executors:
+    """Pools criados no arranque (lifespan) e fechados no encerramento"""
+
+    def __init__(self):
+        self.cpu = None
+        self.io = None
+        self.wsgi = None
+
+    def start(self, cpu_workers=None, io_threads=None, wsgi_threads=None):
+        cpu_workers = ASGI_CPU_WORKERS if cpu_workers is None else cpu_workers
+        if cpu_workers > 0:
+            # Tempos das etapas e queries dos processos de cálculo chegam a /metrics por METRICS_DIR
+            ensure_shared_directory()
+            # spawn: o processo do servidor já tem threads (logging, cache) que o fork não copia
+            self.cpu = ProcessPoolExecutor(cpu_workers, mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=budget_workers.init_worker)
+            # Arrancar já todos os processos (catálogo carregado antes do primeiro pedido)
+            for future in [self.cpu.submit(budget_workers.ping) for _ in range(cpu_workers)]:
+                future.result()
+        else:
+            self.cpu = ThreadPoolExecutor(os.cpu_count() or 1, thread_name_prefix='asgi-cpu')
+        self.io = ThreadPoolExecutor(io_threads or ASGI_IO_THREADS, thread_name_prefix='asgi-io')
+        self.wsgi = ThreadPoolExecutor(wsgi_threads or ASGI_WSGI_THREADS, thread_name_prefix='asgi-wsgi')
+
+    def shutdown(self):
+        for pool in (self.wsgi, self.io, self.cpu):
+            if pool is not None:
+                pool.shutdown(wait=True)
+        self.cpu = self.io = self.wsgi = None
+
+
+async def run_in(pool, fn, *args):
+    """fn(*args) no pool; nas threads mantém o contexto do pedido (ID nos logs)"""
+    loop = asyncio.get_running_loop()
+    if isinstance(pool, ProcessPoolExecutor):
+        return await loop.run_in_executor(pool, functools.partial(fn, *args))
+    return await loop.run_in_executor(pool, functools.partial(contextvars.copy_context().run, fn, *args))
+
+
+def wsgi_environ(scope, body):
+    """Environ WSGI equivalente ao pedido ASGI (também usado para ler cookies, args e cabeçalhos)"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = f'HTTP_{name}'
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # O corpo já foi lido por inteiro: pedidos chunked chegam sem Content-Length
+    # e o werkzeug leria um corpo vazio
+    environ['CONTENT_LENGTH'] = str(len(body))
+    environ['wsgi.input_terminated'] = True
+    return environ
+
+
+def call_wsgi(environ):
+    """Executa a aplicação Flask e devolve (status, cabeçalhos, corpo)"""
+    result = {}
+
+    def start_response(status, headers, exc_info=None):
+        result['status'] = int(status.split(' ', 1)[0])
+        result['headers'] = headers
+
+    iterable = app(environ, start_response)
+    try:
+        body = b''.join(iterable)
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+    return result['status'], result['headers'], body
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def send_response(send, status, headers, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.encode('latin-1'), str(value).encode('latin-1')) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class BudgetAPI:
+    """Rotas da API servidas nativamente; o resto é delegado na aplicação Flask"""
+
+    def __init__(self, flask_app, executors):
+        self.app = flask_app
+        self.executors = executors
+        self.sessions = flask_app.session_interface
+        self.cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+
+    def route(self, method, path, request):
+        """(endpoint, handler, argumentos) de uma rota nativa, ou None"""
+        if method == 'POST' and path == '/generate_budget':
+            # Formulários HTML (redirect + flash) continuam no Flask
+            return ('generate_budget', self.generate_budget, ()) if request.is_json else None
+        if method != 'GET':
+            return None
+        if path == '/preview_total':
+            return 'preview_total', self.preview_total, ()
+        if path == '/get_product_families':
+            return 'get_product_families', self.get_product_families, ()
+        parts = path.split('/')
+        if len(parts) == 3 and parts[1] == 'get_family_products' and parts[2]:
+            return 'get_family_products', self.get_family_products, (unquote(parts[2]),)
+        if len(parts) == 4 and parts[1] == 'get_alternatives' and parts[2] and parts[3]:
+            return 'get_alternatives', self.get_alternatives, (unquote(parts[2]), unquote(parts[3]))
+        return None
+
+    def json_response(self, obj, status=200):
+        response = self.app.json.response(obj)
+        response.status_code = status
+        return response
+
+    def open_session(self, request):
+        return self.sessions.open_sid(request.cookies.get(self.cookie_name))
+
+    def finish_response(self, request, endpoint, response, session=None, repository=None):
+        """Grava o orçamento e a sessão, comprime e acrescenta os cabeçalhos do pedido (thread de I/O)"""
+        if repository is not None:
+            repository.commit()
+            budget_io_stats.record(endpoint, repository)
+            response.headers['X-Budget-Loads'] = str(repository.loads)
+            response.headers['X-Budget-Writes'] = str(repository.writes + repository.patches)
+            response.headers['X-Budget-Bytes'] = str(repository.bytes_written)
+        if session is not None:
+            self.sessions.save_session(self.app, session, response)
+        response.headers['X-Request-ID'] = current_request_id() or ''
+        return compress_response(response, request.accept_encodings, endpoint, compression_stats)
+
+    async def generate_budget(self, request):
+        """Como app.generate_budget (pedidos JSON): cálculo num processo, gravação na thread de I/O"""
+        io_pool = self.executors.io
+        session = await run_in(io_pool, self.open_session, request)
+        try:
+            answers, dimensions, metrics = parse_budget_request(request.get_json(), calculator,
+                                                                session.get('client_data', {}))
+            session['pool_metrics'] = metrics
+            session['pool_dimensions'] = dimensions
+            budget = await run_in(self.executors.cpu, budget_workers.generate_budget,
+                                  answers, metrics, dimensions, session.get('client_data', {}))
+        except Exception as e:
+            if isinstance(e, ValueError):
+                log.info("generate_budget: pedido inválido: %s", e)
+            else:
+                log.exception("Erro em generate_budget")
+            response = self.json_response({'success': False, 'error': str(e)}, 400)
+            return await run_in(io_pool, self.finish_response, request, 'generate_budget', response, session)
+
+        if not budget:
+            log.warning("generate_budget: nenhum orçamento gerado", answers=answers)
+        repository = BudgetRepository(budget_cache, budget_history, session)
+        repository.save(budget, replace=True)
+
+        def respond():
+            # Serializar e comprimir também fora do ciclo de eventos
+            response = self.json_response({'success': True, 'budget': public_budget(budget)})
+            return self.finish_response(request, 'generate_budget', response, session, repository)
+
+        return await run_in(io_pool, respond)
+
+    async def preview_total(self, request):
+        """Como app.preview_total"""
+        session = await run_in(self.executors.io, self.open_session, request)
+        try:
+            answers, dimensions = parse_preview_request(request.args.to_dict(), session.get('client_data', {}))
+            preview = await run_in(self.executors.cpu, budget_workers.preview_total, answers, dimensions)
+            response = self.json_response({'success': True, **preview})
+        except (ValueError, TypeError) as e:
+            response = self.json_response({'success': False, 'error': str(e)}, 400)
+        return self.finish_response(request, 'preview_total', response)
+
+    def catalog_response(self, request, endpoint, build):
+        """Como app.catalog_response (payload pré-serializado, 304, gzip)"""
+        try:
+            response = http_response(build(), request.accept_encodings, request.if_none_match,
+                                     CATALOG_MAX_AGE, self.app.response_class)
+        except ImportError as ex:
+            response = self.json_response({'success': False, 'error': f'Fallback data not available: {ex}'}, 500)
+        except Exception as e:
+            response = self.json_response({'success': False, 'error': str(e)}, 400)
+        return self.finish_response(request, endpoint, response)
+
+    async def get_product_families(self, request):
+        return self.catalog_response(request, 'get_product_families', catalog_responses.families)
+
+    async def get_family_products(self, request, family_name):
+        return self.catalog_response(request, 'get_family_products',
+                                     functools.partial(catalog_responses.family_products, family_name))
+
+    async def get_alternatives(self, request, family_name, current_product_id):
+        """Como app.get_alternatives; a sessão e o orçamento só são lidos se o ID não for do catálogo"""
+
+        def lookup():
+            repository = None
+
+            def get_budget():
+                nonlocal repository
+                repository = BudgetRepository(budget_cache, budget_history, self.open_session(request))
+                return repository.get()
+
+            try:
+                response = self.json_response(alternatives_index.lookup(family_name, current_product_id, get_budget))
+            except ImportError as ex:
+                response = self.json_response({'success': False, 'error': f'Fallback data not available: {ex}'})
+            except Exception as e:
+                response = self.json_response({'success': False, 'error': str(e)}, 400)
+            return self.finish_response(request, 'get_alternatives', response, repository=repository)
+
+        return await run_in(self.executors.io, lookup)
+
+    async def wsgi(self, environ):
+        """Qualquer outra rota: aplicação Flask numa thread"""
+        return await run_in(self.executors.wsgi, call_wsgi, environ)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        environ = wsgi_environ(scope, await read_body(receive))
+        request = Request(environ)
+        route = self.route(scope['method'], scope['path'], request)
+        if route is None:
+            status, headers, body = await self.wsgi(environ)
+            return await send_response(send, status, headers, body)
+
+        endpoint, handler, args = route
+        # Mesmo ID/tracing que init_request_logging dá às rotas Flask
+        forced = LOG_TRACE_HEADER and request.headers.get('X-Debug-Trace') == '1'
+        tokens = begin_request((request.headers.get('X-Request-ID') or '')[:64] or None, forced)
+        started = time.perf_counter()
+        try:
+            response = await handler(request, *args)
+        except Exception:
+            log.exception("Erro em %s", endpoint)
+            response = self.finish_response(request, endpoint, self.json_response(
+                {'success': False, 'error': 'Erro interno'}, 500))
+        else:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("%s %s -> %s", scope['method'], scope['path'], response.status_code,
+                          duration_ms=round((time.perf_counter() - started) * 1000, 2))
+        finally:
+            end_request(tokens)
+        observe_request(endpoint, scope['method'], response.status_code, time.perf_counter() - started)
+        await send_response(send, response.status_code, response.headers.to_wsgi_list(), response.get_data())
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    import server_runtime
+                    # Catálogo e índices já carregados por serve.py; aqui para `uvicorn asgi:application`
+                    await asyncio.to_thread(server_runtime.preload)
+                    await asyncio.to_thread(self.executors.start)
+                except Exception as e:
+                    log.exception("Arranque ASGI falhou")
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                log.info("ASGI pronto", cpu_workers=ASGI_CPU_WORKERS, io_threads=ASGI_IO_THREADS,
+                         wsgi_threads=ASGI_WSGI_THREADS)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                import server_runtime
+                await asyncio.to_thread(self.executors.shutdown)
+                # Pára as limpezas e grava os orçamentos pendentes
+                server_runtime.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+# Instância global
+executors = Executors()
+application = BudgetAPI(app, executors)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Teste de carga: aplicação WSGI (gunicorn/waitress) vs variante ASGI (uvicorn) com utilizadores simultâneos
+
+Uso:
+    python bench_asgi.py [--users 200] [--duration 30] [--servers gunicorn,uvicorn]
+                         [--workers 4] [--threads 8] [--port 5080]
+
+Cada servidor é arrancado com serve.py (mesmos --workers/--threads; no uvicorn são
+os processos de cálculo e as threads de I/O), um de cada vez. Cada utilizador
+simulado tem a sua sessão e uma ligação keep-alive e repete o percurso do
+questionário: gerar orçamento, famílias do catálogo, alternativas de um produto
+e pré-visualização do total. São mostrados pedidos/s e latências p50/p99 por rota.
+
+O gerador de carga corre num só processo (asyncio); com servidores muito rápidos
+pode ser ele o limite, por isso convém correr noutra máquina ou comparar só entre
+servidores na mesma execução.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+import subprocess
+import urllib.request
+from urllib.parse import urlencode
+
+from server_runtime import WARMUP_BUDGETS
+
+ROUTES = ('generate_budget', 'get_product_families', 'get_alternatives', 'preview_total')
+
+
+class Client:
+    """Cliente HTTP/1.1 mínimo com keep-alive e cookie de sessão (um por utilizador)"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.cookie = None
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=None):
+        headers = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Accept-Encoding: gzip"]
+        if self.cookie:
+            headers.append(f"Cookie: {self.cookie}")
+        data = b''
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers += ["Content-Type: application/json", f"Content-Length: {len(data)}"]
+        message = ('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + data
+
+        for attempt in range(2):
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self.writer.write(message)
+                await self.writer.drain()
+                return await self._read_response()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # Ligação keep-alive fechada pelo servidor: abrir outra e repetir uma vez
+                self.close()
+                if attempt:
+                    raise
+
+    async def _read_response(self):
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split(' ')[1])
+        length = 0
+        keep_alive = True
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'set-cookie':
+                self.cookie = value.strip().split(';', 1)[0]
+            elif name == 'connection' and value.strip().lower() == 'close':
+                keep_alive = False
+        await self.reader.readexactly(length)
+        if not keep_alive:
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def simulate_user(host, port, deadline, samples, errors):
+    client = Client(host, port)
+    answers = dict(random.choice(WARMUP_BUDGETS))
+    steps = (
+        ('generate_budget', 'POST', '/generate_budget', answers),
+        ('get_product_families', 'GET', '/get_product_families', None),
+        ('get_alternatives', 'GET', '/get_alternatives/filtracao/1', None),
+        ('preview_total', 'GET', '/preview_total?' + urlencode(answers), None),
+    )
+    try:
+        while time.perf_counter() < deadline:
+            for route, method, path, body in steps:
+                started = time.perf_counter()
+                try:
+                    status = await client.request(method, path, body)
+                except (OSError, asyncio.IncompleteReadError):
+                    errors[route] += 1
+                    continue
+                if status != 200:
+                    errors[route] += 1
+                samples[route].append(time.perf_counter() - started)
+    finally:
+        client.close()
+
+
+async def run_load(host, port, users, duration):
+    samples = {route: [] for route in ROUTES}
+    errors = {route: 0 for route in ROUTES}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(simulate_user(host, port, deadline, samples, errors) for _ in range(users)))
+    return samples, errors, time.perf_counter() - started
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(label, samples, errors, elapsed):
+    print(f"\n{label}")
+    print(f"  {'rota':<24} {'pedidos':>8} {'erros':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    everything = []
+    for route in ROUTES:
+        values = samples[route]
+        everything += values
+        print(f"  {route:<24} {len(values):>8} {errors[route]:>6} {len(values) / elapsed:>8.1f} "
+              f"{percentile(values, 0.5) * 1000:>8.1f} {percentile(values, 0.99) * 1000:>8.1f}")
+    print(f"  {'total':<24} {len(everything):>8} {sum(errors.values()):>6} {len(everything) / elapsed:>8.1f} "
+          f"{percentile(everything, 0.5) * 1000:>8.1f} {percentile(everything, 0.99) * 1000:>8.1f}")
+    return len(everything) / elapsed, percentile(everything, 0.99)
+
+
+def wait_ready(port, process, timeout=120):
+    url = f"http://127.0.0.1:{port}/get_product_families"
+    limit = time.time() + timeout
+    while time.time() < limit:
+        if process.poll() is not None:
+            raise RuntimeError(f"servidor terminou com código {process.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError("servidor não respondeu a tempo")
+
+
+def benchmark(server, args, port):
+    base = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, os.path.join(base, 'serve.py'), '--server', server, '--host', '127.0.0.1',
+               '--port', str(port), '--workers', str(args.workers), '--threads', str(args.threads),
+               '--graceful-timeout', str(args.graceful_timeout)]
+    env = dict(os.environ, LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'))
+    process = subprocess.Popen(command, cwd=base, env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_ready(port, process)
+        samples, errors, elapsed = asyncio.run(run_load('127.0.0.1', port, args.users, args.duration))
+        return report(f"{server} ({args.workers} processos, {args.threads} threads, "
+                      f"{args.users} utilizadores, {elapsed:.0f} s)", samples, errors, elapsed)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=args.graceful_timeout + 10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--users', type=int, default=200, help='utilizadores simultâneos')
+    parser.add_argument('--duration', type=float, default=30, help='segundos de carga por servidor')
+    parser.add_argument('--servers', default='gunicorn,uvicorn', help='servidores a comparar (serve.py --server)')
+    parser.add_argument('--workers', type=int, default=min(os.cpu_count() or 1, 4))
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--graceful-timeout', type=int, default=30)
+    parser.add_argument('--port', type=int, default=5080, help='primeira porta (uma por servidor)')
+    args = parser.parse_args()
+
+    random.seed(42)
+    results = {}
+    for offset, server in enumerate(s.strip() for s in args.servers.split(',') if s.strip()):
+        results[server] = benchmark(server, args, args.port + offset)
+
+    if len(results) > 1:
+        print(f"\n  {'servidor':<24} {'req/s':>8} {'p99 ms':>8}")
+        for server, (throughput, p99) in results.items():
+            print(f"  {server:<24} {throughput:>8.1f} {p99 * 1000:>8.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
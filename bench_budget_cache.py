@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark da cache de orçamentos: ficheiros JSON (BudgetCache) vs SQLite (SQLiteBudgetCache)
+e a camada LRU em memória com escrita diferida (MemoryTieredBudgetCache) sobre SQLite
+
+Uso:
+    python bench_budget_cache.py [--count 100000] [--file-count 10000] [--reads 5000]
+
+Usa como payload um dos orçamentos de exemplo em cache/. O backend de ficheiros
+é medido com menos entradas por omissão (o varrimento de limpeza é O(n) e lê
+cada ficheiro); os tempos por operação são comparáveis.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+from budget_cache import BudgetCache, SQLiteBudgetCache, MemoryTieredBudgetCache
+
+
+def load_sample_budget():
+    """Carrega um orçamento real de cache/ (ou debug_budget.json)"""
+    base = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(glob.glob(os.path.join(base, 'cache', 'budget_*.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)['budget']
+    with open(os.path.join(base, 'debug_budget.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def timed(label, count, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    per_op = elapsed / count * 1e6 if count else 0
+    print(f"  {label:<28} {elapsed:8.2f} s   {per_op:9.1f} µs/op")
+    return result
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def expire_fraction_file(cache, ids, fraction):
+    """Recua o mtime de uma fração dos ficheiros (a validade é dada pelo mtime)"""
+    old = time.time() - 2 * 86400
+    for cache_id in ids[:int(len(ids) * fraction)]:
+        os.utime(cache._cache_file(cache_id), (old, old))
+
+
+def expire_fraction_sqlite(cache, ids, fraction):
+    conn = cache._get_connection()
+    with conn:
+        conn.executemany("UPDATE budgets SET expires_at = 0 WHERE id = ?",
+                         [(cache_id,) for cache_id in ids[:int(len(ids) * fraction)]])
+
+
+def run_backend(name, cache, count, reads, budget, expire):
+    print(f"\n{name} — {count} orçamentos")
+    ids = timed('store_budget', count, lambda: [cache.store_budget(budget) for _ in range(count)])
+    sample = random.sample(ids, min(reads, len(ids)))
+    timed('get_budget (aleatório)', len(sample), lambda: [cache.get_budget(i) for i in sample])
+    hot = sample[:200] * (len(sample) // 200 or 1)
+    timed('get_budget (200 ativos)', len(hot), lambda: [cache.get_budget(i) for i in hot])
+    timed('update+get (200 ativos)', len(hot),
+          lambda: [(cache.update_budget(i, budget), cache.get_budget(i)) for i in hot])
+    timed('update_budget (aleatório)', len(sample), lambda: [cache.update_budget(i, budget) for i in sample])
+    timed('get_budget (inexistente)', len(sample), lambda: [cache.get_budget('nao-existe') for _ in sample])
+    random.shuffle(ids)
+    expire(cache, ids, 0.1)
+    timed('cleanup_expired (10% exp.)', count, cache.cleanup_expired)
+    timed('cleanup_expired (0% exp.)', count, cache.cleanup_expired)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--count', type=int, default=100000, help='orçamentos na cache SQLite')
+    parser.add_argument('--file-count', type=int, default=10000, help='orçamentos na cache de ficheiros')
+    parser.add_argument('--reads', type=int, default=5000, help='leituras/atualizações aleatórias')
+    args = parser.parse_args()
+
+    random.seed(42)
+    budget = load_sample_budget()
+    print(f"Payload: {len(json.dumps(budget, ensure_ascii=False, indent=2).encode('utf-8'))} bytes (JSON indentado)")
+
+    workdir = tempfile.mkdtemp(prefix='bench_budget_cache_')
+    try:
+        if args.file_count:
+            file_cache = BudgetCache(os.path.join(workdir, 'files'))
+            run_backend('BudgetCache (ficheiros)', file_cache, args.file_count, args.reads, budget,
+                        expire_fraction_file)
+            print(f"  {'tamanho em disco':<28} {dir_size(file_cache.cache_dir) / 1e6:8.1f} MB")
+
+        sqlite_cache = SQLiteBudgetCache(os.path.join(workdir, 'sqlite', 'budget_cache.db'))
+        run_backend('SQLiteBudgetCache (WAL)', sqlite_cache, args.count, args.reads, budget,
+                    expire_fraction_sqlite)
+        print(f"  {'tamanho em disco':<28} {dir_size(os.path.dirname(sqlite_cache.db_path)) / 1e6:8.1f} MB")
+
+        tiered = MemoryTieredBudgetCache(
+            SQLiteBudgetCache(os.path.join(workdir, 'tiered', 'budget_cache.db')))
+        run_backend('MemoryTieredBudgetCache (LRU + SQLite)', tiered, args.count, args.reads, budget,
+                    lambda cache, ids, fraction: (cache.flush(), expire_fraction_sqlite(cache.backend, ids, fraction)))
+        timed('flush (pendentes)', 1, tiered.flush)
+        tiered.close()
+        print(f"  {'memória':<28} {tiered.memory_usage()['bytes'] / 1e6:8.1f} MB "
+              f"({tiered.memory_usage()['entries']} orçamentos)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
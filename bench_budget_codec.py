@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compara o codec de orçamentos (budget_codec) com o JSON atual
+
+Uso:
+    python bench_budget_codec.py [--repeat 2000]
+
+Para cada orçamento de exemplo em cache/ e debug_budget.json mostra o tamanho
+e o tempo médio de codificação/descodificação de cada codec disponível,
+comparando com o JSON indentado que a cache de ficheiros gravava. As linhas
+"+refs" usam o orçamento compactado por referência ao catálogo (budget_refs),
+que é o que as caches gravam.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+
+from budget_codec import encode_budget, decode_budget, available_codecs
+from budget_refs import compact_budget, hydrate_budget
+
+
+def load_samples():
+    """Orçamentos de exemplo: (nome, dados)"""
+    base = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for path in sorted(glob.glob(os.path.join(base, 'cache', 'budget_*.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            samples.append((os.path.basename(path)[:20], json.load(f)['budget']))
+    with open(os.path.join(base, 'debug_budget.json'), 'r', encoding='utf-8') as f:
+        samples.append(('debug_budget.json', json.load(f)))
+    return samples
+
+
+def measure(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeat', type=int, default=2000, help='repetições por medição')
+    args = parser.parse_args()
+
+    print(f"{'amostra':<20} {'codec':<14} {'bytes':>7} {'rácio':>6} {'encode µs':>10} {'decode µs':>10}")
+    for name, budget in load_samples():
+        payload, enc = measure(lambda: json.dumps(budget, ensure_ascii=False, indent=2).encode('utf-8'), args.repeat)
+        _, dec = measure(lambda: json.loads(payload), args.repeat)
+        baseline = len(payload)
+        print(f"{name:<20} {'json indentado':<14} {baseline:>7} {1.0:>6.2f} {enc:>10.1f} {dec:>10.1f}")
+
+        for codec in available_codecs():
+            payload, enc = measure(lambda: encode_budget(budget, codec), args.repeat)
+            decoded, dec = measure(lambda: decode_budget(payload), args.repeat)
+            assert decoded == budget, f"{codec}: descodificação diferente do original"
+            print(f"{'':<20} {codec:<14} {len(payload):>7} {baseline / len(payload):>6.2f} {enc:>10.1f} {dec:>10.1f}")
+
+            payload, enc = measure(lambda: encode_budget(compact_budget(budget), codec), args.repeat)
+            decoded, dec = measure(lambda: hydrate_budget(decode_budget(payload)), args.repeat)
+            assert decoded == budget, f"{codec}+refs: hidratação diferente do original"
+            label = f"{codec}+refs"
+            print(f"{'':<20} {label:<14} {len(payload):>7} {baseline / len(payload):>6.2f} {enc:>10.1f} {dec:>10.1f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
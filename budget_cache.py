@@ -1,80 +1,922 @@
 import os
-import json
+import time
 import uuid
+import heapq
+import atexit
+import marshal
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
+from budget_codec import encode_budget, decode_budget
+from budget_patch import apply_operations, budget_version, BudgetPatchError
+from budget_refs import compact_budget, hydrate_budget
+from app_logging import get_logger
+from metrics import registry
+
+log = get_logger('budget_cache')
+
+MEMORY_LOOKUPS = registry.counter('budget_cache_memory_lookups_total',
+                                  'Leituras na camada em memória da cache de orçamentos', ('result',))
+CACHE_ENTRIES = registry.gauge('budget_cache_entries', 'Orçamentos na cache partilhada (incluindo expirados)',
+                               mode='max')
+MEMORY_BYTES = registry.gauge('budget_cache_memory_bytes', 'Bytes de orçamentos na camada em memória')
+MEMORY_ENTRIES = registry.gauge('budget_cache_memory_entries', 'Orçamentos na camada em memória')
+MEMORY_DIRTY = registry.gauge('budget_cache_dirty_entries', 'Orçamentos em memória por gravar no backend')
+
+# Tempo de vida de um orçamento em cache
+CACHE_TTL = timedelta(hours=24)
+
+# Número de deltas acumulados a partir do qual o orçamento é reescrito por inteiro
+DELTA_COMPACT_AFTER = 16
+
+# Tabelas com linhas por orçamento, removidas com ele
+RELATED_TABLES = ('budget_deltas', 'budget_history', 'budget_history_blobs', 'budget_history_position')
+
+# Limpeza de expirados em segundo plano: intervalo entre varrimentos e tamanho de cada lote
+SWEEP_INTERVAL = 300
+SWEEP_BATCH_SIZE = 200
+
+# De quanto em quanto tempo o índice de expiração dos ficheiros é reconstruído
+# (apanha ficheiros escritos por outros processos)
+REINDEX_INTERVAL = 3600
+
+# Lock de ficheiro por orçamento (backend de ficheiros): espera máxima e idade
+# a partir da qual um lock deixado por um processo que morreu é descartado
+LOCK_TIMEOUT = 5.0
+LOCK_STALE_AFTER = 30.0
+
+
+class BudgetConflictError(Exception):
+    """O orçamento foi alterado por outro pedido desde que foi lido (versão diferente)"""
+
 class BudgetCache:
-    """Cache server-side para orçamentos grandes"""
+    """
+    Cache server-side para orçamentos grandes.
+
+    A validade de cada ficheiro é dada pelo seu mtime (hora da última escrita),
+    por isso verificar se expirou não exige ler nem descodificar o conteúdo.
+    Um min-heap de (expires_at, ficheiro), construído a partir de os.scandir,
+    permite à limpeza apagar só os expirados, em lotes pequenos.
+
+    As escritas são atómicas (ficheiro temporário + os.replace), por isso uma
+    leitura concorrente vê sempre a versão anterior ou a nova, nunca metade.
+    Escritas condicionais (expected_version) são serializadas por um lock de
+    ficheiro por orçamento, seguro entre processos.
+    """
     
     def __init__(self, cache_dir="cache"):
         self.cache_dir = cache_dir
         if not os.path.exists(cache_dir):
             os.makedirs(cache_dir)
+        self._heap = None
+        self._indexed_at = 0
+        self._heap_lock = threading.Lock()
+
+    def after_fork(self):
+        """No processo filho: o lock pode ter sido copiado fechado"""
+        self._heap_lock = threading.Lock()
     
-    def store_budget(self, budget_data):
-        """Armazena um orçamento e retorna um ID único"""
-        cache_id = str(uuid.uuid4())
-        cache_file = os.path.join(self.cache_dir, f"budget_{cache_id}.json")
-        
+    def _cache_file(self, cache_id):
+        return os.path.join(self.cache_dir, f"budget_{cache_id}.bgc")
+    
+    def _legacy_file(self, cache_id):
+        return os.path.join(self.cache_dir, f"budget_{cache_id}.json")
+    
+    def _write(self, cache_id, budget_data):
         # Adicionar timestamp para limpeza automática
         cache_data = {
             'timestamp': datetime.now().isoformat(),
-            'budget': budget_data
+            'budget': compact_budget(budget_data)
         }
         
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        cache_file = self._cache_file(cache_id)
+        tmp_file = f"{cache_file}.{uuid.uuid4().hex}.tmp"
+        payload = encode_budget(cache_data)
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_file, cache_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        self._track(os.path.basename(cache_file), time.time() + CACHE_TTL.total_seconds())
         
+        # Versão antiga em JSON deixa de ser necessária
+        legacy_file = self._legacy_file(cache_id)
+        if os.path.exists(legacy_file):
+            os.remove(legacy_file)
+        return len(payload)
+    
+    @contextmanager
+    def _locked(self, cache_id):
+        """Lock exclusivo (entre processos) para uma escrita condicional"""
+        lock_file = os.path.join(self.cache_dir, f"budget_{cache_id}.lock")
+        deadline = time.time() + LOCK_TIMEOUT
+        while True:
+            try:
+                fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.stat(lock_file).st_mtime > LOCK_STALE_AFTER:
+                        os.remove(lock_file)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.time() > deadline:
+                    raise BudgetConflictError(f"Orçamento {cache_id} bloqueado por outro pedido")
+                time.sleep(0.005)
+        try:
+            yield
+        finally:
+            os.close(fd)
+            os.remove(lock_file)
+    
+    @staticmethod
+    def _is_cache_file(filename):
+        # Inclui temporários deixados por escritas interrompidas
+        return filename.startswith('budget_') and filename.endswith(('.bgc', '.json', '.tmp'))
+    
+    @staticmethod
+    def _expires_at(mtime):
+        return mtime + CACHE_TTL.total_seconds()
+    
+    def _track(self, filename, expires_at):
+        with self._heap_lock:
+            if self._heap is not None:
+                heapq.heappush(self._heap, (expires_at, filename))
+    
+    def _rebuild_index(self):
+        """Reconstrói o heap de expiração só com metadados (stat), sem abrir ficheiros"""
+        heap = []
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if self._is_cache_file(entry.name):
+                    try:
+                        heap.append((self._expires_at(entry.stat().st_mtime), entry.name))
+                    except FileNotFoundError:
+                        continue
+        heapq.heapify(heap)
+        self._heap = heap
+        self._indexed_at = time.time()
+    
+    @staticmethod
+    def _read(cache_file):
+        with open(cache_file, 'rb') as f:
+            return decode_budget(f.read())
+    
+    def store_budget(self, budget_data):
+        """Armazena um orçamento e retorna um ID único"""
+        cache_id = str(uuid.uuid4())
+        self._write(cache_id, budget_data)
         return cache_id
     
     def get_budget(self, cache_id):
         """Recupera um orçamento pelo ID"""
-        cache_file = os.path.join(self.cache_dir, f"budget_{cache_id}.json")
-        
+        cache_file = self._cache_file(cache_id)
         if not os.path.exists(cache_file):
-            return None
+            # Ficheiros JSON gravados antes do codec binário
+            cache_file = self._legacy_file(cache_id)
+            if not os.path.exists(cache_file):
+                return None
         
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
-            
-            # Verificar se não expirou (ex: 24 horas)
-            timestamp = datetime.fromisoformat(cache_data['timestamp'])
-            if datetime.now() - timestamp > timedelta(hours=24):
+            # Verificar se não expirou (ex: 24 horas) pelo mtime, antes de ler
+            if self._expires_at(os.stat(cache_file).st_mtime) <= time.time():
                 os.remove(cache_file)
                 return None
             
-            return cache_data['budget']
+            return hydrate_budget(self._read(cache_file)['budget'])
         except Exception:
             return None
     
-    def update_budget(self, cache_id, budget_data):
-        """Atualiza um orçamento existente"""
-        cache_file = os.path.join(self.cache_dir, f"budget_{cache_id}.json")
-        
-        cache_data = {
-            'timestamp': datetime.now().isoformat(),
-            'budget': budget_data
-        }
-        
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
+    def update_budget(self, cache_id, budget_data, expected_version=None):
+        """
+        Atualiza um orçamento existente. Com expected_version, só grava se a versão
+        guardada for essa (compare-and-swap); caso contrário BudgetConflictError.
+        Devolve o número de bytes serializados.
+        """
+        if expected_version is None:
+            return self._write(cache_id, budget_data)
+        with self._locked(cache_id):
+            current = self.get_budget(cache_id)
+            if current is not None and budget_version(current) != expected_version:
+                raise BudgetConflictError(f"Orçamento {cache_id} alterado por outro pedido")
+            return self._write(cache_id, budget_data)
+    
+    def patch_budget(self, cache_id, operations, expected_version=None):
+        """Aplica operações (ver budget_patch) e devolve (orçamento, alterações, bytes gravados)"""
+        with self._locked(cache_id):
+            budget_data = self.get_budget(cache_id)
+            if budget_data is None:
+                raise BudgetPatchError('Orçamento não encontrado', 404)
+            changes = apply_operations(budget_data, operations, expected_version)
+            written = self._write(cache_id, budget_data)
+        return budget_data, changes, written
+    
+    def sweep_expired(self, limit=SWEEP_BATCH_SIZE):
+        """Remove até `limit` ficheiros expirados (pelo heap); devolve quantos removeu"""
+        now = time.time()
+        removed = 0
+        with self._heap_lock:
+            if self._heap is None or now - self._indexed_at > REINDEX_INTERVAL:
+                self._rebuild_index()
+            heap = self._heap
+            while heap and heap[0][0] <= now and removed < limit:
+                _, filename = heapq.heappop(heap)
+                filepath = os.path.join(self.cache_dir, filename)
+                try:
+                    expires_at = self._expires_at(os.stat(filepath).st_mtime)
+                except FileNotFoundError:
+                    continue
+                if expires_at > now:
+                    # Reescrito entretanto (possivelmente por outro processo)
+                    heapq.heappush(heap, (expires_at, filename))
+                    continue
+                try:
+                    os.remove(filepath)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
     
     def cleanup_expired(self):
         """Remove arquivos de cache expirados"""
-        for filename in os.listdir(self.cache_dir):
-            if filename.startswith('budget_') and filename.endswith('.json'):
-                filepath = os.path.join(self.cache_dir, filename)
+        removed = 0
+        while True:
+            batch = self.sweep_expired()
+            removed += batch
+            if batch < SWEEP_BATCH_SIZE:
+                return removed
+
+
+class SQLiteBudgetCache:
+    """
+    Cache server-side de orçamentos numa única tabela SQLite (modo WAL).
+
+    Mesma API que BudgetCache. Cada orçamento é uma linha (id, expires_at, payload)
+    com índice em expires_at, por isso a limpeza de expirados é um DELETE por
+    intervalo do índice em vez de abrir e ler cada ficheiro.
+
+    As alterações pequenas (patch_budget) são acrescentadas à tabela budget_deltas
+    em vez de reescrever o orçamento; a leitura reaplica-as sobre o documento base,
+    que é reescrito (compactado) ao fim de DELTA_COMPACT_AFTER deltas.
+
+    A coluna version acompanha a versão do orçamento (incluindo deltas) e permite
+    escritas condicionais (compare-and-swap) seguras entre processos.
+
+    As tabelas budget_history* guardam o histórico de undo/redo (ver
+    budget_history.SQLiteBudgetHistoryStore) e são limpas com o orçamento.
+    """
+
+    def __init__(self, db_path="cache/budget_cache.db"):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self._local = threading.local()
+        self._create_schema()
+
+    def _get_connection(self):
+        """Uma conexão por thread (as conexões sqlite3 não são partilháveis entre threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def after_fork(self):
+        """No processo filho: as conexões herdadas do pai não podem ser usadas"""
+        self._local = threading.local()
+
+    def _create_schema(self):
+        conn = self._get_connection()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS budgets (
+                    id TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL,
+                    payload BLOB NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_budgets_expires_at ON budgets(expires_at)")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(budgets)")]
+            if 'version' not in columns:
+                conn.execute("ALTER TABLE budgets ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS budget_deltas (
+                    seq INTEGER PRIMARY KEY,
+                    budget_id TEXT NOT NULL,
+                    payload BLOB NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_budget_deltas_budget ON budget_deltas(budget_id, seq)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS budget_history (
+                    budget_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    version INTEGER NOT NULL,
+                    manifest BLOB NOT NULL,
+                    PRIMARY KEY (budget_id, seq)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS budget_history_blobs (
+                    budget_id TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    PRIMARY KEY (budget_id, hash)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS budget_history_position (
+                    budget_id TEXT PRIMARY KEY,
+                    seq INTEGER NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def transaction(self):
+        """Transação exclusiva (BEGIN IMMEDIATE): leitura-alteração-escrita atómica entre processos"""
+        conn = self._get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    @staticmethod
+    def _delete_related(conn, condition, params=()):
+        for table in RELATED_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE budget_id {condition}", params)
+
+    @staticmethod
+    def _encode(budget_data):
+        return encode_budget(budget_data)
+
+    @staticmethod
+    def _decode(payload):
+        # Aceita também linhas em JSON gravadas antes do codec binário
+        return decode_budget(payload)
+
+    def store_budget(self, budget_data):
+        """Armazena um orçamento e retorna um ID único"""
+        cache_id = str(uuid.uuid4())
+        self.update_budget(cache_id, budget_data)
+        return cache_id
+
+    def _load(self, conn, cache_id):
+        """Documento base com os deltas reaplicados; devolve (orçamento, nº de deltas)"""
+        row = conn.execute(
+            "SELECT payload FROM budgets WHERE id = ? AND expires_at > ?",
+            (cache_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None, 0
+        budget_data = hydrate_budget(self._decode(row[0]))
+        deltas = conn.execute(
+            "SELECT payload FROM budget_deltas WHERE budget_id = ? ORDER BY seq", (cache_id,)
+        ).fetchall()
+        for (payload,) in deltas:
+            apply_operations(budget_data, self._decode(payload))
+        return budget_data, len(deltas)
+
+    def get_budget(self, cache_id):
+        """Recupera um orçamento pelo ID (None se não existir ou tiver expirado)"""
+        try:
+            return self._load(self._get_connection(), cache_id)[0]
+        except Exception:
+            return None
+
+    def _exists(self, conn, cache_id):
+        return conn.execute("SELECT 1 FROM budgets WHERE id = ? AND expires_at > ?",
+                            (cache_id, time.time())).fetchone() is not None
+
+    def update_budget(self, cache_id, budget_data, expected_version=None):
+        """
+        Atualiza (ou cria) um orçamento e renova a sua validade. Com expected_version,
+        só grava se a versão guardada for essa (compare-and-swap); caso contrário
+        BudgetConflictError. Devolve o número de bytes serializados.
+        """
+        conn = self._get_connection()
+        expires_at = time.time() + CACHE_TTL.total_seconds()
+        payload = self._encode(compact_budget(budget_data))
+        version = budget_version(budget_data)
+        with conn:
+            if expected_version is not None:
+                cursor = conn.execute("""
+                    UPDATE budgets SET expires_at = ?, payload = ?, version = ?
+                    WHERE id = ? AND version = ? AND expires_at > ?
+                """, (expires_at, payload, version, cache_id, expected_version, time.time()))
+                if cursor.rowcount == 0 and self._exists(conn, cache_id):
+                    raise BudgetConflictError(f"Orçamento {cache_id} alterado por outro pedido")
+            if expected_version is None or cursor.rowcount == 0:
+                conn.execute("""
+                    INSERT INTO budgets (id, expires_at, payload, version) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET expires_at = excluded.expires_at,
+                        payload = excluded.payload, version = excluded.version
+                """, (cache_id, expires_at, payload, version))
+            conn.execute("DELETE FROM budget_deltas WHERE budget_id = ?", (cache_id,))
+        return len(payload)
+
+    def append_operations(self, cache_id, batches, expected_version=None):
+        """
+        Acrescenta deltas (um por lote de operações) sem reescrever o documento.
+        Com expected_version, só acrescenta se a versão guardada for essa.
+        Devolve (deltas pendentes, bytes gravados), ou None se o orçamento não existir.
+        """
+        payloads = [self._encode(operations) for operations in batches]
+        conn = self._get_connection()
+        with conn:
+            params = [time.time() + CACHE_TTL.total_seconds(), len(batches), cache_id, time.time()]
+            condition = ""
+            if expected_version is not None:
+                condition = " AND version = ?"
+                params.append(expected_version)
+            cursor = conn.execute(
+                "UPDATE budgets SET expires_at = ?, version = version + ? WHERE id = ? AND expires_at > ?" + condition,
+                params
+            )
+            if cursor.rowcount == 0:
+                if expected_version is not None and self._exists(conn, cache_id):
+                    raise BudgetConflictError(f"Orçamento {cache_id} alterado por outro pedido")
+                return None
+            conn.executemany("INSERT INTO budget_deltas (budget_id, payload) VALUES (?, ?)",
+                             [(cache_id, payload) for payload in payloads])
+            pending = conn.execute("SELECT COUNT(*) FROM budget_deltas WHERE budget_id = ?",
+                                   (cache_id,)).fetchone()[0]
+        return pending, sum(len(payload) for payload in payloads)
+
+    def patch_budget(self, cache_id, operations, expected_version=None):
+        """
+        Aplica operações (ver budget_patch), grava-as como delta e devolve (orçamento,
+        alterações, bytes gravados). Se outro pedido alterar o orçamento entretanto,
+        levanta BudgetConflictError.
+        """
+        budget_data, _ = self._load(self._get_connection(), cache_id)
+        if budget_data is None:
+            raise BudgetPatchError('Orçamento não encontrado', 404)
+        read_version = budget_version(budget_data)
+        changes = apply_operations(budget_data, operations, expected_version)
+        appended = self.append_operations(cache_id, [operations], expected_version=read_version)
+        pending, written = appended or (None, 0)
+        if pending is None:
+            written += self.update_budget(cache_id, budget_data)
+        elif pending >= DELTA_COMPACT_AFTER:
+            # Compactar só se ninguém acrescentou deltas depois do nosso (a versão
+            # guardada é a deste patch); o delta já está gravado, por isso um
+            # conflito apenas adia a compactação
+            try:
+                written += self.update_budget(cache_id, budget_data, expected_version=read_version + 1)
+            except BudgetConflictError:
+                log.debug("Compactação de %s adiada: orçamento alterado entretanto", cache_id)
+        return budget_data, changes, written
+
+    def delete_budget(self, cache_id):
+        """Remove um orçamento da cache"""
+        conn = self._get_connection()
+        with conn:
+            conn.execute("DELETE FROM budgets WHERE id = ?", (cache_id,))
+            self._delete_related(conn, "= ?", (cache_id,))
+
+    def cleanup_expired(self):
+        """Remove orçamentos expirados (varrimento pelo índice de expires_at); devolve quantos removeu"""
+        conn = self._get_connection()
+        with conn:
+            cursor = conn.execute("DELETE FROM budgets WHERE expires_at <= ?", (time.time(),))
+            if cursor.rowcount:
+                self._delete_related(conn, "NOT IN (SELECT id FROM budgets)")
+        return cursor.rowcount
+
+    def sweep_expired(self, limit=SWEEP_BATCH_SIZE):
+        """Remove até `limit` orçamentos expirados, pelo índice de expires_at; devolve quantos removeu"""
+        conn = self._get_connection()
+        with conn:
+            expired = [row[0] for row in conn.execute(
+                "SELECT id FROM budgets WHERE expires_at <= ? ORDER BY expires_at LIMIT ?",
+                (time.time(), limit)
+            )]
+            if not expired:
+                return 0
+            placeholders = ','.join('?' * len(expired))
+            conn.execute(f"DELETE FROM budgets WHERE id IN ({placeholders})", expired)
+            self._delete_related(conn, f"IN ({placeholders})", expired)
+        return len(expired)
+
+    def count(self):
+        """Número de orçamentos em cache (incluindo expirados ainda não limpos)"""
+        return self._get_connection().execute("SELECT COUNT(*) FROM budgets").fetchone()[0]
+
+
+
+class MemoryTieredBudgetCache:
+    """
+    Camada LRU em memória com escrita diferida (write-behind) à frente de outra cache.
+
+    As leituras são servidas da memória; as escritas ficam marcadas como "sujas"
+    e são agrupadas e gravadas no backend por uma thread em segundo plano a cada
+    flush_interval segundos. Várias edições seguidas do mesmo orçamento resultam
+    numa única escrita; se só houve patch_budget desde a última escrita e o
+    backend suporta deltas, grava-se apenas o delta. Os orçamentos são guardados
+    serializados com marshal, o que isola cada pedido dos restantes (cada get
+    devolve uma cópia) e dá o tamanho exato usado para o limite de memória.
+
+    As gravações no backend são condicionais à versão em que as alterações
+    pendentes se basearam (a lida do backend ou a última gravada); se outro
+    processo gravou entretanto, a gravação é recusada (BudgetConflictError), a
+    cópia em memória é descartada e a próxima leitura vem do backend.
+
+    Nota: a camada é por processo e as escritas condicionais (expected_version)
+    são verificadas contra a cópia em memória, por isso um conflito entre
+    processos só é detetado na gravação, depois de o pedido já ter respondido.
+    É opcional (BUDGET_CACHE_MEMORY_MB) e é desligada (disable) em servidores
+    com vários processos.
+    """
+
+    def __init__(self, backend, max_bytes=64 * 1024 * 1024, flush_interval=1.0, max_dirty=256):
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self._entries = OrderedDict()  # cache_id -> (blob, written_at, version)
+        self._dirty = OrderedDict()    # cache_id -> None (reescrever) ou lotes de operações pendentes
+        self._stored = {}              # cache_id -> versão no backend em que os pendentes se baseiam
+        self._bytes = 0
+        self.enabled = True
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'flushed': 0, 'evictions': 0}
+        self._writer = threading.Thread(target=self._writer_loop, name='budget-cache-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def after_fork(self):
+        """
+        No processo filho (workers com fork): o writer não foi copiado e os locks
+        podem ter ficado fechados. Os pendentes pertencem ao processo pai, que os grava.
+        """
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._dirty.clear()
+        self._closed = False
+        self.stats = dict.fromkeys(self.stats, 0)
+        if hasattr(self.backend, 'after_fork'):
+            self.backend.after_fork()
+        self._writer = threading.Thread(target=self._writer_loop, name='budget-cache-writer', daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def _freeze(budget_data):
+        return marshal.dumps(budget_data)
+
+    @staticmethod
+    def _thaw(blob):
+        return marshal.loads(blob)
+
+    def _put(self, cache_id, blob, written_at, version):
+        old = self._entries.pop(cache_id, None)
+        if old is not None:
+            self._bytes -= len(old[0])
+        self._entries[cache_id] = (blob, written_at, version)
+        self._bytes += len(blob)
+
+    def _evict(self):
+        """Remove entradas limpas menos usadas até respeitar o limite de memória"""
+        while self._bytes > self.max_bytes:
+            # Pendentes não podem sair antes de gravados (no máximo max_dirty à frente)
+            victim = next((cache_id for cache_id in self._entries if cache_id not in self._dirty), None)
+            if victim is None:
+                break
+            blob = self._entries.pop(victim)[0]
+            self._stored.pop(victim, None)
+            self._bytes -= len(blob)
+            self.stats['evictions'] += 1
+
+    def store_budget(self, budget_data):
+        """Armazena um orçamento e retorna um ID único"""
+        cache_id = str(uuid.uuid4())
+        self.update_budget(cache_id, budget_data)
+        return cache_id
+
+    def _memory_get(self, cache_id):
+        """Cópia do orçamento em memória, ou None se não está ou expirou (chamar com o lock)"""
+        entry = self._entries.get(cache_id)
+        if entry is None:
+            return None
+        blob, written_at, _ = entry
+        if time.time() - written_at <= CACHE_TTL.total_seconds():
+            self._entries.move_to_end(cache_id)
+            self.stats['hits'] += 1
+            MEMORY_LOOKUPS.inc(result='hit')
+            return self._thaw(blob)
+        self._discard(cache_id)
+        return None
+
+    def _discard(self, cache_id):
+        """Remove um orçamento da memória, incluindo alterações pendentes (chamar com o lock)"""
+        entry = self._entries.pop(cache_id, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+        self._dirty.pop(cache_id, None)
+        self._stored.pop(cache_id, None)
+
+    def _load(self, cache_id):
+        """Lê do backend, sem o lock (I/O), e guarda em memória se entretanto ninguém escreveu"""
+        self.stats['misses'] += 1
+        MEMORY_LOOKUPS.inc(result='miss')
+        budget_data = self.backend.get_budget(cache_id)
+        if budget_data is not None:
+            with self._lock:
+                if cache_id not in self._entries:
+                    # O backend não guarda a hora de escrita; assumir a atual
+                    self._put(cache_id, self._freeze(budget_data), time.time(), budget_version(budget_data))
+                    self._stored[cache_id] = budget_version(budget_data)
+                    self._evict()
+        return budget_data
+
+    def get_budget(self, cache_id):
+        """Recupera um orçamento pelo ID (da memória se possível)"""
+        if not self.enabled:
+            return self.backend.get_budget(cache_id)
+        with self._lock:
+            budget_data = self._memory_get(cache_id)
+        if budget_data is not None:
+            return budget_data
+        return self._load(cache_id)
+
+    def update_budget(self, cache_id, budget_data, expected_version=None):
+        """
+        Atualiza um orçamento em memória; a escrita no backend é diferida.
+        Com expected_version, só grava se a versão atual for essa (BudgetConflictError).
+        Devolve o número de bytes serializados (em memória).
+        """
+        if not self.enabled:
+            return self.backend.update_budget(cache_id, budget_data, expected_version)
+        if expected_version is not None:
+            with self._lock:
+                in_memory = cache_id in self._entries
+            if not in_memory:
+                # Carregar do backend (fora do lock) para conhecer a versão atual
+                self._load(cache_id)
+        blob = self._freeze(budget_data)
+        with self._lock:
+            entry = self._entries.get(cache_id)
+            if expected_version is not None and entry is not None and entry[2] != expected_version:
+                raise BudgetConflictError(f"Orçamento {cache_id} alterado por outro pedido")
+            if expected_version is None:
+                # Escrita incondicional: grava-se sem comparar versões, como no backend
+                self._stored.pop(cache_id, None)
+            overflow = self._mark_dirty(cache_id, blob, budget_version(budget_data), None)
+        self._after_write(overflow)
+        return len(blob)
+
+    def patch_budget(self, cache_id, operations, expected_version=None):
+        """
+        Aplica operações (ver budget_patch) em memória e devolve (orçamento, alterações,
+        bytes serializados); o delta só chega ao backend no flush
+        """
+        if not self.enabled:
+            return self.backend.patch_budget(cache_id, operations, expected_version)
+        with self._lock:
+            in_memory = cache_id in self._entries
+        # Ler do backend fora do lock (I/O)
+        loaded = None if in_memory else self._load(cache_id)
+        with self._lock:
+            # Leitura, alteração e escrita atómicas dentro do processo; a cópia em
+            # memória, se existir, é a mais recente
+            budget_data = self._memory_get(cache_id) or loaded
+            if budget_data is None:
+                raise BudgetPatchError('Orçamento não encontrado', 404)
+            changes = apply_operations(budget_data, operations, expected_version)
+            blob = self._freeze(budget_data)
+            overflow = self._mark_dirty(cache_id, blob, budget_version(budget_data), list(operations))
+        self._after_write(overflow)
+        return budget_data, changes, len(blob)
+
+    def _mark_dirty(self, cache_id, blob, version, operations):
+        """Guarda em memória e marca como pendente; devolve um ID a gravar já se houver excesso"""
+        overflow = None
+        with self._lock:
+            self._put(cache_id, blob, time.time(), version)
+            pending = self._dirty.pop(cache_id, [])
+            if operations is None or pending is None:
+                # Reescrita completa (ou já havia uma pendente)
+                self._dirty[cache_id] = None
+            else:
+                self._dirty[cache_id] = pending + [operations]
+            self.stats['writes'] += 1
+            if len(self._dirty) > self.max_dirty:
+                overflow = next(iter(self._dirty))
+            self._evict()
+        return overflow
+
+    def _after_write(self, overflow):
+        # Fora do lock: o writer pode estar à espera dele com o _write_lock na mão
+        if overflow is not None:
+            # Conjunto de sujos cheio: gravar o mais antigo já, nesta thread
+            self._flush_ids([overflow])
+        elif self.flush_interval <= 0:
+            self.flush()
+
+    def _flush_ids(self, cache_ids):
+        with self._write_lock:
+            for cache_id in cache_ids:
+                with self._lock:
+                    if cache_id not in self._dirty:
+                        continue
+                    batches = self._dirty.pop(cache_id)
+                    blob, _, version = self._entries[cache_id]
+                    expected = self._stored.get(cache_id)
                 try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        cache_data = json.load(f)
-                    
-                    timestamp = datetime.fromisoformat(cache_data['timestamp'])
-                    if datetime.now() - timestamp > timedelta(hours=24):
-                        os.remove(filepath)
+                    pending = None
+                    if batches is not None and hasattr(self.backend, 'append_operations'):
+                        appended = self.backend.append_operations(cache_id, batches, expected_version=expected)
+                        pending = appended[0] if appended else None
+                    if pending is not None and pending >= DELTA_COMPACT_AFTER:
+                        # Os deltas acabados de gravar já levaram o backend a esta versão
+                        self.backend.update_budget(cache_id, self._thaw(blob), expected_version=version)
+                    elif pending is None:
+                        self.backend.update_budget(cache_id, self._thaw(blob), expected_version=expected)
+                    with self._lock:
+                        if cache_id in self._entries:
+                            self._stored[cache_id] = version
+                    self.stats['flushed'] += 1
+                except BudgetConflictError:
+                    # Outro processo gravou primeiro: descartar a cópia (e edições) deste processo
+                    log.warning("Orçamento %s alterado noutro processo; alterações em memória descartadas",
+                                cache_id)
+                    with self._lock:
+                        self._discard(cache_id)
                 except Exception:
-                    # Arquivo corrompido, remover
-                    os.remove(filepath)
+                    log.exception("Erro ao gravar orçamento %s", cache_id)
+                    with self._lock:
+                        if cache_id in self._entries:
+                            self._dirty[cache_id] = None
+
+    def flush(self):
+        """Grava no backend todos os orçamentos pendentes"""
+        with self._lock:
+            pending = list(self._dirty)
+        self._flush_ids(pending)
+
+    def _writer_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval if self.flush_interval > 0 else None)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Erro no writer")
+
+    def disable(self, reason):
+        """Grava os pendentes e passa a usar só o backend (ex: servidor com vários processos)"""
+        if not self.enabled:
+            return
+        log.warning("Camada em memória da cache de orçamentos desativada: %s", reason)
+        self.enabled = False
+        self.close()
+        with self._lock:
+            self._entries.clear()
+            self._stored.clear()
+            self._bytes = 0
+
+    def close(self):
+        """Pára o writer e grava tudo o que estiver pendente (chamado também no exit)"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join(timeout=5)
+        self.flush()
+
+    def _drop_expired(self, limit=None):
+        cutoff = time.time() - CACHE_TTL.total_seconds()
+        with self._lock:
+            expired = [cache_id for cache_id, entry in self._entries.items() if entry[1] < cutoff]
+            for cache_id in expired[:limit]:
+                self._discard(cache_id)
+
+    def sweep_expired(self, limit=SWEEP_BATCH_SIZE):
+        """Remove um lote de expirados da memória e do backend"""
+        self._drop_expired(limit)
+        return self.backend.sweep_expired(limit)
+
+    def cleanup_expired(self):
+        """Remove expirados da memória e do backend"""
+        self._drop_expired()
+        return self.backend.cleanup_expired()
+
+    def memory_usage(self):
+        """Bytes e número de orçamentos em memória e pendentes de escrita"""
+        with self._lock:
+            return {'bytes': self._bytes, 'entries': len(self._entries), 'dirty': len(self._dirty)}
+
+
+class ExpirySweeper:
+    """
+    Thread em segundo plano que remove orçamentos expirados de uma cache.
+
+    A cada `interval` segundos chama cache.sweep_expired(batch_size) até um lote
+    vir incompleto, com uma pequena pausa entre lotes para não bloquear pedidos.
+    """
+
+    def __init__(self, cache, interval=SWEEP_INTERVAL, batch_size=SWEEP_BATCH_SIZE, pause=0.05):
+        self.cache = cache
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.removed = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='budget-cache-sweeper', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def after_fork(self):
+        """No processo filho: a thread não foi copiada; arrancar outra se estava ativa"""
+        if self._thread is not None:
+            self._stop = threading.Event()
+            self._thread = None
+            self.start()
+
+    def sweep(self):
+        """Um varrimento completo, em lotes; devolve quantos removeu"""
+        total = 0
+        while not self._stop.is_set():
+            removed = self.cache.sweep_expired(self.batch_size)
+            total += removed
+            if removed < self.batch_size:
+                break
+            self._stop.wait(self.pause)
+        self.removed += total
+        return total
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                log.exception("Erro na limpeza de expirados")
+
+
+def create_budget_cache(backend=None):
+    """
+    Cria a cache de orçamentos a partir de variáveis de ambiente:
+    - BUDGET_CACHE_BACKEND: 'sqlite' (omissão) ou 'file'
+    - BUDGET_CACHE_MEMORY_MB: limite da camada LRU em memória (omissão 0, desativada; só
+      para servidores de um processo, ver MemoryTieredBudgetCache)
+    - BUDGET_CACHE_FLUSH_INTERVAL: segundos entre escritas diferidas (omissão 1.0)
+    - BUDGET_CACHE_MAX_DIRTY: máximo de orçamentos pendentes de escrita (omissão 256)
+    - BUDGET_CACHE_SWEEP_INTERVAL: segundos entre limpezas de expirados (0 desativa; omissão 300)
+    """
+    backend = backend or os.environ.get('BUDGET_CACHE_BACKEND', 'sqlite')
+    store = BudgetCache() if backend == 'file' else SQLiteBudgetCache()
+
+    memory_mb = float(os.environ.get('BUDGET_CACHE_MEMORY_MB', 0))
+    if memory_mb <= 0:
+        return store
+    return MemoryTieredBudgetCache(
+        store,
+        max_bytes=int(memory_mb * 1024 * 1024),
+        flush_interval=float(os.environ.get('BUDGET_CACHE_FLUSH_INTERVAL', 1.0)),
+        max_dirty=int(os.environ.get('BUDGET_CACHE_MAX_DIRTY', 256))
+    )
+
+def start_expiry_sweeper(cache):
+    """Inicia a limpeza periódica de expirados para a cache dada"""
+    interval = float(os.environ.get('BUDGET_CACHE_SWEEP_INTERVAL', SWEEP_INTERVAL))
+    return ExpirySweeper(cache, interval=interval).start()
 
 # Instância global
-budget_cache = BudgetCache()
+budget_cache = create_budget_cache()
+budget_cache_sweeper = start_expiry_sweeper(budget_cache)
+
+
+@registry.add_collector
+def collect_budget_cache_metrics():
+    """Tamanho da cache para /metrics (lido a cada snapshot das métricas)"""
+    if hasattr(budget_cache, 'memory_usage'):
+        usage = budget_cache.memory_usage()
+        MEMORY_BYTES.set(usage['bytes'])
+        MEMORY_ENTRIES.set(usage['entries'])
+        MEMORY_DIRTY.set(usage['dirty'])
+    store = getattr(budget_cache, 'backend', budget_cache)
+    if hasattr(store, 'count'):
+        CACHE_ENTRIES.set(store.count())
@@ -0,0 +1,154 @@
+# Codec de Orçamentos - Codificação binária compacta para orçamentos em cache
+# Cabeçalho versionado + JSON compacto comprimido com zlib e dicionário de chaves
+
+import os
+import json
+import zlib
+import struct
+
+try:
+    import zstandard
+except ImportError:  # opcional
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # opcional
+    msgpack = None
+
+# Cabeçalho: MAGIC (3 bytes) + versão do formato (1 byte) + id do codec (1 byte)
+MAGIC = b'\xb7BG'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('>3sBB')
+
+CODEC_JSON = 0
+CODEC_ZLIB_DICT = 1
+CODEC_ZSTD_DICT = 2
+CODEC_MSGPACK_ZLIB = 3
+
+CODEC_NAMES = {
+    'json': CODEC_JSON,
+    'zjson': CODEC_ZLIB_DICT,
+    'zstd': CODEC_ZSTD_DICT,
+    'msgpack': CODEC_MSGPACK_ZLIB,
+}
+
+# Dicionário pré-definido (versão 1 do formato). Contém as chaves e valores que se
+# repetem em todas as linhas do orçamento; o zlib referencia-os em vez de os guardar.
+# NUNCA alterar: orçamentos já gravados dependem deste conteúdo exato. Para mudar,
+# criar um novo FORMAT_VERSION com outro dicionário.
+_BUDGET_DICTIONARY_V1 = ''.join([
+    '"client_data":{"clientName":"","commercialName":"","date":"2025-","localidade":"","localidade_outro":""},',
+    '"family_display_map":{"filtracao":"Filtração","recirculacao_iluminacao":"Recirculação e Iluminação",',
+    '"tratamento_agua":"Tratamento de Água","aquecimento":"Aquecimento","revestimento":"Revestimento",',
+    '"construcao":"Construção"},"family_totals":{"total_price":"subtotal_products":',
+    '"transport_costs":{"nivel_acesso":"facil","custo_por_m3":"custo_transporte_fixo":"custo_total_m3":',
+    '"custo_total":"m3_massa_usado":"explicacao":"Acesso ao local da obra","breakdown":[',
+    '{"descricao":"Custo por m³ de massa ( m³)","calculo":" × €","valor":},',
+    '{"descricao":"Custo fixo de transporte","calculo":"€","valor":}]},"transport_cost":',
+    '"multiplier":1.05,"multiplier_breakdown":{"geometrico":1.0,"tecnologico":1.0,"mercado":1.05,"final":1.05},',
+    '{"pool_info":{"dimensions":{"comprimento":,"largura":,"prof_min":,"prof_max":},',
+    '"metrics":{"prof_media":,"volume":,"m3_h":,"m3_massa":,"m2_fundo":,"m2_paredes":,"m2_tela":,',
+    '"ml_bordadura":,"perimetro":,"rolos_tl":,"rolos_3d":},',
+    '"answers":{"acesso":"facil","escavacao":"false","forma":"standard","tipo_piscina":"skimmer",',
+    '"revestimento":"tela","domotica":"true","localizacao":"interior","exterior","luz":"monofasica","trifasica",',
+    '"tratamento_agua":"clorador_salino","tipo_construcao":"nova","cobertura":"tipo_cobertura_laminas":"",',
+    '"zona_praia":"sim","zona_praia_largura":,"zona_praia_comprimento":,"escadas":"sim","escadas_largura":,',
+    '"casa_maquinas_abaixo":"sim","casa_maquinas_desc":"","tipo_luzes":"rgb"}},',
+    '"alternative_to":"","manual_price":"is_custom":true,"item_type":"alternativo","item_type":"opcional",',
+    '"unit":"m2","unit":"ml","unit":"m3","unit":"kg","unit":"un",',
+    '"families":{"filtracao":{"recirculacao_iluminacao":{"tratamento_agua":{',
+    '"reasoning":"Selecionado para piscina com capacidade  m³/h","Alternativa manual",',
+    '"name":"Filtro Astralpool - D.","Bomba de filtração","Válvula Selectora","Projetor LED",',
+    '"name":"","price":,"quantity":1,"unit":"un","item_type":"incluido","reasoning":"","can_change_type":true,"product_id":',
+    '"name":"","price":,"quantity":1,"unit":"un","item_type":"incluido","reasoning":"","can_change_type":true,"product_id":',
+]).encode('utf-8')
+
+_DICTIONARIES = {1: _BUDGET_DICTIONARY_V1}
+_zstd_dicts = {}
+
+
+def _default_codec():
+    name = os.environ.get('BUDGET_CODEC', 'zjson')
+    codec_id = CODEC_NAMES.get(name, CODEC_ZLIB_DICT)
+    if codec_id == CODEC_ZSTD_DICT and zstandard is None:
+        return CODEC_ZLIB_DICT
+    if codec_id == CODEC_MSGPACK_ZLIB and msgpack is None:
+        return CODEC_ZLIB_DICT
+    return codec_id
+
+
+def _json_bytes(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _zstd_dict(version):
+    if version not in _zstd_dicts:
+        _zstd_dicts[version] = zstandard.ZstdCompressionDict(
+            _DICTIONARIES[version], dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+    return _zstd_dicts[version]
+
+
+def encode_budget(data, codec=None):
+    """Codifica um orçamento (ou qualquer estrutura JSON) em bytes com cabeçalho versionado"""
+    codec_id = CODEC_NAMES[codec] if isinstance(codec, str) else codec
+    if codec_id is None:
+        codec_id = _default_codec()
+
+    if codec_id == CODEC_JSON:
+        body = _json_bytes(data)
+    elif codec_id == CODEC_ZLIB_DICT:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15, zdict=_DICTIONARIES[FORMAT_VERSION])
+        body = compressor.compress(_json_bytes(data)) + compressor.flush()
+    elif codec_id == CODEC_ZSTD_DICT:
+        if zstandard is None:
+            raise ValueError("Codec zstd requer o pacote 'zstandard'")
+        body = zstandard.ZstdCompressor(level=3, dict_data=_zstd_dict(FORMAT_VERSION)).compress(_json_bytes(data))
+    elif codec_id == CODEC_MSGPACK_ZLIB:
+        if msgpack is None:
+            raise ValueError("Codec msgpack requer o pacote 'msgpack'")
+        body = zlib.compress(msgpack.packb(data, use_bin_type=True), 6)
+    else:
+        raise ValueError(f"Codec desconhecido: {codec}")
+
+    return HEADER.pack(MAGIC, FORMAT_VERSION, codec_id) + body
+
+
+def decode_budget(payload):
+    """Descodifica bytes produzidos por encode_budget (aceita também JSON simples legado)"""
+    if isinstance(payload, str):
+        return json.loads(payload)
+    payload = bytes(payload)
+    if not payload.startswith(MAGIC):
+        # Formato anterior: JSON em texto
+        return json.loads(payload)
+
+    _, version, codec_id = HEADER.unpack_from(payload)
+    if version not in _DICTIONARIES:
+        raise ValueError(f"Versão de formato não suportada: {version}")
+    body = memoryview(payload)[HEADER.size:]
+
+    if codec_id == CODEC_JSON:
+        return json.loads(bytes(body))
+    if codec_id == CODEC_ZLIB_DICT:
+        decompressor = zlib.decompressobj(-15, zdict=_DICTIONARIES[version])
+        return json.loads(decompressor.decompress(body) + decompressor.flush())
+    if codec_id == CODEC_ZSTD_DICT:
+        if zstandard is None:
+            raise ValueError("Codec zstd requer o pacote 'zstandard'")
+        return json.loads(zstandard.ZstdDecompressor(dict_data=_zstd_dict(version)).decompress(body))
+    if codec_id == CODEC_MSGPACK_ZLIB:
+        if msgpack is None:
+            raise ValueError("Codec msgpack requer o pacote 'msgpack'")
+        return msgpack.unpackb(zlib.decompress(body), raw=False)
+    raise ValueError(f"Codec desconhecido: {codec_id}")
+
+
+def available_codecs():
+    """Nomes dos codecs utilizáveis neste ambiente"""
+    names = ['json', 'zjson']
+    if zstandard is not None:
+        names.append('zstd')
+    if msgpack is not None:
+        names.append('msgpack')
+    return names
@@ -0,0 +1,421 @@
+# Histórico de Edições - Undo/redo do orçamento no servidor
+# Cada edição guarda um snapshot imutável; as partes que não mudaram (famílias,
+# dados da piscina, do cliente...) são partilhadas com o snapshot anterior.
+# Com a cache SQLite (omissão) o histórico fica na mesma base de dados e é
+# partilhado por todos os workers; com a cache em ficheiros fica em memória.
+
+import os
+import marshal
+import hashlib
+import threading
+from collections import OrderedDict
+
+from app_logging import get_logger
+from budget_cache import budget_cache
+from budget_patch import budget_version, rebuild_budget_state, INTERNAL_KEYS
+
+log = get_logger('budget_history')
+
+# Número máximo de estados guardados por orçamento (o mais antigo sai primeiro)
+HISTORY_LENGTH = 50
+
+# Número máximo de orçamentos com histórico em memória (LRU)
+MAX_HISTORIES = 1000
+
+# marshal versão 2 não usa referências internas, por isso dados iguais dão
+# sempre os mesmos bytes e podem ser partilhados entre snapshots
+_MARSHAL_VERSION = 2
+
+# Campos de topo fora dos snapshots: a versão muda sempre e o estado interno
+# (_totals, _index) é derivado das linhas e reconstruído ao restaurar
+SNAPSHOT_EXCLUDED = ('families', 'version') + INTERNAL_KEYS
+
+
+class BudgetHistoryError(ValueError):
+    """Undo/redo impossível; status é o código HTTP a devolver"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _share(value, previous):
+    """Serializa value, reutilizando o objeto bytes anterior se o conteúdo for igual"""
+    blob = marshal.dumps(value, _MARSHAL_VERSION)
+    return previous if previous == blob else blob
+
+
+class Snapshot:
+    """
+    Estado imutável do orçamento: um blob por campo de topo e, dentro de
+    'families', um blob por família (ver SNAPSHOT_EXCLUDED).
+    """
+
+    __slots__ = ('fields', 'families', 'version')
+
+    def __init__(self, budget, previous=None):
+        old_fields = previous.fields if previous is not None else {}
+        old_families = previous.families if previous is not None else {}
+        self.fields = {
+            key: _share(value, old_fields.get(key))
+            for key, value in budget.items() if key not in SNAPSHOT_EXCLUDED
+        }
+        self.families = {
+            family: _share(lines, old_families.get(family))
+            for family, lines in budget.get('families', {}).items()
+        }
+        self.version = budget_version(budget)
+
+    def thaw(self):
+        """Orçamento completo (cópia nova) deste estado"""
+        budget = {key: marshal.loads(blob) for key, blob in self.fields.items()}
+        budget['families'] = {family: marshal.loads(blob) for family, blob in self.families.items()}
+        budget['version'] = self.version
+        return budget
+
+    def blobs(self):
+        yield from self.fields.values()
+        yield from self.families.values()
+
+
+class BudgetHistory:
+    """Estados de um orçamento e posição atual (undo/redo só movem a posição)"""
+
+    def __init__(self, budget, max_length=HISTORY_LENGTH):
+        self.max_length = max(1, max_length)
+        self.snapshots = [Snapshot(budget)]
+        self.position = 0
+
+    @property
+    def current(self):
+        return self.snapshots[self.position]
+
+    def record(self, budget):
+        """Acrescenta o novo estado; os estados refeitos à frente são descartados"""
+        snapshot = Snapshot(budget, self.current)
+        del self.snapshots[self.position + 1:]
+        self.snapshots.append(snapshot)
+        if len(self.snapshots) > self.max_length:
+            del self.snapshots[0]
+        self.position = len(self.snapshots) - 1
+
+    def can_undo(self):
+        return self.position > 0
+
+    def can_redo(self):
+        return self.position < len(self.snapshots) - 1
+
+    def move(self, step):
+        """Move a posição (-1 undo, +1 redo) e devolve o snapshot de destino"""
+        target = self.position + step
+        if not 0 <= target < len(self.snapshots):
+            raise BudgetHistoryError('Nada para desfazer' if step < 0 else 'Nada para refazer')
+        self.position = target
+        return self.snapshots[target]
+
+    def memory_usage(self):
+        """Bytes ocupados pelos snapshots (blobs partilhados contam uma vez)"""
+        unique = {}
+        for snapshot in self.snapshots:
+            for blob in snapshot.blobs():
+                unique[id(blob)] = len(blob)
+        return sum(unique.values())
+
+    def info(self):
+        return {
+            'can_undo': self.can_undo(),
+            'can_redo': self.can_redo(),
+            'position': self.position,
+            'length': len(self.snapshots),
+            'memory_bytes': self.memory_usage()
+        }
+
+
+class BudgetHistoryStore:
+    """
+    Históricos por ID de orçamento em cache, em memória e com limite LRU.
+
+    É por processo: com vários workers cada um só conheceria as edições que
+    processou, por isso a aplicação desativa-o (disable) em servidores com
+    vários processos. Cada estado guarda a versão do orçamento com que foi
+    gravado e undo/redo só são aceites se a versão atual na cache for a do
+    estado corrente; caso contrário o histórico é descartado (409).
+    """
+
+    shared = False
+
+    def __init__(self, max_length=HISTORY_LENGTH, max_histories=MAX_HISTORIES):
+        self.max_length = max_length
+        self.max_histories = max_histories
+        self.enabled = True
+        self._histories = OrderedDict()
+        self._lock = threading.Lock()
+
+    def disable(self, reason):
+        """Desativa undo/redo (histórico por processo com vários workers)"""
+        log.warning("Histórico de undo/redo em memória desativado: %s", reason)
+        with self._lock:
+            self.enabled = False
+            self._histories.clear()
+
+    def record(self, cache_id, budget, reset=False):
+        """Regista o estado gravado; reset=True começa um histórico novo (orçamento gerado)"""
+        if self.max_length <= 0 or not self.enabled:
+            return
+        with self._lock:
+            history = None if reset else self._histories.get(cache_id)
+            if history is None or history.current.version >= budget_version(budget):
+                # Sem histórico ou com estados de outra linha temporal: recomeçar
+                self._histories[cache_id] = BudgetHistory(budget, self.max_length)
+            else:
+                history.record(budget)
+            self._histories.move_to_end(cache_id)
+            while len(self._histories) > self.max_histories:
+                self._histories.popitem(last=False)
+
+    def step(self, cache_id, current_version, step):
+        """
+        Move o histórico (-1 undo, +1 redo) e devolve o orçamento de destino,
+        com a versão atual e o estado interno reconstruído (quem chama grava-o
+        como uma edição normal).
+        """
+        with self._lock:
+            if not self.enabled:
+                raise BudgetHistoryError('Undo/redo indisponível neste servidor (vários processos)', 404)
+            history = self._histories.get(cache_id)
+            if history is None:
+                raise BudgetHistoryError('Sem histórico de alterações para este orçamento', 404)
+            if history.current.version != current_version:
+                del self._histories[cache_id]
+                raise BudgetHistoryError('O orçamento foi alterado noutro lado; histórico reiniciado', 409)
+            snapshot = history.move(step)
+        budget = snapshot.thaw()
+        budget['version'] = current_version
+        rebuild_budget_state(budget)
+        return budget
+
+    def confirm(self, cache_id, budget):
+        """Atualiza a versão do estado corrente depois de gravado o undo/redo"""
+        with self._lock:
+            history = self._histories.get(cache_id)
+            if history is not None:
+                history.current.version = budget_version(budget)
+
+    def rollback(self, cache_id, step):
+        """Desfaz um step cujo orçamento não chegou a ser gravado"""
+        with self._lock:
+            history = self._histories.get(cache_id)
+            if history is not None:
+                history.position -= step
+
+    def info(self, cache_id):
+        with self._lock:
+            history = self._histories.get(cache_id)
+            if history is None:
+                return {'can_undo': False, 'can_redo': False, 'position': 0, 'length': 0, 'memory_bytes': 0}
+            return history.info()
+
+    def stats(self):
+        """Número de históricos e memória total ocupada"""
+        with self._lock:
+            return {
+                'histories': len(self._histories),
+                'memory_bytes': sum(h.memory_usage() for h in self._histories.values())
+            }
+
+
+def _snapshot_blobs(budget):
+    """(manifesto, {hash: blob}): um blob por campo de topo e por família, como Snapshot"""
+    blobs = {}
+
+    def add(value):
+        blob = marshal.dumps(value, _MARSHAL_VERSION)
+        digest = hashlib.sha1(blob).hexdigest()
+        blobs[digest] = blob
+        return digest
+
+    manifest = {
+        'fields': {key: add(value) for key, value in budget.items() if key not in SNAPSHOT_EXCLUDED},
+        'families': {family: add(lines) for family, lines in budget.get('families', {}).items()}
+    }
+    return manifest, blobs
+
+
+class SQLiteBudgetHistoryStore:
+    """
+    Históricos na base de dados da cache SQLite, partilhados por todos os
+    processos: undo/redo funciona seja qual for o worker que recebe o pedido.
+
+    Mesma API que BudgetHistoryStore. Cada estado é uma linha de budget_history
+    com um manifesto (hash de cada campo de topo e de cada família); os blobs
+    ficam em budget_history_blobs, um por hash e por orçamento, por isso as
+    partes que não mudaram são guardadas uma só vez. A posição atual está em
+    budget_history_position. Tudo é removido com o orçamento (ver SQLiteBudgetCache).
+    """
+
+    shared = True
+    enabled = True
+
+    def __init__(self, cache, max_length=HISTORY_LENGTH):
+        self.cache = cache
+        self.max_length = max_length
+
+    @staticmethod
+    def _position(conn, cache_id):
+        row = conn.execute("SELECT seq FROM budget_history_position WHERE budget_id = ?", (cache_id,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _version(conn, cache_id, seq):
+        row = conn.execute("SELECT version FROM budget_history WHERE budget_id = ? AND seq = ?",
+                           (cache_id, seq)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _clear(conn, cache_id):
+        for table in ('budget_history', 'budget_history_blobs', 'budget_history_position'):
+            conn.execute(f"DELETE FROM {table} WHERE budget_id = ?", (cache_id,))
+
+    @staticmethod
+    def _collect(conn, cache_id):
+        """Remove os blobs que já nenhum estado do orçamento usa"""
+        used = set()
+        for (manifest,) in conn.execute("SELECT manifest FROM budget_history WHERE budget_id = ?", (cache_id,)):
+            manifest = marshal.loads(manifest)
+            used.update(manifest['fields'].values())
+            used.update(manifest['families'].values())
+        stored = [row[0] for row in conn.execute("SELECT hash FROM budget_history_blobs WHERE budget_id = ?",
+                                                 (cache_id,))]
+        conn.executemany("DELETE FROM budget_history_blobs WHERE budget_id = ? AND hash = ?",
+                         [(cache_id, digest) for digest in stored if digest not in used])
+
+    def record(self, cache_id, budget, reset=False):
+        """Regista o estado gravado; reset=True começa um histórico novo (orçamento gerado)"""
+        if self.max_length <= 0:
+            return
+        manifest, blobs = _snapshot_blobs(budget)
+        version = budget_version(budget)
+        with self.cache.transaction() as conn:
+            position = None if reset else self._position(conn, cache_id)
+            current = None if position is None else self._version(conn, cache_id, position)
+            if current is None or current >= version:
+                # Sem histórico ou com estados de outra linha temporal: recomeçar
+                self._clear(conn, cache_id)
+                seq, removed = 0, 0
+            else:
+                seq = position + 1
+                # Estados refeitos à frente e, acima do limite, os mais antigos
+                removed = conn.execute("DELETE FROM budget_history WHERE budget_id = ? AND (seq >= ? OR seq <= ?)",
+                                       (cache_id, seq, seq - self.max_length)).rowcount
+            stored = {row[0] for row in conn.execute("SELECT hash FROM budget_history_blobs WHERE budget_id = ?",
+                                                     (cache_id,))}
+            conn.executemany("INSERT INTO budget_history_blobs (budget_id, hash, payload) VALUES (?, ?, ?)",
+                             [(cache_id, digest, blob) for digest, blob in blobs.items() if digest not in stored])
+            conn.execute("INSERT INTO budget_history (budget_id, seq, version, manifest) VALUES (?, ?, ?, ?)",
+                         (cache_id, seq, version, marshal.dumps(manifest, _MARSHAL_VERSION)))
+            conn.execute("""
+                INSERT INTO budget_history_position (budget_id, seq) VALUES (?, ?)
+                ON CONFLICT(budget_id) DO UPDATE SET seq = excluded.seq
+            """, (cache_id, seq))
+            if removed:
+                self._collect(conn, cache_id)
+
+    def step(self, cache_id, current_version, step):
+        """
+        Move o histórico (-1 undo, +1 redo) e devolve o orçamento de destino,
+        com a versão atual e o estado interno reconstruído (quem chama grava-o
+        como uma edição normal).
+        """
+        conflict = False
+        with self.cache.transaction() as conn:
+            position = self._position(conn, cache_id)
+            if position is None:
+                raise BudgetHistoryError('Sem histórico de alterações para este orçamento', 404)
+            if self._version(conn, cache_id, position) != current_version:
+                # Apagar o histórico (a transação tem de ser confirmada antes do erro)
+                self._clear(conn, cache_id)
+                conflict = True
+            else:
+                row = conn.execute("SELECT manifest FROM budget_history WHERE budget_id = ? AND seq = ?",
+                                   (cache_id, position + step)).fetchone()
+                if row is None:
+                    raise BudgetHistoryError('Nada para desfazer' if step < 0 else 'Nada para refazer')
+                conn.execute("UPDATE budget_history_position SET seq = ? WHERE budget_id = ?",
+                             (position + step, cache_id))
+                manifest = marshal.loads(row[0])
+                digests = list(manifest['fields'].values()) + list(manifest['families'].values())
+                placeholders = ','.join('?' * len(digests))
+                blobs = dict(conn.execute(
+                    f"SELECT hash, payload FROM budget_history_blobs WHERE budget_id = ? AND hash IN ({placeholders})",
+                    [cache_id] + digests
+                ))
+        if conflict:
+            raise BudgetHistoryError('O orçamento foi alterado noutro lado; histórico reiniciado', 409)
+
+        budget = {key: marshal.loads(blobs[digest]) for key, digest in manifest['fields'].items()}
+        budget['families'] = {family: marshal.loads(blobs[digest])
+                              for family, digest in manifest['families'].items()}
+        budget['version'] = current_version
+        rebuild_budget_state(budget)
+        return budget
+
+    def confirm(self, cache_id, budget):
+        """Atualiza a versão do estado corrente depois de gravado o undo/redo"""
+        with self.cache.transaction() as conn:
+            conn.execute("""
+                UPDATE budget_history SET version = ? WHERE budget_id = ?
+                    AND seq = (SELECT seq FROM budget_history_position WHERE budget_id = ?)
+            """, (budget_version(budget), cache_id, cache_id))
+
+    def rollback(self, cache_id, step):
+        """Desfaz um step cujo orçamento não chegou a ser gravado"""
+        with self.cache.transaction() as conn:
+            conn.execute("UPDATE budget_history_position SET seq = seq - ? WHERE budget_id = ?", (step, cache_id))
+
+    def info(self, cache_id):
+        empty = {'can_undo': False, 'can_redo': False, 'position': 0, 'length': 0, 'memory_bytes': 0}
+        if not cache_id:
+            return empty
+        with self.cache.transaction() as conn:
+            position = self._position(conn, cache_id)
+            if position is None:
+                return empty
+            first, last, length = conn.execute(
+                "SELECT MIN(seq), MAX(seq), COUNT(*) FROM budget_history WHERE budget_id = ?", (cache_id,)
+            ).fetchone()
+            memory = conn.execute("SELECT COALESCE(SUM(LENGTH(payload)), 0) FROM budget_history_blobs "
+                                  "WHERE budget_id = ?", (cache_id,)).fetchone()[0]
+        return {
+            'can_undo': position > first,
+            'can_redo': position < last,
+            'position': position - first,
+            'length': length,
+            'memory_bytes': memory
+        }
+
+    def stats(self):
+        """Número de históricos e espaço total ocupado pelos blobs"""
+        with self.cache.transaction() as conn:
+            histories = conn.execute("SELECT COUNT(*) FROM budget_history_position").fetchone()[0]
+            memory = conn.execute("SELECT COALESCE(SUM(LENGTH(payload)), 0) FROM budget_history_blobs").fetchone()[0]
+        return {'histories': histories, 'memory_bytes': memory}
+
+
+def create_budget_history(cache):
+    """
+    Histórico de undo/redo para a cache dada, a partir de variáveis de ambiente:
+    - BUDGET_HISTORY_LENGTH: estados guardados por orçamento (omissão 50)
+    - BUDGET_HISTORY_MAX: orçamentos com histórico em memória (omissão 1000; só
+      com a cache em ficheiros, cujo histórico é por processo)
+    """
+    max_length = int(os.environ.get('BUDGET_HISTORY_LENGTH', HISTORY_LENGTH))
+    store = getattr(cache, 'backend', cache)
+    if hasattr(store, 'transaction'):
+        return SQLiteBudgetHistoryStore(store, max_length=max_length)
+    return BudgetHistoryStore(max_length=max_length,
+                              max_histories=int(os.environ.get('BUDGET_HISTORY_MAX', MAX_HISTORIES)))
+
+
+# Instância global
+budget_history = create_budget_history(budget_cache)
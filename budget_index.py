@@ -0,0 +1,99 @@
+# Índice de Linhas - Localização O(1) das linhas do orçamento
+# As rotas de edição recebem só a chave da linha (ou o ID do produto) e antes
+# percorriam todas as famílias para a encontrar; o índice guarda onde está cada
+# linha e é mantido pelas operações de budget_patch (add, remove, replace).
+
+# Estado guardado no próprio orçamento:
+#   {'version': <versão do orçamento>,
+#    'lines': {chave da linha: família},
+#    'products': {ID do produto (texto): [chaves das linhas com esse produto]}}
+# Como em budget['_totals'], o índice só é válido para a versão indicada: rotas que
+# alteram as famílias diretamente são reindexadas ao gravar (advance_budget_state,
+# em budget_patch) ou, se isso não for possível, na próxima procura. Não é enviado
+# ao cliente (ver budget_patch.public_budget).
+INDEX_KEY = '_index'
+
+
+def line_product_id(line):
+    """ID do produto do catálogo de uma linha (texto), ou None"""
+    if not isinstance(line, dict):
+        return None
+    product_id = line.get('product_id', line.get('id'))
+    return str(product_id) if product_id not in (None, '') else None
+
+
+def _add_entry(index, family, line_id, line):
+    # Chaves repetidas entre famílias: fica a primeira (como a procura sequencial)
+    index['lines'].setdefault(line_id, family)
+    product_id = line_product_id(line)
+    if product_id is not None:
+        keys = index['products'].setdefault(product_id, [])
+        if line_id not in keys:
+            keys.append(line_id)
+
+
+def build_index(budget):
+    """Reconstrói o índice a partir das famílias (O(nº de linhas)) e devolve-o"""
+    index = {'version': budget.get('version', 0), 'lines': {}, 'products': {}}
+    for family, lines in budget.get('families', {}).items():
+        for line_id, line in lines.items():
+            _add_entry(index, family, line_id, line)
+    budget[INDEX_KEY] = index
+    return index
+
+
+def ensure_index(budget):
+    """Índice válido para a versão atual do orçamento (reconstruído se preciso)"""
+    index = budget.get(INDEX_KEY)
+    if not isinstance(index, dict) or index.get('version') != budget.get('version', 0):
+        index = build_index(budget)
+    return index
+
+
+def index_line(budget, family, line_id, line):
+    """Regista uma linha acrescentada (requer índice válido, ver ensure_index)"""
+    _add_entry(budget[INDEX_KEY], family, line_id, line)
+
+
+def unindex_line(budget, family, line_id, line):
+    """Retira uma linha removida do índice"""
+    index = budget[INDEX_KEY]
+    if index['lines'].get(line_id) == family:
+        del index['lines'][line_id]
+        # Outra família com a mesma chave passa a ser a encontrada
+        for other, lines in budget.get('families', {}).items():
+            if line_id in lines:
+                index['lines'][line_id] = other
+                break
+    product_id = line_product_id(line)
+    keys = index['products'].get(product_id)
+    if keys and line_id in keys and line_id not in index['lines']:
+        keys.remove(line_id)
+        if not keys:
+            del index['products'][product_id]
+
+
+def finish_index_update(budget, new_version):
+    """O índice passa a corresponder a new_version"""
+    budget[INDEX_KEY]['version'] = new_version
+
+
+def find_line(budget, line_id):
+    """Família que contém a linha, ou None"""
+    family = ensure_index(budget)['lines'].get(line_id)
+    if family is not None and line_id in budget.get('families', {}).get(family, {}):
+        return family
+    if family is not None:
+        # Índice inconsistente (orçamento alterado sem mudar a versão): reconstruir
+        family = build_index(budget)['lines'].get(line_id)
+    return family
+
+
+def find_product_lines(budget, product_id):
+    """Lista de (família, chave) das linhas com o produto indicado"""
+    result = []
+    for line_id in ensure_index(budget)['products'].get(str(product_id), ()):
+        family = find_line(budget, line_id)
+        if family is not None:
+            result.append((family, line_id))
+    return result
@@ -0,0 +1,280 @@
+# Alterações ao Orçamento - Operações pequenas e tipadas sobre um orçamento versionado
+# Em vez de reescrever o orçamento inteiro, os clientes enviam operações como:
+#   {"op": "set_quantity", "line": "filter_3", "value": 2}
+#   {"op": "set_type", "family": "filtracao", "line": "valve_100", "value": "incluido"}
+#   {"op": "set_price", "line": "custom_1", "value": 120.0}
+#   {"op": "set_name", "line": "custom_1", "value": "Escada inox"}
+#   {"op": "toggle_optional", "line": "cover_7", "include": true}
+#   {"op": "remove", "family": "filtracao", "line": "valve_100"}
+#   {"op": "add", "family": "filtracao", "line": "pump_12", "product": {<linha completa>}}
+#   {"op": "replace", "family": "filtracao", "line": "pump_12", "new_line": "pump_8", "product": {...}}
+# add/replace levam a linha já resolvida a partir do catálogo, para que reaplicar
+# a operação (deltas da cache) dê sempre o mesmo resultado.
+
+from budget_totals import (calculate_and_update_totals, line_base_total, totals_state_valid,
+                           apply_line_delta, finish_incremental_update, TOTALS_STATE_KEY)
+from budget_index import (ensure_index, find_line, index_line, unindex_line, finish_index_update, build_index,
+                          INDEX_KEY)
+
+OPERATIONS = ('set_quantity', 'set_type', 'set_price', 'set_name', 'toggle_optional', 'remove', 'add', 'replace')
+
+# Campos de totais devolvidos ao cliente depois de cada alteração
+TOTAL_FIELDS = ('total_price', 'subtotal_with_margin', 'total_with_iva', 'iva_amount',
+                'family_totals', 'family_totals_base')
+
+# Estado interno guardado no orçamento (somas incrementais e índice de linhas):
+# é gravado na cache com ele, mas nunca enviado ao cliente nem para o PDF
+INTERNAL_KEYS = (TOTALS_STATE_KEY, INDEX_KEY)
+
+
+class BudgetPatchError(ValueError):
+    """Operação inválida; status é o código HTTP a devolver"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def budget_version(budget):
+    """Versão atual do orçamento (0 para orçamentos anteriores ao versionamento)"""
+    return budget.get('version', 0)
+
+
+def _find_line(budget, operation):
+    """Devolve (família, id da linha, linha) para a operação"""
+    line_id = operation.get('line')
+    family = operation.get('family')
+    families = budget.get('families', {})
+
+    if not line_id:
+        raise BudgetPatchError('ID do produto é obrigatório')
+    if family:
+        if family not in families:
+            raise BudgetPatchError('Família não encontrada', 404)
+        if line_id not in families[family]:
+            raise BudgetPatchError('Produto não encontrado', 404)
+        return family, line_id, families[family][line_id]
+
+    # Sem família: localizar pelo índice de linhas
+    family = find_line(budget, line_id)
+    if family is None:
+        raise BudgetPatchError('Produto não encontrado', 404)
+    return family, line_id, families[family][line_id]
+
+
+def _set_quantity(line, operation):
+    value = operation.get('value')
+    # Garantir que quantity seja um número válido
+    try:
+        quantity = float(value) if value not in (None, '') else 0
+    except (ValueError, TypeError):
+        quantity = 0
+    line['quantity'] = max(0, quantity)  # Permitir quantidade 0 e decimais
+
+
+def _set_type(line, operation):
+    new_type = operation.get('value') or 'incluido'
+    line['item_type'] = new_type
+
+    # Se mudou para opcional ou oferta, zerar quantidade
+    if new_type in ['opcional', 'oferta']:
+        line['quantity'] = 0
+    elif new_type == 'incluido' and line['quantity'] == 0:
+        # Se mudou para incluído e estava zerado, colocar 1
+        line['quantity'] = 1
+
+
+def _set_price(line, operation):
+    try:
+        price = float(operation.get('value'))
+        if price < 0:
+            raise ValueError("Preço não pode ser negativo")
+    except (ValueError, TypeError):
+        raise BudgetPatchError('Preço deve ser um número válido e não negativo')
+    if not line.get('editable_price', False):
+        raise BudgetPatchError('Este produto não permite edição de preço')
+    line['price'] = price
+
+
+def _set_name(line, operation):
+    name = (operation.get('value') or '').strip()
+    if not name:
+        raise BudgetPatchError('ID do produto e nome são obrigatórios')
+    if not line.get('editable_name', False):
+        raise BudgetPatchError('Este produto não permite edição de nome')
+    line['name'] = name
+
+
+def _toggle_optional(line, operation):
+    include = operation.get('include', True)
+    # Aceitar produtos opcionais ou produtos que eram opcionais (incluídos via toggle)
+    current_type = line.get('item_type')
+    is_toggleable = (current_type == 'opcional' or
+                     (current_type == 'incluido' and line.get('was_optional', False)))
+    if not is_toggleable:
+        raise BudgetPatchError('Produto opcional não encontrado', 404)
+
+    if include and current_type == 'opcional':
+        # Quando incluir: produto vira "incluído" e quantidade = 1
+        line['item_type'] = 'incluido'
+        line['quantity'] = max(1, line.get('quantity', 1))
+        line['was_optional'] = True  # Marcar que era opcional
+        # Limpar nome (remover sufixos opcionais se houver)
+        line['name'] = line['name'].replace(' (OPCIONAL)', '').replace(' (ALTERNATIVO)', '')
+    elif not include and line.get('was_optional', False):
+        # Quando remover: produto volta a ser "opcional" e quantidade = 0
+        line['item_type'] = 'opcional'
+        line['quantity'] = 0
+        line['was_optional'] = False
+    elif not include and current_type == 'opcional':
+        # Produto opcional sendo "desincluído"
+        line['quantity'] = 0
+
+
+def _product_line(operation):
+    product = operation.get('product')
+    if not isinstance(product, dict) or not product.get('name'):
+        raise BudgetPatchError('Produto inválido')
+    return dict(product)
+
+
+def _add(budget, operation):
+    """Acrescenta (ou substitui, se a chave já existir) uma linha; devolve (família, id)"""
+    family = operation.get('family')
+    line_id = operation.get('line')
+    if not family or not line_id:
+        raise BudgetPatchError('Família e ID do produto são obrigatórios')
+    lines = budget.setdefault('families', {}).setdefault(family, {})
+    if line_id in lines:
+        unindex_line(budget, family, line_id, lines.pop(line_id))
+    lines[line_id] = _product_line(operation)
+    index_line(budget, family, line_id, lines[line_id])
+    budget.setdefault('family_totals', {}).setdefault(family, 0.0)
+    return [(family, line_id)]
+
+
+def _replace(budget, operation):
+    """Troca uma linha por outro produto, mantendo quantidade e tipo"""
+    family, line_id, line = _find_line(budget, operation)
+    new_line_id = operation.get('new_line')
+    if not new_line_id:
+        raise BudgetPatchError('ID do novo produto é obrigatório')
+    new_line = _product_line(operation)
+    new_line['quantity'] = line['quantity']
+    new_line['item_type'] = line['item_type']  # Manter tipo anterior
+    del budget['families'][family][line_id]
+    unindex_line(budget, family, line_id, line)
+    budget['families'][family][new_line_id] = new_line
+    index_line(budget, family, new_line_id, new_line)
+    return [(family, line_id), (family, new_line_id)]
+
+
+_STRUCTURAL_HANDLERS = {
+    'add': _add,
+    'replace': _replace,
+}
+
+
+_HANDLERS = {
+    'set_quantity': _set_quantity,
+    'set_type': _set_type,
+    'set_price': _set_price,
+    'set_name': _set_name,
+    'toggle_optional': _toggle_optional,
+}
+
+
+def apply_operations(budget, operations, expected_version=None):
+    """
+    Aplica uma lista de operações ao orçamento (in place) e atualiza os totais:
+    alterações de linhas ajustam só a soma da família (ver budget_totals);
+    add/replace, ou um estado de totais desatualizado, levam ao cálculo completo.
+
+    Se expected_version for dado e não coincidir com a versão atual, nada é
+    alterado (BudgetPatchError 409). Em caso de erro numa operação o orçamento
+    pode ficar parcialmente alterado; quem chama deve descartar a cópia.
+
+    Devolve {'version', 'lines', 'totals'}, onde lines só contém as linhas
+    alteradas ({família: {id: linha ou None se removida}}).
+    """
+    if expected_version is not None and int(expected_version) != budget_version(budget):
+        raise BudgetPatchError('O orçamento foi alterado entretanto; recarregue a página', 409)
+    if not isinstance(operations, list) or not operations:
+        raise BudgetPatchError('Nenhuma operação indicada')
+
+    changed = {}
+    incremental = totals_state_valid(budget)
+    ensure_index(budget)
+    for operation in operations:
+        op = operation.get('op') if isinstance(operation, dict) else None
+        if op not in OPERATIONS:
+            raise BudgetPatchError(f'Operação desconhecida: {op}')
+
+        if op in _STRUCTURAL_HANDLERS:
+            touched = _STRUCTURAL_HANDLERS[op](budget, operation)
+            incremental = False
+        else:
+            family, line_id, line = _find_line(budget, operation)
+            before = line_base_total(line)
+            if op == 'remove':
+                del budget['families'][family][line_id]
+                unindex_line(budget, family, line_id, line)
+                after = 0
+            else:
+                _HANDLERS[op](line, operation)
+                after = line_base_total(line)
+            if incremental:
+                apply_line_delta(budget, family, before, after)
+            touched = [(family, line_id)]
+        for family, line_id in touched:
+            changed.setdefault(family, {})[line_id] = line_id
+
+    new_version = budget_version(budget) + 1
+    if incremental:
+        finish_incremental_update(budget, new_version)
+    else:
+        # Recalcular totais usando a função comum
+        calculate_and_update_totals(budget)
+        budget[TOTALS_STATE_KEY]['version'] = new_version
+    finish_index_update(budget, new_version)
+    budget['version'] = new_version
+
+    families = budget.get('families', {})
+    return {
+        'version': budget['version'],
+        'lines': {
+            family: {line_id: families.get(family, {}).get(line_id) for line_id in line_ids}
+            for family, line_ids in changed.items()
+        },
+        'totals': {field: budget.get(field, 0) for field in TOTAL_FIELDS}
+    }
+
+
+def public_budget(budget):
+    """Cópia superficial do orçamento sem o estado interno, para respostas JSON"""
+    if not budget:
+        return budget
+    return {key: value for key, value in budget.items() if key not in INTERNAL_KEYS}
+
+
+def rebuild_budget_state(budget):
+    """Recalcula o estado interno (totais incrementais e índice) para a versão atual"""
+    families = budget.get('families')
+    if isinstance(families, dict) and all(isinstance(lines, dict) for lines in families.values()):
+        calculate_and_update_totals(budget)
+        build_index(budget)
+
+
+def advance_budget_state(budget, new_version):
+    """
+    Leva o estado interno para new_version numa gravação feita fora de
+    apply_operations (rotas antigas, undo/redo). As rotas recalculam os totais
+    antes de gravar, por isso somas válidas para a versão atual continuam certas
+    e a próxima edição continua incremental; o índice é reconstruído (as rotas
+    podem ter mudado linhas sem o atualizar). Chamar antes de mudar a versão.
+    """
+    if totals_state_valid(budget):
+        budget[TOTALS_STATE_KEY]['version'] = new_version
+        build_index(budget)
+        budget[INDEX_KEY]['version'] = new_version
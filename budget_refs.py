@@ -0,0 +1,196 @@
+# Referências ao Catálogo - Orçamentos guardados com linhas por referência
+# Cada linha guarda apenas o ID do produto e o que difere do catálogo (quantidade,
+# tipo, justificação, preço/nome alterados); nome, preço e unidade são repostos
+# a partir do catálogo em memória quando o orçamento é lido da cache.
+
+import threading
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from budget_totals import calculate_and_update_totals
+from app_logging import get_logger
+
+log = get_logger('budget_refs')
+
+# Versão do formato compacto; orçamentos sem esta chave já estão completos
+COMPACT_KEY = '_compact'
+COMPACT_FORMAT = 1
+
+# Versão do catálogo com que o orçamento foi compactado
+CATALOG_KEY = '_catalog'
+
+# Linhas sem product_id (construção, recirculação...) referenciam o produto pelo
+# nome; a referência resolvida fica nesta chave
+REF_KEY = 'ref'
+
+# Campos da linha que vêm do catálogo: campo da linha -> campo do produto
+CATALOG_FIELDS = (('name', 'name'), ('price', 'base_price'), ('unit', 'unit'))
+
+
+class CatalogIndex:
+    """
+    Produtos do catálogo indexados por ID e por nome, reconstruídos apenas
+    quando a versão do catálogo muda (como o MultiplierEngine).
+    """
+
+    def __init__(self, db_manager=None):
+        self._db = db_manager
+        self._lock = threading.Lock()
+        self._version = None
+        self._by_id: Dict[int, Dict] = {}
+        self._by_name: Dict[str, int] = {}
+
+    def _get_db(self):
+        if self._db is None:
+            from database_manager import DatabaseManager
+            self._db = DatabaseManager()
+        return self._db
+
+    def current(self) -> Tuple[Optional[str], Dict[int, Dict], Dict[str, int]]:
+        """Devolve (versão, produtos por ID, ID por nome) do catálogo atual"""
+        try:
+            db = self._get_db()
+            version = db.get_catalog_version()
+        except Exception as e:
+            log.warning("Fallback: referências sem catálogo: %s", e)
+            return None, {}, {}
+
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    catalog = db.get_catalog_products()
+                    by_id = {int(p['id']): p for p in catalog}
+                    # Só nomes únicos servem de referência
+                    counts = Counter(p['name'] for p in catalog)
+                    by_name = {p['name']: int(p['id']) for p in catalog if counts[p['name']] == 1}
+                    self._by_id, self._by_name = by_id, by_name
+                    self._version = version
+        return self._version, self._by_id, self._by_name
+
+    def invalidate(self):
+        """Força a releitura do catálogo na próxima utilização"""
+        with self._lock:
+            self._version = None
+
+
+def _catalog_id(product_id):
+    """ID do catálogo se product_id o representa exatamente (12 ou '12'), senão None"""
+    try:
+        catalog_id = int(product_id)
+    except (TypeError, ValueError):
+        return None
+    return catalog_id if str(catalog_id) == str(product_id) else None
+
+
+def _resolve(line, by_id, by_name):
+    """ID do produto referenciado pela linha, ou None"""
+    product_id = line.get('product_id')
+    if product_id is not None:
+        # IDs que não voltam a ser o mesmo int (ex: 'abc', 12.5) não são compactados
+        product_id = _catalog_id(product_id)
+        return product_id if product_id in by_id else None
+    return by_name.get(line.get('name'))
+
+
+def _compact_line(line, by_id, by_name):
+    product_id = _resolve(line, by_id, by_name)
+    if product_id is None:
+        return line
+    product = by_id[product_id]
+
+    compact = dict(line)
+    if 'product_id' not in line:
+        compact[REF_KEY] = product_id
+    # Só sai o que é igual ao catálogo; valores alterados ficam como override
+    for line_field, product_field in CATALOG_FIELDS:
+        if line_field in compact and compact[line_field] == product.get(product_field):
+            del compact[line_field]
+
+    alternatives = line.get('alternatives')
+    if alternatives:
+        compact['alternatives'] = [_compact_alternative(alt, by_id) for alt in alternatives]
+    return compact
+
+
+def _compact_alternative(alternative, by_id):
+    product = by_id.get(alternative.get('id')) if isinstance(alternative, dict) else None
+    if product is None:
+        return alternative
+    compact = dict(alternative)
+    if compact.get('name') == product['name']:
+        del compact['name']
+    if compact.get('price') == product['base_price']:
+        del compact['price']
+    return compact
+
+
+def _missing_product(product_id):
+    log.warning("Fallback: produto %s referenciado no orçamento já não existe no catálogo", product_id)
+    return {'name': f"Produto {product_id}", 'base_price': 0.0, 'unit': 'un'}
+
+
+def _hydrate_line(line, by_id):
+    product_id = line.pop(REF_KEY, None)
+    if product_id is None:
+        # Linha com product_id: só foi compactada se o ID é um ID do catálogo
+        product_id = _catalog_id(line.get('product_id'))
+    if product_id is None:
+        return
+
+    product = None
+    for line_field, product_field in CATALOG_FIELDS:
+        if line_field not in line:
+            if product is None:
+                product = by_id.get(product_id) or _missing_product(product_id)
+            line[line_field] = product.get(product_field)
+
+    for alternative in line.get('alternatives') or ():
+        if isinstance(alternative, dict) and ('name' not in alternative or 'price' not in alternative):
+            product = by_id.get(alternative.get('id')) or _missing_product(alternative.get('id'))
+            alternative.setdefault('name', product['name'])
+            alternative.setdefault('price', product['base_price'])
+
+
+def compact_budget(budget, index=None):
+    """
+    Cópia do orçamento com as linhas por referência ao catálogo. O original não
+    é alterado. Estruturas que não são orçamentos (ex: sessões) passam intactas.
+    """
+    if not isinstance(budget, dict) or not isinstance(budget.get('families'), dict):
+        return budget
+    version, by_id, by_name = (index or catalog_index).current()
+    if version is None:
+        return budget
+
+    compact = dict(budget)
+    compact['families'] = {
+        family: {line_id: _compact_line(line, by_id, by_name) for line_id, line in lines.items()}
+        for family, lines in budget['families'].items()
+    }
+    compact[COMPACT_KEY] = COMPACT_FORMAT
+    compact[CATALOG_KEY] = version
+    return compact
+
+
+def hydrate_budget(budget, index=None):
+    """
+    Repõe (in place) os campos do catálogo num orçamento compactado e devolve-o.
+    Se o catálogo mudou desde a compactação, os totais são recalculados com os
+    valores atuais.
+    """
+    if not isinstance(budget, dict) or budget.pop(COMPACT_KEY, None) is None:
+        return budget
+    compacted_with = budget.pop(CATALOG_KEY, None)
+    version, by_id, _ = (index or catalog_index).current()
+
+    for lines in budget.get('families', {}).values():
+        for line in lines.values():
+            _hydrate_line(line, by_id)
+
+    if compacted_with != version:
+        calculate_and_update_totals(budget)
+    return budget
+
+
+# Instância global
+catalog_index = CatalogIndex()
@@ -0,0 +1,137 @@
+# Repositório do Orçamento - Acesso ao orçamento da sessão durante um pedido
+# O orçamento é lido da cache no máximo uma vez e gravado no máximo uma vez,
+# no fim do pedido, por muitas vezes que as rotas chamem get/save.
+
+import uuid
+import threading
+
+from budget_patch import budget_version, advance_budget_state
+from metrics import registry
+
+BUDGET_LOOKUPS = registry.counter('budget_cache_lookups_total',
+                                  'Leituras do orçamento da sessão na cache (hit: encontrado, miss: expirado ou perdido)',
+                                  ('result',))
+
+
+class BudgetRepository:
+    """
+    Orçamento atual de um pedido (leitura preguiçosa, escrita única).
+
+    save() não escreve logo: marca o orçamento como alterado e atribui já a
+    nova versão (as respostas da rota podem incluí-la); commit() faz a escrita
+    condicional (compare-and-swap) e regista o estado no histórico de undo/redo.
+    Também conta leituras, escritas e bytes serializados do pedido.
+    """
+
+    def __init__(self, cache, history, session):
+        self.cache = cache
+        self.history = history
+        self.session = session
+        self.reset()
+        self.loads = 0
+        self.writes = 0
+        self.patches = 0
+        self.bytes_written = 0
+
+    def reset(self):
+        """Esquece o orçamento lido e as alterações pendentes (ex: antes de repetir o pedido)"""
+        self._budget = None
+        self._loaded = False
+        self._pending = None
+        self._expected_version = None
+        self._record_history = True
+
+    @property
+    def dirty(self):
+        return self._pending is not None
+
+    def get(self):
+        """Orçamento atual ({} se não houver); lido da cache só na primeira chamada"""
+        if not self._loaded:
+            self._loaded = True
+            cache_id = self.session.get('budget_cache_id')
+            budget = None
+            if cache_id:
+                self.loads += 1
+                budget = self.cache.get_budget(cache_id)
+                BUDGET_LOOKUPS.inc(result='hit' if budget is not None else 'miss')
+            self._budget = budget or {}
+        return self._budget
+
+    def save(self, budget, replace=False, record_history=True):
+        """
+        Marca o orçamento para gravar no fim do pedido. A escrita só é aceite se
+        ninguém o alterou desde que foi lido (versão); replace=True substitui-o
+        incondicionalmente (orçamento novo).
+        """
+        if budget is not self._pending:
+            # Primeira gravação deste orçamento no pedido: nova versão (o estado
+            # incremental dos totais e o índice acompanham-na, ver advance_budget_state)
+            self._expected_version = budget_version(budget)
+            advance_budget_state(budget, self._expected_version + 1)
+            budget['version'] = self._expected_version + 1
+        if replace:
+            self._expected_version = None
+        self._pending = budget
+        self._budget = budget
+        self._loaded = True
+        self._record_history = record_history
+
+    def adopt(self, budget, bytes_written=0):
+        """Orçamento já gravado por outra via (patch_budget): passa a ser o atual"""
+        self.patches += 1
+        self.bytes_written += bytes_written or 0
+        self._budget = budget
+        self._loaded = True
+
+    def commit(self):
+        """Grava o orçamento pendente, se houver; BudgetConflictError se a versão mudou"""
+        budget = self._pending
+        if budget is None:
+            return
+        self._pending = None
+
+        cache_id = self.session.get('budget_cache_id')
+        if cache_id:
+            self.bytes_written += self.cache.update_budget(cache_id, budget, expected_version=self._expected_version) or 0
+        else:
+            # Criar novo cache
+            cache_id = str(uuid.uuid4())
+            self.bytes_written += self.cache.update_budget(cache_id, budget) or 0
+            self.session['budget_cache_id'] = cache_id
+        self.writes += 1
+
+        if self._record_history:
+            # Um orçamento novo (versão não superior à do histórico) recomeça o histórico
+            self.history.record(cache_id, budget)
+
+
+class BudgetIOStats:
+    """Leituras, escritas e bytes serializados do orçamento, acumulados por rota"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, repository):
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint or '<sem rota>', {
+                'requests': 0, 'loads': 0, 'writes': 0, 'patches': 0, 'bytes_written': 0
+            })
+            stats['requests'] += 1
+            stats['loads'] += repository.loads
+            stats['writes'] += repository.writes
+            stats['patches'] += repository.patches
+            stats['bytes_written'] += repository.bytes_written
+
+    def snapshot(self):
+        """Cópia dos contadores, com a média de bytes escritos por pedido"""
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                result[endpoint] = dict(stats, bytes_per_request=round(stats['bytes_written'] / stats['requests'], 1))
+            return result
+
+
+# Instância global
+budget_io_stats = BudgetIOStats()
@@ -0,0 +1,178 @@
+# Pedidos de Orçamento - Validação dos dados do questionário e geração do orçamento
+# Partilhado pela aplicação Flask (app.py) e pela variante ASGI (asgi.py), para que
+# as duas aceitem os mesmos dados e devolvam os mesmos erros.
+
+from typing import Dict, Optional, Tuple
+
+from budget_totals import calculate_and_update_totals
+from metrics import timed_stages, stage
+
+REQUIRED_FIELDS = ('acesso', 'forma', 'tipo_piscina', 'revestimento', 'localizacao', 'luz')
+
+DIMENSION_FIELDS = ('comprimento', 'largura', 'prof_min', 'prof_max')
+
+# Métricas calculadas no frontend que substituem as do servidor quando enviadas
+METRIC_OVERRIDES = (('m3_massa', float), ('m2_fundo', float), ('m2_paredes', float), ('m2_tela', float),
+                    ('ml_bordadura', float), ('rolos_tl', int), ('rolos_3d', int))
+
+# Opções do questionário (questionnaire_clean.html) e localidades dos dados do cliente
+# (client_data_clean.html). Respostas vazias também são válidas.
+SIM_NAO = ('sim', 'nao')
+QUESTIONNAIRE_CHOICES = {
+    'acesso': ('facil', 'medio', 'dificil'),
+    'escavacao': (True, False),
+    'forma': ('standard', 'especial'),
+    'tipo_piscina': ('skimmer', 'espelho_dagua', 'transbordo'),
+    'revestimento': ('tela', 'ceramica'),
+    'domotica': (True, False),
+    'localizacao': ('interior', 'exterior'),
+    'luz': ('monofasica', 'trifasica'),
+    'tratamento_agua': ('cloro_manual', 'cloro_automatico', 'clorador_salino', 'clorador_salino_ph',
+                        'clorador_salino_ph_uv', 'nao'),
+    'tipo_construcao': ('nova', 'remodelacao'),
+    'cobertura': ('laminas', 'bolhas', 'barras', 'lona', 'nao'),
+    'tipo_cobertura_laminas': ('elevada', 'fora_praia', 'submersa_praia'),
+    'casa_maquinas_abaixo': SIM_NAO,
+    'tipo_luzes': ('branco_frio', 'branco_adaptavel', 'rgb'),
+    'zona_praia': SIM_NAO,
+    'escadas': SIM_NAO,
+    'havera_laje': SIM_NAO,
+    'laje_espessura': (0.10, 0.15),
+    'revestimento_laje': SIM_NAO,
+    'material_revestimento': ('granito_vila_real', 'granito_pedras_salgadas', 'granito_preto_angola',
+                              'granito_preto_zimbabue', 'marmore_branco_ibiza', 'travertino_turco',
+                              'pedra_hijau', 'base_niza_625', 'base_niza_1200', 'base_oslo_625',
+                              'base_oslo_1200', 'base_tivoli_625', 'base_tivoli_1200', 'base_amberes_625',
+                              'base_amberes_1200', 'base_paradise_bali_625', 'base_oceanic_625'),
+    'havera_bordadura': SIM_NAO,
+    'tipo_bordadura': ('pedra_natural', 'ceramico'),
+    'espessura_bordadura': ('2cm', '3cm', 'outro'),
+    'material_bordadura_natural': tuple(f"{material}_{espessura}" for espessura in ('2cm', '3cm') for material in (
+        'granito_vila_real', 'granito_pedras_salgadas', 'granito_preto_angola',
+        'granito_preto_zimbabue', 'marmore_branco_ibiza')) + ('pedra_hijau_1cm',),
+    'serie_bordadura_ceramico': ('niza', 'oslo', 'paradise_bali', 'tivoli', 'amberes'),
+    'localidade': ('Viseu', 'Ponte Lima', 'Barcelos', 'Santa Maria da Feira', 'Póvoa de Varzim',
+                   'Vila do Conde', 'Viana do Castelo', 'Famalicão', 'Ovar', 'Estarreja', 'Gaia',
+                   'Braga', 'Guimarães', 'Porto', 'Maia', 'Matosinhos', 'Outro'),
+}
+
+
+def parse_questionnaire_answers(data):
+    """Extrai as respostas do questionário (JSON ou form data) com conversão segura"""
+    return {
+        'acesso': data.get('acesso'),
+        'escavacao': str(data.get('escavacao', 'false')).lower() == 'true',
+        'forma': data.get('forma'),
+        'tipo_piscina': data.get('tipo_piscina'),
+        'revestimento': data.get('revestimento'),
+        'domotica': str(data.get('domotica', 'false')).lower() == 'true',
+        'localizacao': data.get('localizacao'),
+        'luz': data.get('luz'),
+        # CAMPOS NOVOS
+        'tratamento_agua': data.get('tratamento_agua'),
+        'tipo_construcao': data.get('tipo_construcao'),
+        'cobertura': data.get('cobertura'),
+        'tipo_cobertura_laminas': data.get('tipo_cobertura_laminas'),
+        'casa_maquinas_abaixo': data.get('casa_maquinas_abaixo'),
+        'tipo_luzes': data.get('tipo_luzes'),
+        # ZONA DE PRAIA E ESCADAS
+        'zona_praia': data.get('zona_praia'),
+        'zona_praia_largura': float(data.get('zona_praia_largura', 0)) if data.get('zona_praia_largura') else 0,
+        'zona_praia_comprimento': float(data.get('largura', 0)) if data.get('zona_praia') == 'sim' else 0,  # Comprimento = largura da piscina
+        'escadas': data.get('escadas'),
+        'escadas_largura': float(data.get('escadas_largura', 0)) if data.get('escadas_largura') else 0,
+        # CONSTRUÇÃO DA LAJE
+        'havera_laje': data.get('havera_laje'),
+        'laje_m2': float(data.get('laje_m2', 0)) if data.get('laje_m2') else 0,
+        'laje_espessura': float(data.get('laje_espessura', 0)) if data.get('laje_espessura') else 0,
+        'revestimento_laje': data.get('revestimento_laje'),
+        'material_revestimento': data.get('material_revestimento'),
+        # BORDADURA
+        'havera_bordadura': data.get('havera_bordadura'),
+        'tipo_bordadura': data.get('tipo_bordadura'),
+        'espessura_bordadura': data.get('espessura_bordadura'),
+        'material_bordadura_natural': data.get('material_bordadura_natural'),
+        'serie_bordadura_ceramico': data.get('serie_bordadura_ceramico')
+    }
+
+
+def is_enumerated(answers, ignore=()) -> bool:
+    """
+    True se todas as respostas são opções do questionário ou estão vazias. Campos de
+    valor livre (laje_m2, larguras da praia e das escadas, localidade_outro) não
+    têm opções, por isso só são aceites vazios
+    """
+    for key, value in answers.items():
+        if key in ignore or not value:
+            continue
+        choices = QUESTIONNAIRE_CHOICES.get(key)
+        if choices is None or value not in choices:
+            return False
+    return True
+
+
+def _check_required(answers):
+    missing_fields = [field for field in REQUIRED_FIELDS if not answers.get(field)]
+    if missing_fields:
+        raise ValueError(f"Campos obrigatórios em falta: {', '.join(missing_fields)}")
+
+
+def _dimensions(data):
+    return {field: float(data.get(field, 0)) for field in DIMENSION_FIELDS}
+
+
+def add_client_location(answers, client_data):
+    """A localidade do cliente define os preços regionais da construção"""
+    for key in ['localidade', 'localidade_outro']:
+        if client_data.get(key):
+            answers[key] = client_data[key]
+    return answers
+
+
+def parse_budget_request(data, calculator, client_data) -> Tuple[Dict, Dict, Dict]:
+    """
+    (respostas, dimensões, métricas) de um pedido /generate_budget.
+    ValueError com a mensagem a devolver ao cliente se faltarem dados.
+    """
+    answers = parse_questionnaire_answers(data)
+    _check_required(answers)
+    add_client_location(answers, client_data)
+
+    try:
+        dimensions = _dimensions(data)
+        if dimensions['comprimento'] <= 0 or dimensions['largura'] <= 0:
+            raise ValueError("Comprimento e largura devem ser maiores que zero")
+        if dimensions['prof_min'] <= 0 or dimensions['prof_max'] <= 0:
+            raise ValueError("Profundidades devem ser maiores que zero")
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Erro nas dimensões: {str(e)}")
+
+    metrics = calculator.calculate_all_metrics(
+        dimensions['comprimento'], dimensions['largura'], dimensions['prof_min'], dimensions['prof_max']
+    )
+    for key, convert in METRIC_OVERRIDES:
+        if key in data and data[key]:
+            metrics[key] = convert(data[key])
+    return answers, dimensions, metrics
+
+
+def parse_preview_request(data, client_data) -> Tuple[Dict, Dict]:
+    """(respostas, dimensões) de um pedido /preview_total; ValueError se inválido"""
+    answers = parse_questionnaire_answers(data)
+    _check_required(answers)
+
+    dimensions = _dimensions(data)
+    if min(dimensions.values()) <= 0:
+        raise ValueError("Medidas devem ser maiores que zero")
+    return add_client_location(answers, client_data), dimensions
+
+
+def build_budget(selector, answers, metrics, dimensions, client_data: Optional[Dict] = None):
+    """Gera o orçamento e calcula os totais (client_data None: lido da sessão Flask)"""
+    with timed_stages():
+        with stage('selecao'):
+            budget = selector.generate_budget(answers, metrics, dimensions, client_data)
+        if budget:
+            with stage('totais'):
+                calculate_and_update_totals(budget)
+    return budget
@@ -0,0 +1,203 @@
+# Totais do Orçamento - Valores base, multiplicador, transporte e IVA
+# Além do cálculo completo, mantém somas por família (estado em budget['_totals'])
+# para que alterar uma linha atualize os totais sem percorrer o orçamento todo.
+
+import os
+import math
+
+from app_logging import get_logger
+
+log = get_logger('budget_totals')
+
+# Estado incremental guardado no próprio orçamento:
+#   {'version': <versão do orçamento>, 'sums': {família: parciais}, 'counts': {família: nº de linhas incluídas}}
+# As somas são guardadas como parciais exatas (algoritmo de Shewchuk, como math.fsum):
+# somar e subtrair contribuições não acumula erro e o valor coincide sempre com o
+# cálculo completo, mesmo junto dos limites de arredondamento a 2 casas.
+TOTALS_STATE_KEY = '_totals'
+
+# Com BUDGET_TOTALS_CHECK=1 cada atualização incremental é comparada com o cálculo
+# completo (modo debug); divergências são registadas e corrigidas
+TOTALS_CHECK = os.environ.get('BUDGET_TOTALS_CHECK', '0') == '1'
+
+# Campos comparados pelo verificador de consistência
+CHECKED_FIELDS = ('family_totals_base', 'family_totals', 'subtotal_base', 'subtotal_with_margin_only',
+                  'subtotal_with_margin', 'iva_amount', 'total_with_iva', 'total_price')
+
+
+def line_base_total(product):
+    """Contribuição base (sem multiplicador) de uma linha para o total da família"""
+    # Contar apenas produtos INCLUÍDOS (excluir alternativos e opcionais)
+    quantity = product.get('quantity', 0)
+    if quantity > 0 and product.get('item_type', 'incluido') == 'incluido':
+        return product.get('price', 0) * quantity
+    return 0
+
+
+def _add_exact(partials, x):
+    """Acrescenta x às parciais (in place) sem perda de precisão"""
+    i = 0
+    for y in partials:
+        if abs(x) < abs(y):
+            x, y = y, x
+        hi = x + y
+        lo = y - (hi - x)
+        if lo:
+            partials[i] = lo
+            i += 1
+        x = hi
+    partials[i:] = [x]
+
+
+def _ensure_total_fields(budget):
+    if 'family_totals' not in budget:
+        budget['family_totals'] = {}
+    if 'family_totals_base' not in budget:
+        budget['family_totals_base'] = {}
+    if 'total_price' not in budget:
+        budget['total_price'] = 0
+    if 'subtotal_base' not in budget:
+        budget['subtotal_base'] = 0
+    # Novos campos para IVA
+    if 'iva_rate' not in budget:
+        budget['iva_rate'] = 0.23  # IVA padrão 23% em Portugal
+    if 'subtotal_with_margin' not in budget:
+        budget['subtotal_with_margin'] = 0
+    if 'iva_amount' not in budget:
+        budget['iva_amount'] = 0
+    if 'total_with_iva' not in budget:
+        budget['total_with_iva'] = 0
+
+
+def _update_family(budget, family, family_total):
+    if family_total > 0:
+        # Armazenar valor base (sem multiplicador)
+        budget['family_totals_base'][family] = round(family_total, 2)
+
+        # Aplicar multiplicador para cálculos internos
+        multiplier = budget['pool_info'].get('multiplier', 1.0)
+        family_total_with_multiplier = family_total * multiplier
+        budget['family_totals'][family] = round(family_total_with_multiplier, 2)
+    else:
+        # Se total for zero, manter os valores zerados
+        budget['family_totals_base'][family] = 0
+        budget['family_totals'][family] = 0
+
+
+def _update_derived_totals(budget):
+    """Totais gerais a partir dos totais por família (O(nº de famílias))"""
+    budget['subtotal_base'] = sum(budget['family_totals_base'].values())
+    budget['subtotal_with_margin_only'] = sum(budget['family_totals'].values())  # Só equipamentos com margem
+
+    # Adicionar custos de transporte de areia (se existirem)
+    transport_costs = budget.get('pool_info', {}).get('transport_costs', {})
+    transport_cost = transport_costs.get('custo_total', 0) if transport_costs else 0
+
+    # Total com margem E transporte
+    budget['subtotal_with_margin'] = budget['subtotal_with_margin_only'] + transport_cost
+
+    # Calcular IVA sobre o valor com margem (incluindo transporte)
+    budget['iva_amount'] = budget['subtotal_with_margin'] * budget['iva_rate']
+
+    # Total final com IVA
+    budget['total_with_iva'] = budget['subtotal_with_margin'] + budget['iva_amount']
+
+    # Manter total_price para compatibilidade (valor com margem sem IVA)
+    budget['total_price'] = budget['subtotal_with_margin']
+
+
+def calculate_and_update_totals(budget):
+    """Calcula e atualiza os totais das famílias com valores base, multiplicador e IVA"""
+    _ensure_total_fields(budget)
+
+    # Verificar estrutura do orçamento - pode ser 'selected_products' ou 'families'
+    products_data = budget.get('selected_products', budget.get('families', {}))
+
+    sums = {}
+    counts = {}
+    # Calcular total por família
+    for family, products in products_data.items():
+        partials = []
+        included = 0
+
+        for product in products.values():
+            subtotal = line_base_total(product)
+            if subtotal:
+                _add_exact(partials, subtotal)
+                included += 1
+
+        sums[family] = partials
+        counts[family] = included
+        _update_family(budget, family, math.fsum(partials))
+
+    _update_derived_totals(budget)
+    budget[TOTALS_STATE_KEY] = {'version': budget.get('version', 0), 'sums': sums, 'counts': counts}
+
+
+def totals_state_valid(budget):
+    """True se as somas guardadas correspondem à versão atual do orçamento"""
+    state = budget.get(TOTALS_STATE_KEY)
+    return (isinstance(state, dict) and state.get('version') == budget.get('version', 0)
+            and 'families' in budget and 'selected_products' not in budget)
+
+
+def apply_line_delta(budget, family, before, after):
+    """
+    Atualiza a soma da família com a diferença da contribuição de uma linha
+    (ver line_base_total) antes e depois da alteração. Requer estado válido.
+    """
+    if before == after:
+        return
+    state = budget[TOTALS_STATE_KEY]
+    partials = state['sums'].setdefault(family, [])
+    if before:
+        _add_exact(partials, -before)
+    if after:
+        _add_exact(partials, after)
+    state['counts'][family] = state['counts'].get(family, 0) + bool(after) - bool(before)
+    state.setdefault('dirty', []).append(family)
+
+
+def finish_incremental_update(budget, new_version):
+    """Recalcula as famílias alteradas e os totais gerais; o estado passa para new_version"""
+    _ensure_total_fields(budget)
+    state = budget[TOTALS_STATE_KEY]
+    for family in set(state.pop('dirty', ())):
+        if state['counts'][family] == 0:
+            state['sums'][family] = []
+        _update_family(budget, family, math.fsum(state['sums'][family]))
+    _update_derived_totals(budget)
+    state['version'] = new_version
+
+    if TOTALS_CHECK:
+        differences = check_totals(budget)
+        if differences:
+            log.warning("Totais incrementais divergentes, a recalcular", differences=differences)
+            calculate_and_update_totals(budget)
+            budget[TOTALS_STATE_KEY]['version'] = new_version
+
+
+def check_totals(budget):
+    """
+    Verificador de consistência: compara os totais atuais com um cálculo completo
+    (numa cópia) e devolve {campo: (atual, esperado)} para os que divergem.
+    """
+    expected = {
+        key: (dict(value) if isinstance(value, dict) else value)
+        for key, value in budget.items() if key != TOTALS_STATE_KEY
+    }
+    expected['family_totals'] = {}
+    expected['family_totals_base'] = {}
+    calculate_and_update_totals(expected)
+
+    differences = {}
+    for field in CHECKED_FIELDS:
+        current, wanted = budget.get(field), expected.get(field)
+        if isinstance(wanted, dict):
+            current = {k: v for k, v in (current or {}).items() if k in wanted}
+            mismatch = any(abs(current.get(k, 0) - v) > 1e-6 for k, v in wanted.items())
+        else:
+            mismatch = abs((current or 0) - (wanted or 0)) > 1e-6
+        if mismatch:
+            differences[field] = (current, wanted)
+    return differences
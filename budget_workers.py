@@ -0,0 +1,52 @@
+# Processos de Cálculo - Geração de orçamentos e pré-visualizações fora do servidor
+# A variante ASGI (asgi.py) corre aqui o trabalho de CPU, num ProcessPoolExecutor,
+# para não bloquear o ciclo de eventos nem disputar o GIL com os pedidos. Este
+# módulo não importa a aplicação Flask nem as caches: cada processo carrega só o
+# catálogo, o seletor e as curvas de preço.
+
+import os
+import threading
+
+from app_logging import get_logger
+
+log = get_logger('budget_workers')
+
+_lock = threading.Lock()
+_selector = None
+_preview = None
+
+
+def init_worker():
+    """Inicializador dos processos: carrega o catálogo antes do primeiro pedido"""
+    _services()
+    log.debug("Processo de cálculo %d pronto", os.getpid())
+
+
+def _services():
+    global _selector, _preview
+    if _selector is None:
+        with _lock:
+            if _selector is None:
+                from advanced_product_selector import AdvancedProductSelector
+                from price_preview import PricePreviewService
+                selector = AdvancedProductSelector()
+                _preview = PricePreviewService(selector)
+                _selector = selector
+    return _selector, _preview
+
+
+def ping():
+    return os.getpid()
+
+
+def generate_budget(answers, metrics, dimensions, client_data):
+    """Orçamento com totais (ver budget_requests.build_budget)"""
+    from budget_requests import build_budget
+    selector, _ = _services()
+    return build_budget(selector, answers, metrics, dimensions, client_data)
+
+
+def preview_total(answers, dimensions):
+    """Total estimado (ver PricePreviewService.preview); as curvas ficam em cache no processo"""
+    _, preview = _services()
+    return preview.preview(answers, dimensions)
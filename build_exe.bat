@@ -9,6 +9,10 @@ if exist "build" rmdir /s /q "build"
 if exist "dist" rmdir /s /q "dist"
 if exist "__pycache__" rmdir /s /q "__pycache__"
 
+echo.
+echo Comprimindo estaticos (.gz/.br)...
+python compress_static.py
+
 echo.
 echo Construindo executavel...
 pyinstaller --clean app.spec
@@ -9,6 +9,10 @@ echo
 echo "Limpando arquivos anteriores..."
 rm -rf dist build
 
+echo
+echo "Comprimindo estáticos (.gz/.br)..."
+python compress_static.py
+
 echo
 echo "Construindo executável..."
 pyinstaller main.spec --clean
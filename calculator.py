@@ -1,4 +1,5 @@
 import math
+from multiplier_engine import multiplier_engine
 
 class PoolCalculator:
     """Calculadora de métricas da piscina baseada nas fórmulas fornecidas"""
@@ -91,79 +92,13 @@ class PoolCalculator:
         NOTA: Factor de acesso foi removido e substituído por custos específicos de transporte de areia.
         
         Fórmula: Multiplicador = Base × Geo × Tech × Location × Market
-        """
-        
-        # 1. FACTOR GEOMÉTRICO (1.0 - 1.35)
-        # Baseado na complexidade da forma e proporções
-        geo_factor = 1.0
-        
-        # Complexidade da forma
-        forma = answers.get('forma', 'standard')
-        if forma == 'especial':
-            geo_factor *= 1.15  # Formas especiais requerem mais trabalho
-        
-        # Tipo de piscina (afeta estrutura e acabamentos)
-        tipo = answers.get('tipo_piscina', 'skimmer')
-        tipo_multipliers = {
-            'skimmer': 1.0,         # Standard
-            'espelho_dagua': 1.08,  # Requer acabamentos especiais
-            'transbordo': 1.20      # Mais complexo estruturalmente
-        }
-        geo_factor *= tipo_multipliers.get(tipo, 1.0)
-        
-        # Factor de proporção (piscinas muito pequenas ou grandes são mais complexas por m²)
-        area = dimensions.get('comprimento', 0) * dimensions.get('largura', 0)
-        if area < 15:  # Piscinas muito pequenas
-            geo_factor *= 1.08
-        elif area > 60:  # Piscinas muito grandes
-            geo_factor *= 1.05
-        
-        # 2. FACTOR DE ACESSO REMOVIDO - Substituído por custos específicos de transporte
-        # Os custos de acesso difícil são agora calculados separadamente na função calculate_transport_costs()
-        
-        # 3. FACTOR TÉCNICO E TECNOLÓGICO (1.0 - 1.12) - REDUZIDO
-        tech_factor = 1.0
-        
-        # Domótica/Automação - REDUZIDO
-        if answers.get('domotica') == 'true':
-            tech_factor *= 1.04  # Reduzido ainda mais (era 1.06) - produtos já incluídos
         
-        # Tipo de revestimento
-        revestimento = answers.get('revestimento', 'tela')
-        if revestimento == 'ceramica':
-            tech_factor *= 1.05  # Reduzido ainda mais (era 1.08) - cerâmicas já custam mais
         
-        # Tipo de alimentação elétrica
-        if answers.get('luz') == 'trifasica':
-            tech_factor *= 1.03  # Instalação elétrica mais complexa
-        
-        # Escavação afeta trabalho técnico
-        if answers.get('escavacao') == 'true':
-            tech_factor *= 1.02  # +2% - reduzido ainda mais (era 1.03)
-        
-        # REMOVIDO: FACTOR DE LOCALIZAÇÃO - Não faz sentido económico
-        # Interior vs exterior não justifica multiplicador significativo
-        
-        # 4. FACTOR DE MERCADO 2025 (1.05) - REDUZIDO AINDA MAIS
-        # Mais equilibrado considerando que produtos premium são adicionados via respostas
-        market_factor = 1.05  # Reduzido (era 1.08) - mais competitivo
-        
-        # CÁLCULO FINAL (sem factor de localização e acesso)
-        final_multiplier = geo_factor * tech_factor * market_factor
-        
-        # Limitação de segurança (não exceder 125% do custo base) - REDUZIDO
-        # Considerando que custos de acesso são agora específicos
-        final_multiplier = min(final_multiplier, 1.25)  # Reduzido ainda mais (era 1.40)
-        
-        # Dados para transparência (3 fatores principais)
-        breakdown = {
-            'geometrico': round(geo_factor, 3),
-            'tecnologico': round(tech_factor, 3),
-            'mercado': round(market_factor, 3),
-            'final': round(final_multiplier, 3)
-        }
-        
-        return final_multiplier, breakdown
+        Os fatores (forma, tipo, área, domótica, revestimento, luz, escavação,
+        mercado e limite de 1.25) vêm das regras compiladas em multiplier_engine,
+        que combina DEFAULT_MULTIPLIER_RULES com a tabela price_multipliers.
+        """
+        return multiplier_engine.compute(answers, dimensions)
 
     def calculate_transport_costs(self, answers, metrics):
         """
@@ -0,0 +1,218 @@
+# Índice de Alternativas - Alternativas de cada produto, já ordenadas, por versão do catálogo
+# /get_alternatives resolvia o produto percorrendo o catálogo várias vezes e depois
+# filtrava e ordenava os candidatos a cada pedido. Aqui tudo isso é calculado uma
+# vez por versão dos dados de default_data: o pedido fica reduzido a duas procuras
+# num dicionário e um slice.
+
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from database_manager import get_fallback_catalog_version
+from catalog_responses import normalize_family_name
+from budget_index import find_line
+from app_logging import get_logger
+
+log = get_logger('catalog_alternatives')
+
+# Número de alternativas devolvidas ao cliente
+ALTERNATIVES_LIMIT = 6
+
+# Chaves de família do orçamento -> nome da família no catálogo
+FAMILY_NAMES = {
+    'filtracao': 'Filtração',
+    'recirculacao': 'Recirculação e Iluminação',
+    'recirculacao_iluminacao': 'Recirculação e Iluminação',
+    'tratamento': 'Tratamento de Água'
+}
+
+
+@lru_cache(maxsize=4096)
+def product_slug(text) -> str:
+    """Slug de nome/código/modelo usado para reconhecer identificadores livres"""
+    if not text:
+        return ''
+    s = unicodedata.normalize('NFKD', str(text)).encode('ASCII', 'ignore').decode('ASCII')
+    s = ''.join(ch for ch in s if ch.isalnum() or ch.isspace() or ch == '_')
+    return s.strip().lower().replace(' ', '_')
+
+
+@lru_cache(maxsize=1024)
+def _normalize_category(name) -> str:
+    if not name:
+        return ''
+    return unicodedata.normalize('NFKD', name).encode('ASCII', 'ignore').decode('ASCII').strip().lower()
+
+
+def _price(product):
+    return product.get('base_price', product.get('price', 0)) or 0
+
+
+def _rank(current, scope, category_of):
+    """
+    Alternativas do produto dentro do âmbito (produtos ativos de uma família, ou
+    todos): primeiro os da mesma categoria, senão os restantes; por proximidade de preço.
+    """
+    current_id = str(current.get('id') or '')
+    current_slug = product_slug(current.get('name') or '')
+    current_category = _normalize_category(category_of(current))
+
+    def is_current(p):
+        slug = product_slug(p.get('name') or '')
+        return str(p.get('id') or '') == current_id or (slug and slug == current_slug)
+
+    same_category = [p for p in scope if _normalize_category(category_of(p)) == current_category]
+    # Só vale a pena priorizar a categoria se houver outro produto nela
+    candidates = [p for p in same_category if not is_current(p)] if len(same_category) > 1 else []
+    if not candidates:
+        # Sem candidatos na categoria: todos os produtos do âmbito (excluindo o atual)
+        candidates = [p for p in scope if not is_current(p)]
+
+    current_price = _price(current)
+    ranked = sorted(candidates, key=lambda p: abs(_price(p) - current_price))
+    return [{
+        'id': p.get('id'),
+        'name': p.get('name'),
+        'price': _price(p),
+        'description': p.get('description', ''),
+        'attributes': p.get('attributes', {})
+    } for p in ranked]
+
+
+class AlternativesIndex:
+    """
+    Para cada âmbito (família do catálogo, ou None = catálogo inteiro) e cada produto,
+    a lista completa de alternativas já ordenada. Reconstruído quando a versão dos
+    dados de default_data muda (como o CatalogResponseCache).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._by_id: Dict[str, Dict] = {}
+        self._by_alias: Dict[str, Dict] = {}
+        self._family_by_name: Dict[str, int] = {}
+        self._family_by_slug: Dict[str, int] = {}
+        self._ranked: Dict[Tuple[Optional[int], str], List[Dict]] = {}
+
+    def _refresh(self):
+        version = get_fallback_catalog_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build()
+                    self._version = version
+
+    def _build(self):
+        from default_data import products, product_categories, product_families
+
+        categories = {c.get('id'): c for c in product_categories}
+
+        def category_of(product):
+            category = categories.get(product.get('category_id'))
+            return category.get('name') if category else ''
+
+        by_id, by_alias = {}, {}
+        for p in products:
+            by_id.setdefault(str(p.get('id')), p)
+            # Nome, modelo ou código servem de identificador (vale o primeiro produto)
+            for field in ('name', 'model', 'code'):
+                slug = product_slug(p.get(field) or '')
+                if slug:
+                    by_alias.setdefault(slug, p)
+
+        active = [p for p in products if p.get('is_active', 1)]
+        scopes = {None: active}
+        family_by_name, family_by_slug = {}, {}
+        for fam in product_families:
+            fam_id = fam.get('id')
+            cat_ids = {c.get('id') for c in product_categories if c.get('family_id') == fam_id}
+            scopes[fam_id] = [p for p in active if p.get('category_id') in cat_ids]
+            family_by_name.setdefault(fam.get('name'), fam_id)
+            family_by_slug.setdefault(normalize_family_name(fam.get('name', '')), fam_id)
+
+        ranked = {}
+        for fam_id, scope in scopes.items():
+            for pid, product in by_id.items():
+                ranked[(fam_id, pid)] = _rank(product, scope, category_of)
+
+        self._by_id, self._by_alias = by_id, by_alias
+        self._family_by_name, self._family_by_slug = family_by_name, family_by_slug
+        self._ranked = ranked
+
+    def product(self, product_id) -> Optional[Dict]:
+        """Produto do catálogo por ID"""
+        self._refresh()
+        return self._by_id.get(str(product_id))
+
+    def find_by_alias(self, identifier) -> Optional[Dict]:
+        """Produto cujo nome, modelo ou código tem o mesmo slug que o identificador"""
+        self._refresh()
+        slug = product_slug(identifier)
+        return self._by_alias.get(slug) if slug else None
+
+    def family_scope(self, family_name) -> Optional[int]:
+        """ID da família do catálogo pelo nome ou slug (None = catálogo inteiro)"""
+        self._refresh()
+        fam_id = self._family_by_name.get(family_name)
+        if fam_id is None:
+            fam_id = self._family_by_slug.get(str(family_name))
+        return fam_id
+
+    def alternatives(self, family_name, product, limit=ALTERNATIVES_LIMIT) -> List[Dict]:
+        """As `limit` alternativas mais próximas em preço do produto, no âmbito da família"""
+        ranked = self._ranked.get((self.family_scope(family_name), str(product.get('id'))), [])
+        return ranked[:limit]
+
+    def lookup(self, family_name, current_product_id, get_budget) -> Dict:
+        """
+        Resposta de /get_alternatives. O identificador pode ser um ID (ou chave
+        terminada no ID), uma chave de linha do orçamento (get_budget() só é chamado
+        nesse caso) ou o nome/modelo/código do produto.
+        """
+        real_product_id = current_product_id
+        match = re.search(r'(\d+)$', current_product_id)
+        if match:
+            real_product_id = match.group(1)
+        db_family_name = FAMILY_NAMES.get(family_name, family_name)
+
+        # 1) Se o identificador termina em dígitos, buscar por id
+        current_product = self.product(real_product_id) if str(real_product_id).isdigit() else None
+
+        # 2) Se não encontrado, tentar resolver como chave presente no orçamento da sessão
+        if not current_product:
+            budget = get_budget()
+            if budget:
+                fam_key = find_line(budget, str(current_product_id))
+                prod_entry = budget['families'][fam_key][str(current_product_id)] if fam_key else None
+                if prod_entry:
+                    pid = prod_entry.get('id') or prod_entry.get('product_id')
+                    if pid:
+                        current_product = self.product(pid)
+
+        # 3) Se ainda não encontrou, tentar matchmaking por slug (nome, código, modelo)
+        if not current_product:
+            current_product = self.find_by_alias(real_product_id)
+
+        if not current_product:
+            log.debug("Produto não encontrado com ID '%s'", real_product_id)
+            return {'success': False, 'error': f'Produto não encontrado com ID {real_product_id}'}
+
+        alternatives = self.alternatives(db_family_name, current_product)
+        log.debug("%s -> %s (%s): %d alternativas",
+                  current_product_id, current_product.get('id'), db_family_name, len(alternatives))
+        return {
+            'success': True,
+            'current_product': {
+                'id': current_product['id'],
+                'name': current_product['name'],
+                'price': current_product.get('base_price', current_product.get('price', 0))
+            },
+            'alternatives': alternatives
+        }
+
+
+# Instância global
+alternatives_index = AlternativesIndex()
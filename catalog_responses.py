@@ -0,0 +1,164 @@
+# Respostas do Catálogo - JSON pré-serializado para as listagens de famílias e produtos
+# As rotas /get_product_families e /get_family_products/<família> devolviam sempre
+# os mesmos dados, reconstruídos e serializados a cada pedido. Aqui os corpos (e as
+# variantes gzip) são gerados uma vez por versão do catálogo; servir uma listagem
+# passa a ser uma procura num dicionário.
+
+import re
+import gzip
+import json
+import hashlib
+import threading
+import unicodedata
+from typing import Dict, Optional
+
+from werkzeug.wrappers import Response
+
+from database_manager import get_fallback_catalog_version
+
+
+def normalize_family_name(name: str) -> str:
+    """Slug determinístico do nome da família (ex: 'Filtração' -> 'filtracao')"""
+    if not name:
+        return ''
+    s = unicodedata.normalize('NFKD', name).encode('ASCII', 'ignore').decode('ASCII').strip().lower()
+    return re.sub(r'[^a-z0-9]+', '_', s).strip('_')
+
+
+class CatalogPayload:
+    """Corpo JSON serializado, a variante gzip (se compensar) e os ETags (hash do conteúdo)"""
+
+    __slots__ = ('body', 'gzip_body', 'etag', 'gzip_etag')
+
+    def __init__(self, data):
+        # Mesmo formato que jsonify (chaves ordenadas, compacto, ASCII)
+        self.body = (json.dumps(data, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+        compressed = gzip.compress(self.body, compresslevel=9, mtime=0)
+        # Corpos pequenos não compensam (o gzip ficaria maior)
+        self.gzip_body = compressed if len(compressed) < len(self.body) else None
+        self.etag = hashlib.sha1(self.body).hexdigest()[:24]
+        self.gzip_etag = self.etag + '-gz'
+
+
+def http_response(payload: CatalogPayload, accept_encodings, if_none_match, max_age, response_class=Response):
+    """
+    Resposta HTTP de um payload: 304 se o cliente já tem esta versão, variante
+    gzip se a aceitar, e cache no browser/proxy durante max_age segundos.
+    """
+    use_gzip = payload.gzip_body is not None and accept_encodings['gzip'] > 0
+    etag = payload.gzip_etag if use_gzip else payload.etag
+    if if_none_match.contains(etag):
+        response = response_class(status=304)
+    else:
+        response = response_class(payload.gzip_body if use_gzip else payload.body, mimetype='application/json')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    return response
+
+
+def _build_families(product_families, product_categories, products):
+    families = []
+    for fam in product_families:
+        fam_copy = dict(fam)
+        fam_id = fam_copy.get('id')
+        cat_ids = {c.get('id') for c in product_categories if c.get('family_id') == fam_id}
+        fam_copy['product_count'] = sum(1 for p in products if p.get('category_id') in cat_ids and p.get('is_active', 1))
+        # Slug determinístico para uso no cliente
+        fam_copy['name_slug'] = normalize_family_name(fam_copy.get('name') or '')
+        families.append(fam_copy)
+    return {'success': True, 'families': families}
+
+
+def _attribute_values(product_attributes, attribute_types):
+    """Atributos de cada produto ({product_id: {nome: valor}}), numa só passagem"""
+    types_by_id = {a.get('id'): a for a in attribute_types}
+    by_product: Dict[int, Dict] = {}
+    for pa in product_attributes:
+        attr_type = types_by_id.get(pa.get('attribute_type_id'))
+        if not attr_type:
+            continue
+        name = attr_type.get('name')
+        data_type = attr_type.get('data_type')
+        attributes = by_product.setdefault(pa.get('product_id'), {})
+        if data_type == 'numeric':
+            attributes[name] = {'value': pa.get('value_numeric'), 'unit': attr_type.get('unit')}
+        elif data_type == 'boolean':
+            attributes[name] = pa.get('value_boolean')
+        else:
+            attributes[name] = pa.get('value_text')
+    return by_product
+
+
+def _build_family_products(fam, product_categories, products, attributes):
+    cats = {c.get('id'): c for c in product_categories if c.get('family_id') == fam.get('id')}
+    result = []
+    for prod in products:
+        if prod.get('category_id') in cats and prod.get('is_active', 1):
+            cat = cats[prod.get('category_id')]
+            prod_copy = prod.copy()
+            prod_copy['category_name'] = cat.get('name')
+            prod_copy['family_name'] = fam.get('name')
+            prod_copy['attributes'] = dict(attributes.get(prod.get('id'), {}))
+            result.append(prod_copy)
+    return {'success': True, 'products': result}
+
+
+class CatalogResponseCache:
+    """
+    Listagens do catálogo pré-serializadas, reconstruídas apenas quando a versão
+    dos dados de default_data muda (como o CatalogIndex de budget_refs).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._families: Optional[CatalogPayload] = None
+        self._by_family: Dict[int, CatalogPayload] = {}
+        self._family_by_name: Dict[str, int] = {}
+        self._family_by_slug: Dict[str, int] = {}
+        self._empty: Optional[CatalogPayload] = None
+
+    def _refresh(self):
+        version = get_fallback_catalog_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build()
+                    self._version = version
+
+    def _build(self):
+        from default_data import (product_families, product_categories, products,
+                                  product_attributes, attribute_types)
+
+        attributes = _attribute_values(product_attributes, attribute_types)
+        by_family, by_name, by_slug = {}, {}, {}
+        for fam in product_families:
+            fam_id = fam.get('id')
+            by_family[fam_id] = CatalogPayload(_build_family_products(fam, product_categories, products, attributes))
+            # Em caso de nomes repetidos vale a primeira família (como a procura sequencial)
+            by_name.setdefault(fam.get('name'), fam_id)
+            by_slug.setdefault(normalize_family_name(fam.get('name', '')), fam_id)
+
+        self._families = CatalogPayload(_build_families(product_families, product_categories, products))
+        self._by_family, self._family_by_name, self._family_by_slug = by_family, by_name, by_slug
+        self._empty = CatalogPayload({'success': True, 'products': []})
+
+    def families(self) -> CatalogPayload:
+        """Payload de /get_product_families"""
+        self._refresh()
+        return self._families
+
+    def family_products(self, family_name: str) -> CatalogPayload:
+        """Payload de /get_family_products/<family_name> (nome ou slug da família)"""
+        self._refresh()
+        fam_id = self._family_by_name.get(family_name)
+        if fam_id is None:
+            fam_id = self._family_by_slug.get(normalize_family_name(family_name))
+        return self._by_family.get(fam_id, self._empty)
+
+
+# Instância global
+catalog_responses = CatalogResponseCache()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gera irmãos pré-comprimidos (.gz e, se o módulo brotli existir, .br) dos estáticos
+
+Uso:
+    python compress_static.py [--folder static] [--min-size 1024] [--force]
+
+Corre no build (ver build_exe.sh/build_exe.bat). A rota /static serve o irmão em
+vez do original quando o cliente o aceita e o irmão não é mais antigo que o
+original; um irmão que não poupe pelo menos --min-saving é apagado.
+"""
+
+import os
+import sys
+import gzip
+import argparse
+
+try:
+    import brotli
+except ImportError:  # opcional
+    brotli = None
+
+from http_compression import STATIC_ENCODINGS
+
+SUFFIXES = tuple(suffix for _, suffix in STATIC_ENCODINGS)
+
+
+def compressors():
+    """(sufixo, função) das codificações disponíveis, com a compressão máxima"""
+    result = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        result.insert(0, ('.br', lambda data: brotli.compress(data, quality=11)))
+    return result
+
+
+def compress_file(path, min_size, min_saving, force):
+    """Gera os irmãos de um ficheiro; devolve {sufixo: bytes} dos que ficaram"""
+    size = os.path.getsize(path)
+    if size < min_size:
+        return {}
+    data = None
+    written = {}
+    for suffix, fn in compressors():
+        target = path + suffix
+        if not force and os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+            written[suffix] = os.path.getsize(target)
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        compressed = fn(data)
+        if len(compressed) > size * (1 - min_saving):
+            # Não compensa: o original é servido tal como está
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        with open(target, 'wb') as out:
+            out.write(compressed)
+        written[suffix] = len(compressed)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--folder', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+                        help='pasta dos estáticos')
+    parser.add_argument('--min-size', type=int, default=1024, help='tamanho mínimo (bytes) para comprimir')
+    parser.add_argument('--min-saving', type=float, default=0.05, help='poupança mínima (fração) para manter o irmão')
+    parser.add_argument('--force', action='store_true', help='regenerar mesmo os irmãos atualizados')
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("brotli não instalado: só são gerados ficheiros .gz")
+
+    total_original = total_best = 0
+    print(f"{'ficheiro':<36} {'bytes':>9} {'.gz':>9} {'.br':>9}")
+    for root, _, files in os.walk(args.folder):
+        for name in sorted(files):
+            if name.endswith(SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            written = compress_file(path, args.min_size, args.min_saving, args.force)
+            size = os.path.getsize(path)
+            total_original += size
+            total_best += min([size, *written.values()])
+            rel = os.path.relpath(path, args.folder)
+            print(f"{rel:<36} {size:>9} {written.get('.gz', '-'):>9} {written.get('.br', '-'):>9}")
+
+    print(f"\nTotal: {total_original} bytes -> {total_best} bytes com a melhor codificação")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
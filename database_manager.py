@@ -7,12 +7,68 @@ from datetime import datetime, date
 from typing import Dict, List, Optional, Any
 import os
 import sys
+import time
+
+from app_logging import get_logger
+from metrics import registry, QUERY_BUCKETS
+
 try:
     from default_data import products, product_families, product_categories
 except ImportError:
     products = []
     product_families = []
     product_categories = []
+try:
+    from default_data import price_multipliers
+except ImportError:
+    price_multipliers = []
+
+log = get_logger('database_manager')
+
+DB_QUERY_SECONDS = registry.histogram('db_query_duration_seconds',
+                                      'Duração das queries à base de dados de produtos (execução)',
+                                      ('operation',), QUERY_BUCKETS)
+
+# Contador de alterações ao catálogo feitas neste processo (ver get_catalog_version)
+_catalog_generation = 0
+
+
+def bump_catalog_version():
+    """Marca o catálogo como alterado, invalidando caches derivados dele"""
+    global _catalog_generation
+    _catalog_generation += 1
+    return _catalog_generation
+
+def get_fallback_catalog_version() -> str:
+    """
+    Versão dos dados de default_data (usados diretamente pelas rotas do catálogo):
+    muda com o ficheiro do módulo ou com bump_catalog_version() neste processo.
+    """
+    try:
+        import default_data
+        st = os.stat(default_data.__file__)
+        file_part = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+    except (ImportError, AttributeError, TypeError, OSError):
+        file_part = "builtin"
+    return f"{file_part}-{_catalog_generation}"
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor que mede cada execute (contagem e duração por tipo de query)"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            operation = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else '-'
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, operation=operation)
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+
 class DatabaseManager:
     """Gestor da base de dados de produtos e orçamentos"""
     
@@ -23,23 +79,21 @@ class DatabaseManager:
             if hasattr(sys, '_MEIPASS'):
                 # No executável, a BD foi copiada para a pasta temporária
                 db_path = os.path.join(sys._MEIPASS, 'pool_budgets.db')
-                print(f"DEBUG: Executável detectado, usando BD em: {db_path}")
             else:
                 # Em desenvolvimento, usar path relativo
                 db_path = "database/pool_budgets.db"
-                print(f"DEBUG: Desenvolvimento detectado, usando BD em: {db_path}")
         
         self.db_path = db_path
-        print(f"DEBUG: Path final da BD: {self.db_path}")
-        print(f"DEBUG: BD existe? {os.path.exists(self.db_path)}")
+        exists = os.path.exists(self.db_path)
+        log.debug("Base de dados: %s (existe: %s)", self.db_path, exists)
         
-        if not os.path.exists(self.db_path):
+        if not exists:
             if hasattr(sys, '_MEIPASS'):
                 # No executável, se não encontrar, tentar path alternativo
                 alt_path = os.path.join(os.path.dirname(sys.executable), 'pool_budgets.db')
                 if os.path.exists(alt_path):
                     self.db_path = alt_path
-                    print(f"DEBUG: BD encontrada em path alternativo: {alt_path}")
+                    log.info("Base de dados encontrada em path alternativo: %s", alt_path)
                 else:
                     raise FileNotFoundError(f"Base de dados não encontrada. Tentou: {db_path} e {alt_path}")
             else:
@@ -65,11 +119,11 @@ class DatabaseManager:
             cursor.executescript(schema)
             conn.commit()
             conn.close()
-            print(f"Base de dados criada em: {self.db_path}")
+            log.info("Base de dados criada em: %s", self.db_path)
     
     def get_connection(self):
         """Retorna conexão à base de dados"""
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, factory=TimedConnection)
         conn.row_factory = sqlite3.Row  # Para acesso por nome de coluna
         return conn
     
@@ -101,6 +155,7 @@ class DatabaseManager:
                     self.add_product_attribute(product_id, attr_name, value, cursor)
             
             conn.commit()
+            bump_catalog_version()
             return product_id
             
         except Exception as e:
@@ -149,6 +204,7 @@ class DatabaseManager:
             
             if close_conn:
                 conn.commit()
+                bump_catalog_version()
                 
         finally:
             if close_conn and cursor:
@@ -185,7 +241,7 @@ class DatabaseManager:
             if products_list:
                 return products_list
         except Exception as e:
-            print(f"[Fallback] Erro ao acessar BD: {e}")
+            log.warning("Fallback: erro ao aceder à BD: %s", e)
         # Fallback para dados default
         cat = next((c for c in product_categories if c['id'] == category_id), None)
         fam = next((f for f in product_families if cat and f['id'] == cat['family_id']), None)
@@ -247,6 +303,7 @@ class DatabaseManager:
         
         conn.commit()
         conn.close()
+        bump_catalog_version()
     
     def get_products_by_conditions(self, conditions: Dict[str, Any]) -> List[Dict]:
         """Encontra produtos que atendem às condições especificadas, com fallback para dados default_data.py"""
@@ -280,7 +337,7 @@ class DatabaseManager:
             if products_list:
                 return products_list
         except Exception as e:
-            print(f"[Fallback] Erro ao acessar BD: {e}")
+            log.warning("Fallback: erro ao aceder à BD: %s", e)
 
         # Fallback para dados default_data.py
         try:
@@ -292,7 +349,9 @@ class DatabaseManager:
             product_attributes = globals().get('product_attributes', [])
             attribute_types = globals().get('attribute_types', [])
 
-        print(f"[DEBUG Render] Produtos carregados: {len(products)} | Categorias: {len(product_categories)} | Famílias: {len(product_families)} | Atributos: {len(product_attributes)} | Tipos de atributo: {len(attribute_types)}")
+        log.debug("Fallback: %d produtos, %d categorias, %d famílias, %d atributos, %d tipos de atributo",
+                  len(products), len(product_categories), len(product_families),
+                  len(product_attributes), len(attribute_types))
 
         # Fallback: retorna todos os produtos ativos que "batem" com as condições
         result = []
@@ -345,9 +404,47 @@ class DatabaseManager:
                         else:
                             prod_copy['attributes'][name] = pa['value_text']
                 result.append(prod_copy)
-        print(f"[DEBUG Render] Produtos retornados pelo fallback: {len(result)}")
+        log.debug("Fallback: %d produtos retornados", len(result))
         return result
     
+    # ==========================================
+    # MULTIPLICADORES E VERSÃO DO CATÁLOGO
+    # ==========================================
+    
+    def get_price_multipliers(self) -> List[Dict]:
+        """Obtém as regras da tabela price_multipliers, com fallback para dados default"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, name, condition_type, condition_value, multiplier,
+                       applies_to, target_id, is_active
+                FROM price_multipliers
+                ORDER BY id
+            """)
+            rules = [dict(row) for row in cursor.fetchall()]
+            conn.close()
+            if rules:
+                return rules
+        except Exception as e:
+            log.warning("Fallback: erro ao aceder à BD: %s", e)
+        return [dict(rule) for rule in price_multipliers]
+    
+    def get_catalog_version(self) -> str:
+        """
+        Devolve um identificador da versão atual do catálogo.
+        
+        Muda quando o ficheiro da BD é alterado (mtime/tamanho) ou quando
+        bump_catalog_version() é chamado neste processo. Serve para invalidar
+        caches derivados do catálogo sem ter de reler os dados.
+        """
+        try:
+            st = os.stat(self.db_path)
+            file_part = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+        except OSError:
+            file_part = "default"
+        return f"{file_part}-{_catalog_generation}"
+    
     # ==========================================
     # GESTÃO DE ORÇAMENTOS
     # ==========================================
@@ -430,7 +527,7 @@ class DatabaseManager:
                 return product
             conn.close()
         except Exception as e:
-            print(f"[Fallback] Erro ao acessar BD: {e}")
+            log.warning("Fallback: erro ao aceder à BD: %s", e)
         # Fallback para dados default
         for prod in products:
             if str(prod['id']) == str(product_id) and prod.get('is_active', 1):
@@ -444,6 +541,25 @@ class DatabaseManager:
                 return prod_copy
         return None
     
+    def get_catalog_products(self) -> List[Dict]:
+        """
+        Lista leve de todos os produtos (id, name, base_price, unit), incluindo
+        inativos, para resolver referências de orçamentos já gravados
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, name, base_price, unit FROM products ORDER BY id")
+            rows = [dict(row) for row in cursor.fetchall()]
+            conn.close()
+            if rows:
+                return rows
+        except Exception as e:
+            log.warning("Fallback: erro ao aceder à BD: %s", e)
+        # Fallback para dados default
+        return [{'id': prod['id'], 'name': prod['name'], 'base_price': prod['base_price'],
+                 'unit': prod.get('unit', 'un')} for prod in products]
+
     def get_products_by_family(self, family_name: str) -> List[Dict]:
         """Busca todos os produtos de uma família específica, com fallback para dados default"""
         try:
@@ -466,7 +582,7 @@ class DatabaseManager:
             if products_list:
                 return products_list
         except Exception as e:
-            print(f"[Fallback] Erro ao acessar BD: {e}")
+            log.warning("Fallback: erro ao aceder à BD: %s", e)
         # Fallback para dados default
         fam = next((f for f in product_families if f['name'] == family_name), None)
         if not fam:
@@ -507,7 +623,7 @@ class DatabaseManager:
             if families:
                 return families
         except Exception as e:
-            print(f"[Fallback] Erro ao acessar BD: {e}")
+            log.warning("Fallback: erro ao aceder à BD: %s", e)
         # Fallback para dados default
         result = []
         for fam in product_families:
@@ -545,7 +661,7 @@ class DatabaseManager:
             if attributes:
                 return attributes
         except Exception as e:
-            print(f"[Fallback] Erro ao acessar BD: {e}")
+            log.warning("Fallback: erro ao aceder à BD: %s", e)
         # Fallback para dados default
         # Tenta importar se não estiver no escopo
         try:
@@ -0,0 +1,122 @@
+# Compressão HTTP - gzip/brotli para respostas HTML/JSON e ficheiros estáticos pré-comprimidos
+# A página do orçamento (budget_clean.html, com CSS e JS inline) e as respostas JSON
+# maiores eram enviadas sem compressão. As respostas dinâmicas acima de um limite são
+# comprimidas no fim do pedido; os estáticos usam irmãos .br/.gz gerados no build
+# (ver compress_static.py e static_assets), escolhidos conforme o Accept-Encoding.
+
+import os
+import gzip
+import threading
+
+try:
+    import brotli
+except ImportError:  # opcional
+    brotli = None
+
+# Respostas mais pequenas que isto não compensam a compressão
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+
+# Nível de compressão das respostas dinâmicas (rápido; os estáticos usam o máximo)
+GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+
+COMPRESSIBLE_MIMETYPES = ('text/html', 'application/json', 'text/css', 'text/javascript',
+                          'application/javascript', 'text/plain')
+
+# Extensões dos irmãos pré-comprimidos, por ordem de preferência
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def available_encodings():
+    """Codificações que este processo sabe produzir"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encodings, encodings):
+    """Primeira codificação de encodings aceite pelo cliente (q > 0), ou None"""
+    for encoding in encodings:
+        if accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionStats:
+    """Bytes antes e depois da compressão, acumulados por rota"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, encoding, original, sent):
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint or '<sem rota>', {
+                'responses': 0, 'compressed': 0, 'bytes_original': 0, 'bytes_sent': 0, 'encodings': {}
+            })
+            stats['responses'] += 1
+            stats['bytes_original'] += original
+            stats['bytes_sent'] += sent
+            if encoding:
+                stats['compressed'] += 1
+                stats['encodings'][encoding] = stats['encodings'].get(encoding, 0) + 1
+
+    def snapshot(self):
+        """Cópia dos contadores, com os bytes poupados (total e por resposta)"""
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                saved = stats['bytes_original'] - stats['bytes_sent']
+                result[endpoint] = dict(stats, encodings=dict(stats['encodings']), bytes_saved=saved,
+                                        bytes_saved_per_response=round(saved / stats['responses'], 1))
+            return result
+
+
+def compress_response(response, accept_encodings, endpoint=None, stats=None):
+    """Comprime (in place) uma resposta HTML/JSON acima de COMPRESS_MIN_SIZE, se o cliente aceitar"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'no-transform' in response.headers.get('Cache-Control', '')):
+        return response
+
+    # Mesmo sem comprimir, a resposta depende do Accept-Encoding
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    encoding = negotiate(accept_encodings, available_encodings()) if len(data) >= COMPRESS_MIN_SIZE else None
+    if encoding:
+        compressed = compress(data, encoding)
+        if len(compressed) < len(data):
+            response.set_data(compressed)
+            response.headers['Content-Encoding'] = encoding
+            etag, weak = response.get_etag()
+            if etag:
+                # Cada codificação é uma representação diferente
+                response.set_etag(f"{etag}-{encoding}", weak)
+        else:
+            encoding = None
+    if stats is not None:
+        stats.record(endpoint, encoding, len(data), response.content_length or len(response.get_data()))
+    return response
+
+
+def init_compression(app, stats=None):
+    """
+    Regista a compressão das respostas. Deve ser chamado antes de registar os
+    outros after_request, para correr depois deles (Flask corre-os pela ordem inversa).
+    """
+    from flask import request
+
+    @app.after_request
+    def compress_after_request(response):
+        return compress_response(response, request.accept_encodings, request.endpoint, stats)
+
+    return compress_after_request
+
+
+# Instância global
+compression_stats = CompressionStats()
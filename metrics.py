@@ -0,0 +1,407 @@
+# Métricas - Registo em processo exposto em /metrics no formato de texto do Prometheus
+# Contadores, gauges e histogramas com labels. Cada métrica tem o seu próprio lock,
+# seguro apenas durante a soma, por isso os pedidos não competem entre métricas.
+#
+# Com vários processos (workers do gunicorn, processos de cálculo do ASGI) cada um
+# grava periodicamente um snapshot em METRICS_DIR (metrics_<pid>.json) e /metrics
+# soma os ficheiros de todos; sem METRICS_DIR só é exposto o processo atual.
+#
+# Configuração por variáveis de ambiente:
+#   METRICS_DIR=/tmp/metrics       diretório partilhado entre processos
+#   METRICS_FLUSH_INTERVAL=5       segundos entre snapshots de cada processo
+
+import os
+import json
+import time
+import atexit
+import bisect
+import shutil
+import tempfile
+import threading
+import contextlib
+import contextvars
+
+from app_logging import get_logger
+
+log = get_logger('metrics')
+
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+# Prefixo de todas as métricas (como o logger raiz da aplicação)
+NAMESPACE = 'piscinas'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1, 0.5)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Metric:
+    """Base: amostras por combinação de valores dos labels"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}
+
+    def snapshot(self):
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._samples.items()]
+        return {'type': self.type, 'help': self.documentation, 'labels': list(self.labelnames), 'samples': samples}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._samples[key] = self._samples.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Valor atual. Com vários processos os valores são somados (mode='sum', ex:
+    memória de cada processo) ou é usado o maior (mode='max', ex: tamanho de uma
+    base de dados partilhada); processos sem snapshot recente são ignorados.
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), mode='sum'):
+        super().__init__(name, documentation, labelnames)
+        self.mode = mode
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._samples[key] = value
+
+    def snapshot(self):
+        return dict(super().snapshot(), mode=self.mode)
+
+
+class Histogram(Metric):
+    """Contagens por intervalo (não cumulativas em memória) e soma das observações"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._samples.get(key)
+            if sample is None:
+                # Último intervalo: acima do maior limite (+Inf); último elemento: soma
+                sample = self._samples[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            sample[index] += 1
+            sample[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            samples = [[list(key), list(value)] for key, value in self._samples.items()]
+        return {'type': self.type, 'help': self.documentation, 'labels': list(self.labelnames),
+                'buckets': list(self.buckets), 'samples': samples}
+
+
+class MetricsRegistry:
+    """
+    Métricas do processo e, com METRICS_DIR, agregação entre processos.
+    Os collectors são funções chamadas a cada snapshot para atualizar gauges
+    com valores lidos de outros componentes (ex: tamanho da cache).
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+        # Processo que criou o diretório temporário (ver ensure_shared_directory)
+        self.owner = None
+
+    def _register(self, metric):
+        metric.name = f"{NAMESPACE}_{metric.name}"
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica {metric.name} já registada")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), mode='sum'):
+        return self._register(Gauge(name, documentation, labelnames, mode))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def snapshot(self):
+        """Métricas deste processo (depois de correr os collectors), serializáveis em JSON"""
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception:
+                log.exception("Erro num collector de métricas")
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    # --- Vários processos ---
+
+    def _path(self, pid=None):
+        return os.path.join(self.directory, f"metrics_{pid or os.getpid()}.json")
+
+    def enable_multiprocess(self, directory):
+        """Passa a gravar snapshots em directory e a agregar os dos outros processos"""
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.start()
+
+    def start(self):
+        if self.directory and (self._flusher is None or not self._flusher.is_alive()):
+            self._stop.clear()
+            self._flusher = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+            self._flusher.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(METRICS_FLUSH_INTERVAL):
+            self.flush()
+
+    def flush(self, snapshot=None):
+        """Grava o snapshot deste processo (escrita atómica: ficheiro temporário + rename)"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        path = self._path()
+        try:
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(snapshot or self.snapshot(), f, separators=(',', ':'))
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            log.warning("Não foi possível gravar as métricas em %s: %s", path, e)
+
+    def clear_directory(self):
+        """Apaga snapshots de execuções anteriores (no arranque, antes dos workers)"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.startswith('metrics_') and name.endswith(('.json', '.tmp')):
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(self.directory, name))
+
+    def after_fork(self):
+        """No worker: os valores herdados já estão no snapshot do processo principal"""
+        self._lock = threading.Lock()
+        for metric in self._metrics.values():
+            metric._lock = threading.Lock()
+            metric.reset()
+        self._stop = threading.Event()
+        self._flusher = None
+        self.start()
+
+    def shutdown(self):
+        """Último snapshot deste processo; o dono de um diretório temporário apaga-o"""
+        self._stop.set()
+        if self.owner is not None and self.owner == os.getpid():
+            shutil.rmtree(self.directory, ignore_errors=True)
+        else:
+            self.flush()
+
+    def collect(self):
+        """Snapshots de todos os processos (ou só deste, sem METRICS_DIR)"""
+        local = self.snapshot()
+        if not self.directory:
+            return [(local, True)]
+        self.flush(local)
+        snapshots = []
+        stale_before = time.time() - 3 * METRICS_FLUSH_INTERVAL
+        for name in os.listdir(self.directory):
+            if not (name.startswith('metrics_') and name.endswith('.json')):
+                continue
+            path = os.path.join(self.directory, name)
+            if path == self._path():
+                snapshots.append((local, True))
+                continue
+            try:
+                live = os.path.getmtime(path) >= stale_before
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshots.append((json.load(f), live))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        return render(merge(self.collect()))
+
+
+def merge(snapshots):
+    """Soma contadores e histogramas; gauges por modo e só de processos ativos"""
+    merged = {}
+    for snapshot, live in snapshots:
+        for name, metric in snapshot.items():
+            if metric['type'] == 'gauge' and not live:
+                continue
+            target = merged.setdefault(name, dict(metric, samples={}))
+            samples = target['samples']
+            for labels, value in metric['samples']:
+                key = tuple(labels)
+                current = samples.get(key)
+                if current is None:
+                    samples[key] = list(value) if isinstance(value, list) else value
+                elif metric['type'] == 'histogram':
+                    samples[key] = [a + b for a, b in zip(current, value)]
+                elif metric['type'] == 'gauge' and metric.get('mode') == 'max':
+                    samples[key] = max(current, value)
+                else:
+                    samples[key] = current + value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(merged):
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric['labels']
+        for labels, value in sorted(metric['samples'].items()):
+            if metric['type'] != 'histogram':
+                lines.append(f"{name}{_labels(names, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric['buckets'] + ['+Inf'], value[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(f"{name}_bucket{_labels(names, labels, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {_number(float(value[-1]))}")
+            lines.append(f"{name}_count{_labels(names, labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+# --- Etapas da geração do orçamento ---
+
+_stage_timing = contextvars.ContextVar('stage_timing', default=False)
+
+
+@contextlib.contextmanager
+def timed_stages():
+    """Ativa stage() no bloco (geração de um orçamento pedida por um cliente)"""
+    token = _stage_timing.set(True)
+    try:
+        yield
+    finally:
+        _stage_timing.reset(token)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Tempo de uma etapa da geração do orçamento. Só conta dentro de timed_stages(),
+    para não misturar os orçamentos gerados pelas curvas de pré-visualização.
+    """
+    if not _stage_timing.get():
+        yield
+        return
+    with BUDGET_STAGE_SECONDS.time(stage=name):
+        yield
+
+
+def ensure_shared_directory():
+    """
+    Diretório partilhado para processos que vão ser criados (fork/spawn): usa
+    METRICS_DIR ou cria um temporário, que os filhos herdam pelo ambiente.
+    """
+    if registry.directory:
+        return registry.directory
+    directory = tempfile.mkdtemp(prefix='metrics_')
+    os.environ['METRICS_DIR'] = directory
+    registry.enable_multiprocess(directory)
+    # Apagado no shutdown() deste processo (não no dos workers, que herdam o registo)
+    registry.owner = os.getpid()
+    return directory
+
+
+def observe_request(endpoint, method, status, seconds):
+    """Pedido HTTP concluído (hooks do Flask e rotas nativas do ASGI)"""
+    endpoint = endpoint or '<sem rota>'
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=method, status=status)
+    HTTP_REQUEST_SECONDS.observe(seconds, endpoint=endpoint)
+
+
+def init_metrics(app):
+    """
+    Regista a medição dos pedidos Flask. Deve ser chamado antes de init_compression,
+    para o after_request correr por último e incluir o tempo das restantes etapas.
+    """
+    from flask import request, g
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            observe_request(request.endpoint, request.method, response.status_code, time.perf_counter() - started)
+        return response
+
+
+# Instância global
+registry = MetricsRegistry()
+if os.environ.get('METRICS_DIR'):
+    registry.enable_multiprocess(os.environ['METRICS_DIR'])
+atexit.register(registry.shutdown)
+
+HTTP_REQUESTS = registry.counter('http_requests_total', 'Pedidos HTTP por rota, método e estado',
+                                 ('endpoint', 'method', 'status'))
+HTTP_REQUEST_SECONDS = registry.histogram('http_request_duration_seconds', 'Duração dos pedidos HTTP por rota',
+                                          ('endpoint',))
+BUDGET_STAGE_SECONDS = registry.histogram('budget_stage_duration_seconds',
+                                          'Duração das etapas da geração do orçamento', ('stage',))
@@ -0,0 +1,207 @@
+# Motor de Multiplicadores - Compilado a partir da tabela price_multipliers
+# Substitui os fatores codificados em PoolCalculator.calculate_complexity_multiplier
+
+import re
+import operator
+import threading
+from typing import Dict, List, Tuple, Optional
+
+from app_logging import get_logger
+
+log = get_logger('multiplier_engine')
+
+# Fatores por grupo, na mesma ordem em que eram aplicados no calculator
+FACTOR_GROUPS = {
+    'geometrico': ['forma', 'tipo_piscina', 'area'],
+    'tecnologico': ['domotica', 'revestimento', 'luz', 'escavacao'],
+    'mercado': ['mercado'],
+}
+
+# Tipos de condição que são comparados diretamente com uma resposta do questionário
+ANSWER_CONDITIONS = ['forma', 'tipo_piscina', 'domotica', 'revestimento', 'luz', 'escavacao']
+
+# Regras por omissão (metodologia 2025). Linhas ativas da tabela price_multipliers
+# com o mesmo (condition_type, condition_value) substituem estas; linhas inativas
+# desativam-nas. Tipos de condição desconhecidos (ex: access_level) são ignorados.
+DEFAULT_MULTIPLIER_RULES = [
+    # Geométrico
+    {'name': 'Forma Especial', 'condition_type': 'forma', 'condition_value': 'especial', 'multiplier': 1.15},
+    {'name': 'Piscina Skimmer', 'condition_type': 'tipo_piscina', 'condition_value': 'skimmer', 'multiplier': 1.0},
+    {'name': "Espelho d'Água", 'condition_type': 'tipo_piscina', 'condition_value': 'espelho_dagua', 'multiplier': 1.08},
+    {'name': 'Transbordo', 'condition_type': 'tipo_piscina', 'condition_value': 'transbordo', 'multiplier': 1.20},
+    {'name': 'Piscina Pequena', 'condition_type': 'area', 'condition_value': '<15', 'multiplier': 1.08},
+    {'name': 'Piscina Grande', 'condition_type': 'area', 'condition_value': '>60', 'multiplier': 1.05},
+    # Técnico e tecnológico
+    {'name': 'Com Domótica', 'condition_type': 'domotica', 'condition_value': 'true', 'multiplier': 1.04},
+    {'name': 'Revestimento Cerâmico', 'condition_type': 'revestimento', 'condition_value': 'ceramica', 'multiplier': 1.05},
+    {'name': 'Alimentação Trifásica', 'condition_type': 'luz', 'condition_value': 'trifasica', 'multiplier': 1.03},
+    {'name': 'Com Escavação', 'condition_type': 'escavacao', 'condition_value': 'true', 'multiplier': 1.02},
+    # Mercado 2025 e limite de segurança
+    {'name': 'Fator de Mercado 2025', 'condition_type': 'mercado', 'condition_value': '*', 'multiplier': 1.05},
+    {'name': 'Limite Máximo', 'condition_type': 'limite', 'condition_value': 'max', 'multiplier': 1.25},
+]
+
+KNOWN_CONDITIONS = set(ANSWER_CONDITIONS) | {'area', 'mercado', 'limite'}
+
+# Operadores aceites nas condições de área (ex: '<15', '>=60')
+AREA_OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+AREA_CONDITION = re.compile(r'^\s*(<=|>=|<|>)\s*(\d+(?:[.,]\d+)?)\s*$')
+
+# O espaço de respostas é pequeno; o limite só protege contra entradas inesperadas
+MAX_CACHE_ENTRIES = 4096
+
+
+class CompiledMultiplierTable:
+    """Tabela de lookup compilada a partir das regras ativas"""
+
+    def __init__(self, rules: List[Dict]):
+        merged = {}
+        for rule in DEFAULT_MULTIPLIER_RULES:
+            merged[(rule['condition_type'], rule['condition_value'])] = dict(rule, is_active=1)
+        for rule in rules:
+            condition_type = rule.get('condition_type')
+            if condition_type not in KNOWN_CONDITIONS:
+                continue
+            if rule.get('applies_to', 'all') not in (None, 'all'):
+                continue
+            key = (condition_type, str(rule.get('condition_value')))
+            merged[key] = dict(rule, condition_value=key[1])
+
+        self.by_answer: Dict[str, Dict[str, float]] = {c: {} for c in ANSWER_CONDITIONS}
+        self.area_rules: List[Tuple[str, float, float]] = []
+        self.market_factor = 1.0
+        self.cap: Optional[float] = None
+
+        for (condition_type, condition_value), rule in merged.items():
+            if not rule.get('is_active', 1):
+                continue
+            multiplier = float(rule['multiplier'])
+            if condition_type in self.by_answer:
+                self.by_answer[condition_type][condition_value] = multiplier
+            elif condition_type == 'area':
+                match = AREA_CONDITION.match(condition_value)
+                if match is None:
+                    log.warning("Regra de área inválida ignorada: %r", condition_value,
+                                rule=rule.get('name'))
+                    continue
+                threshold = float(match.group(2).replace(',', '.'))
+                self.area_rules.append((match.group(1), threshold, multiplier))
+            elif condition_type == 'mercado':
+                self.market_factor *= multiplier
+            elif condition_type == 'limite':
+                self.cap = multiplier
+
+    def area_band(self, area: float) -> Tuple[int, ...]:
+        """Índices das regras de área que se aplicam (chave de cache)"""
+        band = []
+        for idx, (op, threshold, _) in enumerate(self.area_rules):
+            if AREA_OPERATORS[op](area, threshold):
+                band.append(idx)
+        return tuple(band)
+
+    def evaluate(self, answer_values: Tuple, band: Tuple[int, ...]) -> Tuple[float, Dict]:
+        """Calcula multiplicador e breakdown numa só passagem"""
+        factors = dict(zip(ANSWER_CONDITIONS, answer_values))
+
+        geo_factor = 1.0
+        geo_factor *= self.by_answer['forma'].get(factors['forma'], 1.0)
+        geo_factor *= self.by_answer['tipo_piscina'].get(factors['tipo_piscina'], 1.0)
+        for idx in band:
+            geo_factor *= self.area_rules[idx][2]
+
+        tech_factor = 1.0
+        for condition_type in FACTOR_GROUPS['tecnologico']:
+            tech_factor *= self.by_answer[condition_type].get(factors[condition_type], 1.0)
+
+        market_factor = self.market_factor
+
+        final_multiplier = geo_factor * tech_factor * market_factor
+        if self.cap is not None:
+            final_multiplier = min(final_multiplier, self.cap)
+
+        breakdown = {
+            'geometrico': round(geo_factor, 3),
+            'tecnologico': round(tech_factor, 3),
+            'mercado': round(market_factor, 3),
+            'final': round(final_multiplier, 3)
+        }
+        return final_multiplier, breakdown
+
+
+class MultiplierEngine:
+    """
+    Calcula o multiplicador de complexidade a partir de regras do catálogo.
+
+    As regras são compiladas uma vez por versão do catálogo e os resultados
+    ficam em cache por combinação de respostas, por isso editar a tabela
+    price_multipliers altera os preços sem novo deploy.
+    """
+
+    def __init__(self, db_manager=None):
+        self._db = db_manager
+        self._lock = threading.Lock()
+        self._version = None
+        self._table: Optional[CompiledMultiplierTable] = None
+        self._cache: Dict[Tuple, Tuple[float, Dict]] = {}
+
+    def _get_db(self):
+        if self._db is None:
+            from database_manager import DatabaseManager
+            self._db = DatabaseManager()
+        return self._db
+
+    def _current_table(self) -> Tuple[str, CompiledMultiplierTable]:
+        try:
+            db = self._get_db()
+            version = db.get_catalog_version()
+        except Exception as e:
+            log.warning("Fallback: multiplicadores sem catálogo: %s", e)
+            db, version = None, 'builtin'
+
+        if version != self._version or self._table is None:
+            with self._lock:
+                if version != self._version or self._table is None:
+                    rules = db.get_price_multipliers() if db is not None else []
+                    self._table = CompiledMultiplierTable(rules)
+                    self._cache = {}
+                    self._version = version
+        return self._version, self._table
+
+    def invalidate(self):
+        """Força a recompilação das regras no próximo cálculo"""
+        with self._lock:
+            self._version = None
+            self._table = None
+            self._cache = {}
+
+    def compute(self, answers: Dict, dimensions: Dict) -> Tuple[float, Dict]:
+        """Devolve (multiplicador_final, breakdown) para as respostas e dimensões"""
+        version, table = self._current_table()
+
+        answer_values = (
+            answers.get('forma', 'standard'),
+            answers.get('tipo_piscina', 'skimmer'),
+            answers.get('domotica'),
+            answers.get('revestimento', 'tela'),
+            answers.get('luz'),
+            answers.get('escavacao'),
+        )
+        area = dimensions.get('comprimento', 0) * dimensions.get('largura', 0)
+        band = table.area_band(area)
+
+        key = (version, answer_values, band)
+        try:
+            cached = self._cache.get(key)
+        except TypeError:
+            # Respostas não hashable: calcular sem cache
+            return table.evaluate(answer_values, band)
+        if cached is None:
+            if len(self._cache) >= MAX_CACHE_ENTRIES:
+                self._cache.clear()
+            cached = table.evaluate(answer_values, band)
+            self._cache[key] = cached
+        return cached[0], dict(cached[1])
+
+
+# Instância global
+multiplier_engine = MultiplierEngine()
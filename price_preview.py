@@ -0,0 +1,457 @@
+# Pré-visualização de Preços - Curvas de preço pré-calculadas por perfil de respostas
+# Permite mostrar o total estimado enquanto o comercial altera as medidas,
+# sem correr os seletores de produtos em cada pedido.
+
+import copy
+import bisect
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Optional
+
+from calculator import PoolCalculator
+from budget_requests import is_enumerated
+from app_logging import get_logger
+
+log = get_logger('price_preview')
+
+# Respostas que dependem das medidas e por isso não fazem parte do perfil
+DIMENSION_ANSWER_KEYS = {'zona_praia_comprimento'}
+
+# Famílias cujo equipamento depende apenas do volume (bombas, filtros, bombas de calor, sal)
+VOLUME_FAMILIES = ('filtracao', 'aquecimento', 'tratamento_agua')
+VOLUME_RANGE = (1.0, 200.0)
+
+# Famílias que dependem do comprimento e largura (skimmers, bocas, iluminação)
+PLAN_FAMILIES = ('recirculacao_iluminacao',)
+PLAN_RANGE = {'comprimento': (2.0, 25.0), 'largura': (2.0, 12.0)}
+
+# Passo de varrimento e tolerância da bissecção na procura de breakpoints
+SCAN_STEP = {'volume': 2.0, 'comprimento': 0.25, 'largura': 0.25}
+BREAKPOINT_TOLERANCE = 0.01
+
+# O revestimento em tela (rolos e perfis) muda em degraus diagonais no plano
+# comprimento × largura, que uma tabela alinhada aos eixos não representa; é
+# calculado em cada pedido com os produtos lidos durante a construção.
+EXACT_FAMILIES_TELA = ('revestimento',)
+
+# Restantes famílias (construção, revestimento cerâmico, bordadura, laje) variam com
+# quantidades contínuas (m², m³, ml), que são multilineares nas medidas.
+# Nós da grelha de interpolação; 1.65 é o limite de profundidade da tela.
+GRID_KNOTS = {
+    'comprimento': [2.0, 6.0, 10.0, 15.0, 25.0],
+    'largura': [2.0, 4.0, 6.0, 9.0, 12.0],
+    'prof_min': [0.8, 1.4, 2.0],
+    'prof_max': [1.0, 1.64, 1.65, 2.5],
+}
+GRID_AXES = ('comprimento', 'largura', 'prof_min', 'prof_max')
+
+IVA_RATE = 0.23
+MAX_PROFILES = 32
+
+# Perfis à espera de construção; os restantes são calculados diretamente até haver vaga
+MAX_PENDING_BUILDS = 8
+
+
+def family_base_totals(budget: Dict) -> Dict[str, float]:
+    """Soma preço × quantidade dos itens incluídos, por família (sem multiplicador)"""
+    totals = {}
+    for family, items in budget.get('families', {}).items():
+        total = 0.0
+        for item in items.values():
+            quantity = item.get('quantity', 0)
+            if quantity > 0 and item.get('item_type', 'incluido') == 'incluido':
+                total += item.get('price', 0) * quantity
+        totals[family] = total
+    return totals
+
+
+class StepCurve:
+    """Função em escada de uma variável: valores constantes entre breakpoints"""
+
+    def __init__(self, breakpoints: List[float], values: List):
+        self.breakpoints = breakpoints
+        self.values = values
+
+    def __call__(self, x: float):
+        return self.values[bisect.bisect_right(self.breakpoints, x)]
+
+
+class StepTable2D:
+    """
+    Tabela em escada de duas variáveis com breakpoints alinhados aos eixos.
+    Células atravessadas por um degrau que não segue os eixos têm valor None.
+    """
+
+    def __init__(self, xs: List[float], ys: List[float], values: List[List]):
+        self.xs = xs
+        self.ys = ys
+        self.values = values
+
+    def __call__(self, x: float, y: float):
+        return self.values[bisect.bisect_right(self.xs, x)][bisect.bisect_right(self.ys, y)]
+
+
+class MultilinearGrid:
+    """Interpolação multilinear numa grelha retangular (valores fora da grelha são limitados aos extremos)"""
+
+    def __init__(self, knots: List[List[float]], values: Dict[Tuple[int, ...], Dict[str, float]]):
+        self.knots = knots
+        self.values = values
+
+    def __call__(self, point: Tuple[float, ...]) -> Dict[str, float]:
+        cell = []
+        for axis_knots, x in zip(self.knots, point):
+            x = min(max(x, axis_knots[0]), axis_knots[-1])
+            i = min(max(bisect.bisect_right(axis_knots, x) - 1, 0), len(axis_knots) - 2)
+            lo, hi = axis_knots[i], axis_knots[i + 1]
+            t = (x - lo) / (hi - lo) if hi > lo else 0.0
+            cell.append((i, t))
+
+        result: Dict[str, float] = {}
+        for corner in itertools.product((0, 1), repeat=len(cell)):
+            weight = 1.0
+            index = []
+            for (i, t), bit in zip(cell, corner):
+                weight *= t if bit else (1.0 - t)
+                index.append(i + bit)
+            if weight == 0.0:
+                continue
+            for family, value in self.values[tuple(index)].items():
+                result[family] = result.get(family, 0.0) + weight * value
+        return result
+
+
+class PriceCurves:
+    """
+    Curvas de preço base por família para um perfil de respostas. Com
+    revestimento em tela, coating_products são os produtos da família
+    Revestimento, para o revestimento ser calculado em cada pedido.
+    """
+
+    def __init__(self, volume_curve: StepCurve, plan_table: StepTable2D, grid: MultilinearGrid,
+                 coating_products: Optional[List[Dict]] = None):
+        self.volume_curve = volume_curve
+        self.plan_table = plan_table
+        self.grid = grid
+        self.coating_products = coating_products
+
+    def family_totals(self, dimensions: Dict) -> Optional[Dict[str, float]]:
+        """
+        Totais base por família, ou None se as medidas estão fora das curvas
+        (fora da grelha ou numa célula com degrau diagonal) e é preciso gerar
+        o orçamento
+        """
+        comprimento = dimensions['comprimento']
+        largura = dimensions['largura']
+        prof_min = dimensions['prof_min']
+        prof_max = dimensions['prof_max']
+        volume = comprimento * largura * (prof_min + prof_max) / 2
+
+        point = (comprimento, largura, prof_min, prof_max)
+        if not all(k[0] <= x <= k[-1] for k, x in zip(self.grid.knots, point)):
+            return None
+        if not VOLUME_RANGE[0] <= volume <= VOLUME_RANGE[1]:
+            return None
+        plan = self.plan_table(comprimento, largura)
+        if plan is None:
+            return None
+
+        totals = self.grid(point)
+        totals.update(self.volume_curve(volume))
+        totals.update(plan)
+        return totals
+
+
+class _CatalogMemo:
+    """Proxy do DatabaseManager que memoriza as leituras durante a construção das curvas"""
+
+    CACHED_METHODS = {
+        'get_products_by_category', 'get_product_attributes', 'get_products_by_conditions',
+        'get_product_by_id', 'get_products_by_family', 'get_all_families',
+    }
+
+    def __init__(self, db):
+        self._db = db
+        self._cache = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+        if name not in self.CACHED_METHODS:
+            return attr
+
+        def cached(*args):
+            key = (name, repr(args))
+            if key not in self._cache:
+                self._cache[key] = attr(*args)
+            return copy.deepcopy(self._cache[key])
+        return cached
+
+
+class CurveBuilder:
+    """Constrói PriceCurves amostrando o gerador de orçamentos real"""
+
+    def __init__(self, selector, answers: Dict):
+        self.selector = selector
+        self.answers = answers
+        self.plan_families = PLAN_FAMILIES
+        self.exact_families = EXACT_FAMILIES_TELA if answers.get('revestimento', 'tela') == 'tela' else ()
+        self.calculator = PoolCalculator()
+        self.runs = 0
+
+    def _totals(self, comprimento, largura, prof_min, prof_max) -> Dict[str, float]:
+        dimensions = {'comprimento': comprimento, 'largura': largura,
+                      'prof_min': prof_min, 'prof_max': prof_max}
+        metrics = self.calculator.calculate_all_metrics(comprimento, largura, prof_min, prof_max)
+        self.runs += 1
+        # client_data vazio: a localidade vem nas respostas e a sessão não faz parte do perfil
+        return family_base_totals(self.selector.generate_budget(self.answers, metrics, dimensions, {}))
+
+    def _pick(self, totals: Dict[str, float], families) -> Tuple[Tuple[str, float], ...]:
+        return tuple((f, round(totals[f], 2)) for f in families if f in totals)
+
+    def _breakpoints(self, f, lo: float, hi: float, step: float) -> List[float]:
+        """Encontra os pontos onde f muda de valor em [lo, hi], por varrimento e bissecção"""
+        points = []
+
+        def refine(a, fa, b, fb):
+            if b - a <= BREAKPOINT_TOLERANCE:
+                points.append(round(b, 4))
+                return
+            m = (a + b) / 2
+            fm = f(m)
+            if fm != fa:
+                refine(a, fa, m, fm)
+            if fm != fb:
+                refine(m, fm, b, fb)
+
+        a, fa = lo, f(lo)
+        while a < hi:
+            b = min(a + step, hi)
+            fb = f(b)
+            if fb != fa:
+                refine(a, fa, b, fb)
+            a, fa = b, fb
+        return points
+
+    def _segment_values(self, f, breakpoints: List[float], lo: float, hi: float) -> List:
+        """Valor de f no meio de cada segmento definido pelos breakpoints"""
+        edges = [lo] + breakpoints + [hi]
+        return [f((edges[i] + edges[i + 1]) / 2) for i in range(len(edges) - 1)]
+
+    def build_volume_curve(self) -> StepCurve:
+        lo, hi = VOLUME_RANGE
+
+        def f(volume):
+            return self._pick(self._totals(volume, 1.0, 1.0, 1.0), VOLUME_FAMILIES)
+
+        breakpoints = self._breakpoints(f, lo, hi, SCAN_STEP['volume'])
+        values = [dict(v) for v in self._segment_values(f, breakpoints, lo, hi)]
+        return StepCurve(breakpoints, values)
+
+    def build_plan_table(self) -> StepTable2D:
+        """
+        Breakpoints procurados nas linhas médias de cada eixo. Os degraus das
+        quantidades que dependem do perímetro (rolos de tela, perfis) são
+        diagonais e atravessam células, por isso cada célula é avaliada no canto
+        inferior e no superior e, se diferirem, fica sem valor (None). As
+        quantidades só crescem com as medidas, por isso cantos iguais implicam
+        célula constante.
+        """
+        (c_lo, c_hi), (l_lo, l_hi) = PLAN_RANGE['comprimento'], PLAN_RANGE['largura']
+        c_mid, l_mid = (c_lo + c_hi) / 2, (l_lo + l_hi) / 2
+
+        def f(comprimento, largura):
+            return self._pick(self._totals(comprimento, largura, 1.2, 1.5), self.plan_families)
+
+        xs = self._breakpoints(lambda c: f(c, l_mid), c_lo, c_hi, SCAN_STEP['comprimento'])
+        ys = self._breakpoints(lambda l: f(c_mid, l), l_lo, l_hi, SCAN_STEP['largura'])
+        x_edges = [c_lo] + xs + [c_hi]
+        y_edges = [l_lo] + ys + [l_hi]
+
+        def cell(i, j):
+            # O canto superior fica logo abaixo do breakpoint seguinte (que já pertence à célula vizinha)
+            lower = f(x_edges[i], y_edges[j])
+            upper = f(x_edges[i + 1] - BREAKPOINT_TOLERANCE, y_edges[j + 1] - BREAKPOINT_TOLERANCE)
+            return dict(lower) if lower == upper else None
+
+        values = [[cell(i, j) for j in range(len(y_edges) - 1)] for i in range(len(x_edges) - 1)]
+        return StepTable2D(xs, ys, values)
+
+    def build_grid(self) -> MultilinearGrid:
+        knots = [GRID_KNOTS[axis] for axis in GRID_AXES]
+        skip = set(VOLUME_FAMILIES) | set(self.plan_families) | set(self.exact_families)
+        values = {}
+        for index in itertools.product(*(range(len(k)) for k in knots)):
+            point = [knots[axis][i] for axis, i in enumerate(index)]
+            totals = self._totals(*point)
+            values[index] = {f: t for f, t in totals.items() if f not in skip}
+        return MultilinearGrid(knots, values)
+
+    def build(self) -> PriceCurves:
+        coating_products = None
+        if self.exact_families:
+            coating_products = self.selector.db.get_products_by_family('Revestimento')
+        return PriceCurves(self.build_volume_curve(), self.build_plan_table(), self.build_grid(), coating_products)
+
+
+class PricePreviewService:
+    """
+    Responde a pré-visualizações de total a partir de curvas pré-calculadas.
+
+    As curvas são construídas uma vez por perfil de respostas (tudo exceto as
+    medidas), por uma única thread de fundo que trata os perfis por ordem de
+    chegada, e ficam em cache até a versão do catálogo mudar. Só são construídas
+    para respostas que são opções do questionário (uma construção custa ~1700
+    orçamentos gerados) e a fila tem no máximo max_pending perfis. Enquanto as
+    curvas de um perfil não estão prontas, ou as medidas ficam fora delas, o
+    total é calculado diretamente com o gerador de orçamentos.
+    """
+
+    def __init__(self, selector=None, max_profiles: int = MAX_PROFILES, max_pending: int = MAX_PENDING_BUILDS):
+        self._selector = selector
+        self.max_profiles = max_profiles
+        self.max_pending = max_pending
+        self.calculator = PoolCalculator()
+        self._curves: "OrderedDict[Tuple, PriceCurves]" = OrderedDict()
+        self._pending: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._building = None
+        self._version = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._worker = None
+
+    def after_fork(self):
+        """No processo filho: a thread de construção não foi copiada e o lock pode ter ficado fechado"""
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending.clear()
+        self._building = None
+        self._worker = None
+
+    def _get_selector(self):
+        if self._selector is None:
+            from advanced_product_selector import AdvancedProductSelector
+            self._selector = AdvancedProductSelector()
+        return self._selector
+
+    @staticmethod
+    def profile_key(answers: Dict) -> Tuple:
+        return tuple(sorted(
+            (k, v) for k, v in answers.items()
+            if k not in DIMENSION_ANSWER_KEYS and not isinstance(v, (dict, list))
+        ))
+
+    def invalidate(self):
+        """Descarta todas as curvas em cache"""
+        with self._lock:
+            self._curves.clear()
+            self._version = None
+
+    def get_curves(self, answers: Dict) -> Optional[PriceCurves]:
+        """Devolve as curvas do perfil se já estiverem construídas para a versão atual do catálogo"""
+        version = self._get_selector().db.get_catalog_version()
+        key = self.profile_key(answers)
+        with self._lock:
+            if version != self._version:
+                self._curves.clear()
+                self._version = version
+            curves = self._curves.get(key)
+            if curves is not None:
+                self._curves.move_to_end(key)
+            return curves
+
+    def build_curves(self, answers: Dict) -> PriceCurves:
+        """Constrói (de forma síncrona) e guarda as curvas de um perfil"""
+        from advanced_product_selector import AdvancedProductSelector
+        selector = self._get_selector()
+        version = selector.db.get_catalog_version()
+        key = self.profile_key(answers)
+
+        build_selector = AdvancedProductSelector(db=_CatalogMemo(selector.db))
+        curves = CurveBuilder(build_selector, dict(answers)).build()
+
+        with self._lock:
+            if self._version == version:
+                self._curves[key] = curves
+                while len(self._curves) > self.max_profiles:
+                    self._curves.popitem(last=False)
+        return curves
+
+    def schedule_build(self, answers: Dict) -> bool:
+        """
+        Põe o perfil na fila de construção; False se não foi aceite (respostas fora
+        das opções do questionário, já construído ou em fila, ou fila cheia)
+        """
+        if not is_enumerated(answers, ignore=DIMENSION_ANSWER_KEYS):
+            return False
+        key = self.profile_key(answers)
+        with self._lock:
+            if key in self._curves or key in self._pending or key == self._building:
+                return False
+            if len(self._pending) >= self.max_pending:
+                log.debug("Fila de curvas de preço cheia; perfil calculado diretamente")
+                return False
+            self._pending[key] = dict(answers)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._build_loop, name='price-curves', daemon=True)
+                self._worker.start()
+            self._wakeup.notify()
+        return True
+
+    def _build_loop(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait()
+                key, answers = self._pending.popitem(last=False)
+                self._building = key
+            try:
+                self.build_curves(answers)
+            except Exception:
+                log.exception("Erro ao construir curvas de preço")
+            finally:
+                with self._lock:
+                    self._building = None
+
+    def preview(self, answers: Dict, dimensions: Dict) -> Dict:
+        """Total estimado (com multiplicador, transporte e IVA) para as medidas dadas"""
+        metrics = self.calculator.calculate_all_metrics(
+            dimensions['comprimento'], dimensions['largura'],
+            dimensions['prof_min'], dimensions['prof_max']
+        )
+        curves = self.get_curves(answers)
+        base_totals = curves.family_totals(dimensions) if curves is not None else None
+        if base_totals is not None:
+            if curves.coating_products is not None:
+                coating = self._get_selector()._select_coating_products(
+                    {'coating_type': 'tela'}, answers, dimensions, metrics, curves.coating_products
+                )
+                base_totals.update(family_base_totals({'families': {'revestimento': coating}}))
+            source = 'curves'
+        else:
+            if curves is None:
+                self.schedule_build(answers)
+            budget = self._get_selector().generate_budget(answers, metrics, dimensions)
+            base_totals = family_base_totals(budget)
+            source = 'direct'
+
+        multiplier, breakdown = self.calculator.calculate_complexity_multiplier(answers, dimensions)
+        transport_costs = self.calculator.calculate_transport_costs(answers, metrics)
+
+        family_totals_base = {f: round(t, 2) for f, t in base_totals.items()}
+        family_totals = {f: round(t * multiplier, 2) for f, t in base_totals.items()}
+        subtotal_with_margin = sum(family_totals.values()) + transport_costs.get('custo_total', 0)
+        iva_amount = subtotal_with_margin * IVA_RATE
+
+        return {
+            'source': source,
+            'family_totals_base': family_totals_base,
+            'family_totals': family_totals,
+            'multiplier': multiplier,
+            'multiplier_breakdown': breakdown,
+            'transport_cost': transport_costs.get('custo_total', 0),
+            'subtotal_with_margin': round(subtotal_with_margin, 2),
+            'iva_amount': round(iva_amount, 2),
+            'total_with_iva': round(subtotal_with_margin + iva_amount, 2),
+        }
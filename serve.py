@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor de produção: waitress (threads), gunicorn (workers com fork) ou uvicorn (ASGI)
+
+Uso:
+    python serve.py [--server gunicorn|waitress|uvicorn] [--host 0.0.0.0] [--port 5000]
+                    [--workers 4] [--threads 8] [--timeout 60] [--graceful-timeout 30] [--no-warmup]
+
+Os valores por omissão vêm de SERVER, SERVER_HOST, SERVER_PORT, SERVER_WORKERS,
+SERVER_THREADS, SERVER_TIMEOUT, SERVER_GRACEFUL_TIMEOUT e SERVER_WARMUP (0 desativa).
+
+Antes de aceitar pedidos o catálogo e os índices são carregados e são gerados
+alguns orçamentos padrão (ver server_runtime); com gunicorn isto acontece antes
+do fork e os workers partilham essa memória. A camada em memória da cache de
+orçamentos (BUDGET_CACHE_MEMORY_MB) é recusada com mais de um worker, porque as
+escritas condicionais só seriam verificadas dentro de cada processo.
+
+Com uvicorn é servida a variante ASGI (asgi.py): um só processo de servidor,
+--workers processos de cálculo (geração dos orçamentos) e --threads threads para
+o I/O da sessão e da cache.
+
+Com vários processos as métricas de /metrics são agregadas por METRICS_DIR (um
+diretório temporário se não estiver definido).
+
+SIGTERM/SIGINT terminam os pedidos em curso, gravam os orçamentos pendentes e saem.
+run_app.py e wsgi.py continuam a usar o servidor de desenvolvimento do Flask.
+"""
+
+import os
+import sys
+import signal
+import argparse
+
+try:
+    import gunicorn.app.base
+except ImportError:  # opcional (não existe em Windows)
+    gunicorn = None
+
+try:
+    import waitress
+except ImportError:  # opcional
+    waitress = None
+
+try:
+    import uvicorn
+except ImportError:  # opcional
+    uvicorn = None
+
+
+def default_server():
+    return os.environ.get('SERVER') or ('gunicorn' if gunicorn is not None else 'waitress')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--server', choices=('gunicorn', 'waitress', 'uvicorn'), default=default_server(),
+                        help='gunicorn (processos), waitress (threads num processo) ou uvicorn (ASGI)')
+    parser.add_argument('--host', default=os.environ.get('SERVER_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('SERVER_PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SERVER_WORKERS', min(os.cpu_count() or 1, 4))),
+                        help='processos (gunicorn) ou processos de cálculo (uvicorn)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('SERVER_THREADS', 8)),
+                        help='threads por processo (uvicorn: threads de I/O)')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('SERVER_TIMEOUT', 60)),
+                        help='segundos até um pedido (gunicorn) ou ligação inativa (waitress) ser terminado')
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30)),
+                        help='segundos para terminar os pedidos em curso ao encerrar (gunicorn, uvicorn)')
+    parser.add_argument('--no-warmup', dest='warmup', action='store_false',
+                        default=os.environ.get('SERVER_WARMUP', '1') != '0',
+                        help='não gerar orçamentos de aquecimento antes de aceitar pedidos')
+    return parser.parse_args()
+
+
+def prepare(args):
+    """Carrega a aplicação (depois de ajustar o ambiente) e faz o warmup"""
+    if args.server == 'uvicorn':
+        os.environ['ASGI_CPU_WORKERS'] = str(args.workers)
+        os.environ['ASGI_IO_THREADS'] = str(args.threads)
+
+    import metrics
+    # Snapshots de uma execução anterior no mesmo METRICS_DIR
+    metrics.registry.clear_directory()
+    if args.server == 'gunicorn' and args.workers > 1:
+        # /metrics num worker soma os snapshots de todos
+        metrics.ensure_shared_directory()
+
+    import server_runtime
+    app = server_runtime.preload()
+    if args.warmup:
+        server_runtime.warmup(app)
+    return app
+
+
+def run_gunicorn(app, args):
+    import server_runtime
+
+    class Application(gunicorn.app.base.BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{args.host}:{args.port}")
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('threads', args.threads)
+            self.cfg.set('worker_class', 'gthread' if args.threads > 1 else 'sync')
+            self.cfg.set('timeout', args.timeout)
+            self.cfg.set('graceful_timeout', args.graceful_timeout)
+            self.cfg.set('preload_app', True)
+            self.cfg.set('pre_fork', lambda arbiter, worker: server_runtime.freeze())
+            self.cfg.set('post_fork', lambda arbiter, worker: server_runtime.after_fork())
+            self.cfg.set('worker_exit', lambda arbiter, worker: server_runtime.shutdown())
+            self.cfg.set('on_exit', lambda arbiter: server_runtime.shutdown())
+
+        def load(self):
+            return app
+
+    Application().run()
+
+
+def run_waitress(app, args):
+    import server_runtime
+
+    server = waitress.create_server(app, host=args.host, port=args.port,
+                                    threads=args.threads, channel_timeout=args.timeout)
+
+    def stop(signum, frame):
+        # O ciclo do waitress apanha SystemExit e espera pelas threads de pedidos
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    print(f"waitress em http://{args.host}:{args.port} ({args.threads} threads)")
+    try:
+        server.run()
+    finally:
+        server_runtime.shutdown()
+
+
+def run_uvicorn(app, args):
+    # O arranque (processos de cálculo) e o encerramento (server_runtime.shutdown) são do lifespan
+    from asgi import application
+
+    config = uvicorn.Config(application, host=args.host, port=args.port, lifespan='on',
+                            timeout_keep_alive=args.timeout, timeout_graceful_shutdown=args.graceful_timeout,
+                            access_log=False)
+    print(f"uvicorn em http://{args.host}:{args.port} ({args.workers} processos de cálculo, {args.threads} threads de I/O)")
+    uvicorn.Server(config).run()
+
+
+def main():
+    args = parse_args()
+    if args.server == 'gunicorn' and gunicorn is None:
+        print("gunicorn não instalado (pip install gunicorn); use --server waitress")
+        return 1
+    if args.server == 'waitress' and waitress is None:
+        print("waitress não instalado (pip install waitress)")
+        return 1
+    if args.server == 'uvicorn' and uvicorn is None:
+        print("uvicorn não instalado (pip install uvicorn)")
+        return 1
+
+    app = prepare(args)
+    if args.server == 'gunicorn':
+        run_gunicorn(app, args)
+    elif args.server == 'uvicorn':
+        run_uvicorn(app, args)
+    else:
+        run_waitress(app, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# Arranque em Produção - Pré-carregamento, warmup, fork e encerramento
+# Usado por serve.py. O catálogo e os índices derivados são construídos no processo
+# principal antes do fork dos workers, para que a memória seja partilhada
+# (copy-on-write); gc.freeze() tira esses objetos das recolhas do GC, que de outra
+# forma tocariam em todas as páginas e as copiariam em cada worker.
+
+import gc
+import time
+
+from app_logging import get_logger, restart_after_fork, shutdown_logging
+
+log = get_logger('server')
+
+# Perfis comuns do questionário gerados no warmup (rotas, templates, multiplicadores, totais)
+WARMUP_BUDGETS = [
+    {'acesso': 'facil', 'forma': 'standard', 'tipo_piscina': 'skimmer', 'revestimento': 'tela',
+     'localizacao': 'exterior', 'luz': 'monofasica',
+     'comprimento': 8, 'largura': 4, 'prof_min': 1.0, 'prof_max': 1.5},
+    {'acesso': 'medio', 'forma': 'especial', 'tipo_piscina': 'transbordo', 'revestimento': 'ceramica',
+     'localizacao': 'exterior', 'luz': 'trifasica',
+     'comprimento': 10, 'largura': 5, 'prof_min': 1.2, 'prof_max': 2.0},
+    {'acesso': 'dificil', 'forma': 'standard', 'tipo_piscina': 'espelho_dagua', 'revestimento': 'ceramica',
+     'localizacao': 'interior', 'luz': 'monofasica',
+     'comprimento': 6, 'largura': 3, 'prof_min': 1.0, 'prof_max': 1.4},
+]
+
+
+def preload():
+    """Importa a aplicação e constrói o catálogo em memória e os índices derivados"""
+    started = time.perf_counter()
+    from app import app
+    from default_data import products, product_families
+    from catalog_responses import catalog_responses
+    from catalog_alternatives import alternatives_index
+    from budget_refs import catalog_index
+
+    catalog_responses.families()
+    for family in product_families:
+        catalog_responses.family_products(family['name'])
+    alternatives_index.product(products[0]['id'] if products else None)
+    catalog_index.current()
+
+    log.info("Catálogo pré-carregado em %.0f ms", (time.perf_counter() - started) * 1000,
+             products=len(products), families=len(product_families))
+    return app
+
+
+def warmup(app, budgets=WARMUP_BUDGETS):
+    """
+    Gera orçamentos padrão pelo cliente de testes antes de aceitar tráfego. As
+    sessões criadas são apagadas; os orçamentos expiram como os abandonados.
+    Devolve o número de pedidos que falharam.
+    """
+    started = time.perf_counter()
+    failures = 0
+    cookie_name = app.config['SESSION_COOKIE_NAME']
+    for answers in budgets:
+        client = app.test_client()
+        for method, path in (('POST', '/generate_budget'), ('GET', '/budget'), ('GET', '/get_product_families')):
+            response = client.open(path, method=method, json=answers if method == 'POST' else None)
+            if response.status_code != 200:
+                failures += 1
+                log.warning("Warmup: %s %s -> %s", method, path, response.status_code)
+            response.close()
+        cookie = client.get_cookie(cookie_name)
+        if cookie is not None:
+            app.session_interface.store.delete_budget(cookie.value)
+
+    log.info("Warmup: %d orçamentos em %.0f ms", len(budgets), (time.perf_counter() - started) * 1000,
+             failures=failures)
+    return failures
+
+
+def freeze():
+    """Grava os pendentes e congela os objetos atuais no GC (chamado imediatamente antes do fork)"""
+    from budget_cache import budget_cache
+    from metrics import registry
+
+    if hasattr(budget_cache, 'flush'):
+        budget_cache.flush()
+    # As métricas do warmup ficam no snapshot do processo principal; os workers recomeçam do zero
+    registry.flush()
+    gc.collect()
+    gc.freeze()
+
+
+def after_fork():
+    """No worker acabado de criar: recriar threads, locks e conexões herdadas do processo principal"""
+    from app import app, price_preview
+    from budget_cache import budget_cache, budget_cache_sweeper
+    from metrics import registry
+
+    restart_after_fork()
+    for component in (budget_cache, budget_cache_sweeper, registry, price_preview,
+                      app.session_interface.store, app.session_interface.sweeper):
+        if hasattr(component, 'after_fork'):
+            component.after_fork()
+
+
+def shutdown():
+    """Encerramento: pára as limpezas, grava os orçamentos pendentes e as métricas e escreve os logs"""
+    from app import app
+    from budget_cache import budget_cache, budget_cache_sweeper
+    from metrics import registry
+
+    budget_cache_sweeper.stop()
+    app.session_interface.sweeper.stop()
+    if hasattr(budget_cache, 'close'):
+        budget_cache.close()
+    registry.shutdown()
+    log.info("Servidor encerrado")
+    shutdown_logging()
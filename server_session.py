@@ -0,0 +1,93 @@
+# Sessão Server-Side - Substitui a sessão em cookie assinado do Flask
+# O cookie leva apenas um ID opaco; os dados ficam numa tabela SQLite
+
+import os
+import re
+import secrets
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from budget_cache import SQLiteBudgetCache, start_expiry_sweeper
+from metrics import registry, BYTES_BUCKETS
+
+# IDs gerados por secrets.token_urlsafe(32)
+_SID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{43}$')
+
+SESSION_PAYLOAD_BYTES = registry.histogram('session_payload_bytes', 'Tamanho serializado das sessões gravadas',
+                                           buckets=BYTES_BUCKETS)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Sessão cujo conteúdo vive no servidor; só o sid vai no cookie"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Guarda a sessão num store com a API da cache de orçamentos
+    (get_budget/update_budget/delete_budget), por omissão cache/sessions.db.
+
+    O pedido só lê uma linha pequena por ID e a sessão só é regravada quando
+    é modificada, por isso o tamanho do cookie é constante e deixa de haver
+    assinatura/serialização do conteúdo em cada pedido.
+    """
+
+    session_class = ServerSideSession
+
+    def __init__(self, store=None):
+        self.store = store or SQLiteBudgetCache(os.environ.get('SESSION_DB_PATH', 'cache/sessions.db'))
+        # Sessões abandonadas expiram como os orçamentos
+        self.sweeper = start_expiry_sweeper(self.store)
+
+    @staticmethod
+    def _new_sid():
+        return secrets.token_urlsafe(32)
+
+    def open_sid(self, sid):
+        """Sessão guardada com este ID, ou uma nova se o ID for inválido ou desconhecido"""
+        if sid and _SID_PATTERN.match(sid):
+            data = self.store.get_budget(sid)
+            if data is not None:
+                return self.session_class(data, sid=sid)
+        return self.session_class(sid=self._new_sid(), new=True)
+
+    def open_session(self, app, request):
+        return self.open_sid(request.cookies.get(self.get_cookie_name(app)))
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            # Sessão esvaziada: apagar do store e o cookie
+            if session.modified and not session.new:
+                self.store.delete_budget(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        if session.modified:
+            size = self.store.update_budget(session.sid, dict(session))
+            if size:
+                SESSION_PAYLOAD_BYTES.observe(size)
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
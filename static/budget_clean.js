@@ -0,0 +1,3543 @@
+// Script da página do orçamento (extraído de templates/budget_clean.html)
+// Os dados dinâmicos ficam num <script> inline no template (BUDGET_FALLBACK_ANSWERS)
+
+// Função para expandir/colapsar famílias de produtos
+function toggleFamily(familyName) {
+    const productsDiv = document.getElementById('products-' + familyName);
+    const chevron = document.getElementById('chevron-' + familyName);
+
+    if (productsDiv.style.display === 'none') {
+        productsDiv.style.display = 'block';
+        chevron.classList.add('rotated');
+    } else {
+        productsDiv.style.display = 'none';
+        chevron.classList.remove('rotated');
+    }
+}
+
+// Funções para controle de quantidade
+function changeQuantity(productId, change) {
+    const qtyInput = document.getElementById('qty_' + productId);
+    let newQty = parseInt(qtyInput.value) + change;
+    if (newQty < 0) newQty = 0;  // Permitir quantidade 0 para produtos opcionais/alternativos
+    qtyInput.value = newQty;
+    // Ajustar largura do input para o novo valor
+    adjustQtyWidth(qtyInput);
+    updateProductQuantity(productId, newQty);
+}
+
+// Fila de alterações ao orçamento: as mutações feitas na mesma interação (o mesmo
+// clique ou alteração, ex: a Chapa Colaminada e a linha principal) seguem juntas
+// para /budget/batch, que as aplica de forma atómica (um recálculo e uma gravação
+// no servidor). Cada interação é um lote: interações diferentes nunca se juntam,
+// por isso um lote rejeitado só anula as alterações dessa interação.
+const budgetBatch = { queue: [], scheduled: false, inFlight: Promise.resolve() };
+
+function queueBudgetOperation(operation) {
+    return new Promise((resolve, reject) => {
+        budgetBatch.queue.push({ operation, resolve, reject });
+        if (!budgetBatch.scheduled) {
+            // Enviar quando o código desta interação terminar
+            budgetBatch.scheduled = true;
+            queueMicrotask(flushBudgetOperations);
+        }
+    });
+}
+
+function reportRejectedBatch(data, operations) {
+    console.warn('Lote de alterações rejeitado pelo servidor:', data.error, operations);
+    // Com uma só operação quem a enviou mostra o erro; com várias, avisar que nenhuma foi aplicada
+    if (operations.length > 1) {
+        showErrorMessage(`Nenhuma das ${operations.length} alterações foi aplicada: ${data.error || 'erro desconhecido'}`);
+    }
+}
+
+function flushBudgetOperations() {
+    budgetBatch.scheduled = false;
+    const pending = budgetBatch.queue.splice(0);
+    if (!pending.length) return budgetBatch.inFlight;
+    const operations = pending.map(item => item.operation);
+    // Um lote de cada vez, para o servidor aplicar as alterações pela ordem
+    budgetBatch.inFlight = budgetBatch.inFlight.then(() =>
+        fetch('/budget/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ operations })
+        }).then(resp => resp.json())
+    ).then(
+        data => {
+            if (!data.success) reportRejectedBatch(data, operations);
+            pending.forEach(item => item.resolve(data));
+        },
+        err => pending.forEach(item => item.reject(err))
+    );
+    return budgetBatch.inFlight;
+}
+
+// Não perder alterações em fila ao sair da página
+window.addEventListener('pagehide', function() {
+    if (!budgetBatch.queue.length) return;
+    const operations = budgetBatch.queue.splice(0).map(item => item.operation);
+    navigator.sendBeacon('/budget/batch', new Blob([JSON.stringify({ operations })], { type: 'application/json' }));
+});
+
+function updateProductQuantity(productId, quantity) {
+    // Validar quantidade antes de enviar
+    if (quantity === null || quantity === undefined || quantity === '') {
+        quantity = 0;
+    }
+
+    // Permitir vírgula como separador decimal
+    let quantityStr = String(quantity).replace(',', '.');
+    const validQuantity = Math.max(0, parseFloat(quantityStr) || 0);  // Permitir decimais
+
+    // Helper: detectar se um nome corresponde à "Chapa Colaminada" (case-insensitive)
+    function isChapaColaminada(name) {
+        return name && /chapa colaminada/i.test(name);
+    }
+
+    // Obter informação da linha atual (se existir)
+    const currentRow = document.querySelector(`[data-product-id="${productId}"]`);
+    const currentName = currentRow ? currentRow.getAttribute('data-product-name') : null;
+
+    // Tratar caso especial: produtos cerâmicos 102/103 (mantido para compatibilidade)
+    if (productId === '102') {
+        const secondProduct = document.getElementById('qty_103');
+        if (secondProduct) {
+            secondProduct.value = validQuantity;
+            queueBudgetOperation({ op: 'set_quantity', line: '103', value: validQuantity });
+        }
+    } else if (productId === '103') {
+        const firstProduct = document.getElementById('qty_102');
+        if (firstProduct) {
+            firstProduct.value = validQuantity;
+            queueBudgetOperation({ op: 'set_quantity', line: '102', value: validQuantity });
+        }
+    }
+
+    // Se o produto atual for Chapa Colaminada, forçar inteiro e sincronizar com o perfil principal
+    if (isChapaColaminada(currentName)) {
+        const intQty = Math.max(0, Math.round(validQuantity));
+        // Atualizar input visível
+        const input = document.getElementById('qty_' + productId);
+        if (input) input.value = intQty;
+
+        // Se este alternativo aponta para um produto principal, sincronizar o principal
+        const targetId = currentRow ? currentRow.getAttribute('data-alternative-to') : null;
+        if (targetId) {
+            const mainInput = document.getElementById('qty_' + targetId);
+            if (mainInput) {
+                mainInput.value = intQty;
+                // Atualizar principal no servidor
+                queueBudgetOperation({ op: 'set_quantity', line: targetId, value: intQty });
+            }
+        }
+
+        // Enviar atualização do próprio item (Chapa Colaminada)
+        queueBudgetOperation({ op: 'set_quantity', line: productId, value: intQty }).then(data => {
+            if (data && data.success) {
+                applyBudgetTotalsToDOM(data);
+            } else {
+                location.reload();
+            }
+        }).catch(() => location.reload());
+
+        return; // Já tratámos e sincronizámos
+    }
+
+    // Se o produto alterado for o produto principal, procurar alternativas do tipo Chapa Colaminada e sincronizar
+    const altRows = document.querySelectorAll(`[data-alternative-to="${productId}"]`);
+    if (altRows && altRows.length > 0) {
+        altRows.forEach(row => {
+            const altName = row.getAttribute('data-product-name');
+            if (isChapaColaminada(altName)) {
+                const altId = row.getAttribute('data-product-id');
+                const rounded = Math.max(0, Math.round(validQuantity));
+                const altInput = document.getElementById('qty_' + altId);
+                if (altInput) altInput.value = rounded;
+                // Atualizar alternativa no servidor
+                queueBudgetOperation({ op: 'set_quantity', line: altId, value: rounded });
+            }
+        });
+    }
+
+    // Enviar atualização para o servidor para o produto atual
+    queueBudgetOperation({ op: 'set_quantity', line: productId, value: validQuantity }).then(data => {
+        if (data && data.success) {
+            applyBudgetTotalsToDOM(data);
+        } else {
+            // Fallback para reload caso haja erro
+            location.reload();
+        }
+    }).catch(() => {
+        location.reload();
+    });
+}
+
+// Ajusta a largura de um input de quantidade para que o número nunca fique cortado
+function adjustQtyWidth(input) {
+    try {
+        if (!input) return;
+        const value = String(input.value || input.placeholder || '');
+        const cs = window.getComputedStyle(input);
+        // Use a cached canvas for measurements
+        let canvas = adjustQtyWidth._canvas;
+        if (!canvas) {
+            canvas = document.createElement('canvas');
+            adjustQtyWidth._canvas = canvas;
+        }
+        const ctx = canvas.getContext('2d');
+        // Build a font string compatible with canvas
+        // Fallback to font-size + font-family if computed.font is not available
+        const font = cs.font || (cs.fontWeight + ' ' + cs.fontSize + ' ' + cs.fontFamily);
+        ctx.font = font;
+        const metrics = ctx.measureText(value || '0');
+        const textWidth = Math.ceil(metrics.width);
+        // calculate horizontal paddings/borders
+        const padLeft = parseFloat(cs.paddingLeft) || 0;
+        const padRight = parseFloat(cs.paddingRight) || 0;
+        const borderLeft = parseFloat(cs.borderLeftWidth) || 0;
+        const borderRight = parseFloat(cs.borderRightWidth) || 0;
+        const extra = 30; // extra spacing to avoid clipping
+        const minPx = 36; // slightly larger minimum
+        const maxPx = 260; // larger maximum to allow bigger counts
+
+        // If the input uses border-box, width already includes padding/border; otherwise add them
+        const boxSizing = cs.boxSizing || 'content-box';
+        let needed = textWidth + extra;
+        if (boxSizing === 'content-box') {
+            needed += padLeft + padRight + borderLeft + borderRight;
+        }
+
+        const targetPx = Math.min(maxPx, Math.max(minPx, Math.ceil(needed)));
+        input.style.boxSizing = 'border-box';
+        input.style.minWidth = minPx + 'px';
+        input.style.width = targetPx + 'px';
+    } catch (e) {
+        // silently ignore measurement errors
+    }
+}
+
+// Inicializar listeners para ajustar larguras ao digitar e ao carregar
+document.addEventListener('input', (e) => {
+    if (e.target && (e.target.classList && (e.target.classList.contains('qty-input-compact') || e.target.classList.contains('qty-input-small')))) {
+        adjustQtyWidth(e.target);
+    }
+});
+
+document.addEventListener('DOMContentLoaded', () => {
+    // Delay a bit to let fonts render so canvas measurements are accurate
+    setTimeout(() => {
+        document.querySelectorAll('.qty-input-compact, .qty-input-small').forEach(inp => adjustQtyWidth(inp));
+    }, 120);
+});
+
+// Aplica os totais retornados pelo servidor na DOM sem recarregar
+function applyBudgetTotalsToDOM(data) {
+    try {
+        // Atualizar totais por família (base)
+        const familyBases = data.family_totals_base || {};
+        Object.keys(familyBases).forEach(fam => {
+            const container = document.getElementById('products-' + fam);
+            if (container) {
+                // header é o elemento anterior ao container
+                const header = container.previousElementSibling;
+                if (header) {
+                    const totalSpan = header.querySelector('.total-compact');
+                    if (totalSpan) {
+                        totalSpan.textContent = (parseFloat(familyBases[fam]) || 0).toFixed(2) + '€';
+                    }
+                }
+            }
+        });
+
+        // Atualizar totals gerais
+        const totalWithIva = parseFloat(data.total_with_iva || 0).toFixed(2);
+        const subtotal = parseFloat(data.subtotal_with_margin || data.total_price || 0).toFixed(2);
+        const totalElem = document.querySelector('.total-amount');
+        const subtotalElem = document.querySelector('.total-before-iva');
+        if (totalElem) totalElem.textContent = '€' + totalWithIva;
+        if (subtotalElem) subtotalElem.textContent = 'S/ IVA: €' + subtotal;
+
+        // Atualizar preços parciais por item (price * quantity)
+        document.querySelectorAll('[data-product-id]').forEach(row => {
+            try {
+                const pid = row.getAttribute('data-product-id');
+                // Encontrar input de quantidade
+                const qtyInput = document.getElementById('qty_' + pid);
+                const qty = qtyInput ? parseFloat(String(qtyInput.value).replace(',', '.')) || 0 : 0;
+                // Tentar obter preço unitário: primeiro editable-price data, senão parse spec-price
+                let unitPrice = null;
+                const editable = row.querySelector('.editable-price');
+                if (editable && editable.dataset && editable.dataset.originalPrice) {
+                    unitPrice = parseFloat(editable.dataset.originalprice || editable.dataset.originalPrice || editable.textContent) || null;
+                }
+                if (unitPrice === null) {
+                    const spec = row.querySelector('.spec-price');
+                    if (spec) {
+                        // Extrair primeiro número encontrado
+                        const m = spec.textContent.match(/\d+[\.,]?\d*/);
+                        if (m) unitPrice = parseFloat(m[0].replace(',', '.')) || 0;
+                    }
+                }
+                if (unitPrice !== null) {
+                    const partial = (unitPrice * qty) || 0;
+                    const partialElem = row.querySelector('.price-total-compact');
+                    if (partialElem) partialElem.textContent = partial.toFixed(2) + '€';
+                }
+
+                // Atualizar badge de quantidade (spec-qty)
+                const specQty = row.querySelector('.spec-qty');
+                if (specQty) {
+                    try {
+                        specQty.textContent = 'Qtd: ' + qty.toFixed(2);
+                    } catch (e) {
+                        specQty.textContent = 'Qtd: ' + String(qty);
+                    }
+                }
+            } catch (e) {
+                // ignore per-item errors
+            }
+        });
+
+        // Opcional: mostrar notificação rápida
+        const notif = document.createElement('div');
+        notif.style.cssText = 'position:fixed;top:18px;right:18px;background:#059669;color:#fff;padding:10px 14px;border-radius:8px;z-index:1200;box-shadow:0 6px 18px rgba(0,0,0,0.15);font-weight:700;';
+        notif.textContent = 'Quantidade atualizada';
+        document.body.appendChild(notif);
+        setTimeout(() => notif.remove(), 1200);
+    } catch (e) {
+        // Fallback: recarregar se algo falhar
+        console.error('Erro ao aplicar totais na DOM:', e);
+        location.reload();
+    }
+}
+
+// Função para alternar produtos opcionais (incluir/excluir)
+// Função para incluir produto opcional no orçamento
+function includeOptionalProduct(productId, familyName) {
+    const quantityInput = document.getElementById('qty_' + productId);
+    const quantity = parseInt(quantityInput.value) || 1;
+
+    // Se quantidade for 0, definir como 1 ao incluir
+    const finalQuantity = quantity === 0 ? 1 : quantity;
+
+    fetch('/include_optional_product', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            product_id: productId,
+            family: familyName,
+            quantity: finalQuantity
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            // Mostrar feedback de sucesso
+            const successDiv = document.createElement('div');
+            successDiv.style.cssText = `
+                position: fixed;
+                top: 20px;
+                right: 20px;
+                background: linear-gradient(135deg, #10b981, #059669);
+                color: white;
+                padding: 15px 25px;
+                border-radius: 8px;
+                box-shadow: 0 8px 25px rgba(16, 185, 129, 0.3);
+                z-index: 1001;
+                font-weight: 600;
+            `;
+            successDiv.innerHTML = `<i class="fas fa-check-circle"></i> Produto incluído no orçamento`;
+            document.body.appendChild(successDiv);
+
+            setTimeout(() => {
+                successDiv.remove();
+            }, 3000);
+
+            setTimeout(() => location.reload(), 1000);
+        } else {
+            alert('Erro ao incluir produto: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Erro:', error);
+        alert('Erro ao comunicar com o servidor');
+    });
+}
+
+function toggleOptional(productId) {
+    const button = document.getElementById('toggle_' + productId);
+    const isActive = button.classList.contains('active');
+
+    queueBudgetOperation({ op: 'toggle_optional', line: productId, include: !isActive }).then(() => {
+        location.reload(); // Recarregar para atualizar preços
+    });
+}
+
+// Função para trocar produto opcional por incluído
+function replaceProduct(familyName, productId) {
+    console.log('DEBUG: familyName recebido:', familyName);
+    console.log('DEBUG: productId recebido:', productId);
+
+    fetch('/switch_product', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            family: familyName,
+            item_id: productId
+        })
+    }).then(response => response.json())
+    .then(data => {
+        console.log('DEBUG: Resposta do servidor:', data);
+        if (data.success) {
+            location.reload(); // Recarregar para atualizar a interface
+        } else {
+            alert('Erro ao trocar produto: ' + data.error);
+        }
+    }).catch(error => {
+        console.error('Erro:', error);
+        alert('Erro ao trocar produto');
+    });
+}
+
+// Função para exportar PDF
+function updateQuantity(family, productId, newQuantity) {
+    newQuantity = Math.max(0, parseInt(newQuantity));
+
+    fetch('/update_budget', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            family: family,
+            item_id: productId,
+            quantity: newQuantity
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            // Atualizar a interface
+            location.reload();
+        } else {
+            alert('Erro ao atualizar quantidade: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Erro:', error);
+        alert('Erro ao atualizar quantidade');
+    });
+}
+
+function switchProduct(family, productId) {
+    fetch('/switch_product', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            family: family,
+            item_id: productId
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            // Atualizar a interface
+            location.reload();
+        } else {
+            alert('Erro ao trocar produto: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Erro:', error);
+        alert('Erro ao trocar produto');
+    });
+}
+
+// Função para mostrar alternativas disponíveis da base de dados
+let selectedAlternative = null;
+let currentSelection = null;
+
+function showAlternatives(family, currentProductId) {
+    // Buscar alternativas da base de dados
+    fetch(`/get_alternatives/${family}/${currentProductId}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                alert('Erro ao buscar alternativas: ' + data.error);
+                return;
+            }
+
+            if (data.alternatives.length === 0) {
+                alert('Não existem alternativas disponíveis para este produto.');
+                return;
+            }
+
+            selectedAlternative = null;
+            currentSelection = {family, currentProductId, data};
+
+            let optionsHTML = `
+                <div style="max-width: 650px; width: 90vw;">
+                    <div style="background: linear-gradient(135deg, #f8fafc 0%, #e2e8f0 100%); border-radius: 16px 16px 0 0; padding: 24px; border-bottom: 3px solid #3b82f6;">
+                        <h3 style="color: #1e293b; margin: 0 0 8px 0; font-size: 22px; font-weight: 700; display: flex; align-items: center; gap: 12px;">
+                            <i class="fas fa-exchange-alt" style="color: #3b82f6; background: white; padding: 8px; border-radius: 50%; box-shadow: 0 2px 8px rgba(59, 130, 246, 0.2);"></i>
+                            Selecionar Alternativa
+                        </h3>
+                        <p style="color: #64748b; margin: 0; font-size: 14px;">Escolha a melhor opção para o seu projeto</p>
+                    </div>
+
+                    <div style="padding: 24px; background: white;">
+                        <div style="margin-bottom: 24px; padding: 16px; background: linear-gradient(135deg, #dbeafe 0%, #bfdbfe 100%); border-radius: 12px; border: 2px solid #3b82f6; position: relative; overflow: hidden;">
+                            <div style="position: absolute; top: 0; right: 0; background: #3b82f6; color: white; padding: 4px 12px; border-radius: 0 10px 0 8px; font-size: 12px; font-weight: 600;">ATUAL</div>
+                            <div style="font-weight: 700; color: #1e293b; margin-bottom: 6px; font-size: 16px;">${data.current_product.name}</div>
+                            <div style="display: flex; justify-content: space-between; align-items: center;">
+                                <span style="color: #6b7280; font-size: 14px;">Produto atual selecionado</span>
+                                <span style="color: #3b82f6; font-weight: 800; font-size: 18px;">${data.current_product.price.toFixed(2)}€</span>
+                            </div>
+                        </div>
+
+                        <div style="margin-bottom: 20px;">
+                            <h4 style="color: #374151; margin-bottom: 16px; font-size: 16px; font-weight: 600; display: flex; align-items: center; gap: 8px;">
+                                <i class="fas fa-list-alt" style="color: #6b7280;"></i>
+                                Alternativas Disponíveis
+                            </h4>
+                            <div style="display: grid; gap: 12px; max-height: 400px; overflow-y: auto; padding-right: 8px;">
+            `;
+
+            data.alternatives.forEach((alt, index) => {
+                const priceDiff = alt.price - data.current_product.price;
+                const diffText = priceDiff > 0 ? `+${priceDiff.toFixed(2)}€` : `${priceDiff.toFixed(2)}€`;
+                const diffColor = priceDiff > 0 ? '#ef4444' : '#10b981';
+
+                optionsHTML += `
+                    <div class="alternative-option" data-id="${alt.id}" onclick="selectAlternativeOption('${alt.id}')" 
+                         style="
+                             padding: 16px 20px; 
+                             border: 2px solid #e2e8f0;
+                             border-radius: 12px; 
+                             cursor: pointer; 
+                             transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+                             background: linear-gradient(135deg, #ffffff 0%, #f8fafc 100%);
+                             position: relative;
+                             overflow: hidden;
+                         ">
+                        <div style="position: absolute; top: 0; left: 0; width: 4px; height: 100%; background: #e2e8f0; transition: all 0.3s ease;"></div>
+                        <div style="display: flex; justify-content: space-between; align-items: flex-start; margin-bottom: 8px;">
+                            <div style="flex: 1;">
+                                <div style="font-weight: 600; color: #1e293b; margin-bottom: 4px; font-size: 16px;">${alt.name}</div>
+                                ${alt.description ? `<div style="color: #6b7280; font-size: 13px; line-height: 1.4;">${alt.description}</div>` : ''}
+                            </div>
+                            <div style="text-align: right; margin-left: 16px;">
+                                <div style="color: #0ea5e9; font-weight: 700; font-size: 18px;">${alt.price.toFixed(2)}€</div>
+                                <div style="color: ${diffColor}; font-size: 12px; font-weight: 600; margin-top: 2px;">${diffText}</div>
+                            </div>
+                        </div>
+                        <div style="display: flex; justify-content: space-between; align-items: center; margin-top: 12px;">
+                            <div style="display: flex; gap: 8px;">
+                                ${Object.keys(alt.attributes || {})
+                                    .filter(key => !['Capacidade', 'capacidade', 'Diametro', 'diametro', 'Diâmetro'].includes(key))
+                                    .slice(0, 2)
+                                    .map(key => 
+                                        `<span style="background: #f1f5f9; color: #475569; padding: 2px 8px; border-radius: 4px; font-size: 11px; font-weight: 500;">${key}: ${alt.attributes[key]}</span>`
+                                    ).join('')}
+                            </div>
+                            <div class="selection-indicator" style="opacity: 0; color: #10b981; font-size: 12px; font-weight: 600; display: flex; align-items: center; gap: 4px; transition: opacity 0.3s ease;">
+                                <i class="fas fa-check-circle"></i> Selecionado
+                            </div>
+                        </div>
+                    </div>
+                `;
+            });
+
+            optionsHTML += `
+                            </div>
+                        </div>
+
+                        <div style="display: flex; gap: 12px; justify-content: flex-end; padding-top: 20px; border-top: 1px solid #e2e8f0;">
+                            <button onclick="closeAlternativesModal()" 
+                                    style="background: #6b7280; color: white; border: none; padding: 12px 24px; border-radius: 8px; cursor: pointer; font-weight: 500; font-size: 14px; transition: all 0.2s ease;"
+                                    onmouseover="this.style.background='#4b5563'"
+                                    onmouseout="this.style.background='#6b7280'">
+                                <i class="fas fa-times"></i> Cancelar
+                            </button>
+                            <button id="confirmButton" onclick="confirmSelection()" 
+                                    style="background: #d1d5db; color: #9ca3af; border: none; padding: 12px 24px; border-radius: 8px; cursor: not-allowed; font-weight: 600; font-size: 14px; transition: all 0.3s ease;"
+                                    disabled>
+                                <i class="fas fa-check"></i> Confirmar Seleção
+                            </button>
+                        </div>
+                    </div>
+                </div>
+            `;
+
+            // Criar modal
+            const modal = document.createElement('div');
+            modal.id = 'alternativesModal';
+            modal.style.cssText = `
+                position: fixed; 
+                top: 0; left: 0; 
+                width: 100%; height: 100%; 
+                background: rgba(0,0,0,0.7); 
+                display: flex; 
+                justify-content: center; 
+                align-items: center; 
+                z-index: 1000;
+                backdrop-filter: blur(6px);
+                animation: fadeIn 0.3s ease;
+            `;
+
+            modal.innerHTML = `
+                <div style="background: white; border-radius: 16px; box-shadow: 0 25px 50px -12px rgba(0, 0, 0, 0.25); max-width: 95vw; max-height: 95vh; overflow: hidden; animation: slideUp 0.3s ease;">
+                    ${optionsHTML}
+                </div>
+            `;
+
+            document.body.appendChild(modal);
+
+            // Adicionar estilos de animação
+            if (!document.getElementById('modalAnimations')) {
+                const style = document.createElement('style');
+                style.id = 'modalAnimations';
+                style.textContent = `
+                    @keyframes fadeIn {
+                        from { opacity: 0; }
+                        to { opacity: 1; }
+                    }
+                    @keyframes slideUp {
+                        from { opacity: 0; transform: translateY(50px) scale(0.95); }
+                        to { opacity: 1; transform: translateY(0) scale(1); }
+                    }
+                    @keyframes slideInRight {
+                        from { opacity: 0; transform: translateX(100px); }
+                        to { opacity: 1; transform: translateX(0); }
+                    }
+                `;
+                document.head.appendChild(style);
+            }
+        })
+        .catch(error => {
+            console.error('Erro ao buscar alternativas:', error);
+            alert('Erro ao buscar alternativas. Tente novamente.');
+        });
+}
+
+function selectAlternativeOption(altId) {
+    // Remover seleção anterior
+    document.querySelectorAll('.alternative-option').forEach(option => {
+        option.style.borderColor = '#e2e8f0';
+        option.style.background = 'linear-gradient(135deg, #ffffff 0%, #f8fafc 100%)';
+        option.style.transform = 'none';
+        option.querySelector('.selection-indicator').style.opacity = '0';
+        option.querySelector('div[style*="position: absolute"]').style.background = '#e2e8f0';
+    });
+
+    // Aplicar seleção atual
+    const selectedOption = document.querySelector(`[data-id="${altId}"]`);
+    selectedOption.style.borderColor = '#10b981';
+    selectedOption.style.background = 'linear-gradient(135deg, #f0fdf4 0%, #dcfce7 100%)';
+    selectedOption.style.transform = 'translateY(-2px)';
+    selectedOption.style.boxShadow = '0 8px 25px rgba(16, 185, 129, 0.15)';
+    selectedOption.querySelector('.selection-indicator').style.opacity = '1';
+    selectedOption.querySelector('div[style*="position: absolute"]').style.background = '#10b981';
+
+    // Ativar botão de confirmação
+    const confirmBtn = document.getElementById('confirmButton');
+    confirmBtn.disabled = false;
+    confirmBtn.style.background = 'linear-gradient(135deg, #10b981 0%, #059669 100%)';
+    confirmBtn.style.color = 'white';
+    confirmBtn.style.cursor = 'pointer';
+    confirmBtn.style.boxShadow = '0 4px 12px rgba(16, 185, 129, 0.3)';
+
+    // Armazenar seleção
+    selectedAlternative = altId;
+}
+
+function confirmSelection() {
+    if (!selectedAlternative || !currentSelection) {
+        return;
+    }
+
+    const { family, currentProductId } = currentSelection;
+
+    // Fazer a chamada para o backend
+    fetch('/replace_product', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            family: family,
+            current_product_id: currentProductId,
+            new_product_id: selectedAlternative
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            // Mostrar feedback de sucesso
+            const successDiv = document.createElement('div');
+            successDiv.style.cssText = `
+                position: fixed;
+                top: 20px;
+                right: 20px;
+                background: linear-gradient(135deg, #10b981 0%, #059669 100%);
+                color: white;
+                padding: 16px 24px;
+                border-radius: 8px;
+                box-shadow: 0 8px 25px rgba(16, 185, 129, 0.3);
+                z-index: 1001;
+                animation: slideInRight 0.3s ease;
+                font-weight: 600;
+            `;
+            successDiv.innerHTML = `<i class="fas fa-check-circle"></i> ${data.message}`;
+            document.body.appendChild(successDiv);
+
+            setTimeout(() => {
+                successDiv.remove();
+            }, 3000);
+
+            closeAlternativesModal();
+            setTimeout(() => location.reload(), 1000); // Recarregar após mostrar o feedback
+        } else {
+            alert('Erro ao trocar produto: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Erro:', error);
+        alert('Erro ao comunicar com o servidor');
+    });
+}
+
+function selectAlternative(family, currentProductId, newProductId) {
+    // Esta função é mantida para compatibilidade, mas não é mais usada
+    // A nova lógica usa selectAlternativeOption e confirmSelection
+}
+
+function closeAlternativesModal() {
+    const modal = document.getElementById('alternativesModal');
+    if (modal) {
+        modal.remove();
+    }
+}
+
+// Marcar produto como Oferta (não conta para o total)
+function setOffer(familyName, productId) {
+    if (!confirm('Marcar este produto como Oferta? Ele não contará para o total.')) return;
+    queueBudgetOperation({ op: 'set_type', family: familyName, line: productId, value: 'oferta' }).then(data => {
+        if (data.success) {
+            const info = document.createElement('div');
+            info.style.cssText = 'position:fixed;top:20px;right:20px;background:linear-gradient(135deg,#f59e0b,#d97706);padding:12px 18px;color:white;border-radius:8px;z-index:1001;font-weight:700;';
+            info.innerText = 'Produto marcado como Oferta';
+            document.body.appendChild(info);
+            setTimeout(() => info.remove(), 2500);
+            setTimeout(() => location.reload(), 900);
+        } else {
+            alert('Falha ao marcar como Oferta: ' + (data.error || 'erro desconhecido'));
+        }
+    }).catch(err => { console.error(err); alert('Erro ao comunicar com o servidor'); });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    // Animações de entrada sequencial
+    const cards = document.querySelectorAll('.slide-up');
+    cards.forEach((card, index) => {
+        card.style.opacity = '0';
+        card.style.transform = 'translateY(30px)';
+
+        setTimeout(() => {
+            card.style.transition = 'all 0.8s ease-out';
+            card.style.opacity = '1';
+            card.style.transform = 'translateY(0)';
+        }, index * 200);
+    });
+
+    // Adicionar ouvintes para aceitar vírgulas nos campos de quantidade
+    const quantityInputs = document.querySelectorAll('input[type="number"]');
+    quantityInputs.forEach(input => {
+        if (input.id && input.id.startsWith('qty_')) {
+            // Permitir vírgula como separador decimal
+            input.addEventListener('input', function(e) {
+                let value = e.target.value;
+                // Substituir vírgula por ponto para validação
+                if (value.includes(',')) {
+                    e.target.value = value.replace(',', '.');
+                }
+            });
+
+            // Tratar evento blur para normalizar o valor
+            input.addEventListener('blur', function(e) {
+                let value = parseFloat(e.target.value.replace(',', '.')) || 0;
+                if (value < 0) value = 0;
+                e.target.value = value.toFixed(2);
+            });
+        }
+    });
+});
+
+// ==========================================
+// FUNÇÕES PARA REMOVER PRODUTOS
+// ==========================================
+
+function removeProduct(productId, familyName) {
+    if (!confirm('Tem certeza que deseja remover este produto do orçamento?')) {
+        return;
+    }
+
+    fetch('/remove_product', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            product_id: productId,
+            family: familyName
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            // Mostrar feedback de sucesso
+            const successDiv = document.createElement('div');
+            successDiv.style.cssText = `
+                position: fixed;
+                top: 20px;
+                right: 20px;
+                background: linear-gradient(135deg, #10b981, #059669);
+                color: white;
+                padding: 15px 25px;
+                border-radius: 8px;
+                box-shadow: 0 8px 25px rgba(16, 185, 129, 0.3);
+                z-index: 1001;
+                animation: slideInRight 0.3s ease;
+                font-weight: 600;
+            `;
+            successDiv.innerHTML = `<i class="fas fa-trash-alt"></i> ${data.message}`;
+            document.body.appendChild(successDiv);
+
+            setTimeout(() => {
+                successDiv.remove();
+            }, 3000);
+
+            setTimeout(() => location.reload(), 1000);
+        } else {
+            alert('Erro ao remover produto: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Erro:', error);
+        alert('Erro ao comunicar com o servidor');
+    });
+}
+
+// ==========================================
+// FUNÇÕES PARA ADICIONAR NOVOS PRODUTOS
+// ==========================================
+
+function showAddProductModal() {
+    // Buscar famílias disponíveis (deixar o servidor filtrar por famílias com produtos)
+    fetch('/get_product_families')
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            createAddProductModal(data.families);
+        } else {
+            alert('Erro ao buscar famílias: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Erro:', error);
+        alert('Erro ao comunicar com o servidor');
+    });
+}
+
+function createAddProductModal(families) {
+    // Remover modal existente se houver
+    const existingModal = document.getElementById('addProductModal');
+    if (existingModal) {
+        existingModal.remove();
+    }
+
+    // Ensure modal-specific styles exist and are appended last so they win over other CSS.
+    if (!document.getElementById('addProductModalStyles')) {
+        const modalStyle = document.createElement('style');
+        modalStyle.id = 'addProductModalStyles';
+        modalStyle.innerHTML = `
+        /* Modal-specific overrides to guarantee button visuals and hover */
+        #addProductModal .add-product-modal-footer {
+            position: relative !important;
+            display: flex !important;
+            justify-content: space-between !important;
+            align-items: center !important;
+            padding: 1rem 1.5rem !important;
+            gap: 8px !important;
+        }
+
+        /* Back button: redesigned to match Close (symmetry and polish) */
+        #addProductModal .add-product-modal-footer .modal-back-btn {
+            margin: 0 12px 0 0 !important;
+            padding: 0.62rem 1.05rem !important;
+            border-radius: 12px !important;
+            background: linear-gradient(90deg,#556070,#3f4952) !important;
+            color: #fff !important;
+            box-shadow: 0 10px 26px rgba(46,60,73,0.07) !important;
+            border: 1px solid rgba(0,0,0,0.06) !important;
+            display: inline-flex !important;
+            align-items: center !important;
+            gap: 0.5rem !important;
+            font-weight: 700 !important;
+        }
+
+        #addProductModal .add-product-modal-footer .modal-back-btn:hover {
+            transform: translateY(-6px) scale(1.02) !important;
+            box-shadow: 0 18px 38px rgba(46,60,73,0.14) !important;
+            background: linear-gradient(90deg,#717986,#3f4952) !important;
+        }
+
+        #addProductModal .add-product-modal-footer .modal-back-btn:focus {
+            outline: none !important;
+            box-shadow: 0 0 0 6px rgba(59,130,246,0.08) !important;
+        }
+
+        /* Close button (keeps previous polished look) */
+        #addProductModal .add-product-modal-footer .modal-close-btn {
+            margin-left: auto !important;
+            padding: 1.3rem 2.5rem !important;
+            border-radius: 12px !important;
+            background: linear-gradient(90deg,#ef4444,#dc2626) !important;
+            color: #fff !important;
+            box-shadow: 0 10px 26px rgba(220,38,38,0.07) !important;
+            z-index: 60 !important;
+            font-weight: 700 !important;
+            border:none;
+            transition: 0.2s ease-in-out;
+        }
+
+        #addProductModal .add-product-modal-footer .modal-close-btn:hover {
+            transform: translateY(-6px) scale(1.02) !important;
+            box-shadow: 0 18px 44px rgba(220,38,38,0.22) !important;
+            background: linear-gradient(90deg,#ff6b6b,#ef4444) !important;
+        }
+        `;
+        document.head.appendChild(modalStyle);
+    }
+
+    // Small CSS tweaks for compact family cards (no index/sidebar in family chooser)
+    (function injectExtra(){
+        const extraId = 'addProductModalExtraStyles';
+        if (document.getElementById(extraId)) return;
+        const s = document.createElement('style'); s.id = extraId; s.innerHTML = `
+        /* Layout for family chooser */
+        #addProductModal .add-product-layout { display:block; }
+        #addProductModal .family-cards-area { overflow:auto; max-height:420px; }
+        #addProductModal .family-grid.compact { display:grid; grid-template-columns: repeat(auto-fit, minmax(180px, 1fr)); gap:12px; }
+        #addProductModal .family-card-modal.compact { display:flex; gap:12px; align-items:center; padding:12px; border-radius:12px; background:white; border:1px solid #eef2f7; cursor:pointer; transition:all .15s ease; box-shadow:0 6px 20px rgba(15,23,42,0.04); }
+        #addProductModal .family-card-modal.compact .family-icon { width:44px; height:44px; border-radius:10px; background:linear-gradient(135deg,#eef2ff,#f0f9ff); display:flex; align-items:center; justify-content:center; color:#2563eb; font-size:1.15rem; }
+        #addProductModal .family-card-modal.compact .family-meta { display:flex; flex-direction:column; }
+        #addProductModal .family-card-modal.compact .family-title { font-weight:700; color:#0f172a; }
+        #addProductModal .family-card-modal.compact .family-count { font-size:0.85rem; color:#6b7280; }
+        #addProductModal .family-card-modal.compact:hover { transform:translateY(-6px); box-shadow: 0 18px 36px rgba(15,23,42,0.08); border-color:#dbeafe; }
+        @media (max-width: 820px) {
+            #addProductModal .family-grid.compact { grid-template-columns: repeat(2, 1fr); }
+        }
+        `; document.head.appendChild(s);
+    })();
+
+    // Ícones para famílias
+    const familyIcons = {
+        'Filtração': 'fa-filter',
+        'Recirculação e Iluminação': 'fa-water',
+        'Tratamento de Água': 'fa-flask',
+        'Aquecimento': 'fa-thermometer-half',
+        'Iluminação': 'fa-lightbulb',
+        'Automação': 'fa-robot',
+        'Limpeza': 'fa-broom',
+        'Acessórios': 'fa-wrench',
+        'Construção da Piscina': 'fa-hammer',
+        'Construção da Laje': 'fa-layer-group',
+        'Bordadura': 'fa-border-top-left'
+    };
+
+    // Debug: mostrar families recebidas (ajuda a entender por que só aparece uma)
+    try { console.log('createAddProductModal - families.count=', families.length, 'names=', families.map(f => f.name)); } catch(e) {}
+
+    // Normalizar e remover famílias duplicadas (mesmo nome, diferenças de caixa/espacos)
+    const seenFamilies = new Set();
+    const uniqueFamilies = [];
+    families.forEach(f => {
+        const key = (f.name || '').toString().trim().toLowerCase();
+        if (!seenFamilies.has(key)) {
+            seenFamilies.add(key);
+            uniqueFamilies.push(f);
+        }
+    });
+
+    // Safety guard: only render families that actually have products
+    const familiesWithProducts = uniqueFamilies.filter(f => (f.product_count || 0) > 0);
+
+    const modal = document.createElement('div');
+    modal.id = 'addProductModal';
+    modal.className = 'add-product-modal';
+
+    modal.innerHTML = `
+        <div class="add-product-modal-content">
+            <div class="add-product-modal-header">
+                <h3>
+                    <i class="fas fa-plus-circle"></i>
+                    Adicionar Novo Produto
+                </h3>
+            </div>
+            <div class="add-product-modal-body">
+                <div class="add-product-layout">
+                    <section class="family-cards-area" id="familyCardsArea">
+                        <p style="color: #64748b; margin-bottom: 0.5rem;">Selecione a família do produto:</p>
+                        <div class="family-grid compact">
+                            ${uniqueFamilies.map(family => {
+                                const displayName = family.name || '';
+                                const slug = family.name_slug || displayName.normalize('NFKD').replace(/\p{Diacritic}/gu, '').replace(/[^a-zA-Z0-9]+/g, '_').toLowerCase();
+                                const icon = familyIcons[displayName] || 'fa-box';
+                                const count = family.product_count || 0;
+                                return `
+                                <div class="family-card-modal compact" id="fam_${slug}" onclick="showFamilyProducts('${slug}')">
+                                    <div class="family-icon">
+                                        <i class="fas ${icon}"></i>
+                                    </div>
+                                    <div class="family-meta">
+                                        <div class="family-title">${displayName}</div>
+                                        <div class="family-count">${count}</div>
+                                    </div>
+                                </div>
+                            `}).join('')}
+                        </div>
+                    </section>
+                </div>
+                <div id="productSelection" style="display: none;">
+                    <!-- Produtos serão carregados aqui -->
+                </div>
+            </div>
+            <div class="add-product-modal-footer">
+                <div id="modalBackButton" style="display: none;">
+                    <button class="modal-back-btn" onclick="backToFamilies()">
+                        <i class="fas fa-arrow-left"></i>
+                        Voltar às Famílias
+                    </button>
+                </div>
+                <div>
+                    <button class="modal-close-btn" onclick="closeAddProductModal()">
+                        <i class="fas fa-times"></i>
+                        Fechar
+                    </button>
+                </div>
+            </div>
+        </div>
+    `;
+
+    document.body.appendChild(modal);
+    // Pre-fill new fields based on existing displayed values or defaults
+    try {
+        const answersMap = {};
+        // attempt to read from the dashboard values if available
+        answersMap.tratamento_agua = document.querySelector('.value-treatment') ? document.querySelector('.value-treatment').textContent.trim().toLowerCase().replace(/\s+/g,'_') : null;
+        answersMap.tipo_construcao = document.querySelector('.value-construction') ? (document.querySelector('.value-construction').textContent.trim().toLowerCase().includes('remodel') ? 'remodelacao' : 'nova') : null;
+        answersMap.cobertura = document.querySelector('.value-coverage') ? document.querySelector('.value-coverage').textContent.trim().toLowerCase() : null;
+        answersMap.casa_maquinas_abaixo = document.querySelector('.value-machine-room') ? (document.querySelector('.value-machine-room').textContent.includes('Abaixo') ? 'sim' : 'nao') : null;
+        answersMap.casa_maquinas_desc = document.querySelector('.value-machine-desc') ? document.querySelector('.value-machine-desc').textContent.trim() : null;
+        answersMap.tipo_luzes = document.querySelector('.value-light-type') ? document.querySelector('.value-light-type').textContent.trim().toLowerCase().replace(/\s+/g,'_') : null;
+
+        if (answersMap.tratamento_agua && document.getElementById('edit-treatment')) document.getElementById('edit-treatment').value = answersMap.tratamento_agua;
+        if (answersMap.tipo_construcao && document.getElementById('edit-construction')) document.getElementById('edit-construction').value = answersMap.tipo_construcao;
+        if (answersMap.cobertura && document.getElementById('edit-coverage')) document.getElementById('edit-coverage').value = answersMap.cobertura;
+        if (answersMap.casa_maquinas_abaixo && document.getElementById('edit-machine-room')) document.getElementById('edit-machine-room').value = answersMap.casa_maquinas_abaixo;
+        if (answersMap.casa_maquinas_desc && document.getElementById('edit-machine-desc')) document.getElementById('edit-machine-desc').value = answersMap.casa_maquinas_desc;
+        if (answersMap.tipo_luzes && document.getElementById('edit-light-type')) {
+            const t = answersMap.tipo_luzes;
+            if (t.includes('rgb')) document.getElementById('edit-light-type').value = 'rgb';
+            else if (t.includes('adapt')) document.getElementById('edit-light-type').value = 'branco_adaptavel';
+            else document.getElementById('edit-light-type').value = 'branco_frio';
+        }
+
+        // handle coverage laminas visibility
+        const coverageSelect = document.getElementById('edit-coverage');
+        const laminasGroup = document.getElementById('edit-coverage-laminas-group');
+        if (coverageSelect && laminasGroup) {
+            function updateLaminasVisibility() {
+                if (coverageSelect.value === 'laminas') laminasGroup.style.display = 'block';
+                else laminasGroup.style.display = 'none';
+            }
+            coverageSelect.addEventListener('change', updateLaminasVisibility);
+            updateLaminasVisibility();
+        }
+    } catch (err) {
+        console.warn('Pre-fill modal fields failed', err);
+    }
+
+    // Animação de entrada
+    setTimeout(() => {
+        modal.classList.add('show');
+    }, 10);
+
+    // Wire index clicks to smooth-scroll to category cards
+    try {
+        setTimeout(()=>{
+            const indexLinks = modal.querySelectorAll('.index-link');
+            indexLinks.forEach(link => {
+                link.addEventListener('click', (ev)=>{
+                    ev.preventDefault();
+                    const target = link.dataset.target;
+                    const el = document.getElementById('fam_' + target);
+                    if (el) {
+                        el.scrollIntoView({behavior: 'smooth', block: 'center'});
+                        // highlight briefly
+                        el.classList.add('highlight');
+                        setTimeout(()=> el.classList.remove('highlight'), 1200);
+                    }
+                });
+            });
+        }, 50);
+    } catch(e) { console.warn('index wiring failed', e); }
+
+    // Fechar ao clicar fora do modal
+    modal.addEventListener('click', (e) => {
+        if (e.target === modal) {
+            closeAddProductModal();
+        }
+    });
+}
+
+function showFamilyProducts(familyName) {
+    fetch(`/get_family_products/${encodeURIComponent(familyName)}`)
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            displayFamilyProducts(familyName, data.products);
+        } else {
+            alert('Erro ao buscar produtos: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Erro:', error);
+        alert('Erro ao comunicar com o servidor');
+    });
+}
+
+function displayFamilyProducts(familyName, products) {
+    // Use modal-scoped selectors; fall back to global IDs if modal absent
+    const modal = document.getElementById('addProductModal');
+    const familyDiv = modal ? modal.querySelector('#familyCardsArea') : document.getElementById('familySelection');
+    const productDiv = modal ? modal.querySelector('#productSelection') : document.getElementById('productSelection');
+    const backButton = modal ? modal.querySelector('#modalBackButton') : document.getElementById('modalBackButton');
+
+    if (!productDiv) {
+        console.error('displayFamilyProducts: product container not found (productSelection)');
+        return;
+    }
+
+    if (familyDiv && familyDiv.style) familyDiv.style.display = 'none';
+    productDiv.style.display = 'block';
+    if (backButton && backButton.style) backButton.style.display = 'block';
+
+    // Inject product-modal specific styles once
+    (function injectProductStyles(){
+        const id = 'productModalStyles';
+        if (document.getElementById(id)) return;
+        const st = document.createElement('style'); st.id = id; st.innerHTML = `
+        /* Modern compact product modal styles */
+        .product-modal-wrap { display:flex; gap:18px; align-items:flex-start; }
+        .product-grid { display:grid; grid-template-columns: repeat(auto-fit, minmax(240px, 1fr)); gap:14px; width:100%; }
+        .product-card { background:linear-gradient(180deg,#ffffff,#fbfdff); border:1px solid #e6eef8; border-radius:12px; padding:12px; box-shadow:0 10px 30px rgba(15,23,42,0.06); display:flex; flex-direction:column; gap:10px; transition:transform .16s cubic-bezier(.2,.9,.3,1), box-shadow .16s; }
+        .product-card:hover { transform:translateY(-6px); box-shadow:0 22px 42px rgba(15,23,42,0.12); }
+        .product-card .pc-top { display:flex; align-items:flex-start; gap:12px; }
+        .product-thumb { width:56px; height:56px; flex:0 0 56px; border-radius:10px; background:linear-gradient(135deg,#eef6ff,#f0fbff); display:flex; align-items:center; justify-content:center; color:#0b66c2; font-size:1.05rem; font-weight:800; }
+        .product-meta { display:flex; flex-direction:column; gap:2px; }
+        .product-title { font-weight:800; color:#0f172a; font-size:0.98rem; line-height:1.1; }
+        .product-cat { font-size:0.78rem; color:#6b7280; }
+        .product-desc { font-size:0.86rem; color:#475569; min-height:44px; display:-webkit-box; -webkit-line-clamp:3; -webkit-box-orient:vertical; overflow:hidden; }
+        .product-footer { display:flex; justify-content:space-between; align-items:center; gap:8px; }
+        .product-price { font-weight:900; color:#0b76d6; background:rgba(11,118,214,0.06); padding:6px 10px; border-radius:8px; }
+        .product-actions { display:flex; gap:8px; }
+        .product-action-btn { padding:6px 10px; border-radius:8px; border:0; cursor:pointer; font-weight:700; font-size:0.85rem; display:inline-flex; align-items:center; gap:8px; transition: transform 0.16s cubic-bezier(.2,.9,.3,1), box-shadow 0.16s ease, background 0.12s ease; will-change: transform, box-shadow; }
+        .product-action-btn i { font-size:0.9rem; }
+        .product-action-btn.include { background:linear-gradient(90deg,#06b58a,#05906b); color:white; }
+        .product-action-btn.include:hover { transform: translateY(-4px) scale(1.03); box-shadow: 0 14px 38px rgba(16, 185, 129, 0.18); }
+        .product-action-btn.optional { background:linear-gradient(90deg,#f59e0b,#d97706); color:white; }
+        .product-action-btn.optional:hover { transform: translateY(-4px) scale(1.03); box-shadow: 0 14px 38px rgba(245, 158, 11, 0.18); }
+        .product-action-btn.alternative { background:linear-gradient(90deg,#2563eb,#1e40af); color:white; }
+        .product-action-btn.alternative:hover { transform: translateY(-4px) scale(1.03); box-shadow: 0 14px 38px rgba(37, 99, 235, 0.18); }
+
+        /* Right-side sticky index inside products modal */
+        .products-index { width:150px; position:sticky; top:18px; align-self:flex-start; background:linear-gradient(180deg,#ffffff,#fbfdff); border:1px solid #eef6ff; padding:12px; border-radius:12px; height:calc(100% - 24px); overflow:auto; box-shadow:0 6px 18px rgba(15,23,42,0.04); }
+        .products-index .idx-title { font-weight:800; color:#0f172a; margin-bottom:8px; font-size:0.95rem; }
+        .products-index .idx-link { display:block; padding:8px 10px; color:#334155; text-decoration:none; border-radius:999px; font-weight:700; margin-bottom:8px; background:transparent; transition:all .14s ease; font-size:0.88rem; }
+        .products-index .idx-link:hover { background:#eef7ff; color:#0b66c2; transform:translateX(6px); }
+        .products-index .idx-link.active { background:#e6f0ff; color:#0b66c2; box-shadow:inset 0 1px 0 rgba(255,255,255,0.6); }
+
+        @media (max-width:920px){ .product-modal-wrap{ flex-direction:column-reverse; } .products-index{ width:100%; position:relative; order:2; } }
+        `; document.head.appendChild(st);
+    })();
+
+    // Group products by category to build index
+    const grouped = {};
+    products.forEach(p => {
+        const cat = p.category_name || 'Outros';
+        if (!grouped[cat]) grouped[cat] = [];
+        grouped[cat].push(p);
+    });
+
+    // Build HTML
+    const categories = Object.keys(grouped);
+    productDiv.innerHTML = `
+        <h4 style="margin: 0 0 1rem 0; color: #1a202c; display: flex; align-items: center; gap: 0.5rem;">
+            <i class="fas fa-box-open"></i>
+            Produtos - ${familyName}
+        </h4>
+        <div class="product-modal-wrap">
+            <div class="product-grid-area" style="flex:1;">
+                <div class="product-grid" id="productGrid">
+                    ${categories.map(cat => {
+                        return `
+                        <div class="product-category-block" id="cat_${cat.replace(/[^a-z0-9]+/gi, '_')}">
+                            <div style="margin:10px 0 6px 0; font-weight:800; color:#0f172a;">${cat}</div>
+                            <div class="product-category-grid" style="display:grid; grid-template-columns: repeat(auto-fit, minmax(240px, 1fr)); gap:10px;">
+                                ${grouped[cat].map(p => `
+                                    <div class="product-card">
+                                        <div class="pc-top">
+                                            <div class="product-thumb"><i class="fas fa-box"></i></div>
+                                            <div>
+                                                <div class="product-title">${p.name}</div>
+                                                <div class="product-cat">${p.family_name || ''}</div>
+                                            </div>
+                                        </div>
+                                        <div class="product-desc">${p.description || ''}</div>
+                                        <div class="product-footer">
+                                            <div class="product-price">${(p.base_price || 0).toFixed(2)}€</div>
+                                            <div class="product-actions">
+                                                <button class="product-action-btn include" onclick="addProductToQuote(${p.id}, 'incluido')">Incluir</button>
+                                                <button class="product-action-btn optional" onclick="addProductToQuote(${p.id}, 'opcional')">Opcional</button>
+                                                <button class="product-action-btn alternative" onclick="showAlternativeSelection(${p.id}, '${p.family_name || familyName}')">Alternativo</button>
+                                            </div>
+                                        </div>
+                                    </div>
+                                `).join('')}
+                            </div>
+                        </div>
+                        `;
+                    }).join('')}
+                </div>
+            </div>
+            <aside class="products-index" id="productsIndex">
+                <div class="idx-title">Categorias</div>
+                ${categories.map(cat => `<a class="idx-link" href="#cat_${cat.replace(/[^a-z0-9]+/gi, '_')}" data-target="cat_${cat.replace(/[^a-z0-9]+/gi, '_')}">${cat}</a>`).join('')}
+            </aside>
+        </div>
+    `;
+
+    // Wire index clicks to smooth-scroll to category blocks and mark active
+    setTimeout(()=>{
+        const links = productDiv.querySelectorAll('.idx-link');
+        links.forEach(l => {
+            l.addEventListener('click', ev => {
+                ev.preventDefault();
+                links.forEach(x=>x.classList.remove('active'));
+                l.classList.add('active');
+                const tgt = l.dataset.target;
+                const el = document.getElementById(tgt);
+                if (el) el.scrollIntoView({behavior:'smooth', block:'start'});
+            });
+        });
+
+        // Add a simple scroll-spy to highlight index based on nearest category
+        const categoryEls = Array.from(productDiv.querySelectorAll('.product-category-block'));
+        if (categoryEls.length > 0) {
+            const idxLinks = Array.from(productDiv.querySelectorAll('.idx-link'));
+            const observer = new IntersectionObserver((entries)=>{
+                entries.forEach(ent=>{
+                    if (ent.isIntersecting) {
+                        const id = ent.target.id;
+                        idxLinks.forEach(l => l.classList.toggle('active', l.dataset.target === id));
+                    }
+                });
+            }, { root: productDiv, rootMargin: '-40% 0px -40% 0px', threshold: 0.01 });
+            categoryEls.forEach(el => observer.observe(el));
+        }
+    }, 60);
+}
+
+function backToFamilies() {
+    const modal = document.getElementById('addProductModal');
+    if (!modal) return;
+
+    const familyDiv = modal.querySelector('#familyCardsArea');
+    const productDiv = modal.querySelector('#productSelection');
+    const backButton = modal.querySelector('#modalBackButton');
+
+    if (familyDiv) familyDiv.style.display = 'block';
+    if (productDiv) productDiv.style.display = 'none';
+    if (backButton) backButton.style.display = 'none';
+}
+
+function closeAddProductModal() {
+    const modal = document.getElementById('addProductModal');
+    if (modal) {
+        modal.classList.remove('show');
+        setTimeout(() => {
+            modal.remove();
+        }, 300);
+    }
+}
+
+function showAlternativeSelection(productId, productFamily) {
+    // Debug: mostrar a família que estamos procurando
+    console.log('Procurando produtos da família:', productFamily);
+
+    // Buscar produtos já incluídos no orçamento da mesma família
+    const includedProducts = collectIncludedProducts(productFamily);
+
+    if (includedProducts.length === 0) {
+        // Debug adicional: mostrar todas as famílias disponíveis
+        const allProducts = collectIncludedProducts();
+        const availableFamilies = [...new Set(allProducts.map(p => p.family))];
+        console.log('Famílias disponíveis:', availableFamilies);
+
+        alert(`❌ Não há produtos incluídos da família "${productFamily}" no orçamento para associar como alternativo. Adicione primeiro alguns produtos desta família como incluídos.\n\nFamílias disponíveis: ${availableFamilies.join(', ')}`);
+        return;
+    }
+
+    // Criar modal de seleção moderno
+    const modal = document.createElement('div');
+    modal.className = 'alternative-modal-overlay';
+    modal.innerHTML = `
+        <div class="alternative-modal-container">
+            <div class="alternative-modal-header">
+                <div class="header-content">
+                    <div class="header-icon">
+                        <i class="fas fa-exchange-alt"></i>
+                    </div>
+                    <div class="header-text">
+                        <h3>Selecionar Produto Principal</h3>
+                        <p>Escolha qual produto da família "${productFamily}" será o principal</p>
+                    </div>
+                </div>
+                <button onclick="closeAlternativeModal()" class="modal-close-btn">
+                    <i class="fas fa-times"></i>
+                </button>
+            </div>
+            <div class="alternative-modal-body">
+                <div class="products-grid">
+                    ${includedProducts.map(product => `
+                        <div class="alternative-product-card" onclick="selectMainProduct('${productId}', '${product.id}')">
+                            <div class="product-card-content">
+                                <div class="product-icon">
+                                    <i class="fas fa-box"></i>
+                                </div>
+                                <div class="product-details">
+                                    <div class="product-name">${product.name}</div>
+                                    <div class="product-meta">
+                                        <span class="product-family">${product.family}</span>
+                                        <span class="product-qty">Qtd: ${product.quantity}</span>
+                                    </div>
+                                </div>
+                                <div class="product-price-badge">
+                                    ${product.price}
+                                </div>
+                            </div>
+                            <div class="selection-arrow">
+                                <i class="fas fa-chevron-right"></i>
+                            </div>
+                        </div>
+                    `).join('')}
+                </div>
+            </div>
+            <div class="alternative-modal-footer">
+                <button onclick="closeAlternativeModal()" class="btn-cancel">
+                    <i class="fas fa-times-circle"></i>
+                    Cancelar
+                </button>
+            </div>
+        </div>
+    `;
+
+    // Adicionar estilos modernos para o modal
+    if (!document.getElementById('alternativeModalStyles')) {
+        const styles = document.createElement('style');
+        styles.id = 'alternativeModalStyles';
+        styles.innerHTML = `
+            .alternative-modal-overlay {
+                position: fixed;
+                top: 0;
+                left: 0;
+                width: 100%;
+                height: 100%;
+                background: rgba(15, 23, 42, 0.6);
+                backdrop-filter: blur(8px);
+                display: flex;
+                align-items: center;
+                justify-content: center;
+                z-index: 10000;
+                animation: fadeIn 0.3s ease;
+            }
+
+            @keyframes fadeIn {
+                from { opacity: 0; }
+                to { opacity: 1; }
+            }
+
+            @keyframes fadeOut {
+                from { opacity: 1; }
+                to { opacity: 0; }
+            }
+
+            .alternative-modal-container {
+                background: linear-gradient(180deg, #ffffff, #fbfdff);
+                border-radius: 20px;
+                box-shadow: 0 25px 50px rgba(15, 23, 42, 0.15);
+                max-width: 600px;
+                width: 90%;
+                max-height: 80vh;
+                overflow: hidden;
+                animation: slideUp 0.3s ease;
+            }
+
+            @keyframes slideUp {
+                from { transform: translateY(20px); opacity: 0; }
+                to { transform: translateY(0); opacity: 1; }
+            }
+
+            .alternative-modal-header {
+                display: flex;
+                align-items: center;
+                justify-content: space-between;
+                padding: 24px 28px;
+                background: linear-gradient(135deg, #2563eb, #1e40af);
+                color: white;
+            }
+
+            .header-content {
+                display: flex;
+                align-items: center;
+                gap: 16px;
+            }
+
+            .header-icon {
+                width: 48px;
+                height: 48px;
+                background: rgba(255, 255, 255, 0.2);
+                border-radius: 12px;
+                display: flex;
+                align-items: center;
+                justify-content: center;
+                font-size: 20px;
+            }
+
+            .header-text h3 {
+                margin: 0;
+                font-size: 20px;
+                font-weight: 700;
+            }
+
+            .header-text p {
+                margin: 4px 0 0 0;
+                font-size: 14px;
+                opacity: 0.9;
+            }
+
+            .modal-close-btn {
+                width: 40px;
+                height: 40px;
+                border: none;
+                background: rgba(255, 255, 255, 0.2);
+                color: white;
+                border-radius: 10px;
+                cursor: pointer;
+                display: flex;
+                align-items: center;
+                justify-content: center;
+                transition: all 0.2s ease;
+            }
+
+            .modal-close-btn:hover {
+                background: rgba(255, 255, 255, 0.3);
+                transform: scale(1.05);
+            }
+
+            .alternative-modal-body {
+                padding: 24px 28px;
+                max-height: 400px;
+                overflow-y: auto;
+            }
+
+            .products-grid {
+                display: grid;
+                gap: 12px;
+            }
+
+            .alternative-product-card {
+                display: flex;
+                align-items: center;
+                justify-content: space-between;
+                padding: 16px 20px;
+                background: linear-gradient(180deg, #ffffff, #f8fafc);
+                border: 2px solid #e2e8f0;
+                border-radius: 16px;
+                cursor: pointer;
+                transition: all 0.2s ease;
+            }
+
+            .alternative-product-card:hover {
+                border-color: #2563eb;
+                transform: translateY(-2px);
+                box-shadow: 0 12px 24px rgba(37, 99, 235, 0.15);
+            }
+
+            .product-card-content {
+                display: flex;
+                align-items: center;
+                gap: 16px;
+                flex: 1;
+            }
+
+            .product-icon {
+                width: 44px;
+                height: 44px;
+                background: linear-gradient(135deg, #eef6ff, #dbeafe);
+                border-radius: 12px;
+                display: flex;
+                align-items: center;
+                justify-content: center;
+                color: #2563eb;
+                font-size: 18px;
+            }
+
+            .product-details {
+                flex: 1;
+            }
+
+            .product-name {
+                font-weight: 700;
+                color: #0f172a;
+                font-size: 16px;
+                margin-bottom: 4px;
+            }
+
+            .product-meta {
+                display: flex;
+                align-items: center;
+                gap: 12px;
+                font-size: 13px;
+                color: #64748b;
+            }
+
+            .product-family {
+                background: #f1f5f9;
+                padding: 4px 8px;
+                border-radius: 6px;
+                font-weight: 500;
+            }
+
+            .product-qty {
+                font-weight: 600;
+            }
+
+            .product-price-badge {
+                background: linear-gradient(135deg, #10b981, #059669);
+                color: white;
+                padding: 8px 12px;
+                border-radius: 10px;
+                font-weight: 700;
+                font-size: 14px;
+            }
+
+            .selection-arrow {
+                color: #94a3b8;
+                font-size: 18px;
+                transition: all 0.2s ease;
+            }
+
+            .alternative-product-card:hover .selection-arrow {
+                color: #2563eb;
+                transform: translateX(4px);
+            }
+
+            .alternative-modal-footer {
+                padding: 20px 28px;
+                background: #f8fafc;
+                border-top: 1px solid #e2e8f0;
+                display: flex;
+                justify-content: center;
+            }
+
+            .btn-cancel {
+                padding: 12px 24px;
+                background: linear-gradient(135deg, #6b7280, #4b5563);
+                color: white;
+                border: none;
+                border-radius: 12px;
+                cursor: pointer;
+                display: flex;
+                align-items: center;
+                gap: 8px;
+                font-weight: 600;
+                transition: all 0.2s ease;
+            }
+
+            .btn-cancel:hover {
+                transform: translateY(-2px);
+                box-shadow: 0 8px 20px rgba(107, 114, 128, 0.3);
+            }
+        `;
+        document.head.appendChild(styles);
+    }
+
+    document.body.appendChild(modal);
+}
+
+// Função para coletar produtos já incluídos no orçamento (opcionalmente filtrados por família)
+function collectIncludedProducts(familyFilter = null) {
+    const products = [];
+
+    // Normalizar nome da família para comparação
+    const normalizeFamily = (name) => {
+        return name.toLowerCase()
+            .normalize('NFD')
+            .replace(/[\u0300-\u036f]/g, '') // Remove acentos
+            .replace(/[^a-z0-9]/g, ' ')       // Substitui caracteres especiais por espaços
+            .replace(/\s+/g, ' ')             // Remove espaços duplos
+            .trim();
+    };
+
+    const normalizedFilter = familyFilter ? normalizeFamily(familyFilter) : null;
+
+    // Percorrer todas as famílias e coletar produtos incluídos
+    document.querySelectorAll('.family-card-compact').forEach(familyCard => {
+        const familyName = familyCard.querySelector('.family-title-compact')?.textContent.trim() || 'Família';
+        const normalizedFamilyName = normalizeFamily(familyName);
+
+        // Debug: mostrar comparação de nomes
+        if (familyFilter) {
+            console.log(`Comparando: "${normalizedFamilyName}" com "${normalizedFilter}"`);
+        }
+
+        // Se há filtro de família, aplicar comparação flexível
+        if (familyFilter && normalizedFamilyName !== normalizedFilter) {
+            return;
+        }
+
+        familyCard.querySelectorAll('.product-row-compact-detailed').forEach(productRow => {
+            // Verificar se é produto incluído (não alternativo)
+            if (!productRow.classList.contains('alternative-product')) {
+                const nameElement = productRow.querySelector('.product-name-detail, .product-name-compact');
+                const priceElement = productRow.querySelector('.product-price, .spec-price');
+                const quantityInput = productRow.querySelector('input[type="number"]');
+
+                if (nameElement && priceElement && quantityInput) {
+                    // Obter ID do produto a partir do input de quantidade
+                    let productId = null;
+                    if (quantityInput.id) {
+                        productId = quantityInput.id.replace('qty_', '');
+                    } else if (quantityInput.name) {
+                        productId = quantityInput.name.replace('qty_', '');
+                    }
+
+                    // Tentar outras formas de obter o ID se não encontrou
+                    if (!productId) {
+                        const parentRow = quantityInput.closest('.product-row-compact-detailed');
+                        if (parentRow && parentRow.dataset.productId) {
+                            productId = parentRow.dataset.productId;
+                        }
+                    }
+
+                    if (productId && parseInt(quantityInput.value) > 0) {
+                        products.push({
+                            id: productId,
+                            name: nameElement.textContent.trim(),
+                            family: familyName,
+                            price: priceElement.textContent.trim(),
+                            quantity: quantityInput.value
+                        });
+                    }
+                }
+            }
+        });
+    });
+
+    // Debug: mostrar produtos encontrados
+    console.log('Produtos incluídos encontrados' + (familyFilter ? ` da família "${familyFilter}"` : '') + ':', products);
+
+    return products;
+}
+
+function closeAlternativeModal() {
+    const modal = document.querySelector('.alternative-modal-overlay');
+    if (modal) {
+        modal.style.animation = 'fadeOut 0.3s ease';
+        setTimeout(() => {
+            modal.remove();
+        }, 300);
+    }
+}
+
+// Função para selecionar produto principal e adicionar alternativo
+function selectMainProduct(alternativeProductId, mainProductId) {
+    closeAlternativeModal();
+
+    // Mostrar loading
+    const loadingDiv = document.createElement('div');
+    loadingDiv.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        background: linear-gradient(135deg, #3b82f6, #2563eb);
+        color: white;
+        padding: 15px 25px;
+        border-radius: 8px;
+        box-shadow: 0 8px 25px rgba(59, 130, 246, 0.3);
+        z-index: 1001;
+        font-weight: 600;
+    `;
+    loadingDiv.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Adicionando produto alternativo...';
+    document.body.appendChild(loadingDiv);
+
+    // Adicionar produto como alternativo
+    addProductToQuote(alternativeProductId, 'alternativo', mainProductId);
+
+    // Remover loading após um tempo
+    setTimeout(() => {
+        if (document.body.contains(loadingDiv)) {
+            loadingDiv.remove();
+        }
+    }, 3000);
+}
+
+function addProductToQuote(productId, itemType, alternativeTo = null) {
+    fetch('/add_product', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            product_id: productId,
+            item_type: itemType,
+            alternative_to: alternativeTo
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            // Mostrar feedback de sucesso
+            const successDiv = document.createElement('div');
+            successDiv.style.cssText = `
+                position: fixed;
+                top: 20px;
+                right: 20px;
+                background: linear-gradient(135deg, #10b981, #059669);
+                color: white;
+                padding: 15px 25px;
+                border-radius: 8px;
+                box-shadow: 0 8px 25px rgba(16, 185, 129, 0.3);
+                z-index: 1001;
+                animation: slideInRight 0.3s ease;
+                font-weight: 600;
+            `;
+            successDiv.innerHTML = `<i class="fas fa-plus-circle"></i> ${data.message}`;
+            document.body.appendChild(successDiv);
+
+            setTimeout(() => {
+                successDiv.remove();
+            }, 3000);
+
+            closeAddProductModal();
+            setTimeout(() => location.reload(), 1000);
+        } else {
+            alert('Erro ao adicionar produto: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Erro:', error);
+        alert('Erro ao comunicar com o servidor');
+    });
+}
+
+// Sistema de edição inline - Popups para editar dados
+
+// Função principal para editar configuração completa do projeto (medidas + questionário)
+function editProjectConfiguration() {
+    // Obter dados atuais das medidas
+    const dimensionsText = document.querySelector('.value-dimensions')?.textContent || '0×0m';
+    const depthText = document.querySelector('.value-depth')?.textContent || '0-0m';
+
+    const comprimento = dimensionsText.split('×')[0]?.replace('m', '').trim() || '0';
+    const largura = dimensionsText.split('×')[1]?.replace('m', '').trim() || '0';
+    const profMin = depthText.split('-')[0]?.replace('m', '').trim() || '0';
+    const profMax = depthText.split('-')[1]?.replace('m', '').trim() || '0';
+
+    // Buscar respostas atuais do servidor
+    fetch('/get_current_answers')
+    .then(response => response.json())
+    .then(data => {
+        const currentAnswers = data.answers || {};
+        showConfigurationModal(comprimento, largura, profMin, profMax, currentAnswers);
+    })
+    .catch(error => {
+        console.error('Erro ao buscar respostas:', error);
+        // Usar valores padrão em caso de erro
+        // Capturar os valores reais do orçamento
+        const currentAnswers = {...BUDGET_FALLBACK_ANSWERS};
+        showConfigurationModal(comprimento, largura, profMin, profMax, currentAnswers);
+    });
+}
+
+// Função para mostrar o modal com os dados
+function showConfigurationModal(comprimento, largura, profMin, profMax, currentAnswers) {
+    // Processar dados de bordadura para separar material e espessura
+    let processedAnswers = {...currentAnswers};
+
+    if (processedAnswers.material_bordadura_natural) {
+        // Se material_bordadura_natural contém espessura (ex: "granito_vila_real_2cm")
+        const materialCompleto = processedAnswers.material_bordadura_natural;
+
+        // Extrair material base e espessura
+        if (materialCompleto.endsWith('_1cm')) {
+            processedAnswers.material_bordadura_natural_base = materialCompleto.replace('_1cm', '');
+            processedAnswers.espessura_bordadura = '1cm';
+        } else if (materialCompleto.endsWith('_2cm')) {
+            processedAnswers.material_bordadura_natural_base = materialCompleto.replace('_2cm', '');
+            processedAnswers.espessura_bordadura = '2cm';
+        } else if (materialCompleto.endsWith('_3cm')) {
+            processedAnswers.material_bordadura_natural_base = materialCompleto.replace('_3cm', '');
+            processedAnswers.espessura_bordadura = '3cm';
+        } else {
+            // Se não tem espessura no nome, usar o valor original
+            processedAnswers.material_bordadura_natural_base = materialCompleto;
+        }
+    }
+
+    const modal = document.createElement('div');
+    modal.className = 'edit-modal-overlay large-modal';
+    modal.innerHTML = `
+        <div class="edit-modal large premium">
+            <div class="edit-modal-header premium-header">
+                <div class="header-left">
+                    <div class="header-icon">
+                        <i class="fas fa-cogs"></i>
+                    </div>
+                    <div class="header-text">
+                        <h3>Configuração Completa do Projeto</h3>
+                        <p>Edite as medidas da piscina, preferências e configurações técnicas</p>
+                    </div>
+                </div>
+                <button onclick="closeModal()" class="close-btn premium-close">&times;</button>
+            </div>
+            <div class="edit-modal-body large-body premium-body">
+                <!-- Seção 1: Dimensões da Piscina -->
+                <div class="config-section premium-section">
+                    <div class="section-title">
+                        <i class="fas fa-ruler-combined section-icon"></i>
+                        <h4>Dimensões da Piscina</h4>
+                    </div>
+                    <div class="premium-grid">
+                        <div class="form-group premium-field">
+                            <label>Comprimento</label>
+                            <div class="input-wrapper">
+                                <input type="number" id="edit-comprimento" value="${comprimento}" step="0.01" />
+                                <span class="input-unit">m</span>
+                            </div>
+                        </div>
+                        <div class="form-group premium-field">
+                            <label>Largura</label>
+                            <div class="input-wrapper">
+                                <input type="number" id="edit-largura" value="${largura}" step="0.01" />
+                                <span class="input-unit">m</span>
+                            </div>
+                        </div>
+                        <div class="form-group premium-field">
+                            <label>Profundidade Mínima</label>
+                            <div class="input-wrapper">
+                                <input type="number" id="edit-prof-min" value="${profMin}" step="0.01" />
+                                <span class="input-unit">m</span>
+                            </div>
+                        </div>
+                        <div class="form-group premium-field">
+                            <label>Profundidade Máxima</label>
+                            <div class="input-wrapper">
+                                <input type="number" id="edit-prof-max" value="${profMax}" step="0.01" />
+                                <span class="input-unit">m</span>
+                            </div>
+                        </div>
+                    </div>
+                </div>
+
+                <!-- Seção 1.5: Elementos Adicionais -->
+                <div class="config-section premium-section">
+                    <div class="section-title">
+                        <i class="fas fa-plus-circle section-icon"></i>
+                        <h4>Elementos Adicionais</h4>
+                    </div>
+                    <div class="premium-grid">
+                        <!-- Zona de Praia -->
+                        <div class="form-group premium-field">
+                            <label>Há zona de praia?</label>
+                            <div class="radio-group-premium">
+                                <div class="radio-option-premium ${currentAnswers.zona_praia === 'sim' ? 'selected' : ''}" data-value="sim">
+                                    <i class="fas fa-umbrella-beach" style="color: var(--success);"></i>
+                                    <span>Sim</span>
+                                </div>
+                                <div class="radio-option-premium ${currentAnswers.zona_praia === 'nao' ? 'selected' : ''}" data-value="nao">
+                                    <i class="fas fa-times-circle" style="color: var(--text-muted);"></i>
+                                    <span>Não</span>
+                                </div>
+                            </div>
+                            <input type="hidden" id="edit-zona-praia" value="${currentAnswers.zona_praia || 'nao'}" />
+
+                            <!-- Campos condicionais para zona de praia -->
+                            <div id="edit-zona-praia-campos" style="display: ${currentAnswers.zona_praia === 'sim' ? 'block' : 'none'}; margin-top: 12px;">
+                                <div class="premium-grid" style="grid-template-columns: 1fr 1fr;">
+                                    <div class="form-group premium-field">
+                                        <label>Largura da Zona de Praia</label>
+                                        <div class="input-wrapper">
+                                            <input type="number" id="edit-zona-praia-largura" value="${currentAnswers.zona_praia_largura || ''}" step="0.01" />
+                                            <span class="input-unit">m</span>
+                                        </div>
+                                        <small class="form-help">O comprimento da zona de praia é automaticamente igual à largura da piscina</small>
+                                    </div>
+                                </div>
+                            </div>
+                        </div>
+
+                        <!-- Escadas -->
+                        <div class="form-group premium-field">
+                            <label>Há escadas?</label>
+                            <div class="radio-group-premium">
+                                <div class="radio-option-premium ${currentAnswers.escadas === 'sim' ? 'selected' : ''}" data-value="sim">
+                                    <i class="fas fa-sort-amount-up" style="color: var(--success);"></i>
+                                    <span>Sim</span>
+                                </div>
+                                <div class="radio-option-premium ${currentAnswers.escadas === 'nao' ? 'selected' : ''}" data-value="nao">
+                                    <i class="fas fa-times-circle" style="color: var(--text-muted);"></i>
+                                    <span>Não</span>
+                                </div>
+                            </div>
+                            <input type="hidden" id="edit-escadas" value="${currentAnswers.escadas || 'nao'}" />
+
+                            <!-- Campo condicional para escadas -->
+                            <div id="edit-escadas-campos" style="display: ${currentAnswers.escadas === 'sim' ? 'block' : 'none'}; margin-top: 12px;">
+                                <div class="form-group premium-field">
+                                    <label>Largura da Escada</label>
+                                    <div class="input-wrapper">
+                                        <input type="number" id="edit-escadas-largura" value="${currentAnswers.escadas_largura || ''}" step="0.01" />
+                                        <span class="input-unit">m</span>
+                                    </div>
+                                </div>
+                            </div>
+                        </div>
+                    </div>
+                </div>
+
+                <!-- Seção 2: Condições do Local -->
+                <div class="config-section premium-section">
+                    <div class="section-title">
+                        <i class="fas fa-map-marker-alt section-icon"></i>
+                        <h4>Condições do Local</h4>
+                    </div>
+                    <div class="form-group premium-field">
+                        <label>Como é o acesso ao local?</label>
+                        <div class="radio-group-premium">
+                            <div class="radio-option-premium ${currentAnswers.acesso === 'facil' ? 'selected' : ''}" data-value="facil">
+                                <i class="fas fa-truck" style="color: var(--success);"></i>
+                                <span>Fácil</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.acesso === 'medio' ? 'selected' : ''}" data-value="medio">
+                                <i class="fas fa-tools" style="color: var(--warning);"></i>
+                                <span>Médio</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.acesso === 'dificil' ? 'selected' : ''}" data-value="dificil">
+                                <i class="fas fa-mountain" style="color: var(--error);"></i>
+                                <span>Difícil</span>
+                            </div>
+                        </div>
+                        <input type="hidden" id="edit-acesso" value="${currentAnswers.acesso || 'facil'}" />
+                    </div>
+                    <div class="form-group premium-field">
+                        <label>É necessário escavação?</label>
+                        <div class="radio-group-premium">
+                            <div class="radio-option-premium ${currentAnswers.escavacao === 'true' ? 'selected' : ''}" data-value="true">
+                                <i class="fas fa-shovel" style="color: var(--warning);"></i>
+                                <span>Sim</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.escavacao === 'false' ? 'selected' : ''}" data-value="false">
+                                <i class="fas fa-check-circle" style="color: var(--success);"></i>
+                                <span>Não</span>
+                            </div>
+                        </div>
+                        <input type="hidden" id="edit-escavacao" value="${currentAnswers.escavacao || 'false'}" />
+                    </div>
+                </div>
+
+                <!-- Seção 3: Características da Piscina -->
+                <div class="config-section premium-section">
+                    <div class="section-title">
+                        <i class="fas fa-swimming-pool section-icon"></i>
+                        <h4>Características da Piscina</h4>
+                    </div>
+                    <div class="form-group premium-field">
+                        <label>Forma da piscina:</label>
+                        <div class="radio-group-premium">
+                            <div class="radio-option-premium ${currentAnswers.forma === 'standard' ? 'selected' : ''}" data-value="standard">
+                                <i class="fas fa-square" style="color: var(--success);"></i>
+                                <span>Standard</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.forma === 'especial' ? 'selected' : ''}" data-value="especial">
+                                <i class="fas fa-star" style="color: var(--warning);"></i>
+                                <span>Especial</span>
+                            </div>
+                        </div>
+                        <input type="hidden" id="edit-forma" value="${currentAnswers.forma || 'standard'}" />
+                    </div>
+                    <div class="form-group premium-field">
+                        <label>Tipo de piscina:</label>
+                        <div class="radio-group-premium">
+                            <div class="radio-option-premium ${currentAnswers.tipo_piscina === 'skimmer' ? 'selected' : ''}" data-value="skimmer">
+                                <i class="fas fa-water" style="color: var(--primary);"></i>
+                                <span>Skimmer</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.tipo_piscina === 'espelho_dagua' ? 'selected' : ''}" data-value="espelho_dagua">
+                                <i class="fas fa-water" style="color: var(--secondary);"></i>
+                                <span>Espelho d'Água</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.tipo_piscina === 'transbordo' ? 'selected' : ''}" data-value="transbordo">
+                                <i class="fas fa-wave-square" style="color: var(--accent);"></i>
+                                <span>Transbordo</span>
+                            </div>
+                        </div>
+                        <input type="hidden" id="edit-tipo-piscina" value="${currentAnswers.tipo_piscina || 'skimmer'}" />
+                    </div>
+                </div>
+
+                <!-- Seção 4: Acabamentos -->
+                <div class="config-section premium-section">
+                    <div class="section-title">
+                        <i class="fas fa-palette section-icon"></i>
+                        <h4>Acabamentos</h4>
+                    </div>
+                    <div class="form-group premium-field">
+                        <label>Tipo de revestimento:</label>
+                        <div class="radio-group-premium">
+                            <div class="radio-option-premium ${currentAnswers.revestimento === 'tela' ? 'selected' : ''}" data-value="tela">
+                                <i class="fas fa-paint-roller" style="color: var(--success);"></i>
+                                <span>Tela</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.revestimento === 'ceramica' ? 'selected' : ''}" data-value="ceramica">
+                                <i class="fas fa-th-large" style="color: var(--secondary);"></i>
+                                <span>Cerâmica</span>
+                            </div>
+                        </div>
+                        <input type="hidden" id="edit-revestimento" value="${currentAnswers.revestimento || 'tela'}" />
+                    </div>
+                </div>
+
+                <!-- Seção 5: Tecnologia -->
+                <div class="config-section premium-section">
+                    <div class="section-title">
+                        <i class="fas fa-microchip section-icon"></i>
+                        <h4>Tecnologia</h4>
+                    </div>
+                    <div class="form-group premium-field">
+                        <label>Deseja sistema domótico?</label>
+                        <div class="radio-group-premium">
+                            <div class="radio-option-premium ${currentAnswers.domotica === 'true' ? 'selected' : ''}" data-value="true">
+                                <i class="fas fa-mobile-alt" style="color: var(--accent);"></i>
+                                <span>Sim</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.domotica === 'false' ? 'selected' : ''}" data-value="false">
+                                <i class="fas fa-times-circle" style="color: var(--text-muted);"></i>
+                                <span>Não</span>
+                            </div>
+                        </div>
+                        <input type="hidden" id="edit-domotica" value="${currentAnswers.domotica || 'false'}" />
+                    </div>
+                </div>
+
+                <!-- Seção 6: Instalações -->
+                <div class="config-section premium-section">
+                    <div class="section-title">
+                        <i class="fas fa-home section-icon"></i>
+                        <h4>Instalações</h4>
+                    </div>
+                    <div class="form-group premium-field">
+                        <label>Localização:</label>
+                        <div class="radio-group-premium">
+                            <div class="radio-option-premium ${currentAnswers.localizacao === 'interior' ? 'selected' : ''}" data-value="interior">
+                                <i class="fas fa-home" style="color: var(--secondary);"></i>
+                                <span>Interior</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.localizacao === 'exterior' ? 'selected' : ''}" data-value="exterior">
+                                <i class="fas fa-sun" style="color: var(--warning);"></i>
+                                <span>Exterior</span>
+                            </div>
+                        </div>
+                        <input type="hidden" id="edit-localizacao" value="${currentAnswers.localizacao || 'exterior'}" />
+                    </div>
+                    <div class="form-group premium-field">
+                        <label>Tipo de corrente elétrica:</label>
+                        <div class="radio-group-premium">
+                            <div class="radio-option-premium ${currentAnswers.luz === 'monofasica' ? 'selected' : ''}" data-value="monofasica">
+                                <i class="fas fa-bolt" style="color: var(--success);"></i>
+                                <span>Monofásica</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.luz === 'trifasica' ? 'selected' : ''}" data-value="trifasica">
+                                <i class="fas fa-charging-station" style="color: var(--warning);"></i>
+                                <span>Trifásica</span>
+                            </div>
+                        </div>
+                        <input type="hidden" id="edit-luz" value="${currentAnswers.luz || 'monofasica'}" />
+                    </div>
+
+                    <!-- Casa das máquinas (igual ao questionário) -->
+                    <div class="form-group premium-field">
+                        <label>Casa das máquinas estará abaixo do nível da água?</label>
+                        <div class="radio-group-premium">
+                            <div class="radio-option-premium ${currentAnswers.casa_maquinas_abaixo === 'sim' ? 'selected' : ''}" data-value="sim">
+                                <i class="fas fa-arrow-down" style="color: var(--primary);"></i>
+                                <span>Sim</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.casa_maquinas_abaixo === 'nao' ? 'selected' : ''}" data-value="nao">
+                                <i class="fas fa-level-up-alt" style="color: var(--success);"></i>
+                                <span>Não</span>
+                            </div>
+                        </div>
+                        <input type="hidden" id="edit-casa_maquinas_abaixo" value="${currentAnswers.casa_maquinas_abaixo || 'nao'}" />
+                        <div style="margin-top:12px;">
+                            <label class="premium-field" for="edit-casa_maquinas_desc">Observações sobre a casa das máquinas</label>
+                            <textarea id="edit-casa_maquinas_desc" rows="2" style="width:100%;padding:10px;border:2px solid #e5e7eb;border-radius:8px;">${currentAnswers.casa_maquinas_desc || ''}</textarea>
+                        </div>
+                    </div>
+
+                    <!-- Tipo de luzes (igual ao questionário) -->
+                    <div class="form-group premium-field">
+                        <label>Tipo de luzes preferido:</label>
+                        <div class="radio-group-premium">
+                            <div class="radio-option-premium ${currentAnswers.tipo_luzes === 'branco_frio' ? 'selected' : ''}" data-value="branco_frio">
+                                <i class="fas fa-lightbulb" style="color:#87CEEB"></i>
+                                <span>Branco Frio</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.tipo_luzes === 'branco_adaptavel' ? 'selected' : ''}" data-value="branco_adaptavel">
+                                <i class="fas fa-adjust" style="color: var(--warning);"></i>
+                                <span>Branco Adaptável</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.tipo_luzes === 'rgb' ? 'selected' : ''}" data-value="rgb">
+                                <i class="fas fa-palette" style="color: var(--primary);"></i>
+                                <span>RGB</span>
+                            </div>
+                        </div>
+                        <input type="hidden" id="edit-tipo_luzes" value="${currentAnswers.tipo_luzes || 'branco_frio'}" />
+                    </div>
+                </div>
+
+                <!-- Seção 7: Tratamento de Água -->
+                <div class="config-section premium-section">
+                    <div class="section-title">
+                        <i class="fas fa-tint section-icon"></i>
+                        <h4>Tratamento de Água</h4>
+                    </div>
+                    <div class="form-group premium-field">
+                        <label>Que tipo de tratamento de água pretende?</label>
+                        <div class="radio-group-premium">
+                            <div class="radio-option-premium ${currentAnswers.tratamento_agua === 'cloro_manual' ? 'selected' : ''}" data-value="cloro_manual">
+                                <i class="fas fa-hand-paper" style="color: var(--success);"></i>
+                                <span>Cloro Manual</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.tratamento_agua === 'cloro_automatico' ? 'selected' : ''}" data-value="cloro_automatico">
+                                <i class="fas fa-robot" style="color: var(--primary);"></i>
+                                <span>Cloro Automático</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.tratamento_agua === 'clorador_salino' ? 'selected' : ''}" data-value="clorador_salino">
+                                <i class="fas fa-water" style="color: var(--secondary);"></i>
+                                <span>Clorador Salino</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.tratamento_agua === 'clorador_salino_ph' ? 'selected' : ''}" data-value="clorador_salino_ph">
+                                <i class="fas fa-balance-scale" style="color: var(--accent);"></i>
+                                <span>Clorador Salino + pH</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.tratamento_agua === 'clorador_salino_ph_uv' ? 'selected' : ''}" data-value="clorador_salino_ph_uv">
+                                <i class="fas fa-sun" style="color: var(--warning);"></i>
+                                <span>Clorador Salino + pH + UV</span>
+                            </div>
+                            <div class="radio-option-premium ${currentAnswers.tratamento_agua === 'nao' ? 'selected' : ''}" data-value="nao">
+                                <i class="fas fa-times-circle" style="color: var(--text-muted);"></i>
+                                <span>Não Incluído</span>
+                            </div>
+                        </div>
+                        <input type="hidden" id="edit-tratamento-agua" value="${currentAnswers.tratamento_agua || 'cloro_manual'}" />
+                    </div>
+                </div>
+
+                <!-- Seção 6: Configurações de Construção -->
+                <div class="config-section premium-section">
+                    <div class="section-title">
+                        <i class="fas fa-hard-hat section-icon"></i>
+                        <h4>Configurações de Construção</h4>
+                    </div>
+                    <div class="premium-grid">
+                        <div class="form-group premium-field">
+                            <label>Tipo de Construção</label>
+                            <div class="radio-group-premium">
+                                <div class="radio-option-premium ${currentAnswers.tipo_construcao === 'nova' ? 'selected' : ''}" data-value="nova">
+                                    <i class="fas fa-plus-circle"></i>
+                                    <span>Construção Nova</span>
+                                </div>
+                                <div class="radio-option-premium ${currentAnswers.tipo_construcao === 'remodelacao' ? 'selected' : ''}" data-value="remodelacao">
+                                    <i class="fas fa-tools"></i>
+                                    <span>Remodelação</span>
+                                </div>
+                            </div>
+                            <input type="hidden" id="edit-tipo-construcao" value="${currentAnswers.tipo_construcao || 'nova'}" />
+                        </div>
+                    </div>
+                </div>
+
+                <!-- Seção 7: Cobertura -->
+                <div class="config-section premium-section">
+                    <div class="section-title">
+                        <i class="fas fa-umbrella section-icon"></i>
+                        <h4>Sistema de Cobertura</h4>
+                    </div>
+                    <div class="premium-grid">
+                        <div class="form-group premium-field">
+                            <label>Tipo de Cobertura</label>
+                            <div class="radio-group-premium">
+                                <div class="radio-option-premium ${currentAnswers.cobertura === 'laminas' ? 'selected' : ''}" data-value="laminas">
+                                    <i class="fas fa-window-minimize"></i>
+                                    <span>Cobertura de Lâminas</span>
+                                </div>
+                                <div class="radio-option-premium ${currentAnswers.cobertura === 'bolhas' ? 'selected' : ''}" data-value="bolhas">
+                                    <i class="fas fa-circle"></i>
+                                    <span>Cobertura de Bolhas</span>
+                                </div>
+                                <div class="radio-option-premium ${currentAnswers.cobertura === 'barras' ? 'selected' : ''}" data-value="barras">
+                                    <i class="fas fa-bars"></i>
+                                    <span>Cobertura de Barras</span>
+                                </div>
+                                <div class="radio-option-premium ${currentAnswers.cobertura === 'lona' ? 'selected' : ''}" data-value="lona">
+                                    <i class="fas fa-tarp"></i>
+                                    <span>Cobertura de Lona</span>
+                                </div>
+                                <div class="radio-option-premium ${currentAnswers.cobertura === 'nao' ? 'selected' : ''}" data-value="nao">
+                                    <i class="fas fa-times-circle"></i>
+                                    <span>Sem Cobertura</span>
+                                </div>
+                            </div>
+                            <input type="hidden" id="edit-cobertura" value="${currentAnswers.cobertura || 'nao'}" />
+                        </div>
+
+                        <!-- Sub-opções para cobertura de lâminas -->
+                        <div class="form-group premium-field" id="edit-cobertura-laminas-options" style="display: ${currentAnswers.cobertura === 'laminas' ? 'block' : 'none'};">
+                            <label>Tipo de Cobertura de Lâminas</label>
+                            <div class="radio-group-premium">
+                                <div class="radio-option-premium ${currentAnswers.tipo_cobertura_laminas === 'submersa_praia' ? 'selected' : ''}" data-value="submersa_praia">
+                                    <i class="fas fa-water"></i>
+                                    <span>Submersa na Praia</span>
+                                </div>
+                                <div class="radio-option-premium ${currentAnswers.tipo_cobertura_laminas === 'fora_praia' ? 'selected' : ''}" data-value="fora_praia">
+                                    <i class="fas fa-step-backward"></i>
+                                    <span>Fora da Praia</span>
+                                </div>
+                                <div class="radio-option-premium ${currentAnswers.tipo_cobertura_laminas === 'elevada' ? 'selected' : ''}" data-value="elevada">
+                                    <i class="fas fa-arrow-up"></i>
+                                    <span>Cobertura Elevada</span>
+                                </div>
+                            </div>
+                            <input type="hidden" id="edit-tipo-cobertura-laminas" value="${currentAnswers.tipo_cobertura_laminas || ''}" />
+                        </div>
+                    </div>
+                </div>
+
+                <!-- Seção 8: Construção da Laje -->
+                <div class="config-section premium-section">
+                    <div class="section-title">
+                        <i class="fas fa-layer-group section-icon"></i>
+                        <h4>Construção da Laje</h4>
+                    </div>
+                    <div class="premium-grid">
+                        <div class="form-group premium-field">
+                            <label>Haverá construção de laje?</label>
+                            <div class="radio-group-premium">
+                                <div class="radio-option-premium ${currentAnswers.havera_laje === 'sim' ? 'selected' : ''}" data-value="sim">
+                                    <i class="fas fa-check-circle" style="color: var(--success);"></i>
+                                    <span>Sim</span>
+                                </div>
+                                <div class="radio-option-premium ${currentAnswers.havera_laje === 'nao' ? 'selected' : ''}" data-value="nao">
+                                    <i class="fas fa-times-circle" style="color: var(--text-muted);"></i>
+                                    <span>Não</span>
+                                </div>
+                            </div>
+                            <input type="hidden" id="edit-havera-laje" value="${currentAnswers.havera_laje || 'nao'}" />
+
+                            <!-- Campos condicionais para laje -->
+                            <div id="edit-laje-campos" style="display: ${currentAnswers.havera_laje === 'sim' ? 'block' : 'none'}; margin-top: 15px;">
+                                <div class="premium-grid" style="grid-template-columns: 1fr 1fr;">
+                                    <div class="form-group premium-field">
+                                        <label>Área da Laje</label>
+                                        <div class="input-wrapper">
+                                            <input type="number" id="edit-laje-m2" value="${currentAnswers.laje_m2 || ''}" step="0.01" min="0" />
+                                            <span class="input-unit">m²</span>
+                                        </div>
+                                    </div>
+                                    <div class="form-group premium-field">
+                                        <label>Espessura da Laje</label>
+                                        <select id="edit-laje-espessura" style="width:100%;padding:10px;border:2px solid #e5e7eb;border-radius:8px;">
+                                            <option value="">Selecione a espessura</option>
+                                            <option value="0.10" ${currentAnswers.laje_espessura == '0.10' ? 'selected' : ''}>10 cm</option>
+                                            <option value="0.15" ${currentAnswers.laje_espessura == '0.15' ? 'selected' : ''}>15 cm</option>
+                                            <option value="0.20" ${currentAnswers.laje_espessura == '0.20' ? 'selected' : ''}>20 cm</option>
+                                            <option value="0.25" ${currentAnswers.laje_espessura == '0.25' ? 'selected' : ''}>25 cm</option>
+                                            <option value="0.30" ${currentAnswers.laje_espessura == '0.30' ? 'selected' : ''}>30 cm</option>
+                                        </select>
+                                    </div>
+                                </div>
+
+                                <div class="form-group premium-field" style="margin-top: 15px;">
+                                    <label>Haverá revestimento da laje?</label>
+                                    <div class="radio-group-premium">
+                                        <div class="radio-option-premium ${currentAnswers.revestimento_laje === 'sim' ? 'selected' : ''}" data-value="sim">
+                                            <i class="fas fa-check-circle" style="color: var(--success);"></i>
+                                            <span>Sim</span>
+                                        </div>
+                                        <div class="radio-option-premium ${currentAnswers.revestimento_laje === 'nao' ? 'selected' : ''}" data-value="nao">
+                                            <i class="fas fa-times-circle" style="color: var(--text-muted);"></i>
+                                            <span>Não</span>
+                                        </div>
+                                    </div>
+                                    <input type="hidden" id="edit-revestimento-laje" value="${currentAnswers.revestimento_laje || 'nao'}" />
+
+                                    <!-- Campo para material de revestimento -->
+                                    <div id="edit-material-revestimento-container" style="display: ${currentAnswers.revestimento_laje === 'sim' ? 'block' : 'none'}; margin-top: 12px;">
+                                        <label>Material do Revestimento</label>
+                                        <select id="edit-material-revestimento" style="width:100%;padding:10px;border:2px solid #e5e7eb;border-radius:8px;">
+                                            <option value="">Selecione o material</option>
+                                            <optgroup label="Pedras Naturais">
+                                                <option value="granito_vila_real" ${currentAnswers.material_revestimento === 'granito_vila_real' ? 'selected' : ''}>Granito Vila Real (€35/m²)</option>
+                                                <option value="granito_pedras_salgadas" ${currentAnswers.material_revestimento === 'granito_pedras_salgadas' ? 'selected' : ''}>Granito Pedras Salgadas (€35/m²)</option>
+                                                <option value="granito_preto_angola" ${currentAnswers.material_revestimento === 'granito_preto_angola' ? 'selected' : ''}>Granito Preto Angola (€90/m²)</option>
+                                                <option value="granito_preto_zimbabue" ${currentAnswers.material_revestimento === 'granito_preto_zimbabue' ? 'selected' : ''}>Granito Preto Zimbabue (€140/m²)</option>
+                                                <option value="marmore_branco_ibiza" ${currentAnswers.material_revestimento === 'marmore_branco_ibiza' ? 'selected' : ''}>Mármore Branco Ibiza (€90/m²)</option>
+                                                <option value="travertino_turco" ${currentAnswers.material_revestimento === 'travertino_turco' ? 'selected' : ''}>Travertino Turco (€90/m²)</option>
+                                            </optgroup>
+                                            <optgroup label="Cerâmicos">
+                                                <option value="pedra_hijau" ${currentAnswers.material_revestimento === 'pedra_hijau' ? 'selected' : ''}>Pedra Hijau (€40/m²)</option>
+                                            </optgroup>
+                                        </select>
+                                    </div>
+                                </div>
+
+                                <!-- Seção de Bordadura -->
+                                <div class="form-group premium-field" style="margin-top: 25px; border-top: 2px solid #e5e7eb; padding-top: 20px;">
+                                    <label style="font-weight: 600; color: var(--text-primary); font-size: 16px;">
+                                        <i class="fas fa-border-top-left" style="color: var(--primary); margin-right: 8px;"></i>
+                                        Bordadura da Piscina
+                                    </label>
+                                    <div class="radio-group-premium" style="margin-top: 12px;">
+                                        <div class="radio-option-premium ${processedAnswers.havera_bordadura === 'sim' ? 'selected' : ''}" data-value="sim">
+                                            <i class="fas fa-check-circle" style="color: var(--success);"></i>
+                                            <span>Sim</span>
+                                        </div>
+                                        <div class="radio-option-premium ${processedAnswers.havera_bordadura === 'nao' ? 'selected' : ''}" data-value="nao">
+                                            <i class="fas fa-times-circle" style="color: var(--text-muted);"></i>
+                                            <span>Não</span>
+                                        </div>
+                                    </div>
+                                    <input type="hidden" id="edit-havera-bordadura" value="${processedAnswers.havera_bordadura || 'nao'}" />
+
+                                    <!-- Campos condicionais de bordadura -->
+                                    <div id="edit-bordadura-options" style="display: ${processedAnswers.havera_bordadura === 'sim' ? 'block' : 'none'}; margin-top: 15px;">
+
+                                        <!-- Tipo de bordadura -->
+                                        <div class="form-group premium-field" style="margin-bottom: 15px;">
+                                            <label>Tipo de Material</label>
+                                            <div class="radio-group-premium">
+                                                <div class="radio-option-premium ${processedAnswers.tipo_bordadura === 'pedra_natural' ? 'selected' : ''}" data-value="pedra_natural">
+                                                    <i class="fas fa-mountain" style="color: var(--accent);"></i>
+                                                    <span>Pedra Natural</span>
+                                                </div>
+                                                <div class="radio-option-premium ${processedAnswers.tipo_bordadura === 'ceramico' ? 'selected' : ''}" data-value="ceramico">
+                                                    <i class="fas fa-layer-group" style="color: var(--secondary);"></i>
+                                                    <span>Cerâmico</span>
+                                                </div>
+                                            </div>
+                                            <input type="hidden" id="edit-tipo-bordadura" value="${processedAnswers.tipo_bordadura || ''}" />
+                                        </div>
+
+                                        <!-- Opções para pedra natural -->
+                                        <div id="edit-pedra-natural-options" style="display: ${processedAnswers.tipo_bordadura === 'pedra_natural' ? 'block' : 'none'};">
+                                            <div class="form-group premium-field" style="margin-bottom: 12px;">
+                                                <label>Espessura</label>
+                                                <select id="edit-espessura-bordadura" style="width:100%;padding:10px;border:2px solid #e5e7eb;border-radius:8px;">
+                                                    <option value="">Selecione a espessura</option>
+                                                    <option value="2cm" ${processedAnswers.espessura_bordadura === '2cm' ? 'selected' : ''}>2 cm</option>
+                                                    <option value="3cm" ${processedAnswers.espessura_bordadura === '3cm' ? 'selected' : ''}>3 cm</option>
+                                                    <option value="outro" ${processedAnswers.espessura_bordadura === 'outro' ? 'selected' : ''}>Outro</option>
+                                                </select>
+                                            </div>
+
+                                            <div class="form-group premium-field">
+                                                <label>Material da Pedra Natural</label>
+                                                <select id="edit-material-bordadura-natural" style="width:100%;padding:10px;border:2px solid #e5e7eb;border-radius:8px;">
+                                                    <option value="">Selecione o material</option>
+                                                    <option value="granito_vila_real" ${processedAnswers.material_bordadura_natural_base === 'granito_vila_real' ? 'selected' : ''}>Granito Vila Real</option>
+                                                    <option value="granito_pedras_salgadas" ${processedAnswers.material_bordadura_natural_base === 'granito_pedras_salgadas' ? 'selected' : ''}>Granito Pedras Salgadas</option>
+                                                    <option value="granito_preto_angola" ${processedAnswers.material_bordadura_natural_base === 'granito_preto_angola' ? 'selected' : ''}>Granito Preto Angola</option>
+                                                    <option value="granito_preto_zimbabue" ${processedAnswers.material_bordadura_natural_base === 'granito_preto_zimbabue' ? 'selected' : ''}>Granito Preto Zimbabue</option>
+                                                    <option value="marmore_branco_ibiza" ${processedAnswers.material_bordadura_natural_base === 'marmore_branco_ibiza' ? 'selected' : ''}>Mármore Branco Ibiza</option>
+                                                    <option value="travertino_turco" ${processedAnswers.material_bordadura_natural_base === 'travertino_turco' ? 'selected' : ''}>Travertino Turco</option>
+                                                    <option value="pedra_hijau" ${processedAnswers.material_bordadura_natural_base === 'pedra_hijau' ? 'selected' : ''}>Pedra Hijau</option>
+                                                </select>
+                                            </div>
+                                        </div>
+
+                                        <!-- Opções para cerâmico -->
+                                        <div id="edit-ceramico-options" style="display: ${processedAnswers.tipo_bordadura === 'ceramico' ? 'block' : 'none'};">
+                                            <div class="form-group premium-field">
+                                                <label>Série Cerâmica</label>
+                                                <select id="edit-serie-bordadura-ceramico" style="width:100%;padding:10px;border:2px solid #e5e7eb;border-radius:8px;">
+                                                    <option value="">Selecione a série</option>
+                                                    <option value="niza" ${processedAnswers.serie_bordadura_ceramico === 'niza' ? 'selected' : ''}>Niza</option>
+                                                    <option value="oslo" ${processedAnswers.serie_bordadura_ceramico === 'oslo' ? 'selected' : ''}>Oslo</option>
+                                                    <option value="paradise_bali" ${processedAnswers.serie_bordadura_ceramico === 'paradise_bali' ? 'selected' : ''}>Paradise Bali</option>
+                                                    <option value="tivoli" ${processedAnswers.serie_bordadura_ceramico === 'tivoli' ? 'selected' : ''}>Tívoli</option>
+                                                    <option value="amberes" ${processedAnswers.serie_bordadura_ceramico === 'amberes' ? 'selected' : ''}>Amberes</option>
+                                                </select>
+                                            </div>
+                                        </div>
+                                    </div>
+                                </div>
+                            </div>
+                        </div>
+                    </div>
+                </div>
+            </div>
+            <div class="edit-modal-footer premium-footer">
+                <button onclick="closeModal()" class="btn btn-secondary premium-btn">
+                    <i class="fas fa-times"></i>
+                    Cancelar
+                </button>
+                <button onclick="saveCompleteConfiguration()" class="btn btn-primary premium-btn primary">
+                    <i class="fas fa-sync-alt"></i>
+                    Salvar e Recalcular
+                </button>
+            </div>
+        </div>
+    `;
+    document.body.appendChild(modal);
+
+    // Adicionar event listeners para os radio buttons customizados
+    setupPremiumRadioButtons();
+}
+
+// Função para configurar radio buttons premium
+function setupPremiumRadioButtons() {
+    document.querySelectorAll('.radio-option-premium').forEach(option => {
+        option.addEventListener('click', function() {
+            // Remove selected class from siblings
+            const siblings = this.parentNode.querySelectorAll('.radio-option-premium');
+            siblings.forEach(sibling => sibling.classList.remove('selected'));
+
+            // Add selected class to clicked option
+            this.classList.add('selected');
+
+            // Update hidden input
+            const hiddenInput = this.parentNode.nextElementSibling;
+            if (hiddenInput && hiddenInput.tagName === 'INPUT') {
+                hiddenInput.value = this.dataset.value;
+
+                // Handle cobertura sub-options visibility
+                if (hiddenInput.id === 'edit-cobertura') {
+                    const laminasOptions = document.getElementById('edit-cobertura-laminas-options');
+                    if (laminasOptions) {
+                        if (this.dataset.value === 'laminas') {
+                            laminasOptions.style.display = 'block';
+                        } else {
+                            laminasOptions.style.display = 'none';
+                            // Clear laminas type selection
+                            const laminasInput = document.getElementById('edit-tipo-cobertura-laminas');
+                            if (laminasInput) {
+                                laminasInput.value = '';
+                                // Remove selected class from laminas options
+                                const laminasRadios = laminasOptions.querySelectorAll('.radio-option-premium');
+                                laminasRadios.forEach(radio => radio.classList.remove('selected'));
+                            }
+                        }
+                    }
+                }
+
+                // Handle zona de praia sub-options visibility
+                if (hiddenInput.id === 'edit-zona-praia') {
+                    const zonaPraiaCampos = document.getElementById('edit-zona-praia-campos');
+                    if (zonaPraiaCampos) {
+                        if (this.dataset.value === 'sim') {
+                            zonaPraiaCampos.style.display = 'block';
+                        } else {
+                            zonaPraiaCampos.style.display = 'none';
+                            // Clear zona praia inputs
+                            const larguraInput = document.getElementById('edit-zona-praia-largura');
+                            if (larguraInput) larguraInput.value = '';
+                        }
+                    }
+                }
+
+                // Handle escadas sub-options visibility
+                if (hiddenInput.id === 'edit-escadas') {
+                    const escadasCampos = document.getElementById('edit-escadas-campos');
+                    if (escadasCampos) {
+                        if (this.dataset.value === 'sim') {
+                            escadasCampos.style.display = 'block';
+                        } else {
+                            escadasCampos.style.display = 'none';
+                            // Clear escadas input
+                            const larguraInput = document.getElementById('edit-escadas-largura');
+                            if (larguraInput) larguraInput.value = '';
+                        }
+                    }
+                }
+
+                // Handle laje sub-options visibility
+                if (hiddenInput.id === 'edit-havera-laje') {
+                    const lajeCampos = document.getElementById('edit-laje-campos');
+                    if (lajeCampos) {
+                        if (this.dataset.value === 'sim') {
+                            lajeCampos.style.display = 'block';
+                        } else {
+                            lajeCampos.style.display = 'none';
+                            // Clear laje inputs
+                            const m2Input = document.getElementById('edit-laje-m2');
+                            const espessuraInput = document.getElementById('edit-laje-espessura');
+                            const revestimentoInput = document.getElementById('edit-revestimento-laje');
+                            const materialContainer = document.getElementById('edit-material-revestimento-container');
+                            const materialInput = document.getElementById('edit-material-revestimento');
+
+                            if (m2Input) m2Input.value = '';
+                            if (espessuraInput) espessuraInput.value = '';
+                            if (revestimentoInput) revestimentoInput.value = 'nao';
+                            if (materialContainer) materialContainer.style.display = 'none';
+                            if (materialInput) materialInput.value = '';
+
+                            // Clear revestimento laje radio selection
+                            const revestimentoRadios = document.querySelectorAll('[data-value="nao"]');
+                            revestimentoRadios.forEach(radio => {
+                                if (radio.closest('.form-group').querySelector('#edit-revestimento-laje')) {
+                                    radio.classList.add('selected');
+                                    radio.parentNode.querySelectorAll('.radio-option-premium').forEach(opt => {
+                                        if (opt !== radio) opt.classList.remove('selected');
+                                    });
+                                }
+                            });
+                        }
+                    }
+                }
+
+                // Handle revestimento laje sub-options visibility
+                if (hiddenInput.id === 'edit-revestimento-laje') {
+                    const materialContainer = document.getElementById('edit-material-revestimento-container');
+                    if (materialContainer) {
+                        if (this.dataset.value === 'sim') {
+                            materialContainer.style.display = 'block';
+                        } else {
+                            materialContainer.style.display = 'none';
+                            // Clear material selection
+                            const materialInput = document.getElementById('edit-material-revestimento');
+                            if (materialInput) materialInput.value = '';
+                        }
+                    }
+                }
+
+                // Handle bordadura sub-options visibility
+                if (hiddenInput.id === 'edit-havera-bordadura') {
+                    const bordaduraOptions = document.getElementById('edit-bordadura-options');
+                    if (bordaduraOptions) {
+                        if (this.dataset.value === 'sim') {
+                            bordaduraOptions.style.display = 'block';
+                        } else {
+                            bordaduraOptions.style.display = 'none';
+                            // Clear bordadura inputs
+                            const tipoInput = document.getElementById('edit-tipo-bordadura');
+                            const espessuraInput = document.getElementById('edit-espessura-bordadura');
+                            const materialNaturalInput = document.getElementById('edit-material-bordadura-natural');
+                            const serieceramicoInput = document.getElementById('edit-serie-bordadura-ceramico');
+                            const pedraNaturalOptions = document.getElementById('edit-pedra-natural-options');
+                            const ceramicoOptions = document.getElementById('edit-ceramico-options');
+
+                            if (tipoInput) tipoInput.value = '';
+                            if (espessuraInput) espessuraInput.value = '';
+                            if (materialNaturalInput) materialNaturalInput.value = '';
+                            if (serieceramicoInput) serieceramicoInput.value = '';
+                            if (pedraNaturalOptions) pedraNaturalOptions.style.display = 'none';
+                            if (ceramicoOptions) ceramicoOptions.style.display = 'none';
+
+                            // Clear tipo bordadura radio selection
+                            const tipoRadios = bordaduraOptions.querySelectorAll('.radio-option-premium');
+                            tipoRadios.forEach(radio => radio.classList.remove('selected'));
+                        }
+                    }
+                }
+
+                // Handle tipo bordadura sub-options visibility
+                if (hiddenInput.id === 'edit-tipo-bordadura') {
+                    const pedraNaturalOptions = document.getElementById('edit-pedra-natural-options');
+                    const ceramicoOptions = document.getElementById('edit-ceramico-options');
+
+                    if (this.dataset.value === 'pedra_natural') {
+                        if (pedraNaturalOptions) pedraNaturalOptions.style.display = 'block';
+                        if (ceramicoOptions) ceramicoOptions.style.display = 'none';
+                        // Clear ceramico inputs
+                        const serieInput = document.getElementById('edit-serie-bordadura-ceramico');
+                        if (serieInput) serieInput.value = '';
+                    } else if (this.dataset.value === 'ceramico') {
+                        if (ceramicoOptions) ceramicoOptions.style.display = 'block';
+                        if (pedraNaturalOptions) pedraNaturalOptions.style.display = 'none';
+                        // Clear pedra natural inputs
+                        const espessuraInput = document.getElementById('edit-espessura-bordadura');
+                        const materialInput = document.getElementById('edit-material-bordadura-natural');
+                        if (espessuraInput) espessuraInput.value = '';
+                        if (materialInput) materialInput.value = '';
+                    } else {
+                        if (pedraNaturalOptions) pedraNaturalOptions.style.display = 'none';
+                        if (ceramicoOptions) ceramicoOptions.style.display = 'none';
+                    }
+                }
+            }
+        });
+    });
+}
+
+// Função para salvar configuração completa e recalcular
+function saveCompleteConfiguration() {
+    const newDimensions = {
+        comprimento: parseFloat(document.getElementById('edit-comprimento').value),
+        largura: parseFloat(document.getElementById('edit-largura').value),
+        prof_min: parseFloat(document.getElementById('edit-prof-min').value),
+        prof_max: parseFloat(document.getElementById('edit-prof-max').value)
+    };
+
+    const newAnswers = {
+        acesso: document.getElementById('edit-acesso').value,
+        escavacao: document.getElementById('edit-escavacao').value,
+        forma: document.getElementById('edit-forma').value,
+        tipo_piscina: document.getElementById('edit-tipo-piscina').value,
+        revestimento: document.getElementById('edit-revestimento').value,
+        domotica: document.getElementById('edit-domotica').value,
+        localizacao: document.getElementById('edit-localizacao').value,
+        luz: document.getElementById('edit-luz').value,
+        tratamento_agua: document.getElementById('edit-tratamento-agua').value,
+        tipo_construcao: document.getElementById('edit-tipo-construcao').value,
+        cobertura: document.getElementById('edit-cobertura').value,
+        tipo_cobertura_laminas: document.getElementById('edit-tipo-cobertura-laminas').value,
+        // Zona de praia e escadas
+        zona_praia: document.getElementById('edit-zona-praia').value,
+        zona_praia_largura: document.getElementById('edit-zona-praia-largura') ? parseFloat(document.getElementById('edit-zona-praia-largura').value) || 0 : 0,
+        zona_praia_comprimento: document.getElementById('edit-zona-praia').value === 'sim' ? parseFloat(document.getElementById('edit-largura').value) || 0 : 0, // Comprimento = largura da piscina
+        escadas: document.getElementById('edit-escadas').value,
+        escadas_largura: document.getElementById('edit-escadas-largura') ? parseFloat(document.getElementById('edit-escadas-largura').value) || 0 : 0
+    };
+
+    // Incluir casa das máquinas e tipo de luzes (idem questionário)
+    newAnswers.casa_maquinas_abaixo = document.getElementById('edit-casa_maquinas_abaixo') ? document.getElementById('edit-casa_maquinas_abaixo').value : 'nao';
+    newAnswers.casa_maquinas_desc = document.getElementById('edit-casa_maquinas_desc') ? document.getElementById('edit-casa_maquinas_desc').value : '';
+    newAnswers.tipo_luzes = document.getElementById('edit-tipo_luzes') ? document.getElementById('edit-tipo_luzes').value : 'branco_frio';
+
+    // Incluir campos da laje
+    newAnswers.havera_laje = document.getElementById('edit-havera-laje') ? document.getElementById('edit-havera-laje').value : 'nao';
+    if (newAnswers.havera_laje === 'sim') {
+        newAnswers.laje_m2 = document.getElementById('edit-laje-m2') ? parseFloat(document.getElementById('edit-laje-m2').value) || 0 : 0;
+        newAnswers.laje_espessura = document.getElementById('edit-laje-espessura') ? parseFloat(document.getElementById('edit-laje-espessura').value) || 0 : 0;
+        newAnswers.revestimento_laje = document.getElementById('edit-revestimento-laje') ? document.getElementById('edit-revestimento-laje').value : 'nao';
+        if (newAnswers.revestimento_laje === 'sim') {
+            newAnswers.material_revestimento = document.getElementById('edit-material-revestimento') ? document.getElementById('edit-material-revestimento').value : '';
+        }
+    }
+
+    // Incluir campos da bordadura
+    newAnswers.havera_bordadura = document.getElementById('edit-havera-bordadura') ? document.getElementById('edit-havera-bordadura').value : 'nao';
+    if (newAnswers.havera_bordadura === 'sim') {
+        newAnswers.tipo_bordadura = document.getElementById('edit-tipo-bordadura') ? document.getElementById('edit-tipo-bordadura').value : '';
+        if (newAnswers.tipo_bordadura === 'pedra_natural') {
+            const espessura = document.getElementById('edit-espessura-bordadura') ? document.getElementById('edit-espessura-bordadura').value : '';
+            const material = document.getElementById('edit-material-bordadura-natural') ? document.getElementById('edit-material-bordadura-natural').value : '';
+
+            // Combinar material e espessura para formar a chave correta
+            if (espessura && material) {
+                if (material === 'pedra_hijau') {
+                    // Pedra Hijau sempre usa 1cm
+                    newAnswers.material_bordadura_natural = 'pedra_hijau_1cm';
+                } else {
+                    // Outros materiais usam a espessura selecionada
+                    newAnswers.material_bordadura_natural = `${material}_${espessura}`;
+                }
+            }
+            newAnswers.espessura_bordadura = espessura;
+        } else if (newAnswers.tipo_bordadura === 'ceramico') {
+            newAnswers.serie_bordadura_ceramico = document.getElementById('edit-serie-bordadura-ceramico') ? document.getElementById('edit-serie-bordadura-ceramico').value : '';
+        }
+    }
+
+    // Mostrar loading
+    const saveBtn = document.querySelector('.btn.btn-primary.premium-btn.primary');
+    const originalText = saveBtn.innerHTML;
+    saveBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Recalculando...';
+    saveBtn.disabled = true;
+
+    // Enviar para o servidor para recalcular completamente
+    fetch('/recalculate_budget', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            comprimento: newDimensions.comprimento,
+            largura: newDimensions.largura,
+            prof_min: newDimensions.prof_min,
+            prof_max: newDimensions.prof_max,
+            answers: newAnswers
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            closeModal();
+            showSuccessMessage('✨ Configuração atualizada! Recarregando orçamento completo...');
+            setTimeout(() => location.reload(), 2000);
+        } else {
+            saveBtn.innerHTML = originalText;
+            saveBtn.disabled = false;
+            alert('❌ Erro ao recalcular: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Erro:', error);
+        saveBtn.innerHTML = originalText;
+        saveBtn.disabled = false;
+        alert('❌ Erro ao comunicar com o servidor');
+    });
+}
+
+// Função para editar informações do cliente
+function editClientInfo() {
+    const clientName = document.querySelector('.client-name')?.textContent.replace(/[📞👤]/g, '').trim() || '';
+    const proposalNumber = document.querySelector('.proposal-number')?.textContent.replace('#', '').trim() || '';
+    const clientDate = document.querySelector('.date')?.textContent.replace(/[📅]/g, '').trim() || '';
+    const commercialName = document.querySelector('.commercial-name')?.textContent.replace(/[👔]/g, '').trim() || '';
+
+    const modal = document.createElement('div');
+    modal.className = 'edit-modal-overlay';
+    modal.innerHTML = `
+        <div class="edit-modal" style="max-width: 600px;">
+            <div class="edit-modal-header">
+                <h3><i class="fas fa-user-edit"></i> Editar Dados do Cliente</h3>
+                <button onclick="closeModal()" class="close-btn">&times;</button>
+            </div>
+            <div class="edit-modal-body">
+                <div class="form-grid" style="display: grid; grid-template-columns: 1fr 1fr; gap: 1.5rem;">
+                    <div class="form-group">
+                        <label style="display: block; margin-bottom: 0.5rem; font-weight: 600; color: #2c3e50;">
+                            <i class="fas fa-user" style="margin-right: 0.5rem; color: #3498db;"></i>
+                            Nome do Cliente
+                        </label>
+                        <input type="text" id="edit-client-name" value="${clientName}" 
+                               style="width: 100%; padding: 0.75rem; border: 2px solid #e1e8ed; border-radius: 8px; font-size: 14px; transition: all 0.3s ease;"
+                               onfocus="this.style.borderColor='#3498db'; this.style.boxShadow='0 0 0 3px rgba(52, 152, 219, 0.1)'"
+                               onblur="this.style.borderColor='#e1e8ed'; this.style.boxShadow='none'" />
+                    </div>
+                    <div class="form-group">
+                        <label style="display: block; margin-bottom: 0.5rem; font-weight: 600; color: #2c3e50;">
+                            <i class="fas fa-user-tie" style="margin-right: 0.5rem; color: #9b59b6;"></i>
+                            Nome do Comercial
+                        </label>
+                        <input type="text" id="edit-commercial-name" value="${commercialName}" 
+                               style="width: 100%; padding: 0.75rem; border: 2px solid #e1e8ed; border-radius: 8px; font-size: 14px; transition: all 0.3s ease;"
+                               onfocus="this.style.borderColor='#9b59b6'; this.style.boxShadow='0 0 0 3px rgba(155, 89, 182, 0.1)'"
+                               onblur="this.style.borderColor='#e1e8ed'; this.style.boxShadow='none'" />
+                    </div>
+                    <div class="form-group">
+                        <label style="display: block; margin-bottom: 0.5rem; font-weight: 600; color: #2c3e50;">
+                            <i class="fas fa-hashtag" style="margin-right: 0.5rem; color: #e67e22;"></i>
+                            Número da Proposta
+                        </label>
+                        <input type="text" id="edit-proposal-number" value="${proposalNumber}" 
+                               style="width: 100%; padding: 0.75rem; border: 2px solid #e1e8ed; border-radius: 8px; font-size: 14px; transition: all 0.3s ease;"
+                               onfocus="this.style.borderColor='#e67e22'; this.style.boxShadow='0 0 0 3px rgba(230, 126, 34, 0.1)'"
+                               onblur="this.style.borderColor='#e1e8ed'; this.style.boxShadow='none'" />
+                    </div>
+                    <div class="form-group">
+                        <label style="display: block; margin-bottom: 0.5rem; font-weight: 600; color: #2c3e50;">
+                            <i class="fas fa-calendar" style="margin-right: 0.5rem; color: #27ae60;"></i>
+                            Data da Proposta
+                        </label>
+                        <input type="date" id="edit-client-date" value="${clientDate}" 
+                               style="width: 100%; padding: 0.75rem; border: 2px solid #e1e8ed; border-radius: 8px; font-size: 14px; transition: all 0.3s ease;"
+                               onfocus="this.style.borderColor='#27ae60'; this.style.boxShadow='0 0 0 3px rgba(39, 174, 96, 0.1)'"
+                               onblur="this.style.borderColor='#e1e8ed'; this.style.boxShadow='none'" />
+                    </div>
+                </div>
+
+                <div style="margin-top: 1.5rem;">
+                    <div class="form-group">
+                        <label style="display: block; margin-bottom: 0.5rem; font-weight: 600; color: #2c3e50;">
+                            <i class="fas fa-map-marker-alt" style="margin-right: 0.5rem; color: #e74c3c;"></i>
+                            Localidade
+                        </label>
+                        <select id="edit-localidade" 
+                                style="width: 100%; padding: 0.75rem; border: 2px solid #e1e8ed; border-radius: 8px; font-size: 14px; transition: all 0.3s ease; background: white;"
+                                onfocus="this.style.borderColor='#e74c3c'; this.style.boxShadow='0 0 0 3px rgba(231, 76, 60, 0.1)'"
+                                onblur="this.style.borderColor='#e1e8ed'; this.style.boxShadow='none'"
+                                onchange="toggleLocalidadeOutroEdit()">
+                            <option value="">-- Selecionar Localidade --</option>
+                            <option>Viseu</option>
+                            <option>Ponte Lima</option>
+                            <option>Barcelos</option>
+                            <option>Santa Maria da Feira</option>
+                            <option>Póvoa de Varzim</option>
+                            <option>Vila do Conde</option>
+                            <option>Viana do Castelo</option>
+                            <option>Famalicão</option>
+                            <option>Ovar</option>
+                            <option>Estarreja</option>
+                            <option>Gaia</option>
+                            <option>Braga</option>
+                            <option>Guimarães</option>
+                            <option>Porto</option>
+                            <option>Maia</option>
+                            <option>Matosinhos</option>
+                            <option value="Outro">Outro</option>
+                        </select>
+                        <input type="text" id="edit-localidade-outro" placeholder="Especifique outra localidade" 
+                               style="width: 100%; padding: 0.75rem; border: 2px solid #e1e8ed; border-radius: 8px; font-size: 14px; margin-top: 0.5rem; display: none; transition: all 0.3s ease;"
+                               onfocus="this.style.borderColor='#e74c3c'; this.style.boxShadow='0 0 0 3px rgba(231, 76, 60, 0.1)'"
+                               onblur="this.style.borderColor='#e1e8ed'; this.style.boxShadow='none'" />
+                    </div>
+                    <div class="form-group">
+                        <label style="display: block; margin-bottom: 0.5rem; font-weight: 600; color: #2c3e50;">
+                            <i class="fas fa-sticky-note" style="margin-right: 0.5rem; color: #f39c12;"></i>
+                            Observações
+                        </label>
+                        <textarea id="edit-observations" rows="3" placeholder="Informações adicionais sobre o projeto..."
+                                  style="width: 100%; padding: 0.75rem; border: 2px solid #e1e8ed; border-radius: 8px; font-size: 14px; resize: vertical; transition: all 0.3s ease;"
+                                  onfocus="this.style.borderColor='#f39c12'; this.style.boxShadow='0 0 0 3px rgba(243, 156, 18, 0.1)'"
+                                  onblur="this.style.borderColor='#e1e8ed'; this.style.boxShadow='none'"></textarea>
+                    </div>
+                </div>
+            </div>
+            <div class="edit-modal-footer" style="display: flex; justify-content: flex-end; gap: 1rem; padding: 1.5rem; border-top: 1px solid #e1e8ed;">
+                <button onclick="closeModal()" class="btn btn-secondary" 
+                        style="padding: 0.75rem 1.5rem; border: 2px solid #95a5a6; background: transparent; color: #95a5a6; border-radius: 8px; font-weight: 600; transition: all 0.3s ease;"
+                        onmouseover="this.style.background='#95a5a6'; this.style.color='white'"
+                        onmouseout="this.style.background='transparent'; this.style.color='#95a5a6'">
+                    <i class="fas fa-times" style="margin-right: 0.5rem;"></i>Cancelar
+                </button>
+                <button onclick="saveClientInfo()" class="btn btn-primary"
+                        style="padding: 0.75rem 1.5rem; border: 2px solid #3498db; background: #3498db; color: white; border-radius: 8px; font-weight: 600; transition: all 0.3s ease;"
+                        onmouseover="this.style.background='#2980b9'; this.style.borderColor='#2980b9'"
+                        onmouseout="this.style.background='#3498db'; this.style.borderColor='#3498db'">
+                    <i class="fas fa-save" style="margin-right: 0.5rem;"></i>Salvar
+                </button>
+            </div>
+        </div>
+    `;
+    document.body.appendChild(modal);
+
+    // Carregar valores atuais da localidade e observações
+    loadCurrentClientData();
+}
+
+// Função para editar informações da piscina
+function editPoolInfo() {
+    const dimensionsText = document.querySelector('.pool-dimensions, .value-dimensions')?.textContent || '0×0m';
+    const depthText = document.querySelector('.pool-depth, .value-depth')?.textContent || '0-0m';
+
+    const comprimento = dimensionsText.split('×')[0]?.replace('m', '').trim() || '0';
+    const largura = dimensionsText.split('×')[1]?.replace('m', '').trim() || '0';
+    const profMin = depthText.split('-')[0]?.replace('m', '').trim() || '0';
+    const profMax = depthText.split('-')[1]?.replace('m', '').trim() || '0';
+
+    const modal = document.createElement('div');
+    modal.className = 'edit-modal-overlay';
+    modal.innerHTML = `
+        <div class="edit-modal">
+            <div class="edit-modal-header">
+                <h3><i class="fas fa-swimming-pool"></i> Editar Dados da Piscina</h3>
+                <button onclick="closeModal()" class="close-btn">&times;</button>
+            </div>
+            <div class="edit-modal-body">
+                <div class="form-group">
+                    <label>Comprimento (m)</label>
+                    <input type="number" id="edit-comprimento" value="${comprimento}" step="0.1" />
+                </div>
+                <div class="form-group">
+                    <label>Largura (m)</label>
+                    <input type="number" id="edit-largura" value="${largura}" step="0.1" />
+                </div>
+                <div class="form-group">
+                    <label>Profundidade Mínima (m)</label>
+                    <input type="number" id="edit-prof-min" value="${profMin}" step="0.1" />
+                </div>
+                <div class="form-group">
+                    <label>Profundidade Máxima (m)</label>
+                    <input type="number" id="edit-prof-max" value="${profMax}" step="0.1" />
+                </div>
+            </div>
+            <div class="edit-modal-footer">
+                <button onclick="closeModal()" class="btn btn-secondary">Cancelar</button>
+                <button onclick="savePoolInfo()" class="btn btn-primary">Salvar</button>
+            </div>
+        </div>
+    `;
+    document.body.appendChild(modal);
+}
+
+// Função para carregar dados atuais do cliente
+function loadCurrentClientData() {
+    // Carregar localidade atual do backend ou template variables
+    fetch('/get_current_client_data')
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                const localidadeSelect = document.getElementById('edit-localidade');
+                const localidadeOutro = document.getElementById('edit-localidade-outro');
+                const observations = document.getElementById('edit-observations');
+
+                if (data.client_data.localidade) {
+                    localidadeSelect.value = data.client_data.localidade;
+                    if (data.client_data.localidade === 'Outro' && data.client_data.localidade_outro) {
+                        localidadeOutro.style.display = 'block';
+                        localidadeOutro.value = data.client_data.localidade_outro;
+                    }
+                }
+
+                if (data.client_data.observations) {
+                    observations.value = data.client_data.observations;
+                }
+            }
+        })
+        .catch(error => {
+            console.log('Dados do cliente não encontrados, usando valores padrão');
+        });
+}
+
+// Função para alternar campo "Outro" da localidade
+function toggleLocalidadeOutroEdit() {
+    const select = document.getElementById('edit-localidade');
+    const outroField = document.getElementById('edit-localidade-outro');
+
+    if (select.value === 'Outro') {
+        outroField.style.display = 'block';
+        outroField.focus();
+    } else {
+        outroField.style.display = 'none';
+        outroField.value = '';
+    }
+}
+
+// Função para salvar dados do cliente
+function saveClientInfo() {
+    const clientName = document.getElementById('edit-client-name').value;
+    const proposalNumber = document.getElementById('edit-proposal-number').value;
+    const clientDate = document.getElementById('edit-client-date').value;
+    const commercialName = document.getElementById('edit-commercial-name').value;
+    const localidade = document.getElementById('edit-localidade').value;
+    const localidadeOutro = document.getElementById('edit-localidade-outro').value;
+    const observations = document.getElementById('edit-observations').value;
+
+    // Atualizar na interface
+    const clientNameEl = document.querySelector('.client-name');
+    if (clientNameEl) clientNameEl.innerHTML = `<i class="fas fa-user"></i> ${clientName}`;
+
+    const proposalEl = document.querySelector('.proposal-number');
+    if (proposalEl) proposalEl.innerHTML = `<i class="fas fa-hashtag"></i> ${proposalNumber}`;
+
+    const dateEl = document.querySelector('.date');
+    if (dateEl) dateEl.innerHTML = `<i class="fas fa-calendar"></i> ${clientDate}`;
+
+    const commercialEl = document.querySelector('.commercial-name');
+    if (commercialEl && commercialName) commercialEl.innerHTML = `<i class="fas fa-user-tie"></i> ${commercialName}`;
+
+    // Salvar dados no backend
+    const formData = new FormData();
+    formData.append('clientName', clientName);
+    formData.append('proposalNumber', proposalNumber);
+    formData.append('date', clientDate);
+    formData.append('commercialName', commercialName);
+    formData.append('localidade', localidade);
+    formData.append('localidade_outro', localidadeOutro);
+    formData.append('observations', observations);
+
+    fetch('/update_client_data', {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showSuccessMessage('Dados do cliente atualizados com sucesso!');
+        } else {
+            showErrorMessage('Erro ao atualizar dados do cliente: ' + (data.error || 'Erro desconhecido'));
+        }
+    })
+    .catch(error => {
+        console.error('Erro:', error);
+        showErrorMessage('Erro de conexão ao atualizar dados do cliente');
+    });
+
+    closeModal();
+}
+
+// Função para salvar dados da piscina  
+function savePoolInfo() {
+    const comprimento = document.getElementById('edit-comprimento').value;
+    const largura = document.getElementById('edit-largura').value;
+    const profMin = document.getElementById('edit-prof-min').value;
+    const profMax = document.getElementById('edit-prof-max').value;
+
+    // Obter respostas atuais do questionário para manter
+    const poolTypeEl = document.querySelector('.value-pool-type');
+    const shapeEl = document.querySelector('.value-shape');
+    const coatingEl = document.querySelector('.value-coating');
+    const accessEl = document.querySelector('.value-access');
+    const excavationEl = document.querySelector('.value-excavation');
+    const locationEl = document.querySelector('.value-location');
+    const domoticsEl = document.querySelector('.value-domotics');
+    const powerEl = document.querySelector('.value-power');
+
+    const currentPoolType = poolTypeEl ? poolTypeEl.textContent.trim().toLowerCase() : '';
+    const currentShape = shapeEl ? shapeEl.textContent.trim().toLowerCase() : '';
+    const currentCoating = coatingEl ? coatingEl.textContent.trim().toLowerCase() : '';
+    const currentAccess = accessEl ? accessEl.textContent.trim().toLowerCase() : '';
+    const currentExcavation = excavationEl ? (excavationEl.textContent.includes('Incluída') ? 'true' : 'false') : 'false';
+    const currentLocation = locationEl ? locationEl.textContent.trim().toLowerCase() : '';
+    const currentDomotics = domoticsEl ? (domoticsEl.textContent.includes('Sim') ? 'true' : 'false') : 'false';
+    const currentPower = powerEl ? (powerEl.textContent.includes('Trifásica') ? 'trifasica' : 'monofasica') : 'monofasica';
+
+    // Mapear valores de volta para os códigos corretos
+    let poolTypeCode = 'skimmer';
+    if (currentPoolType.includes('espelho')) poolTypeCode = 'espelho_dagua';
+    else if (currentPoolType.includes('transbordo')) poolTypeCode = 'transbordo';
+
+    let shapeCode = 'retangular';
+    if (currentShape.includes('quadrada')) shapeCode = 'quadrada';
+    else if (currentShape.includes('oval')) shapeCode = 'oval';
+    else if (currentShape.includes('redonda')) shapeCode = 'redonda';
+    else if (currentShape.includes('l')) shapeCode = 'em_l';
+    else if (currentShape.includes('irregular')) shapeCode = 'irregular';
+
+    let coatingCode = 'vinil';
+    if (currentCoating.includes('fibra')) coatingCode = 'fibra';
+    else if (currentCoating.includes('azulejo')) coatingCode = 'azulejo';
+    else if (currentCoating.includes('pastilha')) coatingCode = 'pastilha';
+    else if (currentCoating.includes('pedra')) coatingCode = 'pedra';
+
+    let accessCode = 'facil';
+    if (currentAccess.includes('medio')) accessCode = 'medio';
+    else if (currentAccess.includes('dificil')) accessCode = 'dificil';
+
+    let locationCode = 'urbana';
+    if (currentLocation.includes('rural')) locationCode = 'rural';
+    else if (currentLocation.includes('costeira')) locationCode = 'costeira';
+
+    // Preparar dados para recalcular
+    const updateData = {
+        comprimento: parseFloat(comprimento),
+        largura: parseFloat(largura),
+        prof_min: parseFloat(profMin),
+        prof_max: parseFloat(profMax),
+        answers: {
+            tipo_piscina: poolTypeCode,
+            forma: shapeCode,
+            revestimento: coatingCode,
+            acesso: accessCode,
+            escavacao: currentExcavation,
+            localizacao: locationCode,
+            domotica: currentDomotics,
+            luz: currentPower
+        }
+    };
+
+    // Mostrar loading
+    const loadingDiv = document.createElement('div');
+    loadingDiv.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        background: linear-gradient(135deg, #f59e0b, #d97706);
+        color: white;
+        padding: 15px 25px;
+        border-radius: 8px;
+        box-shadow: 0 8px 25px rgba(245, 158, 11, 0.3);
+        z-index: 1002;
+        animation: slideInRight 0.3s ease;
+        font-weight: 600;
+    `;
+    loadingDiv.innerHTML = `<i class="fas fa-spinner fa-spin"></i> Recalculando com novas medidas...`;
+    document.body.appendChild(loadingDiv);
+
+    // Enviar para o backend para recalcular
+    fetch('/recalculate_budget', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(updateData)
+    })
+    .then(response => response.json())
+    .then(data => {
+        loadingDiv.remove();
+        if (data.success) {
+            closeModal();
+            showSuccessMessage('Medidas atualizadas e orçamento recalculado!');
+            setTimeout(() => {
+                window.location.reload();
+            }, 1500);
+        } else {
+            showErrorMessage('Erro ao recalcular: ' + data.error);
+        }
+    })
+    .catch(error => {
+        loadingDiv.remove();
+        console.error('Erro ao recalcular:', error);
+        showErrorMessage('Erro de comunicação com o servidor');
+    });
+}
+
+// Função para editar respostas do questionário
+function editQuestionnaireAnswers() {
+    // Capturar valores atuais das respostas
+    const poolTypeEl = document.querySelector('.value-pool-type');
+    const shapeEl = document.querySelector('.value-shape');
+    const coatingEl = document.querySelector('.value-coating');
+    const accessEl = document.querySelector('.value-access');
+    const excavationEl = document.querySelector('.value-excavation');
+    const locationEl = document.querySelector('.value-location');
+    const domoticsEl = document.querySelector('.value-domotics');
+    const powerEl = document.querySelector('.value-power');
+
+    const currentPoolType = poolTypeEl ? poolTypeEl.textContent.trim().toLowerCase() : '';
+    const currentShape = shapeEl ? shapeEl.textContent.trim().toLowerCase() : '';
+    const currentCoating = coatingEl ? coatingEl.textContent.trim().toLowerCase() : '';
+    const currentAccess = accessEl ? accessEl.textContent.trim().toLowerCase() : '';
+    const currentExcavation = excavationEl ? (excavationEl.textContent.includes('Incluída') ? 'true' : 'false') : 'false';
+    const currentLocation = locationEl ? locationEl.textContent.trim().toLowerCase() : '';
+    const currentDomotics = domoticsEl ? (domoticsEl.textContent.includes('Sim') ? 'true' : 'false') : 'false';
+    const currentPower = powerEl ? (powerEl.textContent.includes('Trifásica') ? 'trifasica' : 'monofasica') : 'monofasica';
+
+    const modal = document.createElement('div');
+    modal.className = 'edit-modal-overlay';
+    modal.innerHTML = `
+        <div class="edit-modal questionnaire-modal">
+            <div class="edit-modal-header">
+                <h3><i class="fas fa-cog"></i> Editar Configuração do Projeto</h3>
+                <button onclick="closeModal()" class="close-btn">&times;</button>
+            </div>
+            <div class="edit-modal-body">
+                <div class="form-group">
+                    <label>Tipo de Piscina</label>
+                    <select id="edit-pool-type">
+                        <option value="skimmer" ${currentPoolType.includes('skimmer') ? 'selected' : ''}>Skimmer</option>
+                        <option value="espelho_dagua" ${currentPoolType.includes('espelho') ? 'selected' : ''}>Espelho d'Água</option>
+                        <option value="transbordo" ${currentPoolType.includes('transbordo') ? 'selected' : ''}>Transbordo</option>
+                    </select>
+                </div>
+                <div class="form-group">
+                    <label>Forma</label>
+                    <select id="edit-shape">
+                        <option value="retangular" ${currentShape.includes('retangular') ? 'selected' : ''}>Retangular</option>
+                        <option value="quadrada" ${currentShape.includes('quadrada') ? 'selected' : ''}>Quadrada</option>
+                        <option value="oval" ${currentShape.includes('oval') ? 'selected' : ''}>Oval</option>
+                        <option value="redonda" ${currentShape.includes('redonda') ? 'selected' : ''}>Redonda</option>
+                        <option value="em_l" ${currentShape.includes('l') ? 'selected' : ''}>Em L</option>
+                        <option value="irregular" ${currentShape.includes('irregular') ? 'selected' : ''}>Irregular</option>
+                    </select>
+                </div>
+                <div class="form-group">
+                    <label>Revestimento</label>
+                    <select id="edit-coating">
+                        <option value="vinil" ${currentCoating.includes('vinil') ? 'selected' : ''}>Vinil</option>
+                        <option value="fibra" ${currentCoating.includes('fibra') ? 'selected' : ''}>Fibra de Vidro</option>
+                        <option value="azulejo" ${currentCoating.includes('azulejo') ? 'selected' : ''}>Azulejo</option>
+                        <option value="pastilha" ${currentCoating.includes('pastilha') ? 'selected' : ''}>Pastilha</option>
+                        <option value="pedra" ${currentCoating.includes('pedra') ? 'selected' : ''}>Pedra Natural</option>
+                    </select>
+                </div>
+                <div class="form-group">
+                    <label>Acesso ao Local</label>
+                    <select id="edit-access">
+                        <option value="facil" ${currentAccess.includes('facil') ? 'selected' : ''}>Fácil</option>
+                        <option value="medio" ${currentAccess.includes('medio') ? 'selected' : ''}>Médio</option>
+                        <option value="dificil" ${currentAccess.includes('dificil') ? 'selected' : ''}>Difícil</option>
+                    </select>
+                </div>
+                <div class="form-group">
+                    <label>Escavação</label>
+                    <select id="edit-excavation">
+                        <option value="true" ${currentExcavation === 'true' ? 'selected' : ''}>Incluída</option>
+                        <option value="false" ${currentExcavation === 'false' ? 'selected' : ''}>Não Incluída</option>
+                    </select>
+                </div>
+                <div class="form-group">
+                    <label>Localização</label>
+                    <select id="edit-location">
+                        <option value="urbana" ${currentLocation.includes('urbana') ? 'selected' : ''}>Urbana</option>
+                        <option value="rural" ${currentLocation.includes('rural') ? 'selected' : ''}>Rural</option>
+                        <option value="costeira" ${currentLocation.includes('costeira') ? 'selected' : ''}>Costeira</option>
+                    </select>
+                </div>
+                <div class="form-group">
+                    <label>Sistema Domótico</label>
+                    <select id="edit-domotics">
+                        <option value="true" ${currentDomotics === 'true' ? 'selected' : ''}>Sim</option>
+                        <option value="false" ${currentDomotics === 'false' ? 'selected' : ''}>Não</option>
+                    </select>
+                </div>
+                <div class="form-group">
+                    <label>Alimentação Elétrica</label>
+                    <select id="edit-power">
+                        <option value="monofasica" ${currentPower === 'monofasica' ? 'selected' : ''}>Monofásica</option>
+                        <option value="trifasica" ${currentPower === 'trifasica' ? 'selected' : ''}>Trifásica</option>
+                    </select>
+                </div>
+                <div class="form-group">
+                    <label>Tratamento de Água</label>
+                    <select id="edit-treatment">
+                        <option value="cloro_manual">Cloro Manual</option>
+                        <option value="cloro_automatico">Cloro Automático</option>
+                        <option value="clorador_salino">Clorador Salino</option>
+                        <option value="clorador_salino_ph">Clorador Salino + pH</option>
+                        <option value="clorador_salino_ph_uv">Clorador Salino + pH + UV</option>
+                        <option value="nao">Não Incluído</option>
+                    </select>
+                </div>
+                <div class="form-group">
+                    <label>Tipo de Construção</label>
+                    <select id="edit-construction">
+                        <option value="nova">Construção Nova</option>
+                        <option value="remodelacao">Remodelação</option>
+                    </select>
+                </div>
+                <div class="form-group">
+                    <label>Cobertura</label>
+                    <select id="edit-coverage">
+                        <option value="nao">Sem Cobertura</option>
+                        <option value="laminas">Cobertura de Lâminas</option>
+                        <option value="bolhas">Cobertura de Bolhas</option>
+                        <option value="barras">Cobertura de Barras</option>
+                        <option value="lona">Cobertura de Lona</option>
+                    </select>
+                </div>
+                <div class="form-group" id="edit-coverage-laminas-group" style="display:none;">
+                    <label>Tipo de Cobertura de Lâminas</label>
+                    <select id="edit-coverage-laminas">
+                        <option value="">-- Selecionar --</option>
+                        <option value="submersa_praia">Submersa na Praia</option>
+                        <option value="fora_praia">Fora da Praia</option>
+                        <option value="elevada">Elevada</option>
+                    </select>
+                </div>
+                <div class="form-group">
+                    <label>Casa das Máquinas abaixo do nível da água?</label>
+                    <select id="edit-machine-room">
+                        <option value="nao">Não</option>
+                        <option value="sim">Sim</option>
+                    </select>
+                </div>
+                <div class="form-group">
+                    <label>Observações sobre a casa das máquinas</label>
+                    <textarea id="edit-machine-desc" rows="2" style="width:100%;padding:8px;border:2px solid #e5e7eb;border-radius:6px;"></textarea>
+                </div>
+                <div class="form-group">
+                    <label>Tipo de Luzes</label>
+                    <select id="edit-light-type">
+                        <option value="branco_frio">Branco Frio</option>
+                        <option value="branco_adaptavel">Branco Adaptável</option>
+                        <option value="rgb">RGB</option>
+                    </select>
+                </div>
+            </div>
+            <div class="edit-modal-footer">
+                <button onclick="closeModal()" class="btn btn-secondary">Cancelar</button>
+                <button onclick="saveQuestionnaireAnswers()" class="btn btn-primary">Salvar e Recalcular</button>
+            </div>
+        </div>
+    `;
+    document.body.appendChild(modal);
+}
+
+// Função para salvar respostas do questionário e recalcular
+function saveQuestionnaireAnswers() {
+    const poolType = document.getElementById('edit-pool-type').value;
+    const shape = document.getElementById('edit-shape').value;
+    const coating = document.getElementById('edit-coating').value;
+    const access = document.getElementById('edit-access').value;
+    const excavation = document.getElementById('edit-excavation').value;
+    const location = document.getElementById('edit-location').value;
+    const domotics = document.getElementById('edit-domotics').value;
+    const power = document.getElementById('edit-power').value;
+    // Novos campos
+    const treatment = document.getElementById('edit-treatment') ? document.getElementById('edit-treatment').value : 'cloro_manual';
+    const construction = document.getElementById('edit-construction') ? document.getElementById('edit-construction').value : 'nova';
+    const coverage = document.getElementById('edit-coverage') ? document.getElementById('edit-coverage').value : 'nao';
+    const coverage_laminas = document.getElementById('edit-coverage-laminas') ? document.getElementById('edit-coverage-laminas').value : '';
+    const machine_room = document.getElementById('edit-machine-room') ? document.getElementById('edit-machine-room').value : 'nao';
+    const machine_desc = document.getElementById('edit-machine-desc') ? document.getElementById('edit-machine-desc').value : '';
+    const light_type = document.getElementById('edit-light-type') ? document.getElementById('edit-light-type').value : 'branco_frio';
+
+    // Coletar também as medidas atuais da piscina
+    const dimensionsEl = document.querySelector('.pool-dimensions, .value-dimensions');
+    const depthEl = document.querySelector('.pool-depth, .value-depth');
+
+    const dimensionsText = dimensionsEl ? dimensionsEl.textContent : '0×0m';
+    const depthText = depthEl ? depthEl.textContent : '0-0m';
+
+    const comprimento = dimensionsText.split('×')[0]?.replace('m', '').trim() || '0';
+    const largura = dimensionsText.split('×')[1]?.replace('m', '').trim() || '0';
+    const profMin = depthText.split('-')[0]?.replace('m', '').trim() || '0';
+    const profMax = depthText.split('-')[1]?.replace('m', '').trim() || '0';
+
+    // Preparar dados para enviar ao backend
+    const updateData = {
+        // Medidas da piscina
+        comprimento: parseFloat(comprimento),
+        largura: parseFloat(largura),
+        prof_min: parseFloat(profMin),
+        prof_max: parseFloat(profMax),
+        // Respostas do questionário
+        answers: {
+            tipo_piscina: poolType,
+            forma: shape,
+            revestimento: coating,
+            acesso: access,
+            escavacao: excavation,
+            localizacao: location,
+            domotica: domotics,
+            luz: power,
+            tratamento_agua: treatment,
+            tipo_construcao: construction,
+            cobertura: coverage,
+            tipo_cobertura_laminas: coverage_laminas,
+            casa_maquinas_abaixo: machine_room,
+            casa_maquinas_desc: machine_desc,
+            tipo_luzes: light_type
+        }
+    };
+
+    // Mostrar loading
+    const loadingDiv = document.createElement('div');
+    loadingDiv.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        background: linear-gradient(135deg, #f59e0b, #d97706);
+        color: white;
+        padding: 15px 25px;
+        border-radius: 8px;
+        box-shadow: 0 8px 25px rgba(245, 158, 11, 0.3);
+        z-index: 1002;
+        animation: slideInRight 0.3s ease;
+        font-weight: 600;
+    `;
+    loadingDiv.innerHTML = `<i class="fas fa-spinner fa-spin"></i> Recalculando orçamento...`;
+    document.body.appendChild(loadingDiv);
+
+    // Enviar para o backend para recalcular
+    fetch('/recalculate_budget', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(updateData)
+    })
+    .then(response => response.json())
+    .then(data => {
+        loadingDiv.remove();
+        if (data.success) {
+            // Recarregar a página para mostrar os novos cálculos
+            closeModal();
+            showSuccessMessage('Orçamento recalculado com sucesso!');
+            setTimeout(() => {
+                window.location.reload();
+            }, 1500);
+        } else {
+            showErrorMessage('Erro ao recalcular: ' + data.error);
+        }
+    })
+    .catch(error => {
+        loadingDiv.remove();
+        console.error('Erro ao recalcular:', error);
+        showErrorMessage('Erro de comunicação com o servidor');
+    });
+}
+
+// Função para mostrar mensagem de erro
+function showErrorMessage(message) {
+    const errorDiv = document.createElement('div');
+    errorDiv.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        background: linear-gradient(135deg, #ef4444, #dc2626);
+        color: white;
+        padding: 15px 25px;
+        border-radius: 8px;
+        box-shadow: 0 8px 25px rgba(239, 68, 68, 0.3);
+        z-index: 1002;
+        animation: slideInRight 0.3s ease;
+        font-weight: 600;
+    `;
+    errorDiv.innerHTML = `<i class="fas fa-exclamation-triangle"></i> ${message}`;
+    document.body.appendChild(errorDiv);
+
+    setTimeout(() => errorDiv.remove(), 5000);
+}
+
+// Função para fechar modal
+function closeModal() {
+    const modal = document.querySelector('.edit-modal-overlay');
+    if (modal) modal.remove();
+}
+
+// Função para mostrar mensagem de sucesso
+function showSuccessMessage(message) {
+    const successDiv = document.createElement('div');
+    successDiv.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        background: linear-gradient(135deg, #10b981, #059669);
+        color: white;
+        padding: 15px 25px;
+        border-radius: 8px;
+        box-shadow: 0 8px 25px rgba(16, 185, 129, 0.3);
+        z-index: 1002;
+        animation: slideInRight 0.3s ease;
+        font-weight: 600;
+    `;
+    successDiv.innerHTML = `<i class="fas fa-check"></i> ${message}`;
+    document.body.appendChild(successDiv);
+
+    setTimeout(() => successDiv.remove(), 3000);
+}
+
+// Função para atualizar nome do produto
+function updateProductName(productId, newName) {
+    if (!newName || newName.trim() === '') {
+        // Restaurar nome original se estiver vazio
+        const nameElement = document.querySelector(`[data-product-id="${productId}"].editable-name`);
+        if (nameElement) {
+            nameElement.textContent = nameElement.dataset.originalName;
+        }
+        return;
+    }
+
+    queueBudgetOperation({ op: 'set_name', line: productId, value: newName.trim() })
+    .then(data => {
+        if (data.success) {
+            showSuccessMessage('Nome atualizado com sucesso');
+        } else {
+            // Restaurar nome original em caso de erro
+            const nameElement = document.querySelector(`[data-product-id="${productId}"].editable-name`);
+            if (nameElement) {
+                nameElement.textContent = nameElement.dataset.originalName;
+            }
+            showErrorMessage(data.error || 'Erro ao atualizar nome');
+        }
+    })
+    .catch(error => {
+        console.error('Erro:', error);
+        // Restaurar nome original em caso de erro
+        const nameElement = document.querySelector(`[data-product-id="${productId}"].editable-name`);
+        if (nameElement) {
+            nameElement.textContent = nameElement.dataset.originalName;
+        }
+        showErrorMessage('Erro ao atualizar nome');
+    });
+}
+
+// Função para atualizar preço do produto
+function updateProductPrice(productId, newPriceText) {
+    // Permitir vírgula como separador decimal
+    const cleanPrice = newPriceText.replace(',', '.');
+    const newPrice = parseFloat(cleanPrice);
+
+    if (isNaN(newPrice) || newPrice < 0) {
+        // Restaurar preço original se inválido
+        const priceElement = document.querySelector(`[data-product-id="${productId}"].editable-price`);
+        if (priceElement) {
+            priceElement.textContent = parseFloat(priceElement.dataset.originalPrice).toFixed(2);
+        }
+        showErrorMessage('Preço inválido. Use apenas números (vírgula ou ponto para decimais)');
+        return;
+    }
+
+    queueBudgetOperation({ op: 'set_price', line: productId, value: newPrice })
+    .then(data => {
+        if (data.success) {
+            showSuccessMessage('Preço atualizado com sucesso');
+            // Atualizar o display do preço
+            const priceElement = document.querySelector(`[data-product-id="${productId}"].editable-price`);
+            if (priceElement) {
+                priceElement.textContent = newPrice.toFixed(2);
+                priceElement.dataset.originalPrice = newPrice;
+            }
+            // Recarregar para atualizar totais
+            setTimeout(() => location.reload(), 1000);
+        } else {
+            // Restaurar preço original em caso de erro
+            const priceElement = document.querySelector(`[data-product-id="${productId}"].editable-price`);
+            if (priceElement) {
+                priceElement.textContent = parseFloat(priceElement.dataset.originalPrice).toFixed(2);
+            }
+            showErrorMessage(data.error || 'Erro ao atualizar preço');
+        }
+    })
+    .catch(error => {
+        console.error('Erro:', error);
+        // Restaurar preço original em caso de erro
+        const priceElement = document.querySelector(`[data-product-id="${productId}"].editable-price`);
+        if (priceElement) {
+            priceElement.textContent = parseFloat(priceElement.dataset.originalPrice).toFixed(2);
+        }
+        showErrorMessage('Erro ao atualizar preço');
+    });
+}
+
+function showErrorMessage(message) {
+    const errorDiv = document.createElement('div');
+    errorDiv.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        background: linear-gradient(135deg, #fef2f2 0%, #fee2e2 100%);
+        color: #dc2626;
+        padding: 12px 16px;
+        border-radius: 8px;
+        border: 1px solid #fecaca;
+        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+        z-index: 10000;
+        font-weight: 500;
+        max-width: 300px;
+    `;
+    errorDiv.innerHTML = `<i class="fas fa-exclamation-triangle"></i> ${message}`;
+    document.body.appendChild(errorDiv);
+
+    setTimeout(() => errorDiv.remove(), 4000);
+}
+
+// Função para controlar a expansão dos detalhes de transporte
+function toggleTransportDetails() {
+    const content = document.getElementById('transport-explanation-content');
+    const icon = document.getElementById('transport-toggle-icon');
+
+    if (content.style.display === 'none' || content.style.display === '') {
+        content.style.display = 'block';
+        icon.style.transform = 'rotate(180deg)';
+    } else {
+        content.style.display = 'none';
+        icon.style.transform = 'rotate(0deg)';
+    }
+}
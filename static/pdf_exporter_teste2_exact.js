@@ -31,15 +31,39 @@ function formatQuantity(value) {
   return num.toFixed(2).replace('.', ',');
 }
 
+// pdf-lib só é descarregado quando o utilizador exporta um PDF (não em cada página)
+const PDF_LIB_URL = 'https://unpkg.com/pdf-lib@1.17.1/dist/pdf-lib.min.js';
+let pdfLibLoading = null;
+
+function loadPdfLib() {
+  if (window.PDFLib) return Promise.resolve(window.PDFLib);
+  if (!pdfLibLoading) {
+    pdfLibLoading = new Promise((resolve, reject) => {
+      const script = document.createElement('script');
+      script.src = PDF_LIB_URL;
+      script.onload = () => resolve(window.PDFLib);
+      script.onerror = () => {
+        pdfLibLoading = null;  // permitir nova tentativa
+        reject(new Error('Não foi possível carregar a biblioteca pdf-lib'));
+      };
+      document.head.appendChild(script);
+    });
+  }
+  return pdfLibLoading;
+}
+
 // Função principal para gerar PDF (igual ao teste2)
 async function gerarPDF(orcamento) {
   try {
     // Caminho do modelo PDF (igual ao teste2)
     const modeloUrl = window.location.origin + '/static/template_orcamento.pdf';
     
-    // Carregar PDF modelo
-    const modeloBytes = await fetch(modeloUrl).then(r => r.arrayBuffer());
-    const { PDFDocument, StandardFonts, rgb } = window.PDFLib;
+    // Carregar PDF modelo e a biblioteca em paralelo
+    const [modeloBytes, PDFLib] = await Promise.all([
+      fetch(modeloUrl).then(r => r.arrayBuffer()),
+      loadPdfLib()
+    ]);
+    const { PDFDocument, StandardFonts, rgb } = PDFLib;
     const pdfDoc = await PDFDocument.load(modeloBytes);
     
     // Fonte para textos dinâmicos
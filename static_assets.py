@@ -0,0 +1,219 @@
+# Recursos Estáticos - Servir /static com cache HTTP, pedidos condicionais e ranges
+# Os templates pedem asset_url('budget_clean.js') e recebem /static/budget_clean.<hash>.js;
+# como o nome muda sempre que o conteúdo muda, o browser pode guardar o ficheiro
+# durante um ano sem revalidar. Não são escritas cópias: a rota /static resolve o
+# nome com hash para o ficheiro original. Os metadados dos ficheiros (tamanho, data,
+# ETag, irmãos .br/.gz) ficam em memória para não fazer stat a cada pedido.
+
+import os
+import re
+import stat
+import time
+import hashlib
+import mimetypes
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+from werkzeug.security import safe_join
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import wrap_file
+
+from http_compression import STATIC_ENCODINGS
+
+# Cache dos recursos com hash no nome (um ano, sem revalidação)
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# Cache dos restantes ficheiros: curta e depois revalidada (ETag / If-Modified-Since)
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 300))
+
+# Durante quantos segundos os metadados de um ficheiro são reutilizados sem novo stat
+STATIC_STAT_TTL = float(os.environ.get('STATIC_STAT_TTL', 2))
+
+# Entrega do ficheiro pelo proxy em vez do Python: 'x-sendfile' (Apache/lighttpd)
+# ou 'x-accel' (nginx, com uma location internal em STATIC_ACCEL_PREFIX)
+STATIC_SENDFILE = os.environ.get('STATIC_SENDFILE', '').lower()
+STATIC_ACCEL_PREFIX = os.environ.get('STATIC_ACCEL_PREFIX', '/_static_files/')
+
+HASH_LENGTH = 10
+
+_FINGERPRINT_RE = re.compile(r'^(?P<base>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[A-Za-z0-9]+)$' % HASH_LENGTH)
+
+
+class StaticFile:
+    """Metadados de um ficheiro estático (e das variantes pré-comprimidas)"""
+
+    __slots__ = ('name', 'path', 'size', 'mtime_ns', 'etag', 'last_modified', 'mimetype', 'variants', 'checked')
+
+    def __init__(self, name, path, st, mimetype, variants):
+        self.name = name
+        self.path = path
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.etag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+        self.last_modified = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+        self.mimetype = mimetype
+        # {codificação: StaticFile} dos irmãos .br/.gz atualizados
+        self.variants = variants
+        self.checked = time.monotonic()
+
+
+class StaticFileCache:
+    """
+    Metadados dos ficheiros de uma pasta, revalidados (stat) no máximo a cada
+    `ttl` segundos. Ficheiros inexistentes não ficam em cache.
+    """
+
+    def __init__(self, folder, ttl=STATIC_STAT_TTL):
+        self.folder = folder
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._files: Dict[str, StaticFile] = {}
+        self.stat_calls = 0
+
+    def _stat(self, path):
+        self.stat_calls += 1
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st if stat.S_ISREG(st.st_mode) else None
+
+    def _load(self, name, path):
+        st = self._stat(path)
+        if st is None:
+            return None
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        variants = {}
+        for encoding, suffix in STATIC_ENCODINGS:
+            sibling = self._stat(path + suffix)
+            # Irmão mais antigo que o original está desatualizado: ignorar
+            if sibling is not None and sibling.st_mtime_ns >= st.st_mtime_ns:
+                variants[encoding] = StaticFile(name + suffix, path + suffix, sibling, mimetype, {})
+        return StaticFile(name, path, st, mimetype, variants)
+
+    def get(self, name) -> Optional[StaticFile]:
+        """Metadados do ficheiro, ou None se não existir (ou sair da pasta)"""
+        entry = self._files.get(name)
+        if entry is not None and time.monotonic() - entry.checked < self.ttl:
+            return entry
+
+        path = safe_join(self.folder, name)
+        if path is None:
+            return None
+        if entry is not None:
+            st = self._stat(path)
+            if st is not None and (st.st_mtime_ns, st.st_size) == (entry.mtime_ns, entry.size):
+                # Sem alterações no original; os irmãos são relidos no próximo carregamento
+                entry.checked = time.monotonic()
+                return entry
+        entry = self._load(name, path)
+        with self._lock:
+            if entry is None:
+                self._files.pop(name, None)
+            else:
+                self._files[name] = entry
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self._files.clear()
+
+
+class AssetManifest:
+    """Hash do conteúdo de cada ficheiro estático, recalculado só quando o ficheiro muda"""
+
+    def __init__(self, files: StaticFileCache):
+        self.files = files
+        self._lock = threading.Lock()
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
+
+    def content_hash(self, filename):
+        """Hash (curto) do conteúdo do ficheiro, ou None se não existir"""
+        entry = self.files.get(filename)
+        if entry is None:
+            return None
+        cached = self._hashes.get(filename)
+        if cached is not None and cached[:2] == (entry.mtime_ns, entry.size):
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(entry.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()[:HASH_LENGTH]
+        with self._lock:
+            self._hashes[filename] = (entry.mtime_ns, entry.size, content_hash)
+        return content_hash
+
+    def fingerprinted(self, filename):
+        """Nome com o hash do conteúdo (ex: budget_clean.3f2a1b9c0d.js); o próprio nome se não existir"""
+        content_hash = self.content_hash(filename)
+        if content_hash is None:
+            return filename
+        base, ext = os.path.splitext(filename)
+        return f"{base}.{content_hash}{ext}"
+
+    def resolve(self, requested):
+        """
+        (ficheiro original, imutável) para um nome pedido à rota /static. Um nome
+        com hash desatualizado (página antiga) serve o ficheiro atual, sem cache longa.
+        """
+        match = _FINGERPRINT_RE.match(requested)
+        if match:
+            original = match.group('base') + match.group('ext')
+            content_hash = self.content_hash(original)
+            if content_hash is not None:
+                return original, content_hash == match.group('hash')
+        return requested, False
+
+
+def choose_variant(entry: StaticFile, accept_encodings, ranged=False):
+    """(ficheiro a enviar, codificação) conforme o Accept-Encoding; pedidos com Range usam o original"""
+    if not ranged:
+        for encoding, _ in STATIC_ENCODINGS:
+            variant = entry.variants.get(encoding)
+            if variant is not None and accept_encodings[encoding] > 0:
+                return variant, encoding
+    return entry, None
+
+
+def send_static_file(environ, entry: StaticFile, encoding=None, immutable=False, sendfile=STATIC_SENDFILE):
+    """
+    Resposta para um ficheiro estático: ETag/Last-Modified com 304, ranges (206)
+    e Cache-Control longa (immutable) ou curta com revalidação. Com sendfile o
+    corpo é entregue pelo proxy (X-Sendfile / X-Accel-Redirect).
+    """
+    if sendfile in ('x-sendfile', 'x-accel'):
+        response = Response(mimetype=entry.mimetype)
+        if sendfile == 'x-accel':
+            response.headers['X-Accel-Redirect'] = STATIC_ACCEL_PREFIX.rstrip('/') + '/' + quote(entry.name)
+        else:
+            response.headers['X-Sendfile'] = entry.path
+        # O proxy trata os ranges; aqui só se decide o 304
+        accept_ranges, complete_length = False, None
+    else:
+        data = wrap_file(environ, open(entry.path, 'rb'))
+        response = Response(data, mimetype=entry.mimetype, direct_passthrough=True)
+        response.content_length = entry.size
+        accept_ranges, complete_length = True, entry.size
+
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(entry.etag)
+    response.last_modified = entry.last_modified
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.max_age = ASSET_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.must_revalidate = True
+
+    response.make_conditional(environ, accept_ranges=accept_ranges, complete_length=complete_length)
+    if response.status_code == 304 and response.direct_passthrough:
+        # O corpo não vai ser enviado: fechar já o ficheiro
+        response.response.close()
+    return response